@@ -1,35 +1,445 @@
-from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter, ArgumentTypeError
+import os
+import sys
 
-# run test
-from entity_linking.classification_report import create_report_for_result
-from entity_linking.wikidata_api import WikidataAPI, WikidataWebAPI, WikidataDBAPI
-from entity_linking.entity_classifier import WikipediaContextGraphEntityClassifier
-from entity_linking.tokenizer import WikidataMorphTagsTokenizer
+# only light modules are imported here - classifiers, pandas, plotting libraries and Morfeusz
+# are loaded by the command that needs them, so help and argument errors are fast
+from entity_linking.utils import (DEFAULT_PROCESSES_NUMBER, DEFAULT_MAX_BATCH_SIZE,
+                                  DEFAULT_MAX_BATCH_WAIT, DEFAULT_WEB_CONCURRENCY,
+                                  DEFAULT_WEB_RATE_LIMIT, DEFAULT_STAGE_QUEUE_SIZE,
+                                  DEFAULT_PREWARM_CONCURRENCY, DEFAULT_SHARD_SIZE,
+                                  DEFAULT_JOB_LEASE, DEFAULT_CHECKPOINT_EVERY)
 
 
-import sys
+def get_wikidata_api(database_name: str, record_file: str = "", replay_file: str = "",
+                     replay_latency: float = 0.0, async_web: bool = False,
+                     web_concurrency: int = DEFAULT_WEB_CONCURRENCY,
+                     web_rate: float = DEFAULT_WEB_RATE_LIMIT, negative_cache: str = "",
+                     cache_policy=None, web_processes: int = 1):
+    from entity_linking.wikidata_api import WikidataWebAPI, WikidataDBAPI
+
+    if replay_file != "":
+        from entity_linking.wikidata_recording import ReplayWikidataAPI
+
+        return ReplayWikidataAPI(replay_file, replay_latency / 1000.0)
+
+    from entity_linking.wikidata_snapshot import WikidataSnapshotAPI, is_snapshot_file
+
+    snapshot = database_name != "" and is_snapshot_file(database_name)
 
+    web_api = None
+    if async_web:
+        import atexit
+        from entity_linking.wikidata_async_api import WikidataAsyncAPI
 
-def run_test_command(input_file: str, seq_number: int, database_name: str):
-    api: WikidataAPI
+        # every worker process has its own client, so they share the rate limit
+        web_api = WikidataAsyncAPI(web_concurrency, web_rate / max(1, web_processes))
+        # session and event loop of this process are closed after database finished background refreshes
+        atexit.register(web_api.close)
 
-    if database_name != "":
-        api = WikidataDBAPI(database_name)
+    if database_name != "" and not snapshot:
+        import atexit
+
+        # rows missing in database are fetched by asynchronous client if it is used
+        api = WikidataDBAPI(database_name, cache_policy, web_api=web_api)
+        # hits counted in memory, background refreshes and eviction are finished at exit
+        atexit.register(api.close)
+    elif web_api is not None:
+        api = web_api
     else:
         api = WikidataWebAPI()
 
-    tokenizer = WikidataMorphTagsTokenizer(api, 2)
-    graph_classifier = WikipediaContextGraphEntityClassifier(tokenizer, api, 5, 8)
+    if snapshot:
+        # snapshot is read-only, lookups missing in it go to web
+        api = WikidataSnapshotAPI(database_name, api)
+
+    if negative_cache != "":
+        import atexit
+        from entity_linking.negative_cache import NegativeCacheWikidataAPI
+
+        api = NegativeCacheWikidataAPI(api, negative_cache)
+        atexit.register(finish_negative_cache, api)
+
+    if record_file != "":
+        from entity_linking.wikidata_recording import RecordingWikidataAPI
+
+        return RecordingWikidataAPI(api, record_file)
+
+    return api
+
+
+def finish_negative_cache(api):
+    api.save()
+    stats = api.stats()
+    measured = "-" if stats["measured_fp_rate"] is None else f"{stats['measured_fp_rate']:.4f}"
+    print(f"Negative cache: {stats['keys']} keys, {stats['hits']} hits, "
+          f"false positive rate: estimated {stats['estimated_fp_rate']:.6f}, "
+          f"measured {measured} ({stats['verified']} verified)")
+
+
+def get_reachability_backend(sparql_reachability: bool, api=None):
+    if not sparql_reachability:
+        return None
+
+    from entity_linking.reachability import CachedReachability, SparqlReachability
+    from entity_linking.wikidata_recording import (RecordingReachability, RecordingWikidataAPI,
+                                                   ReplayReachability, ReplayWikidataAPI)
+
+    # SPARQL queries are recorded and replayed with other lookups
+    if isinstance(api, ReplayWikidataAPI):
+        return CachedReachability(ReplayReachability(api))
+    if isinstance(api, RecordingWikidataAPI):
+        return CachedReachability(RecordingReachability(SparqlReachability(), api))
+    return CachedReachability(SparqlReachability())
+
+
+def finish_recording(api, record_file: str):
+    if record_file != "":
+        from entity_linking.wikidata_recording import RecordingWikidataAPI, merge_recordings
+
+        # part of this process is completed before it is merged
+        if isinstance(api, RecordingWikidataAPI):
+            api.close()
+        print(f"Recorded lookups: {merge_recordings(record_file)}")
+
+
+def start_memory_profiling(interval: int, output_dir: str):
+    if interval > 0:
+        from entity_linking.maintenance.memory_profiler import enable_memory_profiling
+
+        enable_memory_profiling(interval, output_dir)
+
+
+def finish_memory_profiling(interval: int, output_dir: str):
+    if interval > 0:
+        from entity_linking.maintenance.memory_profiler import (REPORT_MEMORY_PROFILE,
+                                                                disable_memory_profiling,
+                                                                load_memory_reports,
+                                                                summarize_memory_reports)
+
+        disable_memory_profiling()
+        summary = summarize_memory_reports(load_memory_reports(output_dir))
+        with open(os.path.join(output_dir, REPORT_MEMORY_PROFILE), "w") as f:
+            f.write(summary)
+        print(summary)
+
+
+def add_profile_memory_argument(parser: ArgumentParser):
+    parser.add_argument(
+        '--profile-memory', type=int, default=0, metavar="N",
+        help="Take tracemalloc snapshot every N sequences in every process and report memory growth, 0 - off"
+    )
+
+
+def add_web_api_arguments(parser: ArgumentParser):
+    parser.add_argument(
+        '--async-web', action="store_true",
+        help="Use asynchronous wikidata and wikipedia client with pooled connections"
+    )
+    parser.add_argument(
+        '--web-concurrency', type=int, default=DEFAULT_WEB_CONCURRENCY, help="Max number of requests in flight of asynchronous client"
+    )
+    parser.add_argument(
+        '--web-rate', type=float, default=DEFAULT_WEB_RATE_LIMIT, help="Max number of requests per second of asynchronous client, shared by all worker processes"
+    )
+    parser.add_argument(
+        '--sparql-reachability', action="store_true",
+        help="Skip candidates that reach no target entity - checked by one SPARQL query per sequence"
+    )
+    parser.add_argument(
+        '--negative-cache', type=str, default="",
+        help="Path to Bloom filter of tokens and entities without results, created if missing"
+    )
+    parser.add_argument(
+        '--cache-ttl', type=float, default=0, help="Hours after which database rows are fetched again, 0 - never"
+    )
+    parser.add_argument(
+        '--cache-max-rows', type=int, default=0, help="Max number of rows of database tables, 0 - no limit"
+    )
+    parser.add_argument(
+        '--cache-max-bytes', type=int, default=0, help="Max size of data of database tables, 0 - no limit"
+    )
+    parser.add_argument(
+        '--cache-eviction', choices=["lru", "lfu"], default="lru",
+        help="Rows removed first from database over limit - least recently or least frequently used"
+    )
+
+
+def get_cache_policy(args):
+    if args.cache_ttl <= 0 and args.cache_max_rows <= 0 and args.cache_max_bytes <= 0:
+        return None
 
-    result = graph_classifier.classify_sequences_from_file(
-        input_file, seq_number
+    from entity_linking.wikidata_db_api import CachePolicy
+
+    return CachePolicy(args.cache_ttl * 3600, args.cache_max_rows, args.cache_max_bytes, args.cache_eviction)
+
+
+def check_checkpoint_arguments(parser: ArgumentParser, args):
+    if args.resume and not args.checkpoint_dir:
+        parser.error("--resume requires --checkpoint-dir")
+    if args.pipeline and args.checkpoint_dir:
+        parser.error("Checkpoints are saved only by run without --pipeline")
+
+
+def add_record_replay_arguments(parser: ArgumentParser):
+    parser.add_argument(
+        '--record', type=str, default="", help="Log all wikidata and wikipedia lookups to this file"
+    )
+    parser.add_argument(
+        '--replay', type=str, default="", help="Serve wikidata and wikipedia lookups from this recording"
+    )
+    parser.add_argument(
+        '--replay-latency', type=float, default=0.0, help="Simulated latency of replayed lookup in ms"
+    )
+
+
+def parse_stage_workers(value: str):
+    name, _, workers = value.partition("=")
+    try:
+        return name, int(workers)
+    except ValueError:
+        raise ArgumentTypeError(f"Expected STAGE=N, not {value}")
+
+
+def add_pipeline_arguments(parser: ArgumentParser):
+    parser.add_argument(
+        '--pipeline', action="store_true",
+        help="Classify with staged pipeline - stages run by own worker threads and connected by bounded queues"
+    )
+    parser.add_argument(
+        '--stage-workers', type=parse_stage_workers, nargs="+", default=[], metavar="STAGE=N",
+        help="Number of worker threads of pipeline stage: tokenize, lookup, graph, score or aggregate"
+    )
+    parser.add_argument(
+        '--queue-size', type=int, default=DEFAULT_STAGE_QUEUE_SIZE, help="Max number of sequences in queue between pipeline stages"
     )
 
-    create_report_for_result(result,
+
+def run_test_command(input_file: str, seq_number: int, database_name: str, prometheus: bool,
+                     record_file: str = "", replay_file: str = "", replay_latency: float = 0.0,
+                     profile_memory: int = 0, async_web: bool = False,
+                     web_concurrency: int = DEFAULT_WEB_CONCURRENCY, web_rate: float = DEFAULT_WEB_RATE_LIMIT,
+                     pipeline: bool = False, stage_workers=None, queue_size: int = DEFAULT_STAGE_QUEUE_SIZE,
+                     sparql_reachability: bool = False, negative_cache: str = "", cache_policy=None,
+                     checkpoint_dir: str = "", resume: bool = False,
+                     checkpoint_every: int = DEFAULT_CHECKPOINT_EVERY):
+    import shutil
+    import tempfile
+    from entity_linking.classification_report import create_report_for_result
+    from entity_linking.entity_classifier import WikipediaContextGraphEntityClassifier
+    from entity_linking.tokenizer import WikidataMorphTagsTokenizer
+
+    api = get_wikidata_api(database_name, record_file, replay_file, replay_latency,
+                           async_web, web_concurrency, web_rate, negative_cache, cache_policy, 8)
+
+    tokenizer = WikidataMorphTagsTokenizer(api, 2)
+    graph_classifier = WikipediaContextGraphEntityClassifier(
+        tokenizer, api, 5, 8, reachability=get_reachability_backend(sparql_reachability, api))
+
+    # report folder is created after run, so memory reports are moved there at the end
+    memory_dir = tempfile.mkdtemp(prefix="memory_") if profile_memory > 0 else ""
+    start_memory_profiling(profile_memory, memory_dir)
+
+    if pipeline:
+        from entity_linking.staged_pipeline import (classify_sequences_with_pipeline,
+                                                    format_pipeline_stats)
+
+        result, stages_stats = classify_sequences_with_pipeline(
+            graph_classifier, input_file, seq_number, dict(stage_workers or []), queue_size
+        )
+        print(format_pipeline_stats(stages_stats))
+    else:
+        result = graph_classifier.classify_sequences_from_file(
+            input_file, seq_number, checkpoint_dir, resume, checkpoint_every
+        )
+    finish_recording(api, record_file)
+    finish_memory_profiling(profile_memory, memory_dir)
+
+    report_dir = create_report_for_result(result,
         seq_number,
         input_file,
         f"classifier:{WikidataMorphTagsTokenizer.__name__}, "
-        f"tokenizer: {WikipediaContextGraphEntityClassifier.__name__}")
+        f"tokenizer: {WikipediaContextGraphEntityClassifier.__name__}",
+        graph_classifier.run_metrics,
+        prometheus)
+
+    if memory_dir:
+        shutil.move(memory_dir, os.path.join(report_dir, "memory"))
+
+
+def run_run_command(input_file: str, output_file: str, seq_number: int, database_name: str,
+                    raw_text: bool, processes_num: int, unordered: bool, metrics_file: str,
+                    record_file: str = "", replay_file: str = "", replay_latency: float = 0.0,
+                    profile_memory: int = 0, async_web: bool = False,
+                    web_concurrency: int = DEFAULT_WEB_CONCURRENCY, web_rate: float = DEFAULT_WEB_RATE_LIMIT,
+                    sparql_reachability: bool = False, negative_cache: str = "", cache_policy=None):
+    import csv
+    from itertools import islice
+    from entity_linking.batch_linker import link_sequences
+    from entity_linking.entity_classifier import WikipediaContextGraphEntityClassifier
+    from entity_linking.load_test_data import get_sequences_from_file
+    from entity_linking.raw_text_pipeline import get_sequences_from_raw_text
+    from entity_linking.tokenizer import WikidataMorphTagsTokenizer
+
+    api = get_wikidata_api(database_name, record_file, replay_file, replay_latency,
+                           async_web, web_concurrency, web_rate, negative_cache, cache_policy,
+                           processes_num)
+
+    tokenizer = WikidataMorphTagsTokenizer(api, 2)
+    graph_classifier = WikipediaContextGraphEntityClassifier(
+        tokenizer, api, 5, processes_num, reachability=get_reachability_backend(sparql_reachability, api))
+
+    memory_dir = f"{output_file}.memory"
+    start_memory_profiling(profile_memory, memory_dir)
+
+    with open(input_file) as in_file, open(output_file, "w") as out_file:
+        if raw_text:
+            sequences = get_sequences_from_raw_text(in_file, processes_num)
+        else:
+            sequences = get_sequences_from_file(csv.reader(in_file, delimiter="\t"))
+
+        if seq_number > 0:
+            sequences = islice(sequences, seq_number)
+
+        summary = link_sequences(graph_classifier, sequences, out_file,
+                                 processes_num, not unordered)
+
+    finish_recording(api, record_file)
+    finish_memory_profiling(profile_memory, memory_dir)
+    print(summary)
+
+    if metrics_file:
+        with open(metrics_file, "w") as m_file:
+            m_file.write(summary.metrics.to_json())
+
+
+def run_serve_command(database_name: str, host: str, port: int, socket_path: str,
+                      batch_size: int, batch_wait: float, async_web: bool = False,
+                      web_concurrency: int = DEFAULT_WEB_CONCURRENCY, web_rate: float = DEFAULT_WEB_RATE_LIMIT,
+                      sparql_reachability: bool = False, negative_cache: str = "", cache_policy=None):
+    from entity_linking.entity_classifier import WikipediaContextGraphEntityClassifier
+    from entity_linking.linking_service import LinkingService, create_server
+    from entity_linking.tokenizer import WikidataMorphTagsTokenizer
+
+    api = get_wikidata_api(database_name, async_web=async_web, web_concurrency=web_concurrency,
+                           web_rate=web_rate, negative_cache=negative_cache,
+                           cache_policy=cache_policy)
+
+    tokenizer = WikidataMorphTagsTokenizer(api, 2)
+    graph_classifier = WikipediaContextGraphEntityClassifier(
+        tokenizer, api, 5, 1, reachability=get_reachability_backend(sparql_reachability, api))
+
+    service = LinkingService(graph_classifier, batch_size, batch_wait)
+    server = create_server(service, host, port, socket_path)
+
+    print(f"Serving on {socket_path if socket_path else f'http://{host}:{port}'}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(service.latency)
+
+
+def run_prewarm_command(input_file: str, seq_number: int, database_name: str, concurrency: int,
+                        wikipedia: bool, record_file: str = "", async_web: bool = False,
+                        web_concurrency: int = DEFAULT_WEB_CONCURRENCY, web_rate: float = DEFAULT_WEB_RATE_LIMIT,
+                        negative_cache: str = "", cache_policy=None):
+    from entity_linking.prewarm import DATABASE_PHASES, PREWARM_PHASES, prewarm_cache
+    from entity_linking.staged_pipeline import load_sequences
+    from entity_linking.tokenizer import WikidataMorphTagsTokenizer
+    from entity_linking.wikidata_snapshot import is_snapshot_file
+
+    api = get_wikidata_api(database_name, record_file, async_web=async_web, web_concurrency=web_concurrency,
+                           web_rate=web_rate, negative_cache=negative_cache,
+                           cache_policy=cache_policy)
+
+    # recording keeps every lookup, database doesn't keep wikipedia pages and snapshot is read-only
+    if record_file != "":
+        persistent_phases = PREWARM_PHASES
+    elif database_name != "" and not is_snapshot_file(database_name):
+        persistent_phases = DATABASE_PHASES
+    else:
+        persistent_phases = ()
+
+    # the same tokenizer and graph levels as classifier of test and run commands, wikipedia pages are
+    # fetched only when recording keeps them
+    report = prewarm_cache(api, WikidataMorphTagsTokenizer(api, 2), load_sequences(input_file, seq_number), 5,
+                           concurrency, wikipedia and record_file != "", persistent_phases)
+    finish_recording(api, record_file)
+    print(report)
+
+
+def run_export_snapshot_command(database_name: str, snapshot_name: str):
+    from entity_linking.wikidata_snapshot import export_snapshot
+
+    for table, records in export_snapshot(database_name, snapshot_name).items():
+        print(f"{table}: {records} records")
+    print(f"Snapshot created! Path: {snapshot_name}")
+
+
+def run_shard_enqueue_command(input_file: str, seq_number: int, queue_name: str, shard_size: int,
+                              results_dir: str):
+    from entity_linking.sharded_run import JobQueue, split_sequences
+
+    ranges = split_sequences(input_file, seq_number, shard_size)
+    JobQueue(queue_name).create(input_file, ranges, results_dir or f"{queue_name}.results")
+    print(f"Enqueued {len(ranges)} jobs, {sum(r.sequences for r in ranges)} sequences! Path: {queue_name}")
+
+
+def run_shard_work_command(queue_name: str, database_name: str, processes_num: int, worker: str, lease: float,
+                           async_web: bool = False, web_concurrency: int = DEFAULT_WEB_CONCURRENCY,
+                           web_rate: float = DEFAULT_WEB_RATE_LIMIT, sparql_reachability: bool = False,
+                           negative_cache: str = "", cache_policy=None):
+    from entity_linking.entity_classifier import WikipediaContextGraphEntityClassifier
+    from entity_linking.sharded_run import JobQueue, run_worker
+    from entity_linking.tokenizer import WikidataMorphTagsTokenizer
+
+    api = get_wikidata_api(database_name, async_web=async_web, web_concurrency=web_concurrency,
+                           web_rate=web_rate, negative_cache=negative_cache,
+                           cache_policy=cache_policy, web_processes=processes_num)
+
+    # the same classifier as classifier of test command
+    tokenizer = WikidataMorphTagsTokenizer(api, 2)
+    graph_classifier = WikipediaContextGraphEntityClassifier(
+        tokenizer, api, 5, processes_num, reachability=get_reachability_backend(sparql_reachability, api))
+
+    done = run_worker(graph_classifier, queue_name, worker, lease)
+    print(f"Classified jobs: {done}")
+    print(JobQueue(queue_name).progress())
+
+
+def run_shard_merge_command(queue_name: str, prometheus: bool):
+    from entity_linking.classification_report import create_report_for_result
+    from entity_linking.entity_classifier import WikipediaContextGraphEntityClassifier
+    from entity_linking.sharded_run import JobQueue, merge_results
+    from entity_linking.tokenizer import WikidataMorphTagsTokenizer
+
+    result, metrics, seq_number = merge_results(queue_name)
+
+    report_dir = create_report_for_result(result,
+        seq_number,
+        JobQueue(queue_name).get_meta()["input_file"],
+        f"classifier:{WikidataMorphTagsTokenizer.__name__}, "
+        f"tokenizer: {WikipediaContextGraphEntityClassifier.__name__}",
+        metrics,
+        prometheus)
+    print(f"Report created! Path: {report_dir}")
+
+
+def run_load_test_command(input_file: str, seq_number: int, url: str, concurrency: int,
+                          requests_num: int):
+    from entity_linking.load_test_client import run_load_test
+    from entity_linking.load_test_data import load_sequences_from_test_file_with_lemmas_and_tags
+
+    sequences = load_sequences_from_test_file_with_lemmas_and_tags(input_file, seq_number)
+
+    result = run_load_test(url, sequences, concurrency, requests_num)
+
+    print(result["histogram"])
+    print(f"Errors: {result['errors']}")
+    print(f"Throughput: {round(result['requests_per_second'], 2)} requests/s")
 
 
 def get_args_parser() -> ArgumentParser:
@@ -50,16 +460,202 @@ def get_args_parser() -> ArgumentParser:
     test_parser.add_argument(
         '-db', type=str, required=False, default="", help="Path to database",
     )
+    test_parser.add_argument(
+        '--prometheus', action="store_true", help="Save run metrics also in Prometheus text format",
+    )
+    add_web_api_arguments(test_parser)
+    add_record_replay_arguments(test_parser)
+    add_profile_memory_argument(test_parser)
+    add_pipeline_arguments(test_parser)
+    test_parser.add_argument(
+        '--checkpoint-dir', type=str, default="", help="Directory where results are saved during run"
+    )
+    test_parser.add_argument(
+        '--resume', action="store_true", help="Don't classify again sequences saved in --checkpoint-dir"
+    )
+    test_parser.add_argument(
+        '--checkpoint-every', type=int, default=DEFAULT_CHECKPOINT_EVERY,
+        help="Save checkpoint every N classified sequences"
+    )
 
-    '''
-    run_parser = subparsers.add_parser("run")
+    def run_test(args):
+        check_checkpoint_arguments(test_parser, args)
+        run_test_command(args.input, args.num, args.db, args.prometheus,
+                         args.record, args.replay, args.replay_latency,
+                         args.profile_memory, args.async_web,
+                         args.web_concurrency, args.web_rate,
+                         args.pipeline, args.stage_workers, args.queue_size,
+                         args.sparql_reachability, args.negative_cache,
+                         get_cache_policy(args), args.checkpoint_dir, args.resume,
+                         args.checkpoint_every)
 
-    run_parser.add_argument('-i', '--input', required=True, type=str,
-                        help="Input file")
+    test_parser.set_defaults(func=run_test)
 
+    run_parser = subparsers.add_parser("run", formatter_class=ArgumentDefaultsHelpFormatter)
+
+    run_parser.add_argument('-i', '--input', required=True, type=str,
+                            help="Input file - PolEval TSV or raw text with --raw")
     run_parser.add_argument('-o', '--output', required=True, type=str,
-                        help="Output file")
-    '''
+                            help="Output file")
+    run_parser.add_argument(
+        '-N', '--num', type=int, default=0, help="Sequences number, 0 - all"
+    )
+    run_parser.add_argument(
+        '-db', type=str, required=False, default="", help="Path to database",
+    )
+    run_parser.add_argument(
+        '--raw', action="store_true", help="Input file is raw text, one sequence per line"
+    )
+    run_parser.add_argument(
+        '-p', '--processes', type=int, default=DEFAULT_PROCESSES_NUMBER, help="Number of worker processes"
+    )
+    run_parser.add_argument(
+        '--unordered', action="store_true", help="Write sequences in order of completion"
+    )
+    run_parser.add_argument(
+        '--metrics', type=str, default="", help="Path to JSON file for timers and counters of run"
+    )
+    add_web_api_arguments(run_parser)
+    add_record_replay_arguments(run_parser)
+    add_profile_memory_argument(run_parser)
+    run_parser.set_defaults(
+        func=lambda args: run_run_command(args.input, args.output, args.num, args.db,
+                                          args.raw, args.processes, args.unordered, args.metrics,
+                                          args.record, args.replay, args.replay_latency,
+                                          args.profile_memory, args.async_web,
+                                          args.web_concurrency, args.web_rate,
+                                          args.sparql_reachability, args.negative_cache,
+                                          get_cache_policy(args)))
+
+    serve_parser = subparsers.add_parser("serve", formatter_class=ArgumentDefaultsHelpFormatter)
+
+    serve_parser.add_argument(
+        '-db', type=str, required=False, default="", help="Path to database",
+    )
+    serve_parser.add_argument('--host', type=str, default="127.0.0.1", help="Host to listen on")
+    serve_parser.add_argument('--port', type=int, default=8080, help="Port to listen on")
+    serve_parser.add_argument(
+        '--socket', type=str, default="", help="Path to Unix socket, used instead of host and port"
+    )
+    serve_parser.add_argument(
+        '--batch-size', type=int, default=DEFAULT_MAX_BATCH_SIZE, help="Max number of sequences in micro-batch"
+    )
+    serve_parser.add_argument(
+        '--batch-wait', type=float, default=DEFAULT_MAX_BATCH_WAIT, help="Max time to fill micro-batch in seconds"
+    )
+    add_web_api_arguments(serve_parser)
+    serve_parser.set_defaults(
+        func=lambda args: run_serve_command(args.db, args.host, args.port, args.socket,
+                                            args.batch_size, args.batch_wait, args.async_web,
+                                            args.web_concurrency, args.web_rate,
+                                            args.sparql_reachability, args.negative_cache,
+                                            get_cache_policy(args)))
+
+    load_test_parser = subparsers.add_parser("load-test", formatter_class=ArgumentDefaultsHelpFormatter)
+
+    load_test_parser.add_argument(
+        '-i', '--input', required=True, type=str, help="Input file with sequences to send"
+    )
+    load_test_parser.add_argument(
+        '-N', '--num', type=int, default=100, help="Number of sequences read from input file"
+    )
+    load_test_parser.add_argument(
+        '--url', type=str, default="http://127.0.0.1:8080", help="Address of linking service"
+    )
+    load_test_parser.add_argument('-c', '--concurrency', type=int, default=8, help="Number of clients")
+    load_test_parser.add_argument('-n', '--requests', type=int, default=1000, help="Number of requests")
+    load_test_parser.set_defaults(
+        func=lambda args: run_load_test_command(args.input, args.num, args.url,
+                                                args.concurrency, args.requests))
+
+    prewarm_parser = subparsers.add_parser("prewarm", formatter_class=ArgumentDefaultsHelpFormatter)
+
+    prewarm_parser.add_argument(
+        '-i', '--input', required=True, type=str, help="Input file"
+    )
+    prewarm_parser.add_argument(
+        '-N', '--num', required=True, type=int, help="Sequences number"
+    )
+    prewarm_parser.add_argument(
+        '-db', type=str, required=False, default="", help="Path to database",
+    )
+    prewarm_parser.add_argument(
+        '-c', '--concurrency', type=int, default=DEFAULT_PREWARM_CONCURRENCY, help="Number of lookups in flight"
+    )
+    prewarm_parser.add_argument(
+        '--no-wikipedia', action="store_true",
+        help="Wikipedia pages are fetched only when --record is given, because only recording keeps them - "
+             "this flag turns that off"
+    )
+    prewarm_parser.add_argument(
+        '--record', type=str, default="", help="Log all wikidata and wikipedia lookups to this file"
+    )
+    add_web_api_arguments(prewarm_parser)
+    prewarm_parser.set_defaults(
+        func=lambda args: run_prewarm_command(args.input, args.num, args.db, args.concurrency,
+                                              not args.no_wikipedia, args.record, args.async_web,
+                                              args.web_concurrency, args.web_rate, args.negative_cache,
+                                              get_cache_policy(args)))
+
+    export_snapshot_parser = subparsers.add_parser("export-snapshot", formatter_class=ArgumentDefaultsHelpFormatter)
+
+    export_snapshot_parser.add_argument('-db', type=str, required=True, help="Path to database")
+    export_snapshot_parser.add_argument(
+        '-o', '--output', required=True, type=str, help="Path to snapshot file, used later as -db"
+    )
+    export_snapshot_parser.set_defaults(
+        func=lambda args: run_export_snapshot_command(args.db, args.output))
+
+    shard_enqueue_parser = subparsers.add_parser("shard-enqueue", formatter_class=ArgumentDefaultsHelpFormatter)
+
+    shard_enqueue_parser.add_argument('-i', '--input', required=True, type=str, help="Input file")
+    shard_enqueue_parser.add_argument(
+        '-N', '--num', type=int, default=0, help="Sequences number, 0 - all"
+    )
+    shard_enqueue_parser.add_argument(
+        '-q', '--queue', required=True, type=str, help="Path to queue database on storage shared by workers"
+    )
+    shard_enqueue_parser.add_argument(
+        '--shard-size', type=int, default=DEFAULT_SHARD_SIZE, help="Number of sequences in one job"
+    )
+    shard_enqueue_parser.add_argument(
+        '--results-dir', type=str, default="", help="Directory of partial results, default: QUEUE.results"
+    )
+    shard_enqueue_parser.set_defaults(
+        func=lambda args: run_shard_enqueue_command(args.input, args.num, args.queue, args.shard_size,
+                                                    args.results_dir))
+
+    shard_work_parser = subparsers.add_parser("shard-work", formatter_class=ArgumentDefaultsHelpFormatter)
+
+    shard_work_parser.add_argument('-q', '--queue', required=True, type=str, help="Path to queue database")
+    shard_work_parser.add_argument(
+        '-db', type=str, required=False, default="", help="Path to database",
+    )
+    shard_work_parser.add_argument(
+        '-p', '--processes', type=int, default=DEFAULT_PROCESSES_NUMBER, help="Number of worker processes"
+    )
+    shard_work_parser.add_argument(
+        '--name', type=str, default="", help="Name of worker, default: host and process ID"
+    )
+    shard_work_parser.add_argument(
+        '--lease', type=float, default=DEFAULT_JOB_LEASE,
+        help="Seconds without renewal of claim after which unfinished job of worker is claimed by other worker"
+    )
+    add_web_api_arguments(shard_work_parser)
+    shard_work_parser.set_defaults(
+        func=lambda args: run_shard_work_command(args.queue, args.db, args.processes, args.name, args.lease,
+                                                 args.async_web, args.web_concurrency, args.web_rate,
+                                                 args.sparql_reachability, args.negative_cache,
+                                                 get_cache_policy(args)))
+
+    shard_merge_parser = subparsers.add_parser("shard-merge", formatter_class=ArgumentDefaultsHelpFormatter)
+
+    shard_merge_parser.add_argument('-q', '--queue', required=True, type=str, help="Path to queue database")
+    shard_merge_parser.add_argument(
+        '--prometheus', action="store_true", help="Save run metrics also in Prometheus text format",
+    )
+    shard_merge_parser.set_defaults(
+        func=lambda args: run_shard_merge_command(args.queue, args.prometheus))
 
     parser.set_defaults(func=lambda x: parser.print_help())
 
@@ -71,7 +667,7 @@ def main():
     print(sys.argv[1:])
     args = parser.parse_args(sys.argv[1:])
 
-    run_test_command(args.input, args.num, args.db)
+    args.func(args)
 
 
 if __name__ == "__main__":
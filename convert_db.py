@@ -0,0 +1,25 @@
+"""
+Simple script to convert database created before lists of IDs were saved as BLOBs.
+"""
+
+import argparse
+import os
+import sys
+
+from entity_linking.wikidata_db_api import convert_database
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("db_name", help="path to database")
+    parser.add_argument("--no-vacuum", action="store_true", help="don't rebuild database file after conversion")
+
+    args = parser.parse_args(sys.argv[1:])
+
+    if not os.path.isfile(args.db_name):
+        parser.error(f"The file {args.db_name} doesn't exist!")
+
+    converted = convert_database(args.db_name, vacuum=not args.no_vacuum)
+
+    print(f"Data base converted! Path: {args.db_name}")
+    for table, rows in converted.items():
+        print(f"{table}: {rows} rows saved as BLOB")
@@ -7,22 +7,35 @@ import sqlite3
 import sys
 
 from entity_linking.utils import parser_check_if_file_exists
+from entity_linking.wikidata_db_api import (CURRENT_SCHEMA_VERSION,
+                                            forget_database,
+                                            set_schema_version)
 
 
 def drop_and_create_database(database_name: str) -> None:
     """
-    Create SQLite3 data base with two tables:
-    entity: id text, sub text
-    token: id text, pages text
+    Create SQLite3 data base with five tables:
+    entity: id text, sub blob, fetched real, version integer, last_access real, hits integer
+    token: id text, pages blob, fetched real, version integer, last_access real, hits integer
+    ancestors: id text, config text, edges text, targets text, fetched real
+    ancestors_member: entity text, id text, config text
+    meta: key text, value text
 
     Entity describes subclasses of entity given by id.
     Token describes pages for given token from Wikidata.
-    Token pages and entity sub are save in format:
-    Q{NUM};...Q{NUM}.
+    Token pages and entity sub are saved as BLOBs encoded by ``encode_qids``, lists it can't encode are
+    saved in format Q{NUM};...Q{NUM};
+    Id of entity and token is unique key. Fetched is time of wikidata request, version is CACHE_ROW_VERSION of data, last_access and hits describe
+    use of row - they are used by TTL and eviction of CachePolicy.
+    Ancestors describes ancestor closure of entity given by id, computed for depth and targets described
+    by config - entity has one closure for every config. Edges are saved in format {LEVEL}:Q{NUM}:Q{NUM};...
+    Fetched of closure is fetched of the oldest entity row it was computed from. Ancestors_member describes
+    entities whose rows were read to compute closure given by id and config.
 
     Args:
         database_name: Path to new database.
     """
+    forget_database(database_name)
     conn = sqlite3.connect(database_name)
 
     c = conn.cursor()
@@ -33,11 +46,39 @@ def drop_and_create_database(database_name: str) -> None:
     # drop table token
     c.execute("""DROP TABLE IF EXISTS token""")
 
+    # drop table ancestors
+    c.execute("""DROP TABLE IF EXISTS ancestors""")
+
+    # drop table ancestors_member
+    c.execute("""DROP TABLE IF EXISTS ancestors_member""")
+
+    # drop table meta
+    c.execute("""DROP TABLE IF EXISTS meta""")
+
     # create table entity
-    c.execute("""CREATE TABLE entity (id text, sub text)""")
+    c.execute(
+        """CREATE TABLE entity (id text, sub blob, fetched real, version integer, last_access real, hits integer)"""
+    )
+    c.execute("""CREATE UNIQUE INDEX entity_id ON entity(id)""")
 
     # create table token
-    c.execute("""CREATE TABLE token (id text, pages text)""")
+    c.execute(
+        """CREATE TABLE token (id text, pages blob, fetched real, version integer, last_access real, hits integer)"""
+    )
+    c.execute("""CREATE UNIQUE INDEX token_id ON token(id)""")
+
+    # create table ancestors
+    c.execute(
+        """CREATE TABLE ancestors (id text, config text, edges text, targets text, fetched real, """
+        """PRIMARY KEY (id, config))"""
+    )
+
+    # create table ancestors_member
+    c.execute("""CREATE TABLE ancestors_member (entity text, id text, config text, PRIMARY KEY (entity, id, config))""")
+    c.execute("""CREATE INDEX ancestors_member_closure ON ancestors_member(id, config)""")
+
+    # create table meta
+    set_schema_version(conn, database_name, CURRENT_SCHEMA_VERSION)
 
     conn.commit()
     conn.close()
@@ -0,0 +1,170 @@
+"""
+Module with production linking path - sequences are streamed from input, classified by pool of workers and
+linked spans are written to output in PolEval format. No result DataFrame or report is created.
+"""
+
+import time
+from dataclasses import dataclass, field
+from multiprocessing import Pool
+from typing import Any, Dict, Iterable, List, TextIO, Tuple
+
+from entity_linking.entity_classifier import EntityClassifier
+from entity_linking.maintenance.memory_profiler import sequence_done
+from entity_linking.maintenance.metrics import METRICS, Metrics
+from entity_linking.utils import (DEFAULT_PROCESSES_NUMBER,
+                                  NOT_WIKIDATA_ENTITY_SIGN,
+                                  ClassificationResult, TokensGroup,
+                                  TokensSequence)
+
+# default number of sequences sent to worker process at once
+DEFAULT_LINKING_CHUNK_SIZE: int = 4
+
+# classifier of worker process
+_CLASSIFIER: EntityClassifier = None
+
+ChosenTokens = List[Tuple[TokensGroup, ClassificationResult]]
+
+
+@dataclass
+class LinkingSummary:
+    """
+    Throughput summary of linking run.
+
+    Attributes:
+        sequences: Number of linked sequences.
+        tokens: Number of tokens in linked sequences.
+        linked_spans: Number of tokens groups linked to entity.
+        elapsed: Time of run in seconds.
+        metrics: Timers and counters merged from all workers.
+    """
+
+    sequences: int = 0
+    tokens: int = 0
+    linked_spans: int = 0
+    elapsed: float = 0.0
+    metrics: Metrics = field(default_factory=Metrics)
+
+    def __str__(self) -> str:
+        elapsed = max(self.elapsed, 1e-9)
+        return (
+            f"Linked sequences: {self.sequences}\n"
+            f"Tokens: {self.tokens}\n"
+            f"Linked spans: {self.linked_spans}\n"
+            f"Time: {round(self.elapsed, 2)}s\n"
+            f"Throughput: {round(self.sequences / elapsed, 2)} sequences/s, "
+            f"{round(self.tokens / elapsed, 2)} tokens/s"
+        )
+
+
+def write_linked_sequence(
+    output: TextIO, sequence: TokensSequence, chosen_tokens: ChosenTokens
+) -> None:
+    """
+    Write ``sequence`` to ``output`` in PolEval format - one token per line: document ID (sequence ID for raw
+    text), token, lemma, preceding blank, morphological tags, link title and entity ID, sequence ends with
+    empty line. Tokens from linked groups get entity ID of group and matched text as link title.
+
+    Args:
+        output: Open output file.
+        sequence: Linked sequence.
+        chosen_tokens: Chosen tokens groups with classification results.
+    """
+    # ground truth values from input are not written - only linker result
+    link_titles = [NOT_WIKIDATA_ENTITY_SIGN] * len(sequence.sequence)
+    entities = [NOT_WIKIDATA_ENTITY_SIGN] * len(sequence.sequence)
+
+    for token, result in chosen_tokens:
+        for x in range(token.start, token.end):
+            link_titles[x] = token.token
+            entities[x] = result.result_entity
+
+    document_id = sequence.document_id if sequence.document_id is not None else sequence.id
+    for x, t in enumerate(sequence.sequence):
+        output.write(
+            f"{document_id}\t{t.token_value}\t{t.lemma}\t{t.preceding_token}\t"
+            f"{t.morph_tags}\t{link_titles[x]}\t{entities[x]}\n"
+        )
+    output.write("\n")
+
+
+def _init_worker(classifier: EntityClassifier) -> None:
+    """
+    Initializer of worker process - keep classifier, so it is not sent with every sequence.
+
+    Args:
+        classifier: Classifier to use in worker.
+    """
+    global _CLASSIFIER
+    _CLASSIFIER = classifier
+
+
+def _link_sequence_worker(
+    sequence: TokensSequence,
+) -> Tuple[TokensSequence, ChosenTokens, Dict[str, Any]]:
+    """
+    Worker function for ``link_sequences``.
+
+    Args:
+        sequence: Sequence to link.
+
+    Returns:
+        Tuple: ``sequence``, its chosen tokens and metrics measured by worker.
+    """
+    chosen_tokens = _CLASSIFIER.classify_sequence_get_chosen_tokens(sequence)
+    # worker doesn't run atexit handlers, so data kept in memory by API is written now
+    _CLASSIFIER.wikidata_api.flush()
+    return sequence, chosen_tokens, METRICS.collect()
+
+
+def link_sequences(
+    classifier: EntityClassifier,
+    sequences: Iterable[TokensSequence],
+    output: TextIO,
+    processes_num: int = DEFAULT_PROCESSES_NUMBER,
+    ordered: bool = True,
+    chunk_size: int = DEFAULT_LINKING_CHUNK_SIZE,
+) -> LinkingSummary:
+    """
+    Link entities in ``sequences`` using ``classifier`` and write result to ``output`` as soon as sequence
+    is done.
+
+    Args:
+        classifier: Classifier used to link entities.
+        sequences: Sequences to link, they are consumed lazily.
+        output: Open output file.
+        processes_num: Number of worker processes, 1 means linking in current process.
+        ordered: If True sequences are written in input order, otherwise in order of completion.
+        chunk_size: Number of sequences sent to worker at once.
+
+    Returns:
+        Throughput summary.
+    """
+    summary = LinkingSummary()
+    start_time = time.time()
+
+    def write_result(sequence: TokensSequence, chosen_tokens: ChosenTokens) -> None:
+        write_linked_sequence(output, sequence, chosen_tokens)
+        summary.sequences += 1
+        summary.tokens += len(sequence.sequence)
+        summary.linked_spans += len(chosen_tokens)
+
+    METRICS.collect()
+
+    if processes_num <= 1:
+        for sequence in sequences:
+            write_result(sequence, classifier.classify_sequence_get_chosen_tokens(sequence))
+    else:
+        with Pool(processes_num, initializer=_init_worker, initargs=(classifier,)) as p:
+            map_fun = p.imap if ordered else p.imap_unordered
+            for sequence, chosen_tokens, worker_metrics in map_fun(_link_sequence_worker, sequences, chunk_size):
+                write_result(sequence, chosen_tokens)
+                summary.metrics.merge(worker_metrics)
+                sequence_done()
+            # workers exit normally and run their finalizers, ``with`` only terminates them
+            p.close()
+            p.join()
+
+    summary.metrics.merge(METRICS.collect())
+    summary.elapsed = time.time() - start_time
+    summary.metrics.add_time("linker.run", summary.elapsed)
+    return summary
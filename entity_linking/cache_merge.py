@@ -0,0 +1,217 @@
+"""
+Merge and compaction of cache databases, e.g. filled by shards on many hosts. Every table is read from every
+database sorted by key and the sorted streams are merged, so only one row per database is kept in memory.
+
+Recency of row is its fetch time. Rows of databases created before rows had fetch time are older than rows
+with it, and among them recency is order of databases - database modified later is newer, see
+``sort_by_recency`` - and then rowid - row inserted later in the same database is newer. Of duplicated
+rows the newest one is kept, with hits and last access of all duplicates.
+"""
+import heapq
+import os
+import sqlite3
+from typing import Any, Dict, Iterator, List, Tuple
+
+from entity_linking.maintenance.metrics import METRICS
+from entity_linking.qid_codec import decode_qids
+from entity_linking.wikidata_db_api import (CACHE_COLUMNS,
+                                            CURRENT_SCHEMA_VERSION,
+                                            create_ancestors_table,
+                                            encode_ids_for_db,
+                                            forget_database,
+                                            set_schema_version)
+
+# default number of rows inserted in one statement
+DEFAULT_MERGE_BATCH_SIZE: int = 10000
+
+# table -> fields, key first; fields with lists of IDs are saved again in current format, cache columns are
+# NULL when database has no such columns
+MERGED_TABLES: Dict[str, List[str]] = {
+    "entity": ["id", "sub"] + [name for name, _ in CACHE_COLUMNS],
+    "token": ["id", "pages"] + [name for name, _ in CACHE_COLUMNS],
+    "ancestors": ["id", "config", "edges", "targets", "fetched"],
+}
+# table -> number of key fields, other tables have one
+MERGED_TABLES_KEY_FIELDS: Dict[str, int] = {"ancestors": 2}
+# tables of merged database, the same as created by create_db.py
+MERGED_TABLES_SCHEMA: List[str] = [
+    "CREATE TABLE entity (id text, sub blob, fetched real, version integer, last_access real, hits integer)",
+    "CREATE TABLE token (id text, pages blob, fetched real, version integer, last_access real, hits integer)",
+    "CREATE TABLE ancestors (id text, config text, edges text, targets text, fetched real, PRIMARY KEY (id, config))",
+]
+QID_LIST_FIELDS = {"sub", "pages"}
+
+
+def sort_by_recency(database_names: List[str]) -> List[str]:
+    """
+    Args:
+        database_names: Paths to databases.
+
+    Returns:
+        Paths from the oldest to the newest database, by modification time - databases with the same time
+        keep order of ``database_names``.
+    """
+    return sorted(database_names, key=os.path.getmtime)
+
+
+def get_table_fields(conn: sqlite3.Connection, table: str) -> List[str]:
+    """
+    Returns:
+        Names of fields of ``table``, empty if there is no such table.
+    """
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def read_sorted_rows(
+    database_name: str, priority: int, table: str, fields: List[str], key_fields: int = 1
+) -> Iterator[Tuple]:
+    """
+    Read rows of ``table`` sorted by key and from the newest one - sorting is done by SQLite, on disk for
+    tables bigger than its cache.
+
+    Args:
+        database_name: Path to database.
+        priority: Recency of database, bigger is newer.
+        table: Name of table.
+        fields: Fields to read, key first.
+        key_fields: Number of fields of key.
+
+    Returns:
+        Iterator over tuples: key - tuple of key fields, -fetch time, -priority, -rowid, values of fields.
+    """
+    conn = sqlite3.connect(database_name)
+    try:
+        table_fields = set(get_table_fields(conn, table))
+        if not table_fields:
+            return
+        select = ", ".join(f if f in table_fields else "NULL" for f in fields)
+        fetched = "coalesce(fetched, 0)" if "fetched" in table_fields else "0"
+        # position of fetch time in result is len(fields) + 1
+        query = (
+            f"SELECT {select}, {fetched}, rowid FROM {table} "
+            f"ORDER BY {', '.join(fields[:key_fields])}, {len(fields) + 1} DESC, rowid DESC"
+        )
+        for row in conn.execute(query):
+            yield (tuple(row[:key_fields]), -row[-2], -priority, -row[-1]) + tuple(row[:-2])
+    finally:
+        conn.close()
+
+
+def merge_rows(
+    database_names: List[str], table: str, fields: List[str], key_fields: int = 1
+) -> Iterator[Tuple[Tuple, int]]:
+    """
+    Merge rows of ``table`` from all databases, ordered from the oldest to the newest.
+
+    Args:
+        database_names: Paths to databases.
+        table: Name of table.
+        fields: Fields to read, key first.
+        key_fields: Number of fields of key.
+
+    Returns:
+        Iterator over tuples: the newest row of every key and number of its dropped duplicates.
+    """
+    streams = [
+        read_sorted_rows(name, priority, table, fields, key_fields) for priority, name in enumerate(database_names)
+    ]
+    hits = fields.index("hits") if "hits" in fields else -1
+    last_access = fields.index("last_access") if "last_access" in fields else -1
+
+    last_key: Any = None
+    newest: Any = None
+    duplicates = 0
+    for row in heapq.merge(*streams):
+        values = row[4:]
+        if newest is not None and row[0] == last_key:
+            duplicates += 1
+            if hits >= 0 and values[hits] is not None:
+                newest[hits] = (newest[hits] or 0) + values[hits]
+            if last_access >= 0 and values[last_access] is not None:
+                newest[last_access] = max(newest[last_access] or 0, values[last_access])
+            continue
+        if newest is not None:
+            yield tuple(newest), duplicates
+        last_key, newest, duplicates = row[0], list(values), 0
+
+    if newest is not None:
+        yield tuple(newest), duplicates
+
+
+def normalize_row(row: Tuple, fields: List[str]) -> Tuple:
+    """
+    Returns:
+        ``row`` with lists of IDs saved in format of current schema version.
+    """
+    return tuple(
+        encode_ids_for_db(decode_qids(value), CURRENT_SCHEMA_VERSION)
+        if name in QID_LIST_FIELDS and value is not None
+        else value
+        for name, value in zip(fields, row)
+    )
+
+
+def merge_databases(
+    database_names: List[str], output_name: str, batch_size: int = DEFAULT_MERGE_BATCH_SIZE, vacuum: bool = True
+) -> Dict[str, Dict[str, int]]:
+    """
+    Merge databases into new database ``output_name`` - one database compacts it. Output is written to
+    temporary file and renamed at the end.
+
+    Args:
+        database_names: Paths to databases, from the oldest to the newest.
+        output_name: Path to merged database, it is overwritten.
+        batch_size: Number of rows inserted in one statement.
+        vacuum: If True, rebuild output file at the end.
+
+    Returns:
+        Table name -> {"rows": rows in output, "duplicates": dropped rows}.
+    """
+    tmp_name = f"{output_name}.tmp"
+    if os.path.exists(tmp_name):
+        os.remove(tmp_name)
+
+    conn = sqlite3.connect(tmp_name)
+    stats = {}
+    try:
+        for statement in MERGED_TABLES_SCHEMA:
+            conn.execute(statement)
+
+        for table, fields in MERGED_TABLES.items():
+            placeholders = ", ".join("?" * len(fields))
+            insert = f"INSERT INTO {table}({', '.join(fields)}) VALUES({placeholders})"
+            table_stats = {"rows": 0, "duplicates": 0}
+
+            batch = []
+            with METRICS.timer(f"cache_merge.{table}"):
+                key_fields = MERGED_TABLES_KEY_FIELDS.get(table, 1)
+                for row, duplicates in merge_rows(database_names, table, fields, key_fields):
+                    batch.append(normalize_row(row, fields))
+                    table_stats["rows"] += 1
+                    table_stats["duplicates"] += duplicates
+                    if len(batch) >= batch_size:
+                        conn.executemany(insert, batch)
+                        batch = []
+                if batch:
+                    conn.executemany(insert, batch)
+                conn.commit()
+
+            stats[table] = table_stats
+
+        # indexes are built once after inserts - faster than updating them on every insert
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS entity_id ON entity(id)")
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS token_id ON token(id)")
+        set_schema_version(conn, output_name, CURRENT_SCHEMA_VERSION)
+        conn.commit()
+        # members of closures are computed from merged closures, closures without fetch time get one
+        create_ancestors_table(tmp_name)
+        forget_database(tmp_name)
+        conn.execute("ANALYZE")
+        if vacuum:
+            conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+    os.replace(tmp_name, output_name)
+    forget_database(output_name)
+    return stats
@@ -0,0 +1,143 @@
+"""
+Checkpoints of long classification runs. Result rows of classified sequences are saved to checkpoint
+directory in parts of ``every`` sequences - every part is written to temporary file and renamed, so run
+interrupted at any moment keeps all saved parts. Resumed run reads them and classifies only sequences
+without saved result.
+
+Sequence is identified by its position in input file, so resumed run must read the same file.
+"""
+import glob
+import json
+import os
+import pickle
+from typing import TYPE_CHECKING, Dict, List
+
+from entity_linking.maintenance.metrics import Metrics
+from entity_linking.utils import DEFAULT_CHECKPOINT_EVERY
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# file with input file of checkpointed run
+CHECKPOINT_META: str = "checkpoint.json"
+# pattern of names of part files
+CHECKPOINT_PART: str = "part-{:06d}.pkl"
+
+
+class ClassificationCheckpoint:
+    """
+    Results of classified sequences, saved in parts.
+
+    Attributes:
+        results: Sequence ID -> result dataframe, saved and not saved yet.
+        metrics: Metrics of sequences saved by previous runs.
+    """
+
+    checkpoint_dir: str
+    file_name: str
+    every: int
+
+    def __init__(self, checkpoint_dir: str, file_name: str, every: int = DEFAULT_CHECKPOINT_EVERY):
+        """
+        Set object attributes.
+
+        Args:
+            checkpoint_dir: Directory of checkpoint, created if it doesn't exist.
+            file_name: Input file of run.
+            every: Save part every N classified sequences.
+        """
+        self.checkpoint_dir = checkpoint_dir
+        self.file_name = os.path.abspath(file_name)
+        self.every = max(1, every)
+        self.results: Dict[int, "pd.DataFrame"] = {}
+        self.metrics = Metrics()
+        self._unsaved: List[int] = []
+        self._unsaved_metrics = Metrics()
+        self._parts = 0
+
+    def _part_files(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.checkpoint_dir, CHECKPOINT_PART.replace("{:06d}", "*"))))
+
+    def load(self, resume: bool) -> Dict[int, "pd.DataFrame"]:
+        """
+        Load saved parts of previous run.
+
+        Args:
+            resume: If False, checkpoint must be empty - new run doesn't mix its results with old ones.
+
+        Returns:
+            Sequence ID -> result dataframe of saved sequences.
+
+        Raises:
+            ValueError: if checkpoint has parts and ``resume`` is False, or parts are of other input file.
+        """
+        parts = self._part_files()
+        if parts and not resume:
+            raise ValueError(f"Checkpoint {self.checkpoint_dir} is not empty - resume it or use other directory")
+
+        meta_name = os.path.join(self.checkpoint_dir, CHECKPOINT_META)
+        if parts:
+            with open(meta_name) as f:
+                saved_file = json.load(f)["input_file"]
+            if saved_file != self.file_name:
+                raise ValueError(f"Checkpoint {self.checkpoint_dir} is of other input file: {saved_file}")
+        else:
+            os.makedirs(self.checkpoint_dir, exist_ok=True)
+            with open(meta_name, "w") as f:
+                json.dump({"input_file": self.file_name}, f)
+
+        for part in parts:
+            with open(part, "rb") as f:
+                data = pickle.load(f)
+            self.results.update(zip(data["ids"], data["results"]))
+            self.metrics.merge(data["metrics"])
+        self._parts = len(parts)
+
+        return dict(self.results)
+
+    def add(self, sequence_id: int, result_df: "pd.DataFrame", metrics: Dict) -> None:
+        """
+        Add result of classified sequence, save part if ``every`` sequences are not saved.
+
+        Args:
+            sequence_id: ID of sequence.
+            result_df: Result dataframe of sequence.
+            metrics: Metrics snapshot of sequence.
+        """
+        self.results[sequence_id] = result_df
+        self._unsaved.append(sequence_id)
+        self._unsaved_metrics.merge(metrics)
+        if len(self._unsaved) >= self.every:
+            self.save()
+
+    def save(self) -> None:
+        """
+        Save results not saved yet as new part.
+        """
+        if not self._unsaved:
+            return
+
+        self._parts += 1
+        part_name = os.path.join(self.checkpoint_dir, CHECKPOINT_PART.format(self._parts))
+        data = {
+            "ids": self._unsaved,
+            "results": [self.results[x] for x in self._unsaved],
+            "metrics": self._unsaved_metrics.snapshot(),
+        }
+        with open(f"{part_name}.tmp", "wb") as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f"{part_name}.tmp", part_name)
+
+        self._unsaved = []
+        self._unsaved_metrics = Metrics()
+
+    def get_result(self, sequence_ids: List[int]) -> "pd.DataFrame":
+        """
+        Returns:
+            Results of ``sequence_ids`` joined in their order.
+        """
+        import pandas as pd
+
+        if not sequence_ids:
+            return pd.DataFrame()
+        return pd.concat([self.results[x] for x in sequence_ids]).reset_index(drop=True)
@@ -6,14 +6,12 @@ import os
 import random
 import string
 import time
-from typing import List
+from typing import List, Optional
 
-import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-import seaborn as sns
-from sklearn.metrics import confusion_matrix
 
+from entity_linking.maintenance.metrics import Metrics
 from entity_linking.utils import (NOT_WIKIDATA_ENTITY_SIGN,
                                   ClassificationResult, TokensGroup,
                                   TokensSequence)
@@ -30,6 +28,10 @@ REPORT_CONFUSION_MATRIX_1: str = "confusion_matrix_1.png"
 REPORT_CONFUSION_MATRIX_2: str = "confusion_matrix_2.png"
 # name for full result file
 REPORT_FULL_RESULT: str = "result.csv"
+# name for run metrics file
+REPORT_METRICS: str = "metrics.json"
+# name for run metrics file in Prometheus text format
+REPORT_METRICS_PROMETHEUS: str = "metrics.prom"
 
 
 def create_report_folder():
@@ -170,21 +172,34 @@ def create_result_data_frame(
 
 
 def create_report_for_result(
-    result_df: pd.DataFrame, seq_number: int, test_file_name: str, method_name: str
-) -> None:
+    result_df: pd.DataFrame,
+    seq_number: int,
+    test_file_name: str,
+    method_name: str,
+    metrics: Optional[Metrics] = None,
+    prometheus: bool = False,
+) -> str:
     """
     Create new report folder and save there following files:
     - main report file
     - two confusion matrixes
     - ``result_df`` dump to csv file
+    - ``metrics`` dump to json file and optionally to Prometheus text file
 
     Args:
         result_df: Result dataframe for sequences. Format described in ``create_result_data_frame`` function.
         seq_number: Number of sequences read from file.
         test_file_name: Source of sequences to classification.
         method_name: String that describe classification method.
+        metrics: Timers and counters of classification run.
+        prometheus: If True metrics are also saved in Prometheus text format.
+
+    Returns:
+        Path to created report dir.
     """
 
+    from sklearn.metrics import confusion_matrix
+
     dir_name = create_report_folder()
 
     result_df.to_csv(os.path.join(dir_name, REPORT_FULL_RESULT))
@@ -228,6 +243,14 @@ def create_report_for_result(
             f"Precision: {round(float(tp2) / float(tp2 + fp2) * 100.0, 2)}%\n"
         )
 
+    if metrics is not None:
+        with open(os.path.join(dir_name, REPORT_METRICS), "w") as metrics_file:
+            metrics_file.write(metrics.to_json())
+
+        if prometheus:
+            with open(os.path.join(dir_name, REPORT_METRICS_PROMETHEUS), "w") as metrics_file:
+                metrics_file.write(metrics.to_prometheus())
+
     save_confusion_matrix_to_dir(
         c_m1, "Classification in same positions", dir_name, REPORT_CONFUSION_MATRIX_1
     )
@@ -238,6 +261,8 @@ def create_report_for_result(
 
     print(f"Classification report save to {dir_name}.")
 
+    return dir_name
+
 
 def save_confusion_matrix_to_dir(
     c_matrix: np.array, plot_title: str, dir_name: str, file_name: str
@@ -251,6 +276,9 @@ def save_confusion_matrix_to_dir(
         dir_name: Path to dir when will be save plot.
         file_name: Plot save file name.
     """
+    # plotting libraries are slow to import - load them only when report is created
+    import matplotlib.pyplot as plt
+    import seaborn as sns
 
     fig_confusion_matrix, ax = plt.subplots()
 
@@ -2,41 +2,111 @@
 Module that holds entity classifiers declarations.
 """
 
+import os
 import time
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from multiprocessing import Pool
-from typing import List
+from typing import (TYPE_CHECKING, Any, Dict, Iterable, List, Optional,
+                    Tuple)
 
 import networkx as nx
-import pandas as pd
 from wikidata.entity import EntityId
 
-from entity_linking.classification_report import create_result_data_frame
+from entity_linking.checkpoint import ClassificationCheckpoint
 from entity_linking.graph_wikidata import (MAX_DEPTH_LEVEL,
                                            check_if_target_entity_is_in_graph,
                                            create_graph_for_entity,
                                            get_graph_score)
 from entity_linking.load_test_data import \
     load_sequences_from_test_file_with_lemmas_and_tags
+from entity_linking.maintenance.memory_profiler import (memory_stage,
+                                                        sequence_done)
+from entity_linking.maintenance.metrics import METRICS, Metrics
+from entity_linking.reachability import ReachabilityBackend
+from entity_linking.sparse_taxonomy import SparseTaxonomy
 from entity_linking.tokenizer import Tokenizer
-from entity_linking.utils import (DEFAULT_PROCESSES_NUMBER,
+from entity_linking.utils import (DEFAULT_CHECKPOINT_EVERY,
+                                  DEFAULT_PAGE_THREADS,
+                                  DEFAULT_PROCESSES_NUMBER,
                                   NOT_WIKIDATA_ENTITY_SIGN,
                                   WIKIPEDIA_SIMILARITY_THRESHOLD,
                                   ClassificationResult, TokensGroup,
                                   TokensSequence)
-from entity_linking.wikidata_api import WikidataAPI
+from entity_linking.wikidata_api import CachedWikidataAPI, WikidataAPI
 from entity_linking.wikipedia_api import get_context_similarity_from_wikipedia
 
+# pandas is slow to import and production linking path doesn't need it - it is loaded
+# only when result dataframes are created
+if TYPE_CHECKING:
+    import pandas as pd
+
+# classifier of worker process
+_CLASSIFIER: "EntityClassifier" = None
+
+
+def get_unique_pages(chosen_tokens: List[TokensGroup]) -> List[str]:
+    """
+    Args:
+        chosen_tokens: Tokens groups of sequence.
+
+    Returns:
+        Unique candidate pages of all ``chosen_tokens``, in order of first occurrence.
+    """
+    return list(dict.fromkeys(page for token in chosen_tokens for page in token.pages))
+
+
+def count_sequence_metrics(sequence: TokensSequence, chosen_tokens: List[TokensGroup]) -> None:
+    """
+    Count classified sequence, its tokens, tokens groups and candidate pages in ``METRICS``.
+
+    Args:
+        sequence: Classified sequence.
+        chosen_tokens: Tokens groups of ``sequence``.
+    """
+    METRICS.inc("classifier.sequences")
+    METRICS.inc("classifier.tokens", len(sequence.sequence))
+    METRICS.inc("classifier.tokens_groups", len(chosen_tokens))
+    METRICS.inc("classifier.candidate_pages", sum(len(t.pages) for t in chosen_tokens))
+
+
+def _init_worker(classifier: "EntityClassifier") -> None:
+    """
+    Initializer of worker process - keep classifier, so it is not sent with every sequence and its API with
+    caches and clients is unpickled once per process.
+
+    Args:
+        classifier: Classifier to use in worker.
+    """
+    global _CLASSIFIER
+    _CLASSIFIER = classifier
+
+
+def _classify_sequence_worker(sequence: TokensSequence) -> Tuple["pd.DataFrame", Dict[str, Any]]:
+    """
+    Worker function for ``EntityClassifier.classify_sequences``.
+    """
+    return _CLASSIFIER._classify_sequence_with_metrics(sequence)
+
 
 class EntityClassifier(ABC):
     """
     Abstract class for entity classifier.
+
+    Attributes:
+        score_uses_graph: False if ``score_page`` doesn't use graph of page - page with target reported by
+            reachability backend is scored without walking its graph.
     """
 
+    score_uses_graph: bool = True
+
     max_graph_levels: int
     tokenizer: Tokenizer
     wikidata_api: WikidataAPI
     processes_num: int
+    page_threads: int
+    reachability: Optional[ReachabilityBackend]
+    run_metrics: Metrics
 
     def __init__(
         self,
@@ -44,6 +114,8 @@ class EntityClassifier(ABC):
         wikidata_api: WikidataAPI,
         max_graph_levels: int = MAX_DEPTH_LEVEL,
         processes_num: int = DEFAULT_PROCESSES_NUMBER,
+        page_threads: int = DEFAULT_PAGE_THREADS,
+        reachability: Optional[ReachabilityBackend] = None,
     ) -> None:
         """
         Set object attributes.
@@ -53,17 +125,161 @@ class EntityClassifier(ABC):
             wikidata_api: API to get from wikidata.
             max_graph_levels: Max levels of graph created to find possible entities.
             processes_num: All classifier uses multiprocessing - number of processes.
+            page_threads: Number of threads that evaluate candidate pages of one sequence, 1 - no threads.
+            reachability: Cached backend that filters out pages without reachable target before graph is
+                created, None - graph of every page is created.
         """
 
         self.tokenizer = tokenizer
         self.wikidata_api = wikidata_api
         self.max_graph_levels = max_graph_levels
         self.processes_num = processes_num
+        self.page_threads = page_threads
+        self.reachability = reachability
+        self.run_metrics = Metrics()
+        self._page_executor: Optional[ThreadPoolExecutor] = None
+        self._page_executor_pid = -1
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # metrics of parent process are not sent to workers, every process creates its own threads
+        state = self.__dict__.copy()
+        del state["run_metrics"]
+        state["_page_executor"] = None
+        state["_page_executor_pid"] = -1
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self.run_metrics = Metrics()
+
+    def use_cached_wikidata_api(self) -> CachedWikidataAPI:
+        """
+        Wrap wikidata API of classifier and its tokenizer by CachedWikidataAPI, if it is not cached already.
+
+        Returns:
+            Cached API used by classifier.
+        """
+        if not isinstance(self.wikidata_api, CachedWikidataAPI):
+            self.wikidata_api = CachedWikidataAPI(self.wikidata_api)
+            self.tokenizer.wikidata_API = self.wikidata_api
+        return self.wikidata_api
+
+    def _get_page_executor(self) -> ThreadPoolExecutor:
+        """
+        Get thread pool of current process - it is created on first call in every process.
+
+        Returns:
+            Thread pool that evaluates candidate pages.
+        """
+        if self._page_executor is None or self._page_executor_pid != os.getpid():
+            self._page_executor = ThreadPoolExecutor(self.page_threads)
+            self._page_executor_pid = os.getpid()
+        return self._page_executor
+
+    def prefetch_reachability(self, pages: List[str]) -> None:
+        """
+        Find reachable targets of all ``pages`` at once, so ``get_page_graph`` takes them from cache.
+
+        Args:
+            pages: IDs of candidate pages, Q{NUM} format.
+        """
+        if self.reachability is not None and pages:
+            self.reachability.get_reachable_targets(pages, self.max_graph_levels)
+
+    def classify_pages(
+        self, sequence: TokensSequence, pages: List[str]
+    ) -> List[Optional[ClassificationResult]]:
+        """
+        Evaluate all ``pages`` using ``classify_page``. Pages are independent and their evaluation waits mostly
+        for network, so they are evaluated by thread pool.
+
+        Args:
+            sequence: Sequence with candidate pages.
+            pages: IDs of candidate pages, Q{NUM} format.
+
+        Returns:
+            Results of ``classify_page``, in the same order as ``pages``.
+        """
+        if self.page_threads <= 1 or len(pages) <= 1:
+            return [self.classify_page(sequence, page) for page in pages]
+
+        return list(self._get_page_executor().map(lambda page: self.classify_page(sequence, page), pages))
+
+    def get_page_graph(self, page: str) -> Optional[nx.Graph]:
+        """
+        Create graph for ``page`` from wikidata data and check if it contains any of target entities.
+
+        Args:
+            page: ID of candidate page, Q{NUM} format.
+
+        Returns:
+            Graph of ``page`` or None if it has no target entity.
+        """
+        if self.reachability is not None:
+            if not self.reachability.get_target_distances(page, self.max_graph_levels):
+                METRICS.inc("classifier.unreachable_pages")
+                return None
+            if not self.score_uses_graph:
+                # target is reachable and score doesn't need graph - empty graph only marks page with target
+                return nx.DiGraph()
+
+        with METRICS.timer("classifier.graph"):
+            graph: nx.Graph = create_graph_for_entity(
+                EntityId(page), self.wikidata_api, self.max_graph_levels
+            )
+            has_target = check_if_target_entity_is_in_graph(graph)
+
+        return graph if has_target else None
 
     @abstractmethod
-    def classify_sequence(self, sequence: TokensSequence) -> pd.DataFrame:
+    def score_page(self, sequence: TokensSequence, page: str, graph: nx.Graph) -> float:
+        """
+        Score possible entity ``page`` for tokens group from ``sequence``.
+
+        Args:
+            sequence: Sequence with tokens group.
+            page: ID of candidate page, Q{NUM} format.
+            graph: Graph of ``page`` from ``get_page_graph``.
+
+        Returns:
+            Score of ``page``.
         """
-        Classify ``sequence`` and return full result dataframe.
+        pass
+
+    def classify_page(
+        self, sequence: TokensSequence, page: str
+    ) -> Optional[ClassificationResult]:
+        """
+        Check if ``page`` is possible entity for tokens group from ``sequence`` and score it.
+
+        Args:
+            sequence: Sequence with tokens group.
+            page: ID of candidate page, Q{NUM} format.
+
+        Returns:
+            Classification result for ``page`` or None if it is not possible entity.
+        """
+        graph = self.get_page_graph(page)
+        if graph is None:
+            return None
+
+        return ClassificationResult(page, self.score_page(sequence, page, graph))
+
+    def choose_result(self, best_result: ClassificationResult) -> ClassificationResult:
+        """
+        Decide if result with best score is final result of tokens group.
+
+        Args:
+            best_result: Result with the best score.
+
+        Returns:
+            Final result of tokens group.
+        """
+        return best_result
+
+    def classify_sequence(self, sequence: TokensSequence) -> "pd.DataFrame":
+        """
+        Classify ``sequence`` and return full result dataframe using ``create_result_data_frame`` function.
 
         Args:
             sequence: Sequence to classify entities.
@@ -71,139 +287,231 @@ class EntityClassifier(ABC):
         Returns:
             Pandas DataFrame with classification results.
         """
-        pass
+        from entity_linking.classification_report import create_result_data_frame
+
+        chosen_tokens, classify_result = self.classify_tokens_groups(sequence)
+
+        with METRICS.timer("classifier.result_data_frame"), memory_stage("result_data_frame"):
+            return create_result_data_frame(sequence, chosen_tokens, classify_result)
+
+    def _classify_sequence_with_metrics(
+        self, sequence: TokensSequence
+    ) -> Tuple["pd.DataFrame", Dict[str, Any]]:
+        """
+        Classify ``sequence`` in worker process of ``classify_sequences`` and collect metrics measured
+        in worker process.
+
+        Args:
+            sequence: Sequence to classify entities.
+
+        Returns:
+            Tuple: result dataframe and metrics snapshot.
+        """
+        METRICS.collect()
+        result = self.classify_sequence(sequence)
+        # worker doesn't run atexit handlers, so data kept in memory by API is written now
+        self.wikidata_api.flush()
+        return result, METRICS.collect()
 
-    @abstractmethod
     def classify_sequences_from_file(
-        self, file_name: str, seq_number: int
-    ) -> pd.DataFrame:
+        self,
+        file_name: str,
+        seq_number: int,
+        checkpoint_dir: str = "",
+        resume: bool = False,
+        checkpoint_every: int = DEFAULT_CHECKPOINT_EVERY,
+    ) -> "pd.DataFrame":
         """
-        Classify sequences from file ``file_name`` and return result pandas dataframe.
+        Classify sequences from file ``file_name`` and return result pandas dataframe. Metrics from all
+        workers are merged into ``run_metrics``.
 
         Args:
             file_name: Name of file with sequences.
             seq_number: Number of sequence to read and classify from file.
+            checkpoint_dir: Directory where results are saved during run, "" - no checkpoints.
+            resume: If True, sequences saved in ``checkpoint_dir`` by previous run are not classified again.
+            checkpoint_every: Save checkpoint every N classified sequences.
 
         Returns:
             Pandas DataFrame with classification results.
         """
-        pass
+        start_time = time.time()
 
-    @abstractmethod
-    def classify_sequence_get_chosen_tokens(self, sequence: TokensSequence) -> List:
+        with METRICS.timer("classifier.load_sequences"):
+            sequences = load_sequences_from_test_file_with_lemmas_and_tags(
+                file_name, seq_number
+            )
+
+        if not checkpoint_dir:
+            result_df = self.classify_sequences(sequences)
+        else:
+            checkpoint = ClassificationCheckpoint(checkpoint_dir, file_name, checkpoint_every)
+            done = checkpoint.load(resume)
+            # metrics of resumed run include sequences classified before
+            self.run_metrics.merge(checkpoint.metrics.snapshot())
+            self.run_metrics.inc("classifier.resumed_sequences", sum(s.id in done for s in sequences))
+
+            self.classify_sequences([s for s in sequences if s.id not in done], checkpoint)
+            result_df = checkpoint.get_result([s.id for s in sequences])
+
+        self.run_metrics.add_time("classifier.run", time.time() - start_time)
+
+        return result_df
+
+    def classify_sequences(
+        self, sequences: Iterable[TokensSequence], checkpoint: Optional[ClassificationCheckpoint] = None
+    ) -> "pd.DataFrame":
         """
-        Classify sequence from ``sequence`` and return chosen tokens and classification result only.
+        Classify ``sequences`` by pool of ``processes_num`` workers and return result pandas dataframe in order
+        of ``sequences``. Metrics from all workers are merged into ``run_metrics``.
 
         Args:
-            sequence: Sequence to classify entities.
+            sequences: Sequences to classify entities.
+            checkpoint: Checkpoint that saves results during run, also when run is interrupted.
 
         Returns:
-            List of chosen tokens and result entities.
+            Pandas DataFrame with classification results.
         """
-        pass
+        import pandas as pd
 
+        # results of pool are in order of sequences
+        sequences = list(sequences)
+        result_df = pd.DataFrame()
 
-class NoContextGraphEntityClassifier(EntityClassifier):
-    def __init__(
-        self,
-        tokenizer: Tokenizer,
-        wikidata_api: WikidataAPI,
-        max_graph_levels: int,
-        processes_num: int,
-    ) -> None:
+        try:
+            with Pool(self.processes_num, initializer=_init_worker, initargs=(self,)) as p:
+                results = p.imap(_classify_sequence_worker, sequences)
+                for sequence, (r, worker_metrics) in zip(sequences, results):
+                    result_df = result_df.append(r)
+                    self.run_metrics.merge(worker_metrics)
+                    if checkpoint is not None:
+                        checkpoint.add(sequence.id, r, worker_metrics)
+                    sequence_done()
+                # workers exit normally and run their finalizers, ``with`` only terminates them
+                p.close()
+                p.join()
+        finally:
+            if checkpoint is not None:
+                checkpoint.save()
+
+        result_df = result_df.reset_index(drop=True)
+        self.run_metrics.merge(METRICS.collect())
+
+        return result_df
+
+    def classify_tokens_groups(
+        self, sequence: TokensSequence
+    ) -> Tuple[List[TokensGroup], List[ClassificationResult]]:
         """
-        Set object attributes.
+        Tokenize ``sequence`` and classify every tokens group - score every page of group using
+        ``classify_page`` and take page with the best score.
 
         Args:
-            tokenizer: Tokenizer use to tokenize sequences.
-            wikidata_api: API to get from wikidata.
-            max_graph_levels: Max levels of graph created to find possible entities.
-            processes_num: All classifier uses multiprocessing - number of processes.
+            sequence: Sequence to classify entities.
+
+        Returns:
+            Tuple: tokens groups and classification results for them.
         """
-        super().__init__(tokenizer, wikidata_api, max_graph_levels, processes_num)
+        start_time = time.time()
+
+        # tokenize
+        with METRICS.timer("classifier.tokenize"), memory_stage("tokenize"):
+            chosen_tokens: List[TokensGroup] = self.tokenizer.tokenize(sequence)
 
-    def classify_sequence(self, sequence: TokensSequence) -> pd.DataFrame:
+        with memory_stage("classify_pages"):
+            # result of page depends only on sequence, so page that is candidate of many groups is evaluated once
+            pages = get_unique_pages(chosen_tokens)
+            self.prefetch_reachability(pages)
+            page_results = dict(zip(pages, self.classify_pages(sequence, pages)))
+            classify_result = self.choose_tokens_groups_results(chosen_tokens, page_results)
+
+        count_sequence_metrics(sequence, chosen_tokens)
+        METRICS.add_time("classifier.sequence", time.time() - start_time)
+
+        print(f"{sequence.id} done!", "Time: ", time.time() - start_time)
+        sequence_done()
+
+        return chosen_tokens, classify_result
+
+    def choose_tokens_groups_results(
+        self, chosen_tokens: List[TokensGroup], page_results: Dict[str, Optional[ClassificationResult]]
+    ) -> List[ClassificationResult]:
         """
-        Classify ``sequence`` using graph created from wikidata data
-        and return full result dataframe using ``create_result_data_frame`` function.
+        Take page with the best score for every tokens group and decide if it is final result using
+        ``choose_result``.
 
         Args:
-            sequence: Sequence to classify entities.
+            chosen_tokens: Tokens groups of sequence.
+            page_results: Page ID -> result of ``classify_page`` for all pages of ``chosen_tokens``.
 
         Returns:
-            Pandas DataFrame with classification results.
+            Classification results for ``chosen_tokens``.
         """
         # simple function to sort classification result by score
         def sort_fun(cr: ClassificationResult):
             return cr.score
 
-        start_time = time.time()
-
-        # tokenize
-        chosen_tokens: List[TokensGroup] = self.tokenizer.tokenize(sequence)
-
-        # iterate over chosen tokens create graph and check if it
-        # contains any of target entities
         classify_result: List[ClassificationResult] = []
 
         for token in chosen_tokens:
             graph_results = [ClassificationResult(NOT_WIKIDATA_ENTITY_SIGN)]
 
             for page in token.pages:
-                graph: nx.Graph = create_graph_for_entity(
-                    EntityId(page), self.wikidata_api, self.max_graph_levels
-                )
-
-                if check_if_target_entity_is_in_graph(graph):
-                    score = get_graph_score(graph, EntityId(page))
-                    graph_results.append(ClassificationResult(page, score))
+                result = page_results[page]
+                if result is not None:
+                    graph_results.append(result)
 
             # sort by score
             graph_results.sort(reverse=True, key=sort_fun)
 
-            classify_result.append(graph_results[0])
-
-        print(f"{sequence.id} done!", "Time: ", time.time() - start_time)
+            classify_result.append(self.choose_result(graph_results[0]))
 
-        return create_result_data_frame(sequence, chosen_tokens, classify_result)
+        return classify_result
 
-    def classify_sequences_from_file(
-        self, file_name: str, seq_number: int
-    ) -> pd.DataFrame:
-        sequences = load_sequences_from_test_file_with_lemmas_and_tags(
-            file_name, seq_number
-        )
-
-        with Pool(self.processes_num) as p:
-            map_results = p.map(self.classify_sequence, sequences)
+    def classify_sequence_get_chosen_tokens(
+        self, sequence: TokensSequence
+    ) -> List[Tuple[TokensGroup, ClassificationResult]]:
+        """
+        Classify sequence from ``sequence`` and return chosen tokens and classification result only.
+        Tokens groups are chosen by score - group is taken if it doesn't overlap any group with higher score.
 
-        result_df = pd.DataFrame()
+        Args:
+            sequence: Sequence to classify entities.
 
-        for r in map_results:
-            result_df = result_df.append(r)
+        Returns:
+            List of chosen tokens and result entities, sorted by position in sequence.
+        """
+        chosen_tokens, classify_result = self.classify_tokens_groups(sequence)
 
-        result_df = result_df.reset_index(drop=True)
-        return result_df
+        tokens_and_results = [
+            (token, result)
+            for token, result in zip(chosen_tokens, classify_result)
+            if result.result_entity != NOT_WIKIDATA_ENTITY_SIGN
+        ]
+        tokens_and_results.sort(reverse=True, key=lambda x: x[1].score)
 
-    def classify_sequence_get_chosen_tokens(self, sequence: TokensSequence) -> List:
-        # TODO!
-        pass
+        taken = [False] * len(sequence.sequence)
+        result = []
 
+        for token, classification in tokens_and_results:
+            if not any(taken[token.start : token.end]):
+                for x in range(token.start, token.end):
+                    taken[x] = True
+                result.append((token, classification))
 
-class WikipediaContextGraphEntityClassifier(EntityClassifier):
-    """
-    Classifier that uses wikpedia site of entity to create context and classify entities.
-    """
+        result.sort(key=lambda x: x[0].start)
+        return result
 
-    score_threshold: float
 
+class NoContextGraphEntityClassifier(EntityClassifier):
     def __init__(
         self,
         tokenizer: Tokenizer,
         wikidata_api: WikidataAPI,
         max_graph_levels: int,
         processes_num: int,
-        score_threshold: float = WIKIPEDIA_SIMILARITY_THRESHOLD,
+        page_threads: int = DEFAULT_PAGE_THREADS,
+        reachability: Optional[ReachabilityBackend] = None,
     ) -> None:
         """
         Set object attributes.
@@ -213,68 +521,150 @@ class WikipediaContextGraphEntityClassifier(EntityClassifier):
             wikidata_api: API to get from wikidata.
             max_graph_levels: Max levels of graph created to find possible entities.
             processes_num: All classifier uses multiprocessing - number of processes.
-            score_threshold: Score threshold for wikipedia page similarity.
+            page_threads: Number of threads that evaluate candidate pages of one sequence, 1 - no threads.
+            reachability: Cached backend that filters out pages without reachable target.
         """
-        super().__init__(tokenizer, wikidata_api, max_graph_levels, processes_num)
-        self.score_threshold = score_threshold
+        super().__init__(tokenizer, wikidata_api, max_graph_levels, processes_num, page_threads, reachability)
 
-    def classify_sequence(self, sequence: TokensSequence) -> pd.DataFrame:
-        def sort_fun(cr: ClassificationResult):
-            return cr.score
+    def score_page(self, sequence: TokensSequence, page: str, graph: nx.Graph) -> float:
+        """
+        Score ``page`` by paths to target entities in its graph.
 
-        start_time = time.time()
+        Args:
+            sequence: Sequence with tokens group.
+            page: ID of candidate page, Q{NUM} format.
+            graph: Graph of ``page`` from ``get_page_graph``.
 
-        # tokenize
-        chosen_tokens: List[TokensGroup] = self.tokenizer.tokenize(sequence)
+        Returns:
+            Score of ``page``.
+        """
+        with METRICS.timer("classifier.graph_score"):
+            return get_graph_score(graph, EntityId(page))
 
-        # iterate over chosen tokens create graph and check if it
-        # contains any of target entities
-        classify_result: List[ClassificationResult] = []
 
-        for token in chosen_tokens:
-            graph_results = [ClassificationResult(NOT_WIKIDATA_ENTITY_SIGN)]
+class SparseTaxonomyEntityClassifier(EntityClassifier):
+    """
+    Classifier that scores candidates like NoContextGraphEntityClassifier, but on SparseTaxonomy - reachability
+    and scores of all candidate pages of sequence are computed at once by sparse matrix products, no graph
+    is created. Scores are the same as scores of graphs of ``max_graph_levels`` levels, see
+    ``SparseTaxonomy.get_walk_scores``.
 
-            for page in token.pages:
-                graph: nx.Graph = create_graph_for_entity(
-                    EntityId(page), self.wikidata_api, self.max_graph_levels
-                )
+    It is used as library only, app.py runs WikipediaContextGraphEntityClassifier.
+    """
 
-                if check_if_target_entity_is_in_graph(graph):
-                    score = get_context_similarity_from_wikipedia(
-                        sequence, EntityId(page)
-                    )
-                    graph_results.append(ClassificationResult(page, score))
+    taxonomy: SparseTaxonomy
 
-            graph_results.sort(reverse=True, key=sort_fun)
+    def __init__(
+        self,
+        tokenizer: Tokenizer,
+        wikidata_api: WikidataAPI,
+        max_graph_levels: int,
+        processes_num: int,
+        taxonomy: Optional[SparseTaxonomy] = None,
+    ) -> None:
+        """
+        Set object attributes.
 
-            if graph_results[0].score < self.score_threshold:
-                classify_result.append(ClassificationResult(NOT_WIKIDATA_ENTITY_SIGN))
-            else:
-                classify_result.append(graph_results[0])
+        Args:
+            tokenizer: Tokenizer use to tokenize sequences.
+            wikidata_api: API to get from wikidata.
+            max_graph_levels: Max graph levels, like in ``NoContextGraphEntityClassifier``.
+            processes_num: All classifier uses multiprocessing - number of processes.
+            taxonomy: Local taxonomy, e.g. loaded from database. Missing entities are fetched with
+                ``wikidata_api``. Default: empty taxonomy.
+        """
+        super().__init__(tokenizer, wikidata_api, max_graph_levels, processes_num, 1)
+        self.taxonomy = taxonomy if taxonomy is not None else SparseTaxonomy()
+        # page -> score computed by ``prefetch_reachability`` and not used yet
+        self._prefetched_scores: Dict[str, float] = {}
 
-        print(f"{sequence.id} done! ", "Time: ", time.time() - start_time)
+    def get_walk_scores(self, pages: List[str]) -> List[float]:
+        """
+        Args:
+            pages: IDs of candidate pages, Q{NUM} format.
 
-        return create_result_data_frame(sequence, chosen_tokens, classify_result)
+        Returns:
+            Score of every page, 0 if it reaches no target entity.
+        """
+        self.taxonomy.expand_from_api(self.wikidata_api, pages, self.max_graph_levels)
+        with METRICS.timer("classifier.sparse_score"):
+            return self.taxonomy.get_walk_scores(pages, self.max_graph_levels).tolist()
 
-    def classify_sequences_from_file(
-        self, file_name: str, seq_number: int
-    ) -> pd.DataFrame:
-        sequences = load_sequences_from_test_file_with_lemmas_and_tags(
-            file_name, seq_number
-        )
+    def prefetch_reachability(self, pages: List[str]) -> None:
+        """
+        Score all ``pages`` at once, so ``classify_pages`` and ``get_page_graph`` take their scores.
 
-        with Pool(self.processes_num) as p:
-            map_results = p.map(self.classify_sequence, sequences)
+        Args:
+            pages: IDs of candidate pages, Q{NUM} format.
+        """
+        if pages:
+            self._prefetched_scores.update(zip(pages, self.get_walk_scores(pages)))
+
+    def _take_scores(self, pages: List[str]) -> List[float]:
+        scores = [self._prefetched_scores.pop(page, None) for page in pages]
+        missing = [page for page, score in zip(pages, scores) if score is None]
+        if missing:
+            computed = dict(zip(missing, self.get_walk_scores(missing)))
+            scores = [computed[page] if score is None else score for page, score in zip(pages, scores)]
+        return scores
+
+    def classify_pages(
+        self, sequence: TokensSequence, pages: List[str]
+    ) -> List[Optional[ClassificationResult]]:
+        return [
+            ClassificationResult(page, score) if score > 0 else None
+            for page, score in zip(pages, self._take_scores(pages))
+        ]
+
+    def get_page_graph(self, page: str) -> Optional[nx.Graph]:
+        # scores come from taxonomy - graph without nodes only keeps score of page that reaches target entity
+        score = self._take_scores([page])[0]
+        return nx.DiGraph(score=score) if score > 0 else None
+
+    def score_page(self, sequence: TokensSequence, page: str, graph: nx.Graph) -> float:
+        return graph.graph["score"]
 
-        result_df = pd.DataFrame()
 
-        for r in map_results:
-            result_df = result_df.append(r)
+class WikipediaContextGraphEntityClassifier(EntityClassifier):
+    """
+    Classifier that uses wikpedia site of entity to create context and classify entities.
+    """
 
-        result_df = result_df.reset_index(drop=True)
+    score_uses_graph = False
+    score_threshold: float
 
-        return result_df
+    def __init__(
+        self,
+        tokenizer: Tokenizer,
+        wikidata_api: WikidataAPI,
+        max_graph_levels: int,
+        processes_num: int,
+        score_threshold: float = WIKIPEDIA_SIMILARITY_THRESHOLD,
+        page_threads: int = DEFAULT_PAGE_THREADS,
+        reachability: Optional[ReachabilityBackend] = None,
+    ) -> None:
+        """
+        Set object attributes.
 
-    def classify_sequence_get_chosen_tokens(self, sequence: TokensSequence) -> List:
-        # TODO!
-        pass
+        Args:
+            tokenizer: Tokenizer use to tokenize sequences.
+            wikidata_api: API to get from wikidata.
+            max_graph_levels: Max levels of graph created to find possible entities.
+            processes_num: All classifier uses multiprocessing - number of processes.
+            score_threshold: Score threshold for wikipedia page similarity.
+            page_threads: Number of threads that evaluate candidate pages of one sequence, 1 - no threads.
+            reachability: Cached backend that filters out pages without reachable target.
+        """
+        super().__init__(tokenizer, wikidata_api, max_graph_levels, processes_num, page_threads, reachability)
+        self.score_threshold = score_threshold
+
+    def score_page(self, sequence: TokensSequence, page: str, graph: nx.Graph) -> float:
+        with METRICS.timer("classifier.wikipedia_score"):
+            return get_context_similarity_from_wikipedia(
+                sequence, EntityId(page), self.wikidata_api
+            )
+
+    def choose_result(self, best_result: ClassificationResult) -> ClassificationResult:
+        if best_result.score < self.score_threshold:
+            return ClassificationResult(NOT_WIKIDATA_ENTITY_SIGN)
+        return best_result
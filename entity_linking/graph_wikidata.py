@@ -6,8 +6,7 @@ from typing import List
 import networkx as nx
 from wikidata.entity import EntityId
 
-from entity_linking.utils import (DISAMBIGUATION_PAGE, MAX_DEPTH_LEVEL,
-                                  TARGET_ENTITIES)
+from entity_linking.utils import MAX_DEPTH_LEVEL, TARGET_ENTITIES
 from entity_linking.wikidata_api import WikidataAPI
 
 
@@ -15,7 +14,8 @@ def create_graph_for_entity(
     entity: EntityId, wikidata_api: WikidataAPI, graph_levels: int = MAX_DEPTH_LEVEL
 ) -> nx.Graph():
     """
-    Create directed graph for given ``entity``. Nodes are entity names.
+    Create directed graph for given ``entity`` from its ancestor closure, see ``WikidataAPI.get_entity_ancestors``.
+    Nodes are entity names.
 
     Args:
         entity: Name of entity, in format Q{Number}.
@@ -28,22 +28,9 @@ def create_graph_for_entity(
 
     g = nx.DiGraph()
 
-    this_level_entities = [entity]
-
-    for depth in range(graph_levels):
-        next_level_entities = []
-
-        # iterate over this level entities
-        for ent in this_level_entities:
-            # omit DISAMBIGUATION_PAGE - it cause errors
-            if ent == DISAMBIGUATION_PAGE:
-                continue
-
-            for instance_of in wikidata_api.get_subclasses_for_entity(EntityId(ent)):
-                g.add_node(instance_of)
-                g.add_edge(ent, instance_of)
-                next_level_entities.append(instance_of)
-        this_level_entities = next_level_entities
+    for source, target, _ in wikidata_api.get_entity_ancestors(entity, graph_levels).edges:
+        g.add_node(target)
+        g.add_edge(source, target)
 
     return g
 
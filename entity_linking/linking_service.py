@@ -0,0 +1,387 @@
+"""
+Module with long running linking service. Classifier, tokenizer and wikidata API with warm in-memory caches stay
+resident, sequences come over local HTTP or Unix socket. Concurrent requests are grouped into micro-batches -
+token lookups of whole batch are done once and concurrently before sequences are classified.
+"""
+
+import json
+import os
+import socketserver
+import time
+from bisect import bisect_left
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from queue import Empty, Queue
+from threading import Lock, Thread
+from typing import Any, Callable, Dict, List
+
+from entity_linking.entity_classifier import EntityClassifier
+from entity_linking.raw_text_pipeline import text_to_sequence
+from entity_linking.utils import (DEFAULT_MAX_BATCH_SIZE, DEFAULT_MAX_BATCH_WAIT,
+                                  NOT_WIKIDATA_ENTITY_SIGN, Token,
+                                  TokensSequence)
+from entity_linking.wikidata_api import CachedWikidataAPI
+
+# default number of threads used for token lookups of micro-batch
+DEFAULT_LOOKUP_THREADS: int = 16
+# upper bounds of latency histogram buckets, in milliseconds
+LATENCY_BUCKETS_MS: List[float] = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000]
+
+
+class LatencyHistogram:
+    """
+    Thread safe histogram of latencies with fixed buckets - see LATENCY_BUCKETS_MS.
+
+    Attributes:
+        counts: Number of latencies in every bucket, the last bucket is for values above all bounds.
+        total: Sum of latencies in seconds.
+        count: Number of latencies.
+    """
+
+    counts: List[int]
+    total: float
+    count: int
+
+    def __init__(self) -> None:
+        """
+        Create empty histogram.
+        """
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self._lock = Lock()
+
+    def record(self, latency: float) -> None:
+        """
+        Add latency to histogram.
+
+        Args:
+            latency: Latency in seconds.
+        """
+        with self._lock:
+            self.counts[bisect_left(LATENCY_BUCKETS_MS, latency * 1000.0)] += 1
+            self.total += latency
+            self.count += 1
+
+    def percentile(self, p: float) -> float:
+        """
+        Get upper bound of bucket that contains ``p`` percentile.
+
+        Args:
+            p: Percentile, from 0 to 100.
+
+        Returns:
+            Latency in milliseconds, inf if percentile is above all buckets.
+        """
+        needed = p / 100.0 * self.count
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, self.counts):
+            cumulative += count
+            if cumulative >= needed and cumulative > 0:
+                return bound
+        return float("inf")
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Returns:
+            Histogram as dict, ready to dump to JSON.
+        """
+        buckets = {f"le_{bound}ms": count for bound, count in zip(LATENCY_BUCKETS_MS, self.counts)}
+        buckets["inf"] = self.counts[-1]
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count * 1000.0, 3) if self.count else 0.0,
+            "p50_ms": self.percentile(50),
+            "p90_ms": self.percentile(90),
+            "p99_ms": self.percentile(99),
+            "buckets": buckets,
+        }
+
+    def __str__(self) -> str:
+        lines = []
+        max_count = max(max(self.counts), 1)
+        labels = [f"<= {bound} ms" for bound in LATENCY_BUCKETS_MS] + ["> max"]
+        for label, count in zip(labels, self.counts):
+            if count > 0:
+                lines.append(f"{label:>12} | {'#' * max(1, count * 50 // max_count)} {count}")
+        d = self.to_dict()
+        lines.append(f"count: {d['count']}, mean: {d['mean_ms']} ms, p50: {d['p50_ms']} ms, "
+                     f"p90: {d['p90_ms']} ms, p99: {d['p99_ms']} ms")
+        return "\n".join(lines)
+
+
+class MicroBatcher:
+    """
+    Group items submitted from many threads into batches and process every batch by one call of ``handler``.
+    Batch is processed when it has ``max_batch_size`` items or when ``max_wait`` seconds passed from arrival
+    of its first item.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_wait: float = DEFAULT_MAX_BATCH_WAIT,
+    ) -> None:
+        """
+        Set object attributes and start batching thread.
+
+        Args:
+            handler: Function that takes list of items and returns list of results in the same order.
+            max_batch_size: Max number of items in batch.
+            max_wait: Max time to wait for batch to fill, in seconds.
+        """
+        self.handler = handler
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.batches = 0
+        self.items = 0
+        # items are pairs: item and its future
+        self._queue: Queue = Queue()
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, item: Any) -> Future:
+        """
+        Add ``item`` to next batch.
+
+        Args:
+            item: Item to process.
+
+        Returns:
+            Future with result for ``item``.
+        """
+        future: Future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.time() + self.max_wait
+
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except Empty:
+                    break
+
+            self.batches += 1
+            self.items += len(batch)
+
+            try:
+                results = self.handler([item for item, _ in batch])
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+
+
+class LinkingService:
+    """
+    Resident linker - classifier with warm caches that links micro-batches of sequences.
+    """
+
+    classifier: EntityClassifier
+    wikidata_api: CachedWikidataAPI
+    latency: LatencyHistogram
+
+    def __init__(
+        self,
+        classifier: EntityClassifier,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_wait: float = DEFAULT_MAX_BATCH_WAIT,
+        lookup_threads: int = DEFAULT_LOOKUP_THREADS,
+    ) -> None:
+        """
+        Set object attributes. Wikidata API of ``classifier`` and its tokenizer is wrapped by CachedWikidataAPI,
+        if it is not cached already.
+
+        Args:
+            classifier: Classifier used to link entities.
+            max_batch_size: Max number of sequences in micro-batch.
+            max_wait: Max time to wait for micro-batch to fill, in seconds.
+            lookup_threads: Number of threads used for token lookups.
+        """
+        self.classifier = classifier
+        self.wikidata_api = classifier.use_cached_wikidata_api()
+        self.latency = LatencyHistogram()
+        self._lookup_executor = ThreadPoolExecutor(lookup_threads)
+        self._batcher = MicroBatcher(self.link_batch, max_batch_size, max_wait)
+        self._sequence_id = 0
+        self._id_lock = Lock()
+
+    def link_batch(self, sequences: List[TokensSequence]) -> List[List[Dict[str, Any]]]:
+        """
+        Link all ``sequences``. Unique token queries of whole batch are searched concurrently first, so
+        classification uses only warm cache for them.
+
+        Args:
+            sequences: Sequences to link.
+
+        Returns:
+            Linked spans for every sequence.
+        """
+        queries = set()
+        for sequence in sequences:
+            queries.update(self.classifier.tokenizer.get_token_queries(sequence))
+        list(self._lookup_executor.map(self.wikidata_api.get_pages_for_token, queries))
+
+        result = []
+        for sequence in sequences:
+            spans = []
+            for token, classification in self.classifier.classify_sequence_get_chosen_tokens(sequence):
+                spans.append(
+                    {
+                        "start": token.start,
+                        "end": token.end,
+                        "token": token.token,
+                        "entity": classification.result_entity,
+                        "score": classification.score,
+                    }
+                )
+            result.append(spans)
+        return result
+
+    def sequence_from_request(self, request: Dict[str, Any]) -> TokensSequence:
+        """
+        Create sequence from request body. Request has raw text in "text" field or list of tokens
+        [token, lemma, preceding, morph tags] in "tokens" field.
+
+        Args:
+            request: Parsed JSON request.
+
+        Returns:
+            Sequence to link.
+        """
+        with self._id_lock:
+            self._sequence_id += 1
+            idx = self._sequence_id
+
+        if "text" in request:
+            return text_to_sequence(request["text"], idx)
+
+        sequence = TokensSequence([], idx)
+        for token, lemma, preceding, morph_tags in request["tokens"]:
+            sequence.append(
+                Token(token, preceding, NOT_WIKIDATA_ENTITY_SIGN, NOT_WIKIDATA_ENTITY_SIGN, lemma, morph_tags)
+            )
+        return sequence
+
+    def link(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Link sequence from ``request`` in next micro-batch and wait for result.
+
+        Args:
+            request: Parsed JSON request.
+
+        Returns:
+            Response with linked spans and latency.
+        """
+        start_time = time.time()
+        sequence = self.sequence_from_request(request)
+        spans = self._batcher.submit(sequence).result()
+        latency = time.time() - start_time
+        self.latency.record(latency)
+        return {
+            "tokens": [t.token_value for t in sequence.sequence],
+            "spans": spans,
+            "latency_ms": round(latency * 1000.0, 3),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns:
+            Service statistics: latency histogram, micro-batching and cache statistics.
+        """
+        return {
+            "latency": self.latency.to_dict(),
+            "batches": self._batcher.batches,
+            "mean_batch_size": round(self._batcher.items / self._batcher.batches, 3) if self._batcher.batches else 0.0,
+            "cache": self.wikidata_api.cache_stats(),
+        }
+
+
+class _LinkingRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP handler: POST /link links sequence, GET /stats returns service statistics.
+    """
+
+    service: LinkingService
+
+    def _send_json(self, code: int, data: Dict[str, Any]) -> None:
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        if self.path == "/stats":
+            self._send_json(200, self.service.stats())
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self) -> None:
+        if self.path != "/link":
+            self._send_json(404, {"error": "not found"})
+            return
+
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        except ValueError:
+            self._send_json(400, {"error": "invalid JSON"})
+            return
+
+        try:
+            self._send_json(200, self.service.link(request))
+        except (KeyError, TypeError, ValueError) as e:
+            self._send_json(400, {"error": f"invalid request: {e}"})
+
+    def address_string(self) -> str:
+        # client address of Unix socket is not a tuple
+        return str(self.client_address[0]) if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    # http.server.ThreadingHTTPServer is not available in Python 3.6
+    daemon_threads = True
+
+
+class _ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ("unix", 0)
+
+
+def create_server(service: LinkingService, host: str = "127.0.0.1", port: int = 8080, socket_path: str = ""):
+    """
+    Create HTTP server for ``service``, on TCP ``host``:``port`` or on Unix socket ``socket_path`` if it is given.
+
+    Args:
+        service: Linking service.
+        host: Host to listen on.
+        port: Port to listen on, 0 - any free port.
+        socket_path: Path to Unix socket.
+
+    Returns:
+        Server object, call ``serve_forever`` to run it.
+    """
+    handler = type("LinkingRequestHandler", (_LinkingRequestHandler,), {"service": service})
+
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        return _ThreadingUnixHTTPServer(socket_path, handler)
+
+    return _ThreadingHTTPServer((host, port), handler)
@@ -0,0 +1,91 @@
+"""
+Module with load-test client for linking service - it sends sequences from test file concurrently and collects
+latency histogram.
+"""
+
+import json
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from entity_linking.linking_service import LatencyHistogram
+from entity_linking.utils import TokensSequence
+
+
+def sequence_to_request(sequence: TokensSequence) -> Dict[str, Any]:
+    """
+    Create linking service request for ``sequence``.
+
+    Args:
+        sequence: Sequence to link.
+
+    Returns:
+        Request ready to dump to JSON.
+    """
+    return {
+        "tokens": [[t.token_value, t.lemma, t.preceding_token, t.morph_tags] for t in sequence.sequence]
+    }
+
+
+def send_link_request(url: str, request: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Send ``request`` to linking service.
+
+    Args:
+        url: Address of service, e.g. http://127.0.0.1:8080.
+        request: Request to send.
+
+    Returns:
+        Parsed response.
+    """
+    http_request = urllib.request.Request(
+        f"{url}/link",
+        data=json.dumps(request).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(http_request) as response:
+        return json.loads(response.read())
+
+
+def run_load_test(
+    url: str, sequences: List[TokensSequence], concurrency: int, requests_num: int
+) -> Dict[str, Any]:
+    """
+    Send ``requests_num`` requests with ``sequences`` (repeated if needed) using ``concurrency`` clients.
+
+    Args:
+        url: Address of service.
+        sequences: Sequences to send.
+        concurrency: Number of concurrent clients.
+        requests_num: Number of requests to send.
+
+    Returns:
+        Dict with client side latency histogram, errors number and throughput.
+    """
+    requests = [sequence_to_request(sequences[i % len(sequences)]) for i in range(requests_num)]
+    histogram = LatencyHistogram()
+    errors = 0
+
+    def send(request: Dict[str, Any]) -> bool:
+        start_time = time.time()
+        try:
+            send_link_request(url, request)
+        except OSError:
+            return False
+        histogram.record(time.time() - start_time)
+        return True
+
+    start_time = time.time()
+    with ThreadPoolExecutor(concurrency) as executor:
+        for ok in executor.map(send, requests):
+            if not ok:
+                errors += 1
+    elapsed = time.time() - start_time
+
+    return {
+        "histogram": histogram,
+        "errors": errors,
+        "elapsed": elapsed,
+        "requests_per_second": requests_num / elapsed if elapsed > 0 else 0.0,
+    }
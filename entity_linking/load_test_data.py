@@ -4,8 +4,6 @@ Module that contains functions design to read data from test files.
 import csv
 from typing import Iterator, List
 
-import pandas as pd
-
 from entity_linking.utils import (NOT_WIKIDATA_ENTITY_SIGN, Token,
                                   TokensSequence)
 
@@ -43,6 +41,8 @@ def load_sequences_from_test_file_with_lemmas_and_tags(
 
             # row not empty - append token to sequence
             else:
+                if not es.sequence:
+                    es.document_id = cur_row[0]
                 es.sequence.append(
                     Token(
                         cur_row[1],
@@ -81,6 +81,8 @@ def get_sequences_from_file(csv_reader) -> Iterator[TokensSequence]:
 
         # row is not empty - append token to sequence
         else:
+            if not es.sequence:
+                es.document_id = cur_row[0]
             es.sequence.append(
                 Token(
                     cur_row[1],
@@ -106,6 +108,8 @@ def get_entities_from_test_file_and_save(
         result_file_name: Result file name.
         sequences_number: Number of sequences to read from ``test_file_name``.
     """
+    import pandas as pd
+
     df = pd.DataFrame()
 
     # open csv test file
@@ -0,0 +1,67 @@
+"""
+Import time benchmark - every module is imported in fresh interpreter, so results don't depend on modules
+already loaded by caller.
+"""
+import json
+import os
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+# modules that are slow to import and must be loaded only by code paths that need them
+HEAVY_MODULES: List[str] = [
+    "matplotlib",
+    "seaborn",
+    "sklearn",
+    "pandas",
+    "morfeusz2",
+]
+
+# modules checked by benchmark and heavy modules that must not be loaded by their import
+IMPORT_BUDGETS: Dict[str, List[str]] = {
+    "app": HEAVY_MODULES + ["networkx", "requests", "wikidata.client"],
+    "entity_linking.utils": HEAVY_MODULES + ["networkx", "requests"],
+    "entity_linking.entity_classifier": HEAVY_MODULES,
+    "entity_linking.batch_linker": HEAVY_MODULES,
+    "entity_linking.raw_text_pipeline": HEAVY_MODULES + ["networkx", "requests"],
+}
+
+# code run in fresh interpreter, it prints import time and loaded heavy modules as JSON
+_MEASURE_CODE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"module": "{module}", "seconds": elapsed,
+                  "loaded": sorted(m for m in sys.modules if m.split(".")[0] in {heavy!r} or m in {heavy!r})}}))
+"""
+
+
+def measure_import(module: str, heavy_modules: List[str] = None) -> Dict[str, Any]:
+    """
+    Import ``module`` in fresh interpreter and measure import time.
+
+    Args:
+        module: Name of module to import.
+        heavy_modules: Names of modules to check if they were loaded. Default: HEAVY_MODULES.
+
+    Returns:
+        Dict with keys: module, seconds - import time and loaded - heavy modules loaded by import.
+    """
+    if heavy_modules is None:
+        heavy_modules = HEAVY_MODULES
+
+    root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    result = subprocess.run(
+        [sys.executable, "-c", _MEASURE_CODE.format(module=module, heavy=heavy_modules)],
+        cwd=root_dir,
+        stdout=subprocess.PIPE,
+        check=True,
+    )
+    return json.loads(result.stdout.decode("utf-8").strip().split("\n")[-1])
+
+
+if __name__ == "__main__":
+    for module_name, heavy in IMPORT_BUDGETS.items():
+        r = measure_import(module_name, heavy)
+        print(f"{module_name:40} {round(r['seconds'] * 1000.0, 1):>8} ms  loaded: {', '.join(r['loaded']) or '-'}")
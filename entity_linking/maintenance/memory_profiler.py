@@ -0,0 +1,327 @@
+"""
+Memory profiling of long classification runs. When profiling is enabled, every process - parent and Pool
+workers - takes tracemalloc snapshot every ``interval`` sequences and saves report with the top growing
+allocation sites to ``output_dir``. Stages of classification record growth of peak RSS and peak of traced
+memory. Reports of all processes are summarized at the end of run.
+
+Workers inherit configuration from parent process, so profiling must be enabled before Pool is created.
+Report of worker is saved also when worker exits - Pool must be closed and joined, terminated workers don't
+run finalizers.
+"""
+import glob
+import json
+import os
+import tracemalloc
+from multiprocessing.util import Finalize
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# default number of the top growing allocation sites in report
+DEFAULT_TOP_SITES: int = 10
+# prefix of report files of processes
+MEMORY_REPORT_PREFIX: str = "memory-"
+# name of summary file in report folder
+REPORT_MEMORY_PROFILE: str = "memory_profile.txt"
+
+# profiling configuration: interval in sequences, output dir and pid of parent process, None - disabled
+_CONFIG: Optional[Tuple[int, str, int]] = None
+# profiler of current process
+_PROFILER: Any = None
+
+
+def get_current_rss_kb() -> int:
+    """
+    Returns:
+        Current resident set size of process in KiB, peak RSS if current value is not available.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, IndexError):
+        return get_peak_rss_kb()
+
+
+def get_peak_rss_kb() -> int:
+    """
+    Returns:
+        Peak resident set size of process in KiB.
+    """
+    # resource module exists only on Unix, it is imported when profiling is used
+    import resource
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class MemoryProfiler:
+    """
+    Memory profiler of one process. Snapshots are compared with snapshot taken at profiler creation.
+
+    Attributes:
+        interval: Number of sequences between snapshots.
+        output_dir: Dir for report of process.
+        role: "parent" or "worker".
+        sequences: Number of sequences done by process.
+        snapshots: Data of taken snapshots.
+        stages: Stage name -> memory statistics of stage.
+        started_tracing: True if tracemalloc was started by profiler.
+    """
+
+    def __init__(self, interval: int, output_dir: str, role: str, top: int = DEFAULT_TOP_SITES) -> None:
+        """
+        Set object attributes and take baseline snapshot.
+
+        Args:
+            interval: Number of sequences between snapshots.
+            output_dir: Dir for report of process.
+            role: "parent" or "worker".
+            top: Number of the top growing allocation sites in snapshot data.
+        """
+        self.interval = interval
+        self.output_dir = output_dir
+        self.role = role
+        self.top = top
+        self.pid = os.getpid()
+        self.sequences = 0
+        self.snapshots: List[Dict[str, Any]] = []
+        self.stages: Dict[str, Dict[str, float]] = {}
+
+        self.started_tracing = not tracemalloc.is_tracing()
+        if self.started_tracing:
+            tracemalloc.start()
+        self._baseline = self._take_tracemalloc_snapshot()
+
+    @staticmethod
+    def _take_tracemalloc_snapshot() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        )
+
+    def sequence_done(self) -> None:
+        """
+        Count done sequence, take snapshot every ``interval`` sequences.
+        """
+        self.sequences += 1
+        if self.sequences % self.interval == 0:
+            self.take_snapshot()
+
+    def take_snapshot(self) -> Dict[str, Any]:
+        """
+        Take snapshot, compare it with baseline and save report of process.
+
+        Returns:
+            Snapshot data: number of sequences, memory sizes and the top growing allocation sites.
+        """
+        snapshot = self._take_tracemalloc_snapshot()
+        growing = [s for s in snapshot.compare_to(self._baseline, "lineno") if s.size_diff > 0]
+
+        traced, _ = tracemalloc.get_traced_memory()
+        data = {
+            "sequences": self.sequences,
+            "rss_kb": get_current_rss_kb(),
+            "peak_rss_kb": get_peak_rss_kb(),
+            "traced_kb": traced // 1024,
+            "top_growth": [
+                {
+                    "site": f"{s.traceback[0].filename}:{s.traceback[0].lineno}",
+                    "size_diff_kb": round(s.size_diff / 1024.0, 1),
+                    "count_diff": s.count_diff,
+                }
+                for s in growing[: self.top]
+            ],
+        }
+        self.snapshots.append(data)
+        self.save()
+        return data
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Context manager that measures growth of peak RSS and peak of traced memory in its block.
+        Stages must not be nested.
+
+        Args:
+            name: Name of stage.
+        """
+        peak_rss_before = get_peak_rss_kb()
+        traced_before, _ = tracemalloc.get_traced_memory()
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            _, traced_peak = tracemalloc.get_traced_memory()
+            peak_rss = get_peak_rss_kb()
+
+            stats = self.stages.setdefault(
+                name, {"calls": 0, "peak_rss_growth_kb": 0, "max_traced_peak_kb": 0.0, "peak_rss_kb": 0}
+            )
+            stats["calls"] += 1
+            stats["peak_rss_growth_kb"] += peak_rss - peak_rss_before
+            stats["max_traced_peak_kb"] = max(
+                stats["max_traced_peak_kb"], round((traced_peak - traced_before) / 1024.0, 1)
+            )
+            stats["peak_rss_kb"] = peak_rss
+
+    def save(self) -> None:
+        """
+        Save report of process to ``output_dir``.
+        """
+        with open(os.path.join(self.output_dir, f"{MEMORY_REPORT_PREFIX}{self.pid}.json"), "w") as f:
+            json.dump(
+                {
+                    "pid": self.pid,
+                    "role": self.role,
+                    "sequences": self.sequences,
+                    "snapshots": self.snapshots,
+                    "stages": self.stages,
+                },
+                f,
+                indent=2,
+            )
+
+
+def enable_memory_profiling(interval: int, output_dir: str) -> None:
+    """
+    Enable memory profiling in current process and in Pool workers created later.
+
+    Args:
+        interval: Number of sequences between snapshots.
+        output_dir: Dir for reports of processes.
+    """
+    global _CONFIG
+
+    os.makedirs(output_dir, exist_ok=True)
+    _CONFIG = (interval, output_dir, os.getpid())
+    get_profiler()
+
+
+def disable_memory_profiling() -> None:
+    """
+    Take the last snapshot in current process and disable memory profiling. Tracing started by caller is
+    not stopped.
+    """
+    global _CONFIG, _PROFILER
+
+    profiler = get_profiler()
+    if profiler is not None:
+        profiler.take_snapshot()
+
+    _CONFIG = None
+    _PROFILER = None
+    if profiler is not None and profiler.started_tracing:
+        tracemalloc.stop()
+
+
+def get_profiler() -> Optional[MemoryProfiler]:
+    """
+    Get profiler of current process - it is created on first call in every process.
+
+    Returns:
+        MemoryProfiler object or None if profiling is disabled.
+    """
+    global _PROFILER
+
+    if _CONFIG is None:
+        return None
+
+    if _PROFILER is None or _PROFILER.pid != os.getpid():
+        interval, output_dir, parent_pid = _CONFIG
+        _PROFILER = MemoryProfiler(interval, output_dir, "parent" if os.getpid() == parent_pid else "worker")
+        if _PROFILER.role == "worker":
+            # worker exits by os._exit, so atexit doesn't run - multiprocessing finalizers do
+            Finalize(None, _PROFILER.take_snapshot, exitpriority=10)
+
+    return _PROFILER
+
+
+@contextmanager
+def memory_stage(name: str) -> Iterator[None]:
+    """
+    Measure block as stage ``name`` if profiling is enabled, see ``MemoryProfiler.stage``.
+
+    Args:
+        name: Name of stage.
+    """
+    profiler = get_profiler()
+    if profiler is None:
+        yield
+    else:
+        with profiler.stage(name):
+            yield
+
+
+def sequence_done() -> None:
+    """
+    Count done sequence in profiler of current process, if profiling is enabled.
+    """
+    profiler = get_profiler()
+    if profiler is not None:
+        profiler.sequence_done()
+
+
+def load_memory_reports(output_dir: str) -> List[Dict[str, Any]]:
+    """
+    Args:
+        output_dir: Dir with reports of processes.
+
+    Returns:
+        Reports of all processes, parent first.
+    """
+    reports = []
+    for file_name in glob.glob(os.path.join(output_dir, f"{MEMORY_REPORT_PREFIX}*.json")):
+        with open(file_name) as f:
+            reports.append(json.load(f))
+    return sorted(reports, key=lambda r: (r["role"] != "parent", r["pid"]))
+
+
+def summarize_memory_reports(reports: List[Dict[str, Any]], top: int = DEFAULT_TOP_SITES) -> str:
+    """
+    Create text summary of memory reports: RSS and traced memory trend of every process, peak RSS and
+    traced memory of every stage and the top growing allocation sites summed over processes.
+
+    Args:
+        reports: Reports of processes, see ``load_memory_reports``.
+        top: Number of allocation sites in summary.
+
+    Returns:
+        Summary text.
+    """
+    lines = ["Processes:"]
+    sites: Dict[str, float] = {}
+    stages: Dict[str, Dict[str, float]] = {}
+
+    for report in reports:
+        snapshots = report["snapshots"]
+        if snapshots:
+            first, last = snapshots[0], snapshots[-1]
+            lines.append(
+                f"  {report['role']:6} {report['pid']:>7}: sequences {report['sequences']}, "
+                f"RSS {first['rss_kb']} -> {last['rss_kb']} KiB, peak RSS {last['peak_rss_kb']} KiB, "
+                f"traced {first['traced_kb']} -> {last['traced_kb']} KiB"
+            )
+            for site in last["top_growth"]:
+                sites[site["site"]] = sites.get(site["site"], 0.0) + site["size_diff_kb"]
+
+        for name, stats in report["stages"].items():
+            total = stages.setdefault(
+                name, {"calls": 0, "peak_rss_growth_kb": 0, "max_traced_peak_kb": 0.0, "peak_rss_kb": 0}
+            )
+            total["calls"] += stats["calls"]
+            total["peak_rss_growth_kb"] += stats["peak_rss_growth_kb"]
+            total["max_traced_peak_kb"] = max(total["max_traced_peak_kb"], stats["max_traced_peak_kb"])
+            total["peak_rss_kb"] = max(total["peak_rss_kb"], stats["peak_rss_kb"])
+
+    lines.append("")
+    lines.append("Stages:")
+    for name, stats in sorted(stages.items()):
+        lines.append(
+            f"  {name:20} calls {stats['calls']:>8}, peak RSS {stats['peak_rss_kb']} KiB, "
+            f"peak RSS growth {stats['peak_rss_growth_kb']} KiB, max traced peak {stats['max_traced_peak_kb']} KiB"
+        )
+
+    lines.append("")
+    lines.append("Top growing allocation sites:")
+    for site, size in sorted(sites.items(), key=lambda x: -x[1])[:top]:
+        lines.append(f"  {size:>10.1f} KiB  {site}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,168 @@
+"""
+Lightweight instrumentation - named timers and counters. Every process has its own registry ``METRICS``;
+snapshots from Pool workers are sent back with results and merged in parent process.
+"""
+import json
+import time
+from contextlib import contextmanager
+from threading import Lock
+from typing import Any, Dict, Iterator
+
+# prefix of metrics names in Prometheus text export
+PROMETHEUS_PREFIX: str = "entity_linking"
+
+
+class Metrics:
+    """
+    Registry of counters and timers. Timer keeps number of measurements, total and max time in seconds.
+    All methods are thread safe.
+    """
+
+    def __init__(self) -> None:
+        """
+        Create empty registry.
+        """
+        self._counters: Dict[str, float] = {}
+        self._timers: Dict[str, Dict[str, float]] = {}
+        self._lock = Lock()
+
+    def inc(self, name: str, value: float = 1) -> None:
+        """
+        Increase counter ``name`` by ``value``.
+
+        Args:
+            name: Name of counter.
+            value: Value to add.
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def add_time(self, name: str, seconds: float) -> None:
+        """
+        Add measurement to timer ``name``.
+
+        Args:
+            name: Name of timer.
+            seconds: Measured time in seconds.
+        """
+        with self._lock:
+            timer = self._timers.get(name)
+            if timer is None:
+                self._timers[name] = {"count": 1, "total": seconds, "max": seconds}
+            else:
+                timer["count"] += 1
+                timer["total"] += seconds
+                if seconds > timer["max"]:
+                    timer["max"] = seconds
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        """
+        Context manager that measures time of its block and adds it to timer ``name``.
+
+        Args:
+            name: Name of timer.
+        """
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start_time)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Returns:
+            Copy of all counters and timers, ready to send to other process or dump to JSON.
+        """
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "timers": {name: dict(timer) for name, timer in self._timers.items()},
+            }
+
+    def merge(self, snapshot: Dict[str, Any]) -> None:
+        """
+        Add counters and timers from ``snapshot`` to this registry.
+
+        Args:
+            snapshot: Result of ``snapshot`` method, e.g. from other process.
+        """
+        with self._lock:
+            for name, value in snapshot["counters"].items():
+                self._counters[name] = self._counters.get(name, 0) + value
+
+            for name, other in snapshot["timers"].items():
+                timer = self._timers.get(name)
+                if timer is None:
+                    self._timers[name] = dict(other)
+                else:
+                    timer["count"] += other["count"]
+                    timer["total"] += other["total"]
+                    timer["max"] = max(timer["max"], other["max"])
+
+    def reset(self) -> None:
+        """
+        Remove all counters and timers.
+        """
+        with self._lock:
+            self._counters.clear()
+            self._timers.clear()
+
+    def collect(self) -> Dict[str, Any]:
+        """
+        Take snapshot and reset registry - used by workers to send only new measurements.
+
+        Returns:
+            Snapshot of registry.
+        """
+        with self._lock:
+            snapshot = {
+                "counters": self._counters,
+                "timers": self._timers,
+            }
+            self._counters = {}
+            self._timers = {}
+        return snapshot
+
+    def to_json(self) -> str:
+        """
+        Returns:
+            Snapshot of registry as JSON string.
+        """
+        return json.dumps(self.snapshot(), indent=2, sort_keys=True)
+
+    def to_prometheus(self, prefix: str = PROMETHEUS_PREFIX) -> str:
+        """
+        Export registry in Prometheus text format. Counters are exported as ``<prefix>_<name>_total``,
+        timers as summaries ``<prefix>_<name>_seconds`` with count and sum, and gauge with max.
+
+        Args:
+            prefix: Prefix of metrics names.
+
+        Returns:
+            Metrics in Prometheus text format.
+        """
+        def metric_name(name: str) -> str:
+            return f"{prefix}_" + "".join(c if c.isalnum() else "_" for c in name)
+
+        snapshot = self.snapshot()
+        lines = []
+
+        for name, value in sorted(snapshot["counters"].items()):
+            m = metric_name(name)
+            lines.append(f"# TYPE {m}_total counter")
+            lines.append(f"{m}_total {value}")
+
+        for name, timer in sorted(snapshot["timers"].items()):
+            m = metric_name(name)
+            lines.append(f"# TYPE {m}_seconds summary")
+            lines.append(f"{m}_seconds_count {timer['count']}")
+            lines.append(f"{m}_seconds_sum {timer['total']}")
+            lines.append(f"# TYPE {m}_seconds_max gauge")
+            lines.append(f"{m}_seconds_max {timer['max']}")
+
+        return "\n".join(lines) + "\n"
+
+
+# registry of current process
+METRICS: Metrics = Metrics()
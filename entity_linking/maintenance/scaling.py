@@ -0,0 +1,237 @@
+"""
+Scaling experiment on synthetic data - runtime and peak memory of graph building, graph scoring and tokenizers
+as taxonomy gets deeper and denser and sequences get longer. Run as module to print results and plot curves:
+python -m entity_linking.maintenance.scaling --depths 2 4 6 --fan-in 1 2 --plot scaling.png
+"""
+import argparse
+import itertools
+import json
+import random
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+from wikidata.entity import EntityId
+
+from entity_linking.graph_wikidata import (create_graph_for_entity,
+                                           get_graph_score)
+from entity_linking.sparse_taxonomy import SparseTaxonomy
+from entity_linking.synthetic import (DEFAULT_SYNTHETIC_SEED,
+                                      SyntheticTaxonomy,
+                                      create_synthetic_wikidata_api,
+                                      generate_sequences, generate_taxonomy)
+from entity_linking.tokenizer import (WikidataLengthTokenizer,
+                                      WikidataMorphTagsTokenizer)
+from entity_linking.utils import TokensSequence
+from entity_linking.wikidata_api import WikidataAPI
+
+# default number of leaves used by graph engines in every run
+DEFAULT_ENTITIES_SAMPLE: int = 20
+# default number of sequences used by tokenizer engines in every run
+DEFAULT_SEQUENCES_NUMBER: int = 20
+# default max token length of tokenizers
+DEFAULT_TOKEN_LENGTH: int = 3
+# default number of measured runs - the best one is reported
+DEFAULT_REPEAT: int = 3
+
+
+def _prepare_create_graph(
+    api: WikidataAPI, taxonomy: SyntheticTaxonomy, entities: List[str], sequences: List[TokensSequence]
+) -> Callable[[], Any]:
+    return lambda: [create_graph_for_entity(EntityId(e), api, taxonomy.depth) for e in entities]
+
+
+def _prepare_graph_score(
+    api: WikidataAPI, taxonomy: SyntheticTaxonomy, entities: List[str], sequences: List[TokensSequence]
+) -> Callable[[], Any]:
+    graphs = [(create_graph_for_entity(EntityId(e), api, taxonomy.depth), e) for e in entities]
+    return lambda: [get_graph_score(g, EntityId(e)) for g, e in graphs]
+
+
+def _prepare_sparse_walk_scores(
+    api: WikidataAPI, taxonomy: SyntheticTaxonomy, entities: List[str], sequences: List[TokensSequence]
+) -> Callable[[], Any]:
+    sparse_taxonomy = SparseTaxonomy(taxonomy.subclasses)
+    # matrix is built before measured runs
+    sparse_taxonomy.get_walk_counts(entities[:1], 1)
+    return lambda: sparse_taxonomy.get_walk_scores(entities, taxonomy.depth)
+
+
+def _prepare_morph_tags_tokenizer(
+    api: WikidataAPI, taxonomy: SyntheticTaxonomy, entities: List[str], sequences: List[TokensSequence]
+) -> Callable[[], Any]:
+    tokenizer = WikidataMorphTagsTokenizer(api, DEFAULT_TOKEN_LENGTH)
+    return lambda: [tokenizer.tokenize(s) for s in sequences]
+
+
+def _prepare_length_tokenizer(
+    api: WikidataAPI, taxonomy: SyntheticTaxonomy, entities: List[str], sequences: List[TokensSequence]
+) -> Callable[[], Any]:
+    tokenizer = WikidataLengthTokenizer(api, DEFAULT_TOKEN_LENGTH)
+    return lambda: [tokenizer.tokenize(s) for s in sequences]
+
+
+# engine name -> function that prepares data and returns measured function
+ENGINES: Dict[str, Callable[..., Callable[[], Any]]] = {
+    "create_graph_for_entity": _prepare_create_graph,
+    "get_graph_score": _prepare_graph_score,
+    "sparse_walk_scores": _prepare_sparse_walk_scores,
+    "morph_tags_tokenizer": _prepare_morph_tags_tokenizer,
+    "length_tokenizer": _prepare_length_tokenizer,
+}
+
+
+def measure(fun: Callable[[], Any], repeat: int = DEFAULT_REPEAT) -> Dict[str, float]:
+    """
+    Measure runtime and peak memory of ``fun``. Memory is measured in separate run, so tracing doesn't
+    slow down timed runs.
+
+    Args:
+        fun: Function to measure.
+        repeat: Number of timed runs.
+
+    Returns:
+        Dict with keys: seconds - the best runtime and peak_memory - peak of allocated memory in bytes.
+    """
+    times = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        fun()
+        times.append(time.perf_counter() - start_time)
+
+    tracemalloc.start()
+    try:
+        fun()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {"seconds": min(times), "peak_memory": peak}
+
+
+def run_scaling_experiment(
+    depths: List[int],
+    fan_outs: List[int],
+    fan_ins: List[int],
+    sequence_lens: List[int],
+    engines: List[str] = None,
+    entities_sample: int = DEFAULT_ENTITIES_SAMPLE,
+    sequences_num: int = DEFAULT_SEQUENCES_NUMBER,
+    repeat: int = DEFAULT_REPEAT,
+    seed: int = DEFAULT_SYNTHETIC_SEED,
+) -> List[Dict[str, Any]]:
+    """
+    Measure every engine for every combination of parameters.
+
+    Args:
+        depths: Depths of taxonomy.
+        fan_outs: Fan-outs of taxonomy.
+        fan_ins: Fan-ins of taxonomy.
+        sequence_lens: Lengths of sequences.
+        engines: Names of engines from ENGINES. Default: all engines.
+        entities_sample: Number of leaves used by graph engines.
+        sequences_num: Number of sequences used by tokenizer engines.
+        repeat: Number of timed runs.
+        seed: Seed of random generators.
+
+    Returns:
+        One row per engine and combination of parameters.
+    """
+    if engines is None:
+        engines = list(ENGINES)
+
+    results = []
+
+    for depth, fan_out, fan_in, sequence_len in itertools.product(depths, fan_outs, fan_ins, sequence_lens):
+        taxonomy = generate_taxonomy(depth, fan_out, fan_in, seed=seed)
+        api = create_synthetic_wikidata_api(taxonomy, seed=seed)
+        entities = random.Random(seed).sample(taxonomy.leaves, min(entities_sample, len(taxonomy.leaves)))
+        sequences = generate_sequences(taxonomy, sequences_num, sequence_len, seed=seed)
+
+        for engine in engines:
+            row: Dict[str, Any] = {
+                "engine": engine,
+                "depth": depth,
+                "fan_out": fan_out,
+                "fan_in": fan_in,
+                "sequence_len": sequence_len,
+                "nodes": taxonomy.nodes_count(),
+                "edges": taxonomy.edges_count(),
+            }
+            row.update(measure(ENGINES[engine](api, taxonomy, entities, sequences), repeat))
+            results.append(row)
+
+    return results
+
+
+def plot_scaling_results(results: List[Dict[str, Any]], x_key: str, file_name: str) -> None:
+    """
+    Plot runtime and peak memory curves of every engine and save figure to ``file_name``.
+
+    Args:
+        results: Result of ``run_scaling_experiment``.
+        x_key: Parameter on X axis, e.g. depth or sequence_len.
+        file_name: Name of result image.
+    """
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig, (ax_time, ax_memory) = plt.subplots(1, 2, figsize=(12, 5))
+
+    curves: Dict[str, List[Dict[str, Any]]] = {}
+    for row in results:
+        others = ", ".join(f"{k}={row[k]}" for k in ["depth", "fan_out", "fan_in", "sequence_len"] if k != x_key)
+        curves.setdefault(f"{row['engine']} ({others})", []).append(row)
+
+    for label, rows in sorted(curves.items()):
+        rows = sorted(rows, key=lambda r: r[x_key])
+        xs = [r[x_key] for r in rows]
+        ax_time.plot(xs, [r["seconds"] * 1000.0 for r in rows], marker="o", label=label)
+        ax_memory.plot(xs, [r["peak_memory"] / 1024.0 for r in rows], marker="o", label=label)
+
+    ax_time.set_xlabel(x_key)
+    ax_time.set_ylabel("time [ms]")
+    ax_time.set_yscale("log")
+    ax_memory.set_xlabel(x_key)
+    ax_memory.set_ylabel("peak memory [KiB]")
+    ax_memory.set_yscale("log")
+    ax_memory.legend(fontsize="x-small")
+
+    fig.tight_layout()
+    fig.savefig(file_name)
+    plt.close(fig)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scaling experiment on synthetic taxonomy and sequences")
+    parser.add_argument("--depths", type=int, nargs="+", default=[2, 3, 4, 5])
+    parser.add_argument("--fan-out", type=int, nargs="+", default=[2])
+    parser.add_argument("--fan-in", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--sequence-len", type=int, nargs="+", default=[20])
+    parser.add_argument("--engines", nargs="+", choices=list(ENGINES), default=None)
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SYNTHETIC_SEED)
+    parser.add_argument("--output", type=str, default="", help="Save results as JSON to this file.")
+    parser.add_argument("--plot", type=str, default="", help="Save plot to this file.")
+    parser.add_argument("--x", type=str, default="depth", choices=["depth", "fan_out", "fan_in", "sequence_len"])
+    args = parser.parse_args()
+
+    scaling_results = run_scaling_experiment(
+        args.depths, args.fan_out, args.fan_in, args.sequence_len, args.engines, repeat=args.repeat, seed=args.seed
+    )
+
+    for r in scaling_results:
+        print(
+            f"{r['engine']:25} depth={r['depth']:<3} fan_out={r['fan_out']:<3} fan_in={r['fan_in']:<3} "
+            f"len={r['sequence_len']:<5} nodes={r['nodes']:<8} {r['seconds'] * 1000.0:10.3f} ms "
+            f"{r['peak_memory'] / 1024.0:10.1f} KiB"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(scaling_results, f, indent=2)
+
+    if args.plot:
+        plot_scaling_results(scaling_results, args.x, args.plot)
@@ -0,0 +1,194 @@
+"""
+Module with morphological analysis layer built around Morfeusz. Morfeusz object is created lazily, once per
+process, and results are memoized per word form, because the same forms repeat heavily across Wikipedia pages
+and sequences.
+"""
+
+import os
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Tuple
+
+from entity_linking.maintenance.metrics import METRICS
+
+# default max number of word forms kept in analysis cache
+DEFAULT_ANALYSIS_CACHE_SIZE: int = 100000
+
+# single Morfeusz result: start node, end node and interpretation tuple
+MorfeuszResult = Tuple[int, int, Tuple[str, str, str, List[str], List[str]]]
+
+# Morfeusz object for current process and pid of process that created it
+_MORFEUSZ: Any = None
+_MORFEUSZ_PID: int = -1
+# Morfeusz object is shared by threads of process, but it is not thread safe
+_MORFEUSZ_LOCK: Lock = Lock()
+
+# analyser shared by all users in current process
+_SHARED_ANALYSER: Any = None
+
+
+def get_morfeusz() -> Any:
+    """
+    Get Morfeusz object for current process. It is created on first call in every process, so it is never
+    constructed at import time and processes created by fork don't share it with parent.
+
+    Returns:
+        morfeusz2.Morfeusz object.
+    """
+    global _MORFEUSZ, _MORFEUSZ_PID
+
+    if _MORFEUSZ is None or _MORFEUSZ_PID != os.getpid():
+        import morfeusz2
+
+        _MORFEUSZ = morfeusz2.Morfeusz()
+        _MORFEUSZ_PID = os.getpid()
+
+    return _MORFEUSZ
+
+
+class MorfeuszAnalyser:
+    """
+    Morfeusz wrapper with bounded, least recently used cache of analyses for word forms. Text is split
+    by white characters and every form is analysed separately - Morfeusz never joins segments across white
+    characters, so result is the same as for analysis of whole text.
+
+    Attributes:
+        cache_size: Max number of word forms kept in cache.
+        hits: Number of word forms taken from cache.
+        misses: Number of word forms analysed by Morfeusz.
+    """
+
+    cache_size: int
+    hits: int
+    misses: int
+
+    def __init__(self, cache_size: int = DEFAULT_ANALYSIS_CACHE_SIZE) -> None:
+        """
+        Set object attributes.
+
+        Args:
+            cache_size: Max number of word forms kept in cache.
+        """
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._cache: "OrderedDict[str, Tuple[Tuple[MorfeuszResult, ...], int]]" = OrderedDict()
+        self._lock = Lock()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # lock can't be pickled and cache is useless in other process
+        return {"cache_size": self.cache_size, "hits": 0, "misses": 0}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__(state["cache_size"])
+
+    def _analyse_word_form(self, form: str) -> Tuple[Tuple[MorfeuszResult, ...], int]:
+        """
+        Get analysis of single word form - from cache or using Morfeusz.
+
+        Args:
+            form: Word form without white characters.
+
+        Returns:
+            Tuple: Morfeusz results with nodes counted from 0 and number of nodes used by ``form``.
+        """
+        with self._lock:
+            cached = self._cache.get(form)
+            if cached is not None:
+                self._cache.move_to_end(form)
+                self.hits += 1
+                METRICS.inc("morfeusz_cache.hit")
+                return cached
+
+        with _MORFEUSZ_LOCK:
+            result = tuple(get_morfeusz().analyse(form))
+        nodes_num = max((r[1] for r in result), default=0)
+
+        with self._lock:
+            self.misses += 1
+            METRICS.inc("morfeusz_cache.miss")
+            self._cache[form] = (result, nodes_num)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        return result, nodes_num
+
+    def analyse(self, text: str) -> List[MorfeuszResult]:
+        """
+        Analyse ``text``, result is in the same format as result of ``morfeusz2.Morfeusz.analyse``.
+        Returned interpretations are shared with cache - don't modify them.
+
+        Args:
+            text: Text to analyse.
+
+        Returns:
+            List of tuples (start node, end node, interpretation).
+        """
+        return self._join_forms([self._analyse_word_form(form) for form in text.split()])
+
+    @staticmethod
+    def _join_forms(forms: List[Tuple[Tuple[MorfeuszResult, ...], int]]) -> List[MorfeuszResult]:
+        # nodes of every form are shifted by number of nodes of previous forms
+        result: List[MorfeuszResult] = []
+        offset = 0
+
+        for form_result, nodes_num in forms:
+            if offset == 0:
+                result.extend(form_result)
+            else:
+                for start, end, interpretation in form_result:
+                    result.append((start + offset, end + offset, interpretation))
+            offset += nodes_num
+
+        return result
+
+    def analyse_many(self, texts: Iterable[str]) -> List[List[MorfeuszResult]]:
+        """
+        Analyse all ``texts`` in one call. Every unique word form of ``texts`` is analysed once - taken from
+        cache or by Morfeusz - even if it is evicted from cache in the meantime.
+
+        Args:
+            texts: Texts to analyse.
+
+        Returns:
+            List of analyses - one for each text, in the same order as ``texts``.
+        """
+        texts_forms = [text.split() for text in texts]
+        analyses = {}
+        for forms in texts_forms:
+            for form in forms:
+                if form not in analyses:
+                    analyses[form] = self._analyse_word_form(form)
+
+        return [self._join_forms([analyses[form] for form in forms]) for forms in texts_forms]
+
+    def clear_cache(self) -> None:
+        """
+        Remove all word forms from cache and reset cache statistics.
+        """
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def cache_len(self) -> int:
+        """
+        Returns:
+            Number of word forms in cache.
+        """
+        return len(self._cache)
+
+
+def get_analyser() -> MorfeuszAnalyser:
+    """
+    Get analyser shared by all users in current process.
+
+    Returns:
+        Shared MorfeuszAnalyser object.
+    """
+    global _SHARED_ANALYSER
+
+    if _SHARED_ANALYSER is None:
+        _SHARED_ANALYSER = MorfeuszAnalyser()
+
+    return _SHARED_ANALYSER
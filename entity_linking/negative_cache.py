@@ -0,0 +1,311 @@
+"""
+Persistent filter of lookups known to have no result - tokens without pages and entities without subclasses.
+Most candidate windows of tokenizer have no pages, so NegativeCacheWikidataAPI answers them from Bloom filter
+before any database query or network request.
+
+Bloom filter has no false negatives, but key that was never added may be reported as empty with probability
+``estimated_false_positive_rate``. Every ``verify_every``-th filtered lookup is still passed to API, so the
+real rate of false positives is measured too.
+"""
+import fcntl
+import math
+import os
+from hashlib import blake2b
+from threading import Lock
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from entity_linking.maintenance.metrics import METRICS
+from entity_linking.utils import EntityAncestors
+from entity_linking.wikidata_api import WikidataAPI
+
+# default number of keys that filter holds with DEFAULT_NEGATIVE_CACHE_FP_RATE
+DEFAULT_NEGATIVE_CACHE_CAPACITY: int = 1000000
+# default target false positive rate of filter
+DEFAULT_NEGATIVE_CACHE_FP_RATE: float = 0.001
+# default number of filtered lookups per one lookup checked in API
+DEFAULT_NEGATIVE_CACHE_VERIFY_EVERY: int = 100
+# default number of new keys after which filter is saved
+DEFAULT_NEGATIVE_CACHE_SAVE_EVERY: int = 1000
+
+# first bytes of filter file, the last byte is format version
+BLOOM_FILTER_MAGIC: bytes = b"ELBLOOM\x01"
+
+# prefixes of keys of lookup kinds
+NEGATIVE_TOKEN: str = "t:"
+NEGATIVE_ENTITY: str = "e:"
+
+
+class BloomFilter:
+    """
+    Bloom filter with ``bits_number`` bits and ``hashes_number`` hash functions, made by double hashing
+    of one blake2b digest.
+
+    Attributes:
+        count: Number of added keys.
+    """
+
+    def __init__(self, bits_number: int, hashes_number: int, bits: np.ndarray = None, count: int = 0):
+        """
+        Set object attributes.
+
+        Args:
+            bits_number: Size of filter in bits.
+            hashes_number: Number of bits set by key.
+            bits: Saved bits of filter, default: empty filter.
+            count: Number of keys added to saved bits.
+        """
+        self.bits_number = bits_number
+        self.hashes_number = hashes_number
+        self.bits = bits if bits is not None else np.zeros((bits_number + 7) // 8, dtype=np.uint8)
+        self.count = count
+
+    @classmethod
+    def create(cls, capacity: int, fp_rate: float) -> "BloomFilter":
+        """
+        Args:
+            capacity: Number of keys.
+            fp_rate: False positive rate of filter with ``capacity`` keys.
+
+        Returns:
+            Empty filter of optimal size.
+        """
+        bits_number = max(8, int(math.ceil(-capacity * math.log(fp_rate) / math.log(2) ** 2)))
+        hashes_number = max(1, int(round(bits_number / capacity * math.log(2))))
+        return cls(bits_number, hashes_number)
+
+    def _positions(self, key: str) -> List[int]:
+        digest = blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + x * h2) % self.bits_number for x in range(self.hashes_number)]
+
+    def add(self, key: str) -> bool:
+        """
+        Returns:
+            True if ``key`` was not in filter.
+        """
+        new = False
+        for position in self._positions(key):
+            mask = 1 << (position & 7)
+            if not self.bits[position >> 3] & mask:
+                self.bits[position >> 3] |= mask
+                new = True
+        if new:
+            self.count += 1
+        return new
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+    def estimated_false_positive_rate(self) -> float:
+        """
+        Returns:
+            Probability that key that was not added is in filter.
+        """
+        return (1.0 - math.exp(-self.hashes_number * self.count / self.bits_number)) ** self.hashes_number
+
+    def union(self, other: "BloomFilter") -> None:
+        """
+        Add keys of ``other`` filter of the same size. Count of keys is estimated from set bits.
+        """
+        if (other.bits_number, other.hashes_number) != (self.bits_number, self.hashes_number):
+            raise ValueError("Filters of other sizes can't be joined")
+
+        np.bitwise_or(self.bits, other.bits, out=self.bits)
+        ones = int(np.unpackbits(self.bits).sum())
+        if ones < self.bits_number:
+            estimated = -self.bits_number / self.hashes_number * math.log(1.0 - ones / self.bits_number)
+            self.count = max(self.count, other.count, int(round(estimated)))
+
+    def save(self, file_name: str) -> None:
+        """
+        Write filter to temporary file and rename it, so readers never see half written filter.
+        """
+        tmp_name = f"{file_name}.tmp-{os.getpid()}"
+        with open(tmp_name, "wb") as f:
+            f.write(BLOOM_FILTER_MAGIC)
+            f.write(np.array([self.bits_number, self.hashes_number, self.count], dtype="<u8").tobytes())
+            f.write(self.bits.tobytes())
+        os.replace(tmp_name, file_name)
+
+    @classmethod
+    def load(cls, file_name: str) -> "BloomFilter":
+        """
+        Raises:
+            ValueError: if ``file_name`` is not filter file.
+        """
+        with open(file_name, "rb") as f:
+            data = f.read()
+
+        if not data.startswith(BLOOM_FILTER_MAGIC):
+            raise ValueError(f"{file_name} is not Bloom filter file")
+
+        bits_number, hashes_number, count = (
+            int(x) for x in np.frombuffer(data, dtype="<u8", count=3, offset=len(BLOOM_FILTER_MAGIC))
+        )
+        bits = np.frombuffer(data, dtype=np.uint8, offset=len(BLOOM_FILTER_MAGIC) + 24).copy()
+        if len(bits) != (bits_number + 7) // 8:
+            raise ValueError(f"{file_name} is truncated")
+        return cls(bits_number, hashes_number, bits, count)
+
+
+class NegativeCacheWikidataAPI(WikidataAPI):
+    """
+    Wrapper that returns empty result for tokens and entities in filter without asking ``api``. Empty results
+    of ``api`` are added to filter. Filter is loaded from ``file_name`` if it exists and saved to it every
+    ``save_every`` new keys and by ``save`` - joined with filter saved by other processes in the meantime.
+
+    Attributes:
+        hits: Number of lookups answered by filter.
+        verified: Number of lookups in filter checked in API.
+        false_positives: Number of checked lookups that had result.
+    """
+
+    api: WikidataAPI
+    file_name: str
+
+    def __init__(
+        self,
+        api: WikidataAPI,
+        file_name: str = "",
+        capacity: int = DEFAULT_NEGATIVE_CACHE_CAPACITY,
+        fp_rate: float = DEFAULT_NEGATIVE_CACHE_FP_RATE,
+        verify_every: int = DEFAULT_NEGATIVE_CACHE_VERIFY_EVERY,
+        save_every: int = DEFAULT_NEGATIVE_CACHE_SAVE_EVERY,
+    ):
+        """
+        Set object attributes.
+
+        Args:
+            api: API to get from wikidata.
+            file_name: Path to filter file, "" - filter is kept only in memory.
+            capacity: Number of keys of new filter.
+            fp_rate: False positive rate of new filter with ``capacity`` keys.
+            verify_every: Check every N-th lookup in filter in API, 0 - off.
+            save_every: Save filter every N new keys, 0 - only by ``save``.
+        """
+        self.api = api
+        self.file_name = file_name
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.verify_every = verify_every
+        self.save_every = save_every
+        self.hits = 0
+        self.verified = 0
+        self.false_positives = 0
+        self._unsaved = 0
+        self._lock = Lock()
+
+        if file_name and os.path.isfile(file_name):
+            self.filter = BloomFilter.load(file_name)
+        else:
+            self.filter = BloomFilter.create(capacity, fp_rate)
+
+    def __getstate__(self):
+        # lock can't be pickled, worker loads filter saved on disk
+        state = {k: getattr(self, k) for k in ["api", "file_name", "capacity", "fp_rate", "verify_every", "save_every"]}
+        state["filter"] = None if self.file_name else self.filter
+        return state
+
+    def __setstate__(self, state):
+        saved_filter = state.pop("filter")
+        self.__init__(**state)
+        if saved_filter is not None:
+            self.filter = saved_filter
+
+    def _lookup(self, kind: str, key: str, fetch) -> Any:
+        filter_key = kind + key
+
+        with self._lock:
+            negative = filter_key in self.filter
+            verify = False
+            if negative:
+                self.hits += 1
+                verify = self.verify_every > 0 and self.hits % self.verify_every == 0
+
+        if negative and not verify:
+            METRICS.inc("negative_cache.hit")
+            return []
+
+        result = fetch(key)
+
+        if negative:
+            with self._lock:
+                self.verified += 1
+                METRICS.inc("negative_cache.verified")
+                if result:
+                    self.false_positives += 1
+                    METRICS.inc("negative_cache.false_positive")
+            return result
+
+        METRICS.inc("negative_cache.miss")
+        if not result:
+            with self._lock:
+                if self.filter.add(filter_key):
+                    self._unsaved += 1
+                save = self.save_every > 0 and self._unsaved >= self.save_every
+            if save:
+                self.save()
+
+        return result
+
+    def get_subclasses_for_entity(self, entity: str) -> List[str]:
+        return self._lookup(NEGATIVE_ENTITY, str(entity), self.api.get_subclasses_for_entity)
+
+    def get_pages_for_token(self, token: str) -> List[str]:
+        return self._lookup(NEGATIVE_TOKEN, token, self.api.get_pages_for_token)
+
+    def get_wikipedia_title(self, entity: str) -> Optional[str]:
+        return self.api.get_wikipedia_title(entity)
+
+    def get_wikipedia_content(self, page_title: str) -> str:
+        return self.api.get_wikipedia_content(page_title)
+
+    def get_entity_ancestors(self, entity: str, depth: int) -> EntityAncestors:
+        # wrapped API may keep closures itself, e.g. in database
+        return self.api.get_entity_ancestors(entity, depth)
+
+    def flush(self) -> None:
+        # worker gets filter loaded from file, keys found by it are kept only if they are saved
+        with self._lock:
+            unsaved = self._unsaved
+        if unsaved > 0:
+            self.save()
+        self.api.flush()
+
+    def save(self) -> None:
+        """
+        Join filter with filter saved in file and save it. Does nothing for filter kept only in memory.
+        """
+        if not self.file_name:
+            return
+
+        # workers save at the same time, file is locked so keys of none of them are lost
+        with self._lock, open(f"{self.file_name}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            if os.path.isfile(self.file_name):
+                try:
+                    self.filter.union(BloomFilter.load(self.file_name))
+                except ValueError:
+                    # file of other size or broken one is overwritten
+                    pass
+            self.filter.save(self.file_name)
+            self._unsaved = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns:
+            Size of filter, number of keys, expected false positive rate and rate measured by verified lookups.
+        """
+        with self._lock:
+            return {
+                "keys": self.filter.count,
+                "bits": self.filter.bits_number,
+                "hashes": self.filter.hashes_number,
+                "hits": self.hits,
+                "estimated_fp_rate": self.filter.estimated_false_positive_rate(),
+                "verified": self.verified,
+                "measured_fp_rate": self.false_positives / self.verified if self.verified else None,
+            }
@@ -0,0 +1,173 @@
+from array import array
+from entity_linking.grammar.range import Range
+
+
+class Interner():
+    def __init__(self):
+        self._ids = dict()
+        self._values = list()
+
+    def __len__(self):
+        return len(self._values)
+
+    def intern(self, value) -> int:
+        value_id = self._ids.get(value)
+        if value_id is None:
+            value_id = len(self._values)
+            self._ids[value] = value_id
+            self._values.append(value)
+        return value_id
+
+    def value(self, value_id: int):
+        return self._values[value_id]
+
+
+class AnalysisView():
+    __slots__ = ("_text", "_idx")
+
+    def __init__(self, text, idx: int):
+        self._text = text
+        self._idx = idx
+
+    def __eq__(self, other):
+        return self.lemma == other.lemma and \
+            self.tag == other.tag and \
+            self.add_info_1 == other.add_info_1 and \
+            self.add_info_2 == other.add_info_2
+
+    def __ne__(self, other):
+        return not self == other
+
+    @property
+    def lemma(self):
+        return self._text.strings.value(self._text.lemmas[self._idx])
+
+    @property
+    def tag(self):
+        return self._text.strings.value(self._text.tags[self._idx])
+
+    @property
+    def add_info_1(self):
+        return list(self._text.infos.value(self._text.add_infos_1[self._idx]))
+
+    @property
+    def add_info_2(self):
+        return list(self._text.infos.value(self._text.add_infos_2[self._idx]))
+
+
+class TokenView():
+    __slots__ = ("_text", "_idx")
+
+    def __init__(self, text, idx: int):
+        self._text = text
+        self._idx = idx
+
+    def __eq__(self, other):
+        return self.range == other.range and \
+            self.word == other.word and \
+            self.analyses == other.analyses
+
+    def __ne__(self, other):
+        return not self == other
+
+    @property
+    def range(self):
+        return Range(start=self._text.starts[self._idx],
+                     end=self._text.ends[self._idx])
+
+    @property
+    def word(self) -> str:
+        return self._text.strings.value(self._text.words[self._idx])
+
+    @property
+    def analyses(self):
+        first = self._text.analyses_offsets[self._idx]
+        last = self._text.analyses_offsets[self._idx + 1]
+        return [AnalysisView(self._text, i) for i in range(first, last)]
+
+
+class ParsedText():
+    """
+    Parser result stored in parallel arrays. Token ``i`` spans nodes
+    ``starts[i]``-``ends[i]``, has word ``words[i]`` and analyses
+    ``analyses_offsets[i]``-``analyses_offsets[i + 1]`` from analyses
+    table (``lemmas``, ``tags``, ``add_infos_1``, ``add_infos_2``).
+    Words, lemmas and tags are IDs from ``strings``, additional info
+    lists are IDs from ``infos``. Token and Analysis views are created
+    only on access.
+    """
+
+    def __init__(self, strings: Interner = None, infos: Interner = None):
+        self.strings = strings if strings is not None else Interner()
+        self.infos = infos if infos is not None else Interner()
+        self.starts = array("i")
+        self.ends = array("i")
+        self.words = array("i")
+        self.analyses_offsets = array("i", [0])
+        self.lemmas = array("i")
+        self.tags = array("i")
+        self.add_infos_1 = array("i")
+        self.add_infos_2 = array("i")
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, idx: int):
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("token index out of range")
+        return TokenView(self, idx)
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield TokenView(self, idx)
+
+    def analyses_count(self, idx: int) -> int:
+        return self.analyses_offsets[idx + 1] - self.analyses_offsets[idx]
+
+    @staticmethod
+    def from_analyses(analyses, strings: Interner = None,
+                      infos: Interner = None):
+        text = ParsedText(strings=strings, infos=infos)
+        # analyses are read twice - iterator would be empty the second time
+        if not isinstance(analyses, (list, tuple)):
+            analyses = list(analyses)
+
+        # assign token index to every analysis, tokens are ordered by
+        # first occurrence of their (start, end) pair
+        token_ids = dict()
+        analysis_token = array("i")
+        for i, j, analysis in analyses:
+            token_idx = token_ids.get((i, j))
+            if token_idx is None:
+                token_idx = len(token_ids)
+                token_ids[(i, j)] = token_idx
+                text.starts.append(i)
+                text.ends.append(j)
+                text.words.append(text.strings.intern(analysis[0]))
+            analysis_token.append(token_idx)
+
+        # counting sort of analyses by token index
+        counts = array("i", bytes(4 * len(token_ids)))
+        for token_idx in analysis_token:
+            counts[token_idx] += 1
+        for count in counts:
+            text.analyses_offsets.append(text.analyses_offsets[-1] + count)
+
+        size = len(analysis_token)
+        text.lemmas = array("i", bytes(4 * size))
+        text.tags = array("i", bytes(4 * size))
+        text.add_infos_1 = array("i", bytes(4 * size))
+        text.add_infos_2 = array("i", bytes(4 * size))
+        positions = array("i", text.analyses_offsets[:-1])
+
+        for token_idx, (_, _, analysis) in zip(analysis_token, analyses):
+            pos = positions[token_idx]
+            positions[token_idx] += 1
+            text.lemmas[pos] = text.strings.intern(analysis[1])
+            text.tags[pos] = text.strings.intern(analysis[2])
+            text.add_infos_1[pos] = text.infos.intern(tuple(analysis[3]))
+            text.add_infos_2[pos] = text.infos.intern(tuple(analysis[4]))
+
+        return text
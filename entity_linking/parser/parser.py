@@ -1,15 +1,28 @@
-from morfeusz2 import Morfeusz
 from typing import List
 from entity_linking.grammar.token import Token
+from entity_linking.morph_analyser import MorfeuszAnalyser, get_analyser
+from entity_linking.parser.parsed_text import Interner, ParsedText
 
 
 class Parser():
-    def __init__(self):
-        self._morfeusz = Morfeusz()
+    def __init__(self, analyser: MorfeuszAnalyser = None):
+        self._analyser = analyser if analyser is not None else get_analyser()
 
     def parse_text(self, text: str):
+        return self._build_tokens(self.analyse_text(text))
+
+    def parse_texts(self, texts: List[str]):
+        return [self._build_tokens(analyses)
+                for analyses in self._analyser.analyse_many(texts)]
+
+    def parse_text_compact(self, text: str, strings: Interner = None,
+                           infos: Interner = None) -> ParsedText:
+        return ParsedText.from_analyses(self.analyse_text(text),
+                                        strings=strings, infos=infos)
+
+    @staticmethod
+    def _build_tokens(analyses):
         tokens = dict()
-        analyses = self.analyse_text(text)
         for i, j, analysis in analyses:
             if (i, j) in tokens.keys():
                 tokens[(i, j)].add_analysis(analysis=analysis)
@@ -20,4 +33,4 @@ class Parser():
         return [token for pos, token in tokens.items()]
 
     def analyse_text(self, text: str):
-        return self._morfeusz.analyse(text)
+        return self._analyser.analyse(text)
@@ -0,0 +1,225 @@
+"""
+Prewarming of cache before classification. All lookups that classification of sequences will do are found
+and done in bulk phases - token queries, subclasses of candidate pages level by level, ancestor closures and
+wikipedia pages of candidates with target entity. Every phase looks up unique keys only, by many threads.
+
+Only persistent layers of configured API keep results for classification run in other process - database
+keeps subclasses, pages and ancestor closures, recording keeps every lookup, negative cache keeps empty results.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from entity_linking.maintenance.metrics import METRICS
+from entity_linking.tokenizer import Tokenizer
+from entity_linking.utils import (DEFAULT_PREWARM_CONCURRENCY,
+                                  DISAMBIGUATION_PAGE, MAX_DEPTH_LEVEL,
+                                  TokensSequence)
+from entity_linking.wikidata_api import WikidataAPI
+
+# prefixes of counters of persistent caches - hit and miss counters show how much was cached before prewarm
+CACHE_COUNTER_PREFIXES: Tuple[str, ...] = ("db_cache.", "snapshot.")
+# phases of prewarm, the last two are done only when wikipedia pages are fetched
+PREWARM_PHASES: Tuple[str, ...] = ("pages", "subclasses", "ancestors", "wikipedia_title", "wikipedia_content")
+# phases with results kept by database
+DATABASE_PHASES: Tuple[str, ...] = ("pages", "subclasses", "ancestors")
+
+
+@dataclass
+class PrewarmReport:
+    """
+    Counts of keys looked up by prewarm.
+
+    Attributes:
+        sequences: Number of sequences.
+        queries: Number of token queries of all sequences, with repetitions.
+        unique_queries: Number of unique token queries.
+        unique_pages: Number of unique candidate pages.
+        unique_entities: Number of unique entities of all graphs, candidate pages included.
+        target_pages: Number of candidate pages with target entity in graph.
+        wikipedia_pages: Number of wikipedia pages fetched.
+        lookups: Number of unique keys looked up, per phase.
+        failed: Number of lookups that raised error, per phase.
+        cache_hits: Token and subclasses lookups found in persistent cache before prewarm.
+        cache_misses: Token and subclasses lookups missing in persistent cache before prewarm.
+        persistent_phases: Phases with results kept by persistent layer of API.
+    """
+
+    sequences: int = 0
+    queries: int = 0
+    unique_queries: int = 0
+    unique_pages: int = 0
+    unique_entities: int = 0
+    target_pages: int = 0
+    wikipedia_pages: int = 0
+    lookups: Dict[str, int] = field(default_factory=dict)
+    failed: Dict[str, int] = field(default_factory=dict)
+    cache_hits: int = 0
+    cache_misses: int = 0
+    persistent_phases: Tuple[str, ...] = PREWARM_PHASES
+
+    def cold_hit_rate(self) -> Optional[float]:
+        """
+        Returns:
+            Hit rate of persistent cache before prewarm, None if API has no counted cache.
+        """
+        total = self.cache_hits + self.cache_misses
+        return self.cache_hits / total if total else None
+
+    def projected_hit_rate(self) -> float:
+        """
+        Returns:
+            Hit rate of classification run after prewarm - every key of persistent phase that didn't fail is
+            cached, keys of other phases are looked up again.
+        """
+        keys = sum(self.lookups.values())
+        cached = sum(
+            self.lookups[phase] - self.failed.get(phase, 0) for phase in self.lookups if phase in self.persistent_phases
+        )
+        return cached / keys if keys else 1.0
+
+    def __str__(self) -> str:
+        cold = self.cold_hit_rate()
+        lines = [
+            f"sequences: {self.sequences}",
+            f"token queries: {self.queries}, unique: {self.unique_queries}",
+            f"candidate pages: {self.unique_pages}, with target entity: {self.target_pages}",
+            f"graph entities: {self.unique_entities}",
+            f"wikipedia pages: {self.wikipedia_pages}",
+            f"lookups: {sum(self.lookups.values())} {self.lookups}",
+            f"failed lookups: {sum(self.failed.values())} {self.failed}",
+            f"hit rate before prewarm: {'-' if cold is None else f'{cold:.1%}'}",
+            f"projected hit rate: {self.projected_hit_rate():.1%}",
+        ]
+        return "\n".join(lines)
+
+
+def lookup_all(
+    executor: ThreadPoolExecutor, fun: Callable[[str], Any], keys: List[str], phase: str, report: PrewarmReport
+) -> Dict[str, Any]:
+    """
+    Look up all ``keys`` by thread pool. Errors are counted in report, so one failed lookup doesn't stop prewarm.
+
+    Args:
+        executor: Thread pool.
+        fun: Lookup function.
+        keys: Unique keys.
+        phase: Name of phase in report.
+        report: Report to update.
+
+    Returns:
+        Key -> result, only for keys that didn't fail.
+    """
+
+    def safe_lookup(key: str) -> Tuple[str, Any, bool]:
+        try:
+            return key, fun(key), True
+        except Exception:
+            return key, None, False
+
+    result = {}
+    with METRICS.timer(f"prewarm.{phase}"):
+        for key, value, ok in executor.map(safe_lookup, keys):
+            if ok:
+                result[key] = value
+            else:
+                report.failed[phase] = report.failed.get(phase, 0) + 1
+    METRICS.inc(f"prewarm.{phase}", len(keys))
+    report.lookups[phase] = report.lookups.get(phase, 0) + len(keys)
+    return result
+
+
+def get_cache_counters(counters: Dict[str, float]) -> Tuple[float, float]:
+    """
+    Returns:
+        Sum of hit and miss counters of persistent caches.
+    """
+    hits = misses = 0.0
+    for name, value in counters.items():
+        if name.startswith(CACHE_COUNTER_PREFIXES):
+            if name.endswith(".hit"):
+                hits += value
+            elif name.endswith(".miss"):
+                misses += value
+    return hits, misses
+
+
+def prewarm_cache(
+    api: WikidataAPI,
+    tokenizer: Tokenizer,
+    sequences: Iterable[TokensSequence],
+    max_graph_levels: int = MAX_DEPTH_LEVEL,
+    concurrency: int = DEFAULT_PREWARM_CONCURRENCY,
+    wikipedia: bool = True,
+    persistent_phases: Iterable[str] = PREWARM_PHASES,
+) -> PrewarmReport:
+    """
+    Look up everything classification of ``sequences`` needs.
+
+    Args:
+        api: API with caches to fill.
+        tokenizer: Tokenizer of classifier - its queries are looked up.
+        sequences: Sequences to classify later.
+        max_graph_levels: Max levels of graph of classifier.
+        concurrency: Number of threads.
+        wikipedia: If True, fetch wikipedia pages of candidates with target entity.
+        persistent_phases: Phases with results kept by persistent layer of ``api``, e.g. DATABASE_PHASES.
+
+    Returns:
+        Report of prewarm.
+    """
+    report = PrewarmReport(persistent_phases=tuple(persistent_phases))
+    hits_before, misses_before = get_cache_counters(METRICS.snapshot()["counters"])
+
+    queries: List[str] = []
+    for sequence in sequences:
+        report.sequences += 1
+        queries.extend(tokenizer.get_token_queries(sequence))
+    report.queries = len(queries)
+    unique_queries = list(dict.fromkeys(queries))
+    report.unique_queries = len(unique_queries)
+
+    with ThreadPoolExecutor(concurrency) as executor:
+        pages_of_queries = lookup_all(executor, api.get_pages_for_token, unique_queries, "pages", report)
+        pages = list(dict.fromkeys(p for x in pages_of_queries.values() for p in x))
+        report.unique_pages = len(pages)
+
+        # one level of all graphs at once, every entity is looked up once
+        visited = set(pages)
+        this_level = pages
+        for _ in range(max_graph_levels):
+            subclasses = lookup_all(
+                executor,
+                api.get_subclasses_for_entity,
+                [e for e in this_level if e != DISAMBIGUATION_PAGE],
+                "subclasses",
+                report,
+            )
+            next_level = []
+            for parents in subclasses.values():
+                for parent in parents:
+                    if parent not in visited:
+                        visited.add(parent)
+                        next_level.append(parent)
+            this_level = next_level
+        report.unique_entities = len(visited)
+
+        # later phases read subclasses cached just now, so they are not counted
+        hits_after, misses_after = get_cache_counters(METRICS.snapshot()["counters"])
+        report.cache_hits = int(hits_after - hits_before)
+        report.cache_misses = int(misses_after - misses_before)
+
+        # subclasses are cached, so closures are read from cache and saved by APIs that keep them
+        ancestors = lookup_all(
+            executor, lambda page: api.get_entity_ancestors(page, max_graph_levels), pages, "ancestors", report
+        )
+        target_pages = [page for page in pages if page in ancestors and ancestors[page].targets]
+        report.target_pages = len(target_pages)
+
+        if wikipedia:
+            titles = lookup_all(executor, api.get_wikipedia_title, target_pages, "wikipedia_title", report)
+            unique_titles = list(dict.fromkeys(t for t in titles.values() if t is not None))
+            lookup_all(executor, api.get_wikipedia_content, unique_titles, "wikipedia_content", report)
+            report.wikipedia_pages = len(unique_titles)
+
+    return report
@@ -0,0 +1,128 @@
+"""
+Binary encoding of lists of wikidata IDs kept in cache database. ID is packed to integer - number with kind
+of ID in two lowest bits - and list is saved as zigzag encoded differences of consecutive integers, every
+difference as varint. Order of list is kept, so pages of token stay in order of search results.
+"""
+import re
+from typing import List, Tuple, Union
+
+import numpy as np
+
+# first byte of encoded list, format of the rest of bytes
+QID_CODEC_VARINT_DELTA: int = 1
+
+# prefixes of IDs that can be encoded, index is kind saved in two lowest bits
+ID_PREFIXES: str = "QPL"
+
+ID_RE = re.compile(r"^([QPL])(\d+)$")
+
+# encoded lists up to this size are decoded without numpy
+DECODE_LOOP_MAX_BYTES: int = 256
+
+
+def encode_qids(ids: List[str]) -> bytes:
+    """
+    Args:
+        ids: List of IDs, Q{NUM}, P{NUM} or L{NUM} format.
+
+    Returns:
+        Encoded list.
+
+    Raises:
+        ValueError: if some ID is in other format.
+    """
+    out = bytearray([QID_CODEC_VARINT_DELTA])
+    previous = 0
+
+    for entity_id in ids:
+        match = ID_RE.match(entity_id)
+        if match is None:
+            raise ValueError(f"Can't encode ID: {entity_id!r}")
+        value = (int(match.group(2)) << 2) | ID_PREFIXES.index(match.group(1))
+
+        delta = value - previous
+        previous = value
+        zigzag = delta << 1 if delta >= 0 else (-delta << 1) - 1
+
+        while zigzag >= 0x80:
+            out.append((zigzag & 0x7F) | 0x80)
+            zigzag >>= 7
+        out.append(zigzag)
+
+    return bytes(out)
+
+
+def decode_qid_numbers(data: bytes) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Decode list without creating ID strings.
+
+    Args:
+        data: List encoded by ``encode_qids``.
+
+    Returns:
+        Tuple of two int64 arrays: numbers of IDs and kinds of IDs - indexes in ID_PREFIXES.
+
+    Raises:
+        ValueError: if ``data`` is not encoded list.
+    """
+    if not data or data[0] != QID_CODEC_VARINT_DELTA:
+        raise ValueError("Unknown format of encoded IDs")
+
+    raw = np.frombuffer(data, dtype=np.uint8, offset=1)
+    if len(raw) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+    if raw[-1] & 0x80:
+        raise ValueError("Truncated encoded IDs")
+
+    # last byte of every varint has no continuation bit
+    ends = np.flatnonzero(raw < 0x80)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    positions = np.arange(len(raw)) - np.repeat(starts, ends - starts + 1)
+    parts = (raw & 0x7F).astype(np.uint64) << (7 * positions).astype(np.uint64)
+    zigzag = np.add.reduceat(parts, starts)
+
+    deltas = (zigzag >> np.uint64(1)).astype(np.int64) ^ -(zigzag & np.uint64(1)).astype(np.int64)
+    values = np.cumsum(deltas)
+    return values >> 2, values & 3
+
+
+def _decode_qids_loop(data: bytes) -> List[str]:
+    if not data or data[0] != QID_CODEC_VARINT_DELTA:
+        raise ValueError("Unknown format of encoded IDs")
+
+    ids = []
+    value = zigzag = shift = 0
+    for byte in data[1:]:
+        zigzag |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        value += (zigzag >> 1) ^ -(zigzag & 1)
+        ids.append(ID_PREFIXES[value & 3] + str(value >> 2))
+        zigzag = shift = 0
+
+    if shift:
+        raise ValueError("Truncated encoded IDs")
+    return ids
+
+
+def decode_qids(data: Union[bytes, str]) -> List[str]:
+    """
+    Short lists - e.g. subclasses of entity - are decoded by plain loop, numpy calls cost more than the loop
+    for them.
+
+    Args:
+        data: List encoded by ``encode_qids`` or saved as text in format Q{NUM};...Q{NUM};
+
+    Returns:
+        List of IDs.
+    """
+    if isinstance(data, str):
+        return data.split(";")[:-1]
+
+    if len(data) <= DECODE_LOOP_MAX_BYTES:
+        return _decode_qids_loop(data)
+
+    numbers, kinds = decode_qid_numbers(data)
+    return [ID_PREFIXES[k] + str(n) for n, k in zip(numbers.tolist(), kinds.tolist())]
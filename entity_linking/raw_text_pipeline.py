@@ -0,0 +1,221 @@
+"""
+Module with ingestion stage for raw Polish text. Text is analysed by ``Parser``, one interpretation is chosen
+for every token by simple heuristic and result is converted to ``TokensSequence`` objects, the same as ones
+loaded from test file, so any classifier can use them.
+"""
+
+from multiprocessing import Pool
+from typing import Iterable, Iterator, List, Tuple
+
+from entity_linking.morph_analyser import get_morfeusz
+from entity_linking.parser.parsed_text import ParsedText
+from entity_linking.parser.parser import Parser
+from entity_linking.utils import (DEFAULT_PROCESSES_NUMBER,
+                                  NOT_WIKIDATA_ENTITY_SIGN, Token,
+                                  TokensSequence)
+
+# first parts of morphological tags in order of preference during disambiguation
+DISAMBIGUATION_TAGS_PRIORITY: List[str] = ["subst", "fin", "praet", "adj", "num"]
+# default number of lines sent to worker process at once
+DEFAULT_CHUNK_SIZE: int = 16
+
+# parser for current process
+_PARSER: Parser = None
+
+
+def get_parser() -> Parser:
+    """
+    Get parser for current process, create it on first call.
+
+    Returns:
+        Parser object.
+    """
+    global _PARSER
+
+    if _PARSER is None:
+        _PARSER = Parser()
+
+    return _PARSER
+
+
+def choose_analysis(text: ParsedText, idx: int) -> Tuple[str, str]:
+    """
+    Choose one analysis for token ``idx`` from ``text``. Analysis with best tag from DISAMBIGUATION_TAGS_PRIORITY
+    is taken, if there is no such analysis - the first one. Homonym marker (e.g. ":S" in "zaginiony:S") is removed
+    from lemma.
+
+    Args:
+        text: Parsed text.
+        idx: Index of token in ``text``.
+
+    Returns:
+        Tuple: lemma and morphological tags of chosen analysis.
+    """
+    first = text.analyses_offsets[idx]
+    last = text.analyses_offsets[idx + 1]
+
+    best = first
+    best_priority = len(DISAMBIGUATION_TAGS_PRIORITY)
+
+    for a in range(first, last):
+        tag_part = text.strings.value(text.tags[a]).split(":")[0]
+        if tag_part in DISAMBIGUATION_TAGS_PRIORITY:
+            priority = DISAMBIGUATION_TAGS_PRIORITY.index(tag_part)
+            if priority < best_priority:
+                best = a
+                best_priority = priority
+
+    lemma = text.strings.value(text.lemmas[best])
+    lemma = lemma.split(":")[0] or lemma
+
+    return lemma, text.strings.value(text.tags[best])
+
+
+def choose_tokens_path(text: ParsedText) -> List[int]:
+    """
+    Morfeusz returns graph of segments - some words can be split in more than one way. Choose one path
+    through this graph, always taking the longest segment that starts in current node.
+
+    Args:
+        text: Parsed text.
+
+    Returns:
+        Indexes of tokens from ``text`` that build chosen path.
+    """
+    best = {}
+    for idx in range(len(text)):
+        start = text.starts[idx]
+        if start not in best or text.ends[idx] > text.ends[best[start]]:
+            best[start] = idx
+
+    path = []
+    node = 0
+    for start in sorted(best):
+        if start >= node:
+            path.append(best[start])
+            node = text.ends[best[start]]
+
+    return path
+
+
+def text_to_sequence(text: str, idx: int, parser: Parser = None) -> TokensSequence:
+    """
+    Parse raw ``text`` and create sequence from it. Link title and entity ID of every token are set to
+    NOT_WIKIDATA_ENTITY_SIGN.
+
+    Args:
+        text: Raw text.
+        idx: ID of created sequence.
+        parser: Parser to use, if not given the parser of current process is used.
+
+    Returns:
+        Sequence of tokens.
+    """
+    if parser is None:
+        parser = get_parser()
+
+    parsed = parser.parse_text_compact(text)
+    sequence = TokensSequence([], idx)
+
+    text_position = 0
+    for token_idx in choose_tokens_path(parsed):
+        word = parsed.strings.value(parsed.words[token_idx])
+
+        # find word in text to check if it was preceded by a blank character
+        word_position = text.find(word, text_position)
+        if word_position == -1:
+            preceding = 0
+        else:
+            preceding = 1 if word_position > 0 and text[word_position - 1].isspace() else 0
+            text_position = word_position + len(word)
+
+        lemma, morph_tags = choose_analysis(parsed, token_idx)
+        sequence.append(
+            Token(
+                word,
+                preceding,
+                NOT_WIKIDATA_ENTITY_SIGN,
+                NOT_WIKIDATA_ENTITY_SIGN,
+                lemma,
+                morph_tags,
+            )
+        )
+
+    return sequence
+
+
+def _init_worker() -> None:
+    """
+    Initializer of worker process - create Morfeusz of this process before first text comes.
+    """
+    get_morfeusz()
+
+
+def _text_to_sequence_worker(idx_and_text: Tuple[int, str]) -> TokensSequence:
+    """
+    Worker function for ``get_sequences_from_raw_text``.
+
+    Args:
+        idx_and_text: ID of sequence and its text.
+
+    Returns:
+        Sequence of tokens.
+    """
+    return text_to_sequence(idx_and_text[1], idx_and_text[0])
+
+
+def get_sequences_from_raw_text(
+    lines: Iterable[str],
+    processes_num: int = DEFAULT_PROCESSES_NUMBER,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[TokensSequence]:
+    """
+    Convert every not empty line from ``lines`` into sequence. Lines are parsed by pool of ``processes_num``
+    processes, each with its own Morfeusz. Sequences are yielded in the same order as lines.
+
+    Args:
+        lines: Lines of raw text, e.g. open file.
+        processes_num: Number of processes, 1 means parsing in current process.
+        chunk_size: Number of lines sent to worker at once.
+
+    Returns:
+        Iterator to sequences.
+    """
+    texts = enumerate(line.strip() for line in lines if line.strip())
+
+    if processes_num <= 1:
+        for idx, text in texts:
+            yield text_to_sequence(text, idx)
+        return
+
+    with Pool(processes_num, initializer=_init_worker) as p:
+        for sequence in p.imap(_text_to_sequence_worker, texts, chunk_size):
+            yield sequence
+        # workers exit normally and run their finalizers, ``with`` only terminates them
+        p.close()
+        p.join()
+
+
+def load_sequences_from_raw_text_file(
+    file_name: str, seq_number: int, processes_num: int = DEFAULT_PROCESSES_NUMBER
+) -> List[TokensSequence]:
+    """
+    Load first ``seq_number`` sequences from file with raw text - one sequence per not empty line.
+
+    Args:
+        file_name: Name of file with raw text.
+        seq_number: Number of sequences to read from file.
+        processes_num: Number of processes used to parse text.
+
+    Returns:
+        List of sequences.
+    """
+    result: List[TokensSequence] = []
+
+    with open(file_name) as text_file:
+        for sequence in get_sequences_from_raw_text(text_file, processes_num):
+            result.append(sequence)
+            if len(result) == seq_number:
+                break
+
+    return result
@@ -0,0 +1,258 @@
+"""
+Reachability of target entities - which of TARGET_ENTITIES candidate entity reaches by "instance of",
+"subclass of" and "facet of" edges within depth limit, and at what distance. ``create_graph_for_entity``
+answers it by fetching entities one by one, SparqlReachability asks one SPARQL query for batch of candidates.
+"""
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, List, Tuple
+
+import requests
+
+from entity_linking.maintenance.metrics import METRICS
+from entity_linking.utils import (DISAMBIGUATION_PAGE, ID_FACET_OF,
+                                  ID_INSTANCE_OF, ID_SUBCLASS_OF,
+                                  TARGET_ENTITIES, USER_AGENT,
+                                  WIKIDATA_URL_SPARQL)
+from entity_linking.wikidata_api import DEFAULT_MEMORY_CACHE_SIZE, WikidataAPI
+
+# default number of candidates in one SPARQL query
+DEFAULT_REACHABILITY_BATCH_SIZE: int = 50
+# default timeout of SPARQL query in seconds
+DEFAULT_REACHABILITY_TIMEOUT: float = 60.0
+
+# target entity -> min distance from candidate
+TargetDistances = Dict[str, int]
+
+
+class ReachabilityBackend(ABC):
+    """
+    Base class of backends that find target entities reachable from candidates.
+    """
+
+    @abstractmethod
+    def get_reachable_targets(self, entities: List[str], max_depth: int) -> Dict[str, TargetDistances]:
+        """
+        Find targets reachable from every entity by at most ``max_depth`` edges.
+
+        Args:
+            entities: IDs of candidate entities, Q{NUM} format.
+            max_depth: Max length of path, the same as graph levels of ``create_graph_for_entity``.
+
+        Returns:
+            Entity ID -> target ID -> min distance, for every entity from ``entities``.
+        """
+        pass
+
+    def get_target_distances(self, entity: str, max_depth: int) -> TargetDistances:
+        """
+        Args:
+            entity: ID of candidate entity, Q{NUM} format.
+            max_depth: Max length of path.
+
+        Returns:
+            Target ID -> min distance from ``entity``, empty if no target is reachable.
+        """
+        return self.get_reachable_targets([str(entity)], max_depth)[str(entity)]
+
+
+class ApiReachability(ReachabilityBackend):
+    """
+    Backend that walks up hierarchy with WikidataAPI, level by level like ``create_graph_for_entity``.
+    """
+
+    def __init__(self, api: WikidataAPI, targets: List[str] = None) -> None:
+        """
+        Set object attributes.
+
+        Args:
+            api: API to get from wikidata.
+            targets: IDs of target entities. Default: TARGET_ENTITIES.
+        """
+        self.api = api
+        self.targets = list(targets) if targets is not None else list(TARGET_ENTITIES)
+
+    def get_reachable_targets(self, entities: List[str], max_depth: int) -> Dict[str, TargetDistances]:
+        targets = set(self.targets)
+        result = {}
+
+        for entity in entities:
+            distances: TargetDistances = {}
+            visited = {str(entity)}
+            this_level = [str(entity)]
+
+            for depth in range(1, max_depth + 1):
+                next_level = []
+                for ent in this_level:
+                    # omit DISAMBIGUATION_PAGE - it is not expanded by create_graph_for_entity too
+                    if ent == DISAMBIGUATION_PAGE:
+                        continue
+                    for parent in self.api.get_subclasses_for_entity(ent):
+                        if parent in visited:
+                            continue
+                        visited.add(parent)
+                        next_level.append(parent)
+                        if parent in targets:
+                            distances[parent] = depth
+                this_level = next_level
+
+            result[str(entity)] = distances
+
+        return result
+
+
+def create_reachability_query(entities: List[str], targets: List[str], max_depth: int) -> str:
+    """
+    Create SPARQL query that finds min distance from every entity to every reachable target. Every path
+    length has its own branch of UNION - ``*`` property path has no length limit and no distance.
+
+    Args:
+        entities: IDs of candidate entities.
+        targets: IDs of target entities.
+        max_depth: Max length of path.
+
+    Returns:
+        SPARQL query.
+    """
+    edge = f"(wdt:{ID_INSTANCE_OF}|wdt:{ID_SUBCLASS_OF}|wdt:{ID_FACET_OF})"
+    branches = [
+        f"{{ ?item {'/'.join([edge] * depth)} ?target . BIND({depth} AS ?depth) }}"
+        for depth in range(1, max_depth + 1)
+    ]
+    return (
+        "PREFIX wd: <http://www.wikidata.org/entity/> "
+        "PREFIX wdt: <http://www.wikidata.org/prop/direct/> "
+        "SELECT ?item ?target (MIN(?depth) AS ?distance) WHERE { "
+        f"VALUES ?item {{ {' '.join(f'wd:{e}' for e in entities)} }} "
+        f"VALUES ?target {{ {' '.join(f'wd:{t}' for t in targets)} }} "
+        f"{' UNION '.join(branches)} "
+        "} GROUP BY ?item ?target"
+    )
+
+
+def get_distances_from_sparql_result(data: Dict[str, Any]) -> List[Tuple[str, str, int]]:
+    """
+    Args:
+        data: JSON result of query created by ``create_reachability_query``.
+
+    Returns:
+        List of tuples: entity ID, target ID and distance.
+    """
+    return [
+        (
+            x["item"]["value"].split("/")[-1],
+            x["target"]["value"].split("/")[-1],
+            int(x["distance"]["value"]),
+        )
+        for x in data["results"]["bindings"]
+    ]
+
+
+class SparqlReachability(ReachabilityBackend):
+    """
+    Backend that asks wikidata SPARQL service one query per batch of candidates.
+
+    Paths go through DISAMBIGUATION_PAGE too, although ``create_graph_for_entity`` doesn't expand it.
+    """
+
+    def __init__(
+        self,
+        sparql_url: str = WIKIDATA_URL_SPARQL,
+        targets: List[str] = None,
+        batch_size: int = DEFAULT_REACHABILITY_BATCH_SIZE,
+        timeout: float = DEFAULT_REACHABILITY_TIMEOUT,
+    ) -> None:
+        """
+        Set object attributes.
+
+        Args:
+            sparql_url: Address of wikidata SPARQL API.
+            targets: IDs of target entities. Default: TARGET_ENTITIES.
+            batch_size: Max number of candidates in one query.
+            timeout: Timeout of query in seconds.
+        """
+        self.sparql_url = sparql_url
+        self.targets = list(targets) if targets is not None else list(TARGET_ENTITIES)
+        self.batch_size = batch_size
+        self.timeout = timeout
+
+    def get_reachable_targets(self, entities: List[str], max_depth: int) -> Dict[str, TargetDistances]:
+        entities = list(dict.fromkeys(str(e) for e in entities))
+        result: Dict[str, TargetDistances] = {e: {} for e in entities}
+
+        for x in range(0, len(entities), self.batch_size):
+            batch = entities[x : x + self.batch_size]
+
+            METRICS.inc("reachability.sparql_query")
+            with METRICS.timer("reachability.sparql_query"):
+                # long queries don't fit in URL, so they are sent in body
+                r: requests.Response = requests.post(
+                    self.sparql_url,
+                    headers={"User-Agent": USER_AGENT},
+                    data={"format": "json", "query": create_reachability_query(batch, self.targets, max_depth)},
+                    timeout=self.timeout,
+                )
+                r.raise_for_status()
+
+            for entity, target, distance in get_distances_from_sparql_result(r.json()):
+                if entity in result:
+                    result[entity][target] = distance
+
+        return result
+
+
+class CachedReachability(ReachabilityBackend):
+    """
+    Wrapper that keeps results of another backend in memory, bounded LRU cache like CachedWikidataAPI.
+    Only not cached entities of batch are passed to backend.
+    """
+
+    backend: ReachabilityBackend
+    cache_size: int
+    hits: int
+    misses: int
+
+    def __init__(self, backend: ReachabilityBackend, cache_size: int = DEFAULT_MEMORY_CACHE_SIZE):
+        self.backend = backend
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._cache: "OrderedDict[Tuple[str, int], TargetDistances]" = OrderedDict()
+        self._lock = Lock()
+
+    def __getstate__(self):
+        # lock can't be pickled, cache is not copied to other processes
+        return {"backend": self.backend, "cache_size": self.cache_size}
+
+    def __setstate__(self, state):
+        self.__init__(state["backend"], state["cache_size"])
+
+    def get_reachable_targets(self, entities: List[str], max_depth: int) -> Dict[str, TargetDistances]:
+        result: Dict[str, TargetDistances] = {}
+        missing: List[str] = []
+
+        with self._lock:
+            for entity in dict.fromkeys(str(e) for e in entities):
+                value = self._cache.get((entity, max_depth))
+                if value is not None:
+                    self._cache.move_to_end((entity, max_depth))
+                    self.hits += 1
+                    METRICS.inc("reachability_cache.hit")
+                    result[entity] = value
+                else:
+                    missing.append(entity)
+
+        if missing:
+            fetched = self.backend.get_reachable_targets(missing, max_depth)
+
+            with self._lock:
+                for entity in missing:
+                    self.misses += 1
+                    METRICS.inc("reachability_cache.miss")
+                    self._cache[(entity, max_depth)] = fetched[entity]
+                    result[entity] = fetched[entity]
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        return result
@@ -0,0 +1,475 @@
+"""
+Sharded classification run without external broker. Coordinator splits input file into ranges of sequences
+and saves them in job table of SQLite database on shared storage - any file system with working file locks.
+Workers on any number of hosts claim ranges, classify them and write partial result files; range of worker
+that died is claimed again when its lease expires. Merge step joins partial results in order of input file,
+so report is the same as report of one ``classify_sequences_from_file`` run.
+
+Range is kept as byte offsets in input file, so worker reads only its sequences.
+"""
+import csv
+import io
+import json
+import os
+import socket
+import sqlite3
+import time
+from dataclasses import dataclass
+from threading import Event, Thread
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+
+from entity_linking.load_test_data import get_sequences_from_file
+from entity_linking.maintenance.metrics import METRICS, Metrics
+from entity_linking.utils import (DEFAULT_JOB_LEASE, DEFAULT_SHARD_SIZE,
+                                  TokensSequence)
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from entity_linking.entity_classifier import EntityClassifier
+
+# default number of claims of job before it is marked as failed
+DEFAULT_JOB_ATTEMPTS: int = 3
+# time in seconds to wait for lock of queue database held by other worker
+QUEUE_LOCK_TIMEOUT: float = 60.0
+# number of renewals of claim of running job in time of lease
+JOB_HEARTBEATS_PER_LEASE: int = 3
+
+# states of job
+JOB_PENDING: str = "pending"
+JOB_RUNNING: str = "running"
+JOB_DONE: str = "done"
+JOB_FAILED: str = "failed"
+
+QUEUE_SCHEMA: List[str] = [
+    "CREATE TABLE IF NOT EXISTS queue_meta (key text PRIMARY KEY, value text)",
+    "CREATE TABLE IF NOT EXISTS jobs (id integer PRIMARY KEY, first_sequence integer, sequences integer, "
+    "start_offset integer, end_offset integer, status text, worker text, claimed real, finished real, attempts integer, "
+    "error text)",
+    "CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status)",
+]
+
+
+@dataclass
+class SequenceRange:
+    """
+    Range of sequences in input file.
+
+    Attributes:
+        first_sequence: Index of the first sequence in file.
+        sequences: Number of sequences.
+        start: Offset of the first byte of range.
+        end: Offset of the first byte after range.
+    """
+
+    first_sequence: int
+    sequences: int
+    start: int
+    end: int
+
+
+@dataclass
+class Job:
+    """
+    Job of queue - range of sequences and its state.
+    """
+
+    id: int
+    range: SequenceRange
+    status: str
+    worker: Optional[str]
+    attempts: int
+    error: Optional[str]
+
+
+def _lines_with_offsets(binary_file, offsets: List[int]) -> Iterator[str]:
+    # offset after the last line read by csv reader is kept in offsets[0]
+    for line in binary_file:
+        offsets[0] += len(line)
+        yield line.decode()
+
+
+def split_sequences(file_name: str, seq_number: int, shard_size: int = DEFAULT_SHARD_SIZE) -> List[SequenceRange]:
+    """
+    Split sequences of file into ranges. Sequences are found the same way as by ``get_sequences_from_file``.
+
+    Args:
+        file_name: Name of file with sequences, with lemmas and tags.
+        seq_number: Number of sequences to split, 0 - all.
+        shard_size: Number of sequences in range.
+
+    Returns:
+        Ranges in order of file.
+    """
+    if shard_size <= 0:
+        raise ValueError("Shard size must be positive")
+
+    ranges: List[SequenceRange] = []
+    offsets = [0]
+    sequences = 0
+    first = 0
+    range_start = sequence_end = 0
+
+    with open(file_name, "rb") as f:
+        for row in csv.reader(_lines_with_offsets(f, offsets), delimiter="\t"):
+            # empty row ends sequence
+            if row:
+                continue
+            sequences += 1
+            sequence_end = offsets[0]
+            if sequences - first == shard_size or sequences == seq_number:
+                ranges.append(SequenceRange(first, sequences - first, range_start, sequence_end))
+                first, range_start = sequences, sequence_end
+            if sequences == seq_number:
+                break
+
+    # rows after the last empty row are not a sequence, like in ``get_sequences_from_file``
+    if sequences > first:
+        ranges.append(SequenceRange(first, sequences - first, range_start, sequence_end))
+    return ranges
+
+
+def read_sequences(file_name: str, sequence_range: SequenceRange) -> List[TokensSequence]:
+    """
+    Returns:
+        Sequences of ``sequence_range`` with IDs of their position in file.
+    """
+    with open(file_name, "rb") as f:
+        f.seek(sequence_range.start)
+        data = f.read(sequence_range.end - sequence_range.start).decode()
+
+    sequences = list(get_sequences_from_file(csv.reader(io.StringIO(data), delimiter="\t")))
+    for x, sequence in enumerate(sequences):
+        sequence.id = sequence_range.first_sequence + x
+    return sequences
+
+
+class JobQueue:
+    """
+    Durable queue of jobs in SQLite database. Every change is one IMMEDIATE transaction, so workers of many
+    processes and hosts never claim the same pending job.
+    """
+
+    database_name: str
+
+    def __init__(self, database_name: str, timeout: float = QUEUE_LOCK_TIMEOUT):
+        """
+        Set object attributes.
+
+        Args:
+            database_name: Path to queue database, created by ``create``.
+            timeout: Time in seconds to wait for lock held by other worker.
+        """
+        self.database_name = database_name
+        self.timeout = timeout
+
+    def _connect(self) -> sqlite3.Connection:
+        # transactions are started explicitly
+        return sqlite3.connect(self.database_name, timeout=self.timeout, isolation_level=None)
+
+    def create(self, input_file: str, ranges: List[SequenceRange], results_dir: str,
+               max_attempts: int = DEFAULT_JOB_ATTEMPTS) -> None:
+        """
+        Create queue with one pending job per range.
+
+        Args:
+            input_file: File with sequences - the same path must be readable by every worker.
+            ranges: Ranges of sequences in ``input_file``.
+            results_dir: Directory of partial result files.
+            max_attempts: Number of claims of job before it is marked as failed.
+
+        Raises:
+            ValueError: if queue already has jobs.
+        """
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for statement in QUEUE_SCHEMA:
+                conn.execute(statement)
+            if conn.execute("SELECT count(*) FROM jobs").fetchone()[0]:
+                conn.execute("ROLLBACK")
+                raise ValueError(f"Queue {self.database_name} already has jobs")
+
+            meta = {
+                "input_file": os.path.abspath(input_file),
+                "results_dir": os.path.abspath(results_dir),
+                "max_attempts": str(max_attempts),
+            }
+            conn.executemany("INSERT OR REPLACE INTO queue_meta VALUES(?, ?)", meta.items())
+            conn.executemany(
+                "INSERT INTO jobs(first_sequence, sequences, start_offset, end_offset, status, attempts) VALUES(?, ?, ?, ?, ?, 0)",
+                [(r.first_sequence, r.sequences, r.start, r.end, JOB_PENDING) for r in ranges],
+            )
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def get_meta(self) -> Dict[str, str]:
+        """
+        Returns:
+            Input file, results directory and max attempts of queue.
+        """
+        conn = self._connect()
+        try:
+            return dict(conn.execute("SELECT key, value FROM queue_meta"))
+        finally:
+            conn.close()
+
+    def claim(self, worker: str, lease: float = DEFAULT_JOB_LEASE) -> Optional[Job]:
+        """
+        Claim the first pending job, or running job whose lease expired. Expired job that was claimed max
+        attempts times is marked as failed.
+
+        Args:
+            worker: Name of worker.
+            lease: Time in seconds after which job claimed by other worker can be claimed again.
+
+        Returns:
+            Claimed job, None if there is no job to claim.
+        """
+        now = time.time()
+        expired = 0
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            max_attempts = self._get_max_attempts(conn)
+            expired = conn.execute(
+                "UPDATE jobs SET status = ?, error = ? WHERE status = ? AND claimed < ? AND attempts >= ?",
+                (JOB_FAILED, f"Lease expired {max_attempts} times", JOB_RUNNING, now - lease, max_attempts),
+            ).rowcount
+            row = conn.execute(
+                "SELECT id, first_sequence, sequences, start_offset, end_offset, attempts, error FROM jobs "
+                "WHERE status = ? OR (status = ? AND claimed < ?) ORDER BY id LIMIT 1",
+                (JOB_PENDING, JOB_RUNNING, now - lease),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker = ?, claimed = ?, attempts = attempts + 1 WHERE id = ?",
+                (JOB_RUNNING, worker, now, row[0]),
+            )
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+            if expired:
+                METRICS.inc("sharded_run.failed", expired)
+
+        METRICS.inc("sharded_run.claimed")
+        return Job(row[0], SequenceRange(*row[1:5]), JOB_RUNNING, worker, row[5] + 1, row[6])
+
+    def renew(self, job: Job) -> bool:
+        """
+        Extend lease of running ``job`` - it starts again from now.
+
+        Returns:
+            False if job was claimed again by other worker in the meantime.
+        """
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                "UPDATE jobs SET claimed = ? WHERE id = ? AND worker = ? AND status = ?",
+                (time.time(), job.id, job.worker, JOB_RUNNING),
+            )
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def complete(self, job: Job) -> bool:
+        """
+        Mark ``job`` as done.
+
+        Returns:
+            False if job was claimed again by other worker in the meantime - its result is written by both.
+        """
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, finished = ?, error = NULL WHERE id = ? AND worker = ? AND status = ?",
+                (JOB_DONE, time.time(), job.id, job.worker, JOB_RUNNING),
+            )
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def fail(self, job: Job, error: str) -> None:
+        """
+        Return ``job`` to queue, or mark it as failed if it was claimed max attempts times.
+        """
+        conn = self._connect()
+        try:
+            max_attempts = self._get_max_attempts(conn)
+            conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, error = ? "
+                "WHERE id = ? AND worker = ? AND status = ?",
+                (max_attempts, JOB_FAILED, JOB_PENDING, error, job.id, job.worker, JOB_RUNNING),
+            )
+        finally:
+            conn.close()
+        METRICS.inc("sharded_run.failed")
+
+    @staticmethod
+    def _get_max_attempts(conn: sqlite3.Connection) -> int:
+        row = conn.execute("SELECT value FROM queue_meta WHERE key = 'max_attempts'").fetchone()
+        return int(row[0]) if row is not None else DEFAULT_JOB_ATTEMPTS
+
+    def get_jobs(self) -> List[Job]:
+        """
+        Returns:
+            All jobs in order of input file.
+        """
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT id, first_sequence, sequences, start_offset, end_offset, status, worker, attempts, error "
+                "FROM jobs ORDER BY first_sequence"
+            ).fetchall()
+        finally:
+            conn.close()
+        return [Job(r[0], SequenceRange(*r[1:5]), r[5], r[6], r[7], r[8]) for r in rows]
+
+    def progress(self) -> Dict[str, int]:
+        """
+        Returns:
+            State of job -> number of jobs.
+        """
+        counts = {status: 0 for status in [JOB_PENDING, JOB_RUNNING, JOB_DONE, JOB_FAILED]}
+        for job in self.get_jobs():
+            counts[job.status] += 1
+        return counts
+
+
+def get_result_files(results_dir: str, job_id: int) -> Tuple[str, str]:
+    """
+    Returns:
+        Paths to partial result dataframe and metrics of job.
+    """
+    base_name = os.path.join(results_dir, f"shard-{job_id:06d}")
+    return f"{base_name}.pkl", f"{base_name}.metrics.json"
+
+
+def save_partial_result(results_dir: str, job_id: int, result_df: "pd.DataFrame", metrics: Metrics) -> None:
+    """
+    Save result of job. Files are written to temporary files and renamed, so merge never reads half written
+    result of worker that died.
+    """
+    os.makedirs(results_dir, exist_ok=True)
+    result_file, metrics_file = get_result_files(results_dir, job_id)
+    suffix = f".tmp-{socket.gethostname()}-{os.getpid()}"
+
+    result_df.to_pickle(result_file + suffix)
+    with open(metrics_file + suffix, "w") as f:
+        f.write(metrics.to_json())
+    os.replace(result_file + suffix, result_file)
+    os.replace(metrics_file + suffix, metrics_file)
+
+
+def get_worker_name() -> str:
+    """
+    Returns:
+        Name of worker process, unique across hosts.
+    """
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _renew_claim(queue: JobQueue, job: Job, interval: float, stop: Event) -> None:
+    # claim is renewed until job is classified, so long job is not claimed by other worker
+    while not stop.wait(interval):
+        if not queue.renew(job):
+            break
+
+
+def run_worker(
+    classifier: "EntityClassifier", queue_name: str, worker: str = "", lease: float = DEFAULT_JOB_LEASE,
+    max_jobs: int = 0,
+) -> int:
+    """
+    Claim and classify jobs of queue until there is none left. Every job is classified by Pool of
+    ``classifier``, claim of job is renewed while it is classified. Error of job returns it to queue, so it is
+    tried again by some worker.
+
+    Args:
+        classifier: Classifier of sequences.
+        queue_name: Path to queue database.
+        worker: Name of worker, default: host and process ID.
+        lease: Time in seconds after which job of this worker can be claimed by other one, if worker stopped
+            renewing its claim.
+        max_jobs: Max number of jobs to classify, 0 - no limit.
+
+    Returns:
+        Number of classified jobs completed by this worker.
+    """
+    if lease <= 0:
+        raise ValueError("Lease must be positive")
+
+    queue = JobQueue(queue_name)
+    meta = queue.get_meta()
+    worker = worker or get_worker_name()
+    done = 0
+
+    while max_jobs <= 0 or done < max_jobs:
+        job = queue.claim(worker, lease)
+        if job is None:
+            break
+
+        stop_heartbeat = Event()
+        heartbeat = Thread(
+            target=_renew_claim, args=(queue, job, lease / JOB_HEARTBEATS_PER_LEASE, stop_heartbeat), daemon=True
+        )
+        heartbeat.start()
+
+        # metrics of every job are saved with its result
+        classifier.run_metrics = Metrics()
+        start_time = time.time()
+        try:
+            result_df = classifier.classify_sequences(read_sequences(meta["input_file"], job.range))
+            classifier.run_metrics.add_time("classifier.run", time.time() - start_time)
+            save_partial_result(meta["results_dir"], job.id, result_df, classifier.run_metrics)
+        except Exception as e:
+            queue.fail(job, repr(e))
+            continue
+        finally:
+            stop_heartbeat.set()
+            heartbeat.join()
+
+        # job claimed again by other worker is counted by that worker
+        if queue.complete(job):
+            done += 1
+
+    return done
+
+
+def merge_results(queue_name: str) -> Tuple["pd.DataFrame", Metrics, int]:
+    """
+    Join partial results of all jobs in order of input file.
+
+    Args:
+        queue_name: Path to queue database.
+
+    Returns:
+        Tuple: result dataframe, metrics of all jobs and number of sequences.
+
+    Raises:
+        ValueError: if some job is not done.
+    """
+    import pandas as pd
+
+    queue = JobQueue(queue_name)
+    results_dir = queue.get_meta()["results_dir"]
+    jobs = queue.get_jobs()
+
+    not_done = [job for job in jobs if job.status != JOB_DONE]
+    if not_done:
+        raise ValueError(f"{len(not_done)} of {len(jobs)} jobs are not done: {queue.progress()}")
+
+    frames = []
+    metrics = Metrics()
+    for job in jobs:
+        result_file, metrics_file = get_result_files(results_dir, job.id)
+        frames.append(pd.read_pickle(result_file))
+        with open(metrics_file) as f:
+            metrics.merge(json.load(f))
+
+    result_df = pd.concat(frames).reset_index(drop=True) if frames else pd.DataFrame()
+    return result_df, metrics, sum(job.range.sequences for job in jobs)
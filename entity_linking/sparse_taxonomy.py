@@ -0,0 +1,366 @@
+"""
+Taxonomy of "instance of", "subclass of" and "facet of" edges as scipy CSR adjacency matrix over integer
+encoded Q-IDs. Reachability of target entities from batch of candidates is computed by repeated sparse matrix
+products - row of candidate after ``d`` products holds number of walks of length ``d`` to every entity.
+Scores count walks inside entities expanded by ``create_graph_for_entity`` until no walk is left, so they are
+numbers of paths of its graph. Walks of candidate that reaches a cycle of taxonomy may visit entity twice, so
+such candidate is scored on graph of its ancestors, like by ``get_graph_score``.
+"""
+import re
+import sqlite3
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+import networkx as nx
+import numpy as np
+from scipy import sparse
+from scipy.sparse import csgraph
+
+from entity_linking.maintenance.metrics import METRICS
+from entity_linking.qid_codec import decode_qids
+from entity_linking.reachability import ReachabilityBackend, TargetDistances
+from entity_linking.utils import DISAMBIGUATION_PAGE, TARGET_ENTITIES
+from entity_linking.wikidata_api import InMemoryWikidataAPI, WikidataAPI
+
+ENTITY_ID_RE = re.compile(r"^Q(\d+)$")
+
+
+def get_entity_number(entity: str) -> Optional[int]:
+    """
+    Args:
+        entity: ID of entity, Q{NUM} format.
+
+    Returns:
+        NUM part of ID or None if ``entity`` is not in Q{NUM} format.
+    """
+    match = ENTITY_ID_RE.match(str(entity))
+    return int(match.group(1)) if match else None
+
+
+class SparseTaxonomy:
+    """
+    Taxonomy with CSR adjacency matrix. Entities are added by ``add_subclasses``, matrix is built again on first
+    query after taxonomy changed. Like ``create_graph_for_entity``, DISAMBIGUATION_PAGE is not expanded.
+
+    Attributes:
+        targets: IDs of target entities.
+    """
+
+    def __init__(self, subclasses: Dict[str, List[str]] = None, targets: List[str] = None) -> None:
+        """
+        Set object attributes.
+
+        Args:
+            subclasses: Entity ID -> IDs of its "instance of", "subclass of" and "facet of" entities.
+            targets: IDs of target entities. Default: TARGET_ENTITIES.
+        """
+        self.targets = list(targets) if targets is not None else list(TARGET_ENTITIES)
+        self._subclasses: Dict[str, List[str]] = {}
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._matrix = sparse.csr_matrix((0, 0))
+        self._targets_columns = np.zeros(0, dtype=np.int64)
+        self._cyclic = np.zeros(0, dtype=bool)
+        self._dirty = False
+        self._lock = Lock()
+
+        if subclasses:
+            self.add_subclasses(subclasses)
+
+    def __getstate__(self):
+        # lock can't be pickled, matrix is built again in other process
+        return {"subclasses": self._subclasses, "targets": self.targets}
+
+    def __setstate__(self, state):
+        self.__init__(state["subclasses"], state["targets"])
+
+    def __contains__(self, entity: str) -> bool:
+        """
+        Returns:
+            True if subclasses of ``entity`` are in taxonomy.
+        """
+        return str(entity) in self._subclasses
+
+    def __len__(self) -> int:
+        """
+        Returns:
+            Number of entities with known subclasses.
+        """
+        return len(self._subclasses)
+
+    def add_subclasses(self, subclasses: Dict[str, List[str]]) -> None:
+        """
+        Add entities and their subclasses to taxonomy.
+
+        Args:
+            subclasses: Entity ID -> IDs of its "instance of", "subclass of" and "facet of" entities.
+        """
+        with self._lock:
+            for entity, parents in subclasses.items():
+                self._subclasses[str(entity)] = list(parents)
+            self._dirty = True
+
+    def _build(self) -> None:
+        numbers = set()
+        edges = []
+        for entity, parents in self._subclasses.items():
+            number = get_entity_number(entity)
+            if number is None:
+                continue
+            numbers.add(number)
+            if entity == DISAMBIGUATION_PAGE:
+                continue
+            for parent in parents:
+                parent_number = get_entity_number(parent)
+                if parent_number is not None:
+                    numbers.add(parent_number)
+                    edges.append((number, parent_number))
+
+        self._ids = np.array(sorted(numbers), dtype=np.int64)
+        size = len(self._ids)
+
+        if edges:
+            edges_array = np.array(edges, dtype=np.int64)
+            rows = np.searchsorted(self._ids, edges_array[:, 0])
+            columns = np.searchsorted(self._ids, edges_array[:, 1])
+        else:
+            rows = columns = np.zeros(0, dtype=np.int64)
+
+        matrix = sparse.csr_matrix((np.ones(len(rows)), (rows, columns)), shape=(size, size))
+        # the same edge from many properties is one edge
+        matrix.sum_duplicates()
+        matrix.data[:] = 1.0
+        self._matrix = matrix
+
+        # entities of strongly connected components with more than one entity or with loop
+        _, components = csgraph.connected_components(matrix, directed=True, connection="strong")
+        self._cyclic = (np.bincount(components)[components] > 1) | (matrix.diagonal() > 0)
+
+        self._targets_columns = self._get_indexes(self.targets)
+        self._dirty = False
+        METRICS.inc("sparse_taxonomy.build")
+
+    def _get_indexes(self, entities: List[str]) -> np.ndarray:
+        numbers = np.array([get_entity_number(e) or -1 for e in entities], dtype=np.int64)
+        indexes = np.searchsorted(self._ids, numbers)
+        found = indexes < len(self._ids)
+        found[found] = self._ids[indexes[found]] == numbers[found]
+        return np.where(found, indexes, -1)
+
+    def get_walk_counts(self, entities: List[str], max_depth: int) -> np.ndarray:
+        """
+        Count walks from every entity to every target.
+
+        Args:
+            entities: IDs of candidate entities.
+            max_depth: Max length of walk.
+
+        Returns:
+            Array of shape (entities, max_depth, targets) - number of walks of length 1..max_depth.
+        """
+        with self._lock:
+            if self._dirty:
+                self._build()
+            matrix, targets_columns = self._matrix, self._targets_columns
+            indexes = self._get_indexes(entities)
+
+        counts = np.zeros((len(entities), max_depth, len(self.targets)))
+        known = np.flatnonzero(indexes >= 0)
+        known_targets = np.flatnonzero(targets_columns >= 0)
+        if len(known) == 0 or len(known_targets) == 0:
+            return counts
+
+        with METRICS.timer("sparse_taxonomy.walk_counts"):
+            # one row per candidate, all candidates walk at once
+            frontier = sparse.csr_matrix(
+                (np.ones(len(known)), (np.arange(len(known)), indexes[known])), shape=(len(known), matrix.shape[0])
+            )
+            for depth in range(max_depth):
+                frontier = frontier @ matrix
+                counts[known[:, None], depth, known_targets[None, :]] = frontier[
+                    :, targets_columns[known_targets]
+                ].toarray()
+
+        return counts
+
+    def get_reachable_targets(self, entities: List[str], max_depth: int) -> Dict[str, TargetDistances]:
+        """
+        Find targets reachable from every entity by at most ``max_depth`` edges.
+
+        Args:
+            entities: IDs of candidate entities.
+            max_depth: Max length of path.
+
+        Returns:
+            Entity ID -> target ID -> min distance, for every entity from ``entities``.
+        """
+        entities = [str(e) for e in entities]
+        reached = self.get_walk_counts(entities, max_depth) > 0
+
+        result = {}
+        for x, entity in enumerate(entities):
+            depths, targets = np.nonzero(reached[x])
+            distances: TargetDistances = {}
+            # nonzero returns depths in ascending order, so the first one is the min distance
+            for depth, target in zip(depths, targets):
+                distances.setdefault(self.targets[target], int(depth) + 1)
+            result[entity] = distances
+        return result
+
+    def _get_path_scores(self, entities: List[str], max_depth: int) -> Tuple[np.ndarray, np.ndarray]:
+        with self._lock:
+            if self._dirty:
+                self._build()
+            matrix, targets_columns = self._matrix, self._targets_columns
+            cyclic_columns = np.flatnonzero(self._cyclic)
+            indexes = self._get_indexes(entities)
+
+        scores = np.zeros((len(entities), len(self.targets)))
+        reaches_cycle = np.zeros(len(entities), dtype=bool)
+        known = np.flatnonzero(indexes >= 0)
+        known_targets = np.flatnonzero(targets_columns >= 0)
+        if len(known) == 0 or len(known_targets) == 0 or max_depth <= 0:
+            return scores, reaches_cycle
+
+        with METRICS.timer("sparse_taxonomy.path_scores"):
+            start = sparse.csr_matrix(
+                (np.ones(len(known)), (np.arange(len(known)), indexes[known])), shape=(len(known), matrix.shape[0])
+            )
+            # entities expanded by ``create_graph_for_entity`` - less than ``max_depth`` edges from candidate
+            expanded = start
+            frontier = start
+            for _ in range(max_depth - 1):
+                frontier = frontier @ matrix
+                expanded = expanded + frontier
+            expanded.data[:] = 1.0
+
+            if len(cyclic_columns):
+                reached = expanded + expanded @ matrix
+                reaches_cycle[known] = np.asarray(reached[:, cyclic_columns].sum(axis=1)).ravel() > 0
+
+            # graph of candidate without cycle is acyclic, so its walks are paths and they end
+            walking = np.flatnonzero(~reaches_cycle[known])
+            frontier, expanded = start[walking], expanded[walking]
+            rows = known[walking][:, None]
+            length = 0
+            while frontier.nnz:
+                frontier = frontier.multiply(expanded).tocsr() @ matrix
+                length += 1
+                # path of length d has d + 1 nodes
+                scores[rows, known_targets[None, :]] += (
+                    frontier[:, targets_columns[known_targets]].toarray() / (length + 1)
+                )
+
+        return scores, reaches_cycle
+
+    def get_walk_scores(self, entities: List[str], max_depth: int) -> np.ndarray:
+        """
+        Score entities like ``get_graph_score`` on graph created by ``create_graph_for_entity`` to ``max_depth``
+        - for every target sum 1 / number of nodes of path over paths to target and take the best target. Walks
+        go only through entities less than ``max_depth`` edges from entity - those expanded in graph, so also
+        paths longer than ``max_depth`` are counted. Entity that reaches a cycle is scored by
+        ``get_graph_score`` on graph of its ancestors - walk could visit the cycle many times.
+
+        Args:
+            entities: IDs of candidate entities.
+            max_depth: Max length of walk.
+
+        Returns:
+            Score of every entity, 0 if it reaches no target.
+        """
+        entities = [str(e) for e in entities]
+        scores, reaches_cycle = self._get_path_scores(entities, max_depth)
+        scores = scores.max(axis=1) if scores.shape[1] else np.zeros(len(entities))
+
+        for x in np.flatnonzero(reaches_cycle):
+            METRICS.inc("sparse_taxonomy.cyclic_entities")
+            scores[x] = self._get_graph_score(entities[x], max_depth)
+        return scores
+
+    def _get_graph_score(self, entity: str, max_depth: int) -> float:
+        ancestors = InMemoryWikidataAPI(self._subclasses, {}).get_entity_ancestors(entity, max_depth)
+        graph = nx.DiGraph()
+        graph.add_edges_from((source, target) for source, target, _ in ancestors.edges)
+
+        scores = [
+            sum(1.0 / len(path) for path in nx.all_simple_paths(graph, source=entity, target=target))
+            for target in self.targets
+            if target in graph and target != entity
+        ]
+        return max(scores, default=0.0)
+
+    def expand_from_api(self, api: WikidataAPI, entities: List[str], max_depth: int) -> int:
+        """
+        Fetch subclasses of entities that are missing in taxonomy, level by level up to ``max_depth``.
+
+        Args:
+            api: API to get from wikidata.
+            entities: IDs of candidate entities.
+            max_depth: Max length of path from candidates.
+
+        Returns:
+            Number of fetched entities.
+        """
+        fetched: Dict[str, List[str]] = {}
+        this_level = [str(e) for e in entities]
+        visited = set(this_level)
+
+        for _ in range(max_depth):
+            next_level = []
+            for entity in this_level:
+                if entity == DISAMBIGUATION_PAGE:
+                    continue
+                parents = self._subclasses.get(entity)
+                if parents is None:
+                    parents = fetched[entity] = list(api.get_subclasses_for_entity(entity))
+                for parent in parents:
+                    if parent not in visited:
+                        visited.add(parent)
+                        next_level.append(parent)
+            this_level = next_level
+
+        if fetched:
+            self.add_subclasses(fetched)
+        return len(fetched)
+
+
+def load_taxonomy_from_db(database_name: str, targets: List[str] = None) -> SparseTaxonomy:
+    """
+    Load all entities cached in database to taxonomy.
+
+    Args:
+        database_name: Path to database.
+        targets: IDs of target entities. Default: TARGET_ENTITIES.
+
+    Returns:
+        Taxonomy object.
+    """
+    conn = sqlite3.connect(database_name)
+    try:
+        subclasses = {entity: decode_qids(sub) for entity, sub in conn.execute("SELECT id, sub FROM entity")}
+    finally:
+        conn.close()
+
+    return SparseTaxonomy(subclasses, targets)
+
+
+class SparseReachability(ReachabilityBackend):
+    """
+    Backend that computes reachability of batch of candidates on SparseTaxonomy. Candidates missing in
+    taxonomy are expanded with ``api`` first, if it is given.
+    """
+
+    def __init__(self, taxonomy: SparseTaxonomy, api: WikidataAPI = None) -> None:
+        """
+        Set object attributes.
+
+        Args:
+            taxonomy: Local taxonomy.
+            api: API to get missing entities from wikidata, None - missing entities reach no target.
+        """
+        self.taxonomy = taxonomy
+        self.api = api
+
+    def get_reachable_targets(self, entities: List[str], max_depth: int) -> Dict[str, TargetDistances]:
+        if self.api is not None:
+            self.taxonomy.expand_from_api(self.api, entities, max_depth)
+        return self.taxonomy.get_reachable_targets(entities, max_depth)
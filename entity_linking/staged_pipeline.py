@@ -0,0 +1,482 @@
+"""
+Staged classification pipeline - classification of sequence is split into stages connected by bounded queues:
+load -> tokenize -> lookup -> graph -> score -> aggregate. Every stage has its own number of worker threads,
+so I/O bound stages (token search, entity and wikipedia fetch) can have many workers and CPU bound ones few.
+Full queue blocks upstream stage (backpressure), so fast stages don't pile up sequences in memory.
+
+For every stage busy time and time spent waiting for input and for space in output queue are measured -
+stage with the highest utilization is the bottleneck of run.
+"""
+import csv
+import time
+from dataclasses import dataclass, field
+from queue import Empty, Full, Queue
+from threading import Event, Lock, Thread
+from typing import (TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator,
+                    List, Optional, Tuple)
+
+import networkx as nx
+
+from entity_linking.entity_classifier import (EntityClassifier,
+                                              count_sequence_metrics,
+                                              get_unique_pages)
+from entity_linking.load_test_data import get_sequences_from_file
+from entity_linking.maintenance.memory_profiler import sequence_done
+from entity_linking.maintenance.metrics import METRICS
+from entity_linking.utils import (DEFAULT_STAGE_QUEUE_SIZE,
+                                  ClassificationResult, TokensGroup,
+                                  TokensSequence)
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# names of stages of classification pipeline, in order
+STAGE_LOAD: str = "load"
+STAGE_TOKENIZE: str = "tokenize"
+STAGE_LOOKUP: str = "lookup"
+STAGE_GRAPH: str = "graph"
+STAGE_SCORE: str = "score"
+STAGE_AGGREGATE: str = "aggregate"
+PIPELINE_STAGES: List[str] = [STAGE_LOAD, STAGE_TOKENIZE, STAGE_LOOKUP, STAGE_GRAPH, STAGE_SCORE, STAGE_AGGREGATE]
+
+# default number of worker threads of every stage - load stage reads file, so it has always one worker
+DEFAULT_STAGE_WORKERS: Dict[str, int] = {
+    STAGE_LOAD: 1,
+    STAGE_TOKENIZE: 1,
+    STAGE_LOOKUP: 8,
+    STAGE_GRAPH: 4,
+    STAGE_SCORE: 4,
+    STAGE_AGGREGATE: 1,
+}
+# how often blocked workers check if pipeline is stopped, in seconds
+_STOP_CHECK_INTERVAL: float = 0.1
+# marks end of items in queue
+_END = object()
+
+
+@dataclass
+class StageStats:
+    """
+    Statistics of pipeline stage.
+
+    Attributes:
+        name: Name of stage.
+        workers: Number of worker threads.
+        items: Number of processed items.
+        busy: Time of processing items, summed over workers, in seconds.
+        input_wait: Time of waiting for input items, summed over workers, in seconds.
+        output_wait: Time of waiting for space in full output queue, summed over workers, in seconds.
+        max_queue: Max number of items in output queue.
+        elapsed: Time of pipeline run in seconds.
+    """
+
+    name: str
+    workers: int
+    items: int = 0
+    busy: float = 0.0
+    input_wait: float = 0.0
+    output_wait: float = 0.0
+    max_queue: int = 0
+    elapsed: float = 0.0
+    _lock: Lock = field(default_factory=Lock, repr=False, compare=False)
+
+    @property
+    def utilization(self) -> float:
+        """
+        Part of run time when workers of stage were busy, from 0 to 1.
+        """
+        if self.elapsed <= 0:
+            return 0.0
+        return self.busy / (self.elapsed * self.workers)
+
+    def add(self, busy: float, input_wait: float, output_wait: float, queue_size: int) -> None:
+        """
+        Add measurements of one processed item.
+
+        Args:
+            busy: Time of processing item.
+            input_wait: Time of waiting for item.
+            output_wait: Time of waiting for space in output queue.
+            queue_size: Number of items in output queue after item was put.
+        """
+        with self._lock:
+            self.items += 1
+            self.busy += busy
+            self.input_wait += input_wait
+            self.output_wait += output_wait
+            self.max_queue = max(self.max_queue, queue_size)
+
+    def __str__(self) -> str:
+        return (
+            f"{self.name:10} workers {self.workers:>3}, items {self.items:>7}, "
+            f"utilization {round(self.utilization * 100.0, 1):>5}%, busy {round(self.busy, 2)}s, "
+            f"input wait {round(self.input_wait, 2)}s, output wait {round(self.output_wait, 2)}s, "
+            f"max queue {self.max_queue}"
+        )
+
+
+def get_bottleneck(stats: List[StageStats]) -> Optional[StageStats]:
+    """
+    Args:
+        stats: Statistics of pipeline stages.
+
+    Returns:
+        Stage with the highest utilization or None if there are no stages.
+    """
+    return max(stats, key=lambda s: s.utilization, default=None)
+
+
+def format_pipeline_stats(stats: List[StageStats]) -> str:
+    """
+    Args:
+        stats: Statistics of pipeline stages.
+
+    Returns:
+        Text summary of stages and their bottleneck.
+    """
+    lines = ["Pipeline stages:"] + [f"  {s}" for s in stats]
+    bottleneck = get_bottleneck(stats)
+    if bottleneck is not None:
+        lines.append(f"Bottleneck: {bottleneck.name}")
+    return "\n".join(lines) + "\n"
+
+
+class StagedPipeline:
+    """
+    Pipeline of stages run by worker threads and connected by bounded queues. Source stage takes items
+    from iterable, every next stage maps item to new item. Items leave the last stage in order of completion.
+    Error in any stage stops pipeline and is raised by ``run``.
+
+    Attributes:
+        stats: Statistics of source stage and all stages, available after run.
+    """
+
+    def __init__(
+        self,
+        source_name: str,
+        stages: List[Tuple[str, Callable[[Any], Any], int]],
+        queue_size: int = DEFAULT_STAGE_QUEUE_SIZE,
+    ) -> None:
+        """
+        Set object attributes.
+
+        Args:
+            source_name: Name of source stage.
+            stages: Name, function and number of workers of every stage.
+            queue_size: Max number of items in queue between stages.
+        """
+        for name, _, workers in stages:
+            if workers < 1:
+                raise ValueError(f"Stage {name} must have at least one worker, not {workers}!")
+
+        self.source_name = source_name
+        self.stages = stages
+        self.queue_size = queue_size
+        self.stats: List[StageStats] = []
+        self._stop = Event()
+        self._error: Optional[BaseException] = None
+        self._active: List[int] = []
+        self._active_lock = Lock()
+
+    def _get(self, queue: Queue) -> Any:
+        while not self._stop.is_set():
+            try:
+                return queue.get(timeout=_STOP_CHECK_INTERVAL)
+            except Empty:
+                pass
+        return _END
+
+    def _put(self, queue: Queue, item: Any) -> bool:
+        while not self._stop.is_set():
+            try:
+                queue.put(item, timeout=_STOP_CHECK_INTERVAL)
+                return True
+            except Full:
+                pass
+        return False
+
+    def _fail(self, error: BaseException) -> None:
+        if self._error is None:
+            self._error = error
+        self._stop.set()
+
+    def _finish_worker(self, stage: int, output: Queue, next_workers: int) -> None:
+        # the last worker of stage tells every worker of next stage that there are no more items
+        with self._active_lock:
+            self._active[stage] -= 1
+            last = self._active[stage] == 0
+        if last:
+            for _ in range(next_workers):
+                self._put(output, _END)
+
+    def _source_worker(self, items: Iterable[Any], output: Queue, next_workers: int) -> None:
+        stats = self.stats[0]
+        try:
+            iterator = iter(items)
+            while not self._stop.is_set():
+                start_time = time.perf_counter()
+                item = next(iterator, _END)
+                if item is _END:
+                    break
+                put_time = time.perf_counter()
+                if not self._put(output, item):
+                    break
+                stats.add(put_time - start_time, 0.0, time.perf_counter() - put_time, output.qsize())
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            self._finish_worker(0, output, next_workers)
+
+    def _stage_worker(
+        self, stage: int, fun: Callable[[Any], Any], input_queue: Queue, output: Queue, next_workers: int
+    ) -> None:
+        stats = self.stats[stage]
+        try:
+            while True:
+                start_time = time.perf_counter()
+                item = self._get(input_queue)
+                if item is _END:
+                    break
+                busy_start = time.perf_counter()
+                result = fun(item)
+                put_time = time.perf_counter()
+                if not self._put(output, result):
+                    break
+                stats.add(
+                    put_time - busy_start,
+                    busy_start - start_time,
+                    time.perf_counter() - put_time,
+                    output.qsize(),
+                )
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            self._finish_worker(stage, output, next_workers)
+
+    def run(self, items: Iterable[Any]) -> Iterator[Any]:
+        """
+        Pass ``items`` through all stages.
+
+        Args:
+            items: Items of source stage, they are consumed lazily.
+
+        Returns:
+            Iterator over results of the last stage, in order of completion.
+        """
+        self._stop.clear()
+        self._error = None
+        self.stats = [StageStats(self.source_name, 1)] + [StageStats(n, w) for n, _, w in self.stages]
+        self._active = [s.workers for s in self.stats]
+
+        queues = [Queue(self.queue_size) for _ in range(len(self.stats))]
+        # consumer of the last queue is caller
+        next_workers = [s.workers for s in self.stats[1:]] + [1]
+
+        threads = [Thread(target=self._source_worker, args=(items, queues[0], next_workers[0]), daemon=True)]
+        for x, (_, fun, workers) in enumerate(self.stages, 1):
+            for _ in range(workers):
+                threads.append(
+                    Thread(
+                        target=self._stage_worker,
+                        args=(x, fun, queues[x - 1], queues[x], next_workers[x]),
+                        daemon=True,
+                    )
+                )
+
+        start_time = time.perf_counter()
+        for t in threads:
+            t.start()
+
+        try:
+            while True:
+                result = self._get(queues[-1])
+                if result is _END:
+                    break
+                yield result
+        finally:
+            # caller stopped iteration or stage failed - other workers are stopped
+            if self._error is not None or self._active[-1] > 0:
+                self._stop.set()
+            for t in threads:
+                t.join()
+
+            elapsed = time.perf_counter() - start_time
+            for stats in self.stats:
+                stats.elapsed = elapsed
+                METRICS.add_time(f"pipeline.{stats.name}.busy", stats.busy)
+                METRICS.add_time(f"pipeline.{stats.name}.input_wait", stats.input_wait)
+                METRICS.add_time(f"pipeline.{stats.name}.output_wait", stats.output_wait)
+                METRICS.inc(f"pipeline.{stats.name}.items", stats.items)
+
+        if self._error is not None:
+            raise self._error
+
+
+@dataclass
+class SequenceWork:
+    """
+    State of sequence passed between stages of classification pipeline.
+
+    Attributes:
+        sequence: Classified sequence.
+        queries: Unique strings searched in wikidata for sequence.
+        chosen_tokens: Tokens groups of sequence.
+        graphs: Page ID -> graph, for candidate pages that have target entity in graph.
+        page_results: Page ID -> classification result, None if page is not possible entity.
+    """
+
+    sequence: TokensSequence
+    queries: List[str] = field(default_factory=list)
+    chosen_tokens: List[TokensGroup] = field(default_factory=list)
+    graphs: Dict[str, nx.Graph] = field(default_factory=dict)
+    page_results: Dict[str, Optional[ClassificationResult]] = field(default_factory=dict)
+
+
+def get_stage_workers(stage_workers: Dict[str, int] = None) -> Dict[str, int]:
+    """
+    Args:
+        stage_workers: Stage name -> number of workers, for stages that don't use default number.
+
+    Returns:
+        Number of workers of every stage.
+    """
+    result = dict(DEFAULT_STAGE_WORKERS)
+    for name, workers in (stage_workers or {}).items():
+        if name not in result:
+            raise ValueError(f"Unknown pipeline stage {name}, stages: {', '.join(PIPELINE_STAGES)}!")
+        if name == STAGE_LOAD and workers != 1:
+            raise ValueError("Stage load reads file and must have one worker!")
+        result[name] = workers
+    return result
+
+
+def create_classification_pipeline(
+    classifier: EntityClassifier,
+    stage_workers: Dict[str, int] = None,
+    queue_size: int = DEFAULT_STAGE_QUEUE_SIZE,
+) -> StagedPipeline:
+    """
+    Create pipeline that classifies TokensSequence items and returns tuples: sequence and its result dataframe,
+    see ``create_result_data_frame``. Wikidata API of ``classifier`` is wrapped by CachedWikidataAPI, so lookups done
+    by lookup stage are reused by tokenizer and by next stages.
+
+    Args:
+        classifier: Classifier used to classify sequences.
+        stage_workers: Stage name -> number of workers, for stages that don't use default number.
+        queue_size: Max number of sequences in queue between stages.
+
+    Returns:
+        Pipeline object.
+    """
+    workers = get_stage_workers(stage_workers)
+    classifier.use_cached_wikidata_api()
+
+    def tokenize(sequence: TokensSequence) -> SequenceWork:
+        return SequenceWork(sequence, list(dict.fromkeys(classifier.tokenizer.get_token_queries(sequence))))
+
+    def lookup(work: SequenceWork) -> SequenceWork:
+        for query in work.queries:
+            classifier.wikidata_api.get_pages_for_token(query)
+        # all queries are in cache now
+        work.chosen_tokens = classifier.tokenizer.tokenize(work.sequence)
+        return work
+
+    def graph(work: SequenceWork) -> SequenceWork:
+        pages = get_unique_pages(work.chosen_tokens)
+        classifier.prefetch_reachability(pages)
+        for page in pages:
+            page_graph = classifier.get_page_graph(page)
+            work.page_results[page] = None
+            if page_graph is not None:
+                work.graphs[page] = page_graph
+        return work
+
+    def score(work: SequenceWork) -> SequenceWork:
+        for page, page_graph in work.graphs.items():
+            work.page_results[page] = ClassificationResult(
+                page, classifier.score_page(work.sequence, page, page_graph)
+            )
+        # graphs are not needed anymore
+        work.graphs = {}
+        return work
+
+    def aggregate(work: SequenceWork) -> Tuple[TokensSequence, "pd.DataFrame"]:
+        from entity_linking.classification_report import create_result_data_frame
+
+        classify_result = classifier.choose_tokens_groups_results(work.chosen_tokens, work.page_results)
+        count_sequence_metrics(work.sequence, work.chosen_tokens)
+        with METRICS.timer("classifier.result_data_frame"):
+            return work.sequence, create_result_data_frame(work.sequence, work.chosen_tokens, classify_result)
+
+    return StagedPipeline(
+        STAGE_LOAD,
+        [
+            (STAGE_TOKENIZE, tokenize, workers[STAGE_TOKENIZE]),
+            (STAGE_LOOKUP, lookup, workers[STAGE_LOOKUP]),
+            (STAGE_GRAPH, graph, workers[STAGE_GRAPH]),
+            (STAGE_SCORE, score, workers[STAGE_SCORE]),
+            (STAGE_AGGREGATE, aggregate, workers[STAGE_AGGREGATE]),
+        ],
+        queue_size,
+    )
+
+
+def load_sequences(file_name: str, seq_number: int) -> Iterator[TokensSequence]:
+    """
+    Read first ``seq_number`` sequences from file ``file_name`` lazily.
+
+    Args:
+        file_name: Name of file with sequences, with lemmas and tags.
+        seq_number: Number of sequences to read.
+
+    Returns:
+        Iterator over sequences.
+    """
+    with open(file_name) as csv_file:
+        for x, sequence in enumerate(get_sequences_from_file(csv.reader(csv_file, delimiter="\t"))):
+            if x == seq_number:
+                break
+            yield sequence
+
+
+def classify_sequences_with_pipeline(
+    classifier: EntityClassifier,
+    file_name: str,
+    seq_number: int,
+    stage_workers: Dict[str, int] = None,
+    queue_size: int = DEFAULT_STAGE_QUEUE_SIZE,
+) -> Tuple["pd.DataFrame", List[StageStats]]:
+    """
+    Classify sequences from file ``file_name`` with staged pipeline - the same result as
+    ``EntityClassifier.classify_sequences_from_file``. Metrics are merged into ``run_metrics`` of classifier.
+
+    Args:
+        classifier: Classifier used to classify sequences.
+        file_name: Name of file with sequences.
+        seq_number: Number of sequence to read and classify from file.
+        stage_workers: Stage name -> number of workers, for stages that don't use default number.
+        queue_size: Max number of sequences in queue between stages.
+
+    Returns:
+        Tuple: Pandas DataFrame with classification results and statistics of stages.
+    """
+    import pandas as pd
+
+    start_time = time.time()
+    pipeline = create_classification_pipeline(classifier, stage_workers, queue_size)
+
+    # sequences leave pipeline in order of completion, result keeps input order
+    results: Dict[int, pd.DataFrame] = {}
+    for sequence, result in pipeline.run(load_sequences(file_name, seq_number)):
+        results[sequence.id] = result
+        sequence_done()
+
+    if results:
+        result_df = pd.concat([results[x] for x in sorted(results)]).reset_index(drop=True)
+    else:
+        result_df = pd.DataFrame()
+
+    classifier.run_metrics.merge(METRICS.collect())
+    classifier.run_metrics.add_time("classifier.run", time.time() - start_time)
+
+    return result_df, pipeline.stats
@@ -0,0 +1,256 @@
+"""
+Module with generator of synthetic data for scaling experiments - class DAGs with tunable depth, fan-in and
+fan-out, tagged sequences that mention their leaves and in-memory Wikidata API over them. Generated data is
+deterministic for given seed.
+"""
+import random
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+from entity_linking.utils import (NOT_WIKIDATA_ENTITY_SIGN, TARGET_ENTITIES,
+                                  Token, TokensSequence)
+from entity_linking.wikidata_api import InMemoryWikidataAPI
+
+# synthetic entities get IDs from this number up, so they never collide with target entities
+SYNTHETIC_ID_OFFSET: int = 900000000
+# default seed of random generators
+DEFAULT_SYNTHETIC_SEED: int = 0
+# morphological tags of synthetic entity tokens
+SYNTHETIC_ENTITY_TAGS: str = "subst:sg:nom:m3"
+
+# words between entities in synthetic sequences: token, lemma and morphological tags
+FILLER_WORDS: List[Tuple[str, str, str]] = [
+    ("i", "i", "conj"),
+    ("w", "w", "prep:loc:nwok"),
+    ("jest", "być", "fin:sg:ter:imperf"),
+    ("duży", "duży", "adj:sg:nom:m3:pos"),
+    ("dom", "dom", "subst:sg:nom:m3"),
+    ("bardzo", "bardzo", "adv:pos"),
+    ("widzi", "widzieć", "fin:sg:ter:imperf"),
+    ("nowy", "nowy", "adj:sg:nom:m3:pos"),
+    ("rok", "rok", "subst:sg:nom:m3"),
+    (",", ",", "interp"),
+]
+
+
+@dataclass
+class SyntheticTaxonomy:
+    """
+    Synthetic class DAG. Level 0 contains target entities, every next level contains subclasses of
+    entities from previous level.
+
+    Attributes:
+        subclasses: Entity ID -> IDs of its parents, like result of ``get_subclasses_for_entity``.
+        levels: Entity IDs on every level.
+    """
+
+    subclasses: Dict[str, List[str]]
+    levels: List[List[str]]
+
+    @property
+    def depth(self) -> int:
+        return len(self.levels) - 1
+
+    @property
+    def leaves(self) -> List[str]:
+        return self.levels[-1]
+
+    def nodes_count(self) -> int:
+        return sum(len(level) for level in self.levels)
+
+    def edges_count(self) -> int:
+        return sum(len(parents) for parents in self.subclasses.values())
+
+
+def get_synthetic_entity_id(number: int) -> str:
+    """
+    Args:
+        number: Number of synthetic entity.
+
+    Returns:
+        Entity ID in Q{NUM} format.
+    """
+    return f"Q{SYNTHETIC_ID_OFFSET + number}"
+
+
+def get_synthetic_entity_token(entity: str) -> str:
+    """
+    Args:
+        entity: ID of synthetic entity.
+
+    Returns:
+        Word that is name of ``entity`` in synthetic sequences.
+    """
+    return f"Byt{int(entity[1:]) - SYNTHETIC_ID_OFFSET}"
+
+
+def generate_taxonomy(
+    depth: int,
+    fan_out: int,
+    fan_in: int = 1,
+    roots: int = 1,
+    seed: int = DEFAULT_SYNTHETIC_SEED,
+) -> SyntheticTaxonomy:
+    """
+    Generate class DAG. Every entity has ``fan_out`` subclasses and every subclass has ``fan_in`` parents:
+    entity that created it and ``fan_in`` - 1 random entities from the same level. Number of entities on
+    level n is ``roots`` * ``fan_out`` ^ n and number of paths from leaf to root grows as ``fan_in`` ^ ``depth``.
+
+    Args:
+        depth: Number of levels below roots.
+        fan_out: Number of subclasses of every entity.
+        fan_in: Number of parents of every subclass.
+        roots: Number of target entities used as roots.
+        seed: Seed of random generator.
+
+    Returns:
+        Generated taxonomy.
+    """
+    if not 1 <= roots <= len(TARGET_ENTITIES):
+        raise ValueError(f"Number of roots must be between 1 and {len(TARGET_ENTITIES)}!")
+    if fan_out < 1 or fan_in < 1:
+        raise ValueError("Fan-out and fan-in must be positive!")
+
+    rnd = random.Random(seed)
+    levels: List[List[str]] = [TARGET_ENTITIES[:roots]]
+    subclasses: Dict[str, List[str]] = {e: [] for e in levels[0]}
+    number = 0
+
+    for _ in range(depth):
+        previous_level = levels[-1]
+        level = []
+
+        for parent in previous_level:
+            for _ in range(fan_out):
+                entity = get_synthetic_entity_id(number)
+                number += 1
+
+                parents = [parent]
+                if fan_in > 1:
+                    for other in rnd.sample(previous_level, min(fan_in, len(previous_level))):
+                        if other != parent and len(parents) < fan_in:
+                            parents.append(other)
+
+                subclasses[entity] = parents
+                level.append(entity)
+
+        levels.append(level)
+
+    return SyntheticTaxonomy(subclasses, levels)
+
+
+def generate_pages(
+    taxonomy: SyntheticTaxonomy, ambiguity: int = 1, seed: int = DEFAULT_SYNTHETIC_SEED
+) -> Dict[str, List[str]]:
+    """
+    Generate pages for tokens - name of every leaf points to the leaf and to ``ambiguity`` - 1 random
+    other leaves.
+
+    Args:
+        taxonomy: Synthetic taxonomy.
+        ambiguity: Number of pages for every token.
+        seed: Seed of random generator.
+
+    Returns:
+        Token -> IDs of pages, like result of ``get_pages_for_token``.
+    """
+    rnd = random.Random(seed)
+    leaves = taxonomy.leaves
+    pages = {}
+
+    for leaf in leaves:
+        result = [leaf]
+        if ambiguity > 1:
+            for other in rnd.sample(leaves, min(ambiguity, len(leaves))):
+                if other != leaf and len(result) < ambiguity:
+                    result.append(other)
+        pages[get_synthetic_entity_token(leaf)] = result
+
+    return pages
+
+
+def create_synthetic_wikidata_api(
+    taxonomy: SyntheticTaxonomy, ambiguity: int = 1, seed: int = DEFAULT_SYNTHETIC_SEED
+) -> InMemoryWikidataAPI:
+    """
+    Create in-memory API over ``taxonomy``. Every leaf has wikipedia page with its name and few filler words.
+
+    Args:
+        taxonomy: Synthetic taxonomy.
+        ambiguity: Number of pages for every token, see ``generate_pages``.
+        seed: Seed of random generator.
+
+    Returns:
+        API over synthetic data.
+    """
+    rnd = random.Random(seed)
+    titles = {}
+    contents = {}
+
+    for leaf in taxonomy.leaves:
+        title = get_synthetic_entity_token(leaf)
+        titles[leaf] = title
+        contents[title] = " ".join([title] + [rnd.choice(FILLER_WORDS)[0] for _ in range(20)])
+
+    return InMemoryWikidataAPI(taxonomy.subclasses, generate_pages(taxonomy, ambiguity, seed), titles, contents)
+
+
+def generate_sequences(
+    taxonomy: SyntheticTaxonomy,
+    sequences_num: int,
+    sequence_len: int,
+    entities_ratio: float = 0.2,
+    seed: int = DEFAULT_SYNTHETIC_SEED,
+) -> List[TokensSequence]:
+    """
+    Generate tagged sequences. Every token is mention of random leaf of ``taxonomy`` with probability
+    ``entities_ratio``, otherwise it is random filler word.
+
+    Args:
+        taxonomy: Synthetic taxonomy.
+        sequences_num: Number of sequences.
+        sequence_len: Number of tokens in every sequence.
+        entities_ratio: Probability that token is entity mention.
+        seed: Seed of random generator.
+
+    Returns:
+        List of sequences with ground truth entities.
+    """
+    rnd = random.Random(seed)
+    leaves = taxonomy.leaves
+    result = []
+
+    for idx in range(sequences_num):
+        sequence = TokensSequence([], idx)
+        for x in range(sequence_len):
+            preceding = 0 if x == 0 else 1
+            if rnd.random() < entities_ratio:
+                entity = rnd.choice(leaves)
+                word = get_synthetic_entity_token(entity)
+                sequence.append(Token(word, preceding, word, entity, word, SYNTHETIC_ENTITY_TAGS))
+            else:
+                word, lemma, tags = rnd.choice(FILLER_WORDS)
+                sequence.append(
+                    Token(word, preceding, NOT_WIKIDATA_ENTITY_SIGN, NOT_WIKIDATA_ENTITY_SIGN, lemma, tags)
+                )
+        result.append(sequence)
+
+    return result
+
+
+def save_sequences_to_test_file(sequences: List[TokensSequence], file_name: str) -> None:
+    """
+    Save ``sequences`` in test file format, readable by ``load_sequences_from_test_file_with_lemmas_and_tags``.
+
+    Args:
+        sequences: Sequences to save.
+        file_name: Name of result file.
+    """
+    with open(file_name, "w") as f:
+        for sequence in sequences:
+            for t in sequence.sequence:
+                f.write(
+                    f"{sequence.id}\t{t.token_value}\t{t.lemma}\t{t.preceding_token}\t"
+                    f"{t.morph_tags}\t{t.link_title}\t{t.entity_id}\n"
+                )
+            f.write("\n")
@@ -42,6 +42,20 @@ class Tokenizer(ABC):
         """
         pass
 
+    @abstractmethod
+    def get_token_queries(self, sequence: TokensSequence) -> List[str]:
+        """
+        Abstract method to all tokenizers - get all strings that ``tokenize`` searches in wikidata
+        for ``sequence``, without searching them.
+
+        Args:
+            sequence: Sequence of tokens to tokenize.
+
+        Returns:
+            List of queries, in order of search.
+        """
+        pass
+
 
 class WikidataLengthTokenizer(Tokenizer):
     """
@@ -108,6 +122,28 @@ class WikidataLengthTokenizer(Tokenizer):
 
         return result
 
+    def get_token_queries(self, sequence: TokensSequence) -> List[str]:
+        """
+        Get original and lemma forms of all ``max_token_length`` parts of sequence.
+
+        Args:
+            sequence: Sequence to tokenize.
+
+        Returns:
+            List of queries.
+        """
+        result: List[str] = []
+        for x in range(len(sequence.sequence) - self.max_token_length + 1):
+            if x + self.max_token_length < len(sequence.sequence):
+                result.append(
+                    sequence.get_token_str_original_form(x, x + self.max_token_length)
+                )
+                result.append(
+                    sequence.get_token_str_lemma_form(x, x + self.max_token_length)
+                )
+
+        return result
+
 
 class WikidataMorphTagsTokenizer(Tokenizer):
     """
@@ -199,3 +235,21 @@ class WikidataMorphTagsTokenizer(Tokenizer):
                 )
 
         return result
+
+    def get_token_queries(self, sequence: TokensSequence) -> List[str]:
+        """
+        Get original and lemma forms of tokens from ``get_possible_tokens``.
+
+        Args:
+            sequence: Sequence to tokenize.
+
+        Returns:
+            List of queries.
+        """
+        result: List[str] = []
+
+        for start, end in self.get_possible_tokens(sequence):
+            result.append(sequence.get_token_str_original_form(start, end))
+            result.append(sequence.get_token_str_lemma_form(start, end))
+
+        return result
@@ -4,9 +4,8 @@ Module with tools, constants and common class declarations.
 import argparse
 import os
 from dataclasses import dataclass
-from typing import List
+from typing import List, Optional, Tuple
 
-import morfeusz2
 from wikidata.entity import EntityId
 
 # test file 2 name - with extended data: lemmas and tags, ATTENTION! it is too big to read full
@@ -90,6 +89,26 @@ BEST_TOKEN_GROUPS: List[List[str]] = [
 
 # default number of processes to run
 DEFAULT_PROCESSES_NUMBER: int = 8
+# default number of threads that evaluate candidate pages of one sequence
+DEFAULT_PAGE_THREADS: int = 4
+# default max number of sequences in queue between stages of staged pipeline
+DEFAULT_STAGE_QUEUE_SIZE: int = 16
+# default number of lookups in flight of cache prewarm
+DEFAULT_PREWARM_CONCURRENCY: int = 16
+# default number of classified sequences saved in one part of checkpoint
+DEFAULT_CHECKPOINT_EVERY: int = 100
+# default number of sequences in one job of sharded run
+DEFAULT_SHARD_SIZE: int = 100
+# default time in seconds after which unfinished job of sharded run is claimed by other worker
+DEFAULT_JOB_LEASE: float = 3600.0
+# default max number of requests in one micro-batch of linking service
+DEFAULT_MAX_BATCH_SIZE: int = 16
+# default time to wait for more requests to micro-batch of linking service, in seconds
+DEFAULT_MAX_BATCH_WAIT: float = 0.01
+# default max number of requests in flight of asynchronous wikidata client
+DEFAULT_WEB_CONCURRENCY: int = 16
+# default max number of requests per second of asynchronous wikidata client, 0 - no limit
+DEFAULT_WEB_RATE_LIMIT: float = 20.0
 # default score threshold for WikipediaContextGraphEntityClassifier
 WIKIPEDIA_SIMILARITY_THRESHOLD: float = 0.1
 
@@ -108,13 +127,13 @@ ID_FACET_OF: str = "P1269"
 WIKIDATA_URL: str = "https://www.wikidata.org/wiki/"
 # address of wikidata sparql API
 WIKIDATA_URL_SPARQL: str = 'https://query.wikidata.org/sparql'
+# address of Polish wikipedia API
+WIKIPEDIA_API_URL: str = "https://pl.wikipedia.org/w/api.php"
 # default max results
 DEFAULT_RESULTS_LIMIT: int = 5
 # user agent
 USER_AGENT: str = "EntityLinking/1.0 (https://github.com/ppapryczka/EntityLinking) Python/Wikidata/0.6.1"
 
-# it is important that it must be global object! It cause strange memory leak!
-MORFEUSZ: morfeusz2.Morfeusz = morfeusz2.Morfeusz()
 # max length of content from wikipedia site.
 MAX_WIKIPEDIA_PAGE_CONTENT_LEN: int = 1000
 
@@ -209,6 +228,20 @@ class ClassificationResult:
         self.score = score
 
 
+@dataclass
+class EntityAncestors:
+    """
+    Ancestor closure of entity up to depth - edges of graph created by ``create_graph_for_entity``.
+
+    Attributes:
+        edges: Edges (entity, its subclass, level of entity), every edge once, with the lowest level.
+        targets: Target entities in closure.
+    """
+
+    edges: List[Tuple[str, str, int]]
+    targets: List[str]
+
+
 @dataclass
 class TokensSequence:
     """
@@ -217,10 +250,12 @@ class TokensSequence:
     Attributes.
         sequence: List of tokens.
         id: ID of sequence, useful to identification and progress reporting.
+        document_id: ID of document of sequence from the first column of input file, None for raw text.
     """
 
     sequence: List[Token]
     id: int
+    document_id: Optional[str] = None
 
     def get_token_str_original_form(self, start: int, end: int) -> str:
         """
@@ -1,16 +1,54 @@
 """
 Declaration of Wikidata api - first by direct request to wikidata website, second by simple database.
+Wikipedia pages of entities are also taken through this api, so every network request of classification
+goes through one object.
 """
 
+import os
+import time
 from abc import ABC, abstractmethod
-from typing import List
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Callable, Dict, List, Optional, Set, Tuple
 
 from wikidata.entity import EntityId
 
-from entity_linking.wikidata_db_api import (get_pages_for_token_db,
-                                            get_subclasses_for_entity_db)
+from entity_linking.maintenance.metrics import METRICS
+from entity_linking.utils import (DISAMBIGUATION_PAGE, TARGET_ENTITIES,
+                                  EntityAncestors)
+from entity_linking.wikidata_db_api import (CACHE_HIT, CACHE_MISS, CACHE_STALE,
+                                            CACHE_TABLES, SCHEMA_VERSION_BLOB,
+                                            CachePolicy, add_cache_columns,
+                                            add_entity_ancestors_to_data_base,
+                                            add_unique_keys,
+                                            create_ancestors_table,
+                                            evict_cache,
+                                            get_ancestors_config_key,
+                                            get_entity_ancestors_db,
+                                            get_pages_for_token_db,
+                                            get_schema_version,
+                                            get_subclasses_for_entity_db,
+                                            has_cache_columns,
+                                            invalidate_ancestors,
+                                            lookup_cached_ids,
+                                            record_accesses, save_cached_ids)
 from entity_linking.wikidata_web_api import (
-    get_pages_for_token_wikidata, get_subclasses_for_entity_wikidata)
+    get_pages_for_token_wikidata, get_subclasses_for_entity_wikidata,
+    get_title_in_polish_wikipedia)
+from entity_linking.wikipedia_api import get_site_wikipedia_site_content
+
+
+# default max number of entries kept by CachedWikidataAPI for every lookup type
+DEFAULT_MEMORY_CACHE_SIZE: int = 1000000
+
+# default number of hits of database rows counted in memory before they are written
+DEFAULT_ACCESS_FLUSH_EVERY: int = 100
+# default number of new database rows after which tables over limits are evicted
+DEFAULT_EVICT_EVERY: int = 1000
+
+# marker of value missing in cache - None is correct cached value
+_MISSING = object()
 
 
 class WikidataAPI(ABC):
@@ -22,23 +60,408 @@ class WikidataAPI(ABC):
     def get_pages_for_token(self, token: str) -> List[str]:
         pass
 
+    def get_wikipedia_title(self, entity: str) -> Optional[str]:
+        with METRICS.timer("wikipedia.get_title"):
+            return get_title_in_polish_wikipedia(EntityId(entity))
+
+    def get_wikipedia_content(self, page_title: str) -> str:
+        with METRICS.timer("wikipedia.get_content"):
+            return get_site_wikipedia_site_content(page_title)
+
+    def flush(self) -> None:
+        """
+        Write data kept in memory of current process, e.g. counted hits of database rows. Pool workers call it
+        after every sequence, because they don't run atexit handlers.
+        """
+        pass
+
+    def get_entity_ancestors(self, entity: str, depth: int) -> EntityAncestors:
+        """
+        Walk up hierarchy of ``entity`` level by level using ``get_subclasses_for_entity``. Every entity is
+        expanded once - expanding it again on deeper level adds no new edge. DISAMBIGUATION_PAGE is not expanded.
+
+        Args:
+            entity: ID of entity, Q{NUM} format.
+            depth: Number of levels.
+
+        Returns:
+            Ancestor closure of ``entity``.
+        """
+        edges: Dict[Tuple[str, str], int] = {}
+        visited = {str(entity)}
+        this_level = [str(entity)]
+
+        for level in range(depth):
+            next_level = []
+            for ent in this_level:
+                # omit DISAMBIGUATION_PAGE - it cause errors
+                if ent == DISAMBIGUATION_PAGE:
+                    continue
+
+                for subclass in self.get_subclasses_for_entity(EntityId(ent)):
+                    edges.setdefault((ent, subclass), level)
+                    if subclass not in visited:
+                        visited.add(subclass)
+                        next_level.append(subclass)
+            this_level = next_level
+
+        return EntityAncestors(
+            [(source, target, level) for (source, target), level in edges.items()],
+            [target for target in TARGET_ENTITIES if target in visited],
+        )
+
 
 class WikidataWebAPI(WikidataAPI):
     def get_subclasses_for_entity(self, entity: str) -> List[str]:
-        return get_subclasses_for_entity_wikidata(EntityId(entity))
+        with METRICS.timer("wikidata_web.get_subclasses_for_entity"):
+            return get_subclasses_for_entity_wikidata(EntityId(entity))
 
     def get_pages_for_token(self, token: str) -> List[str]:
-        return get_pages_for_token_wikidata(token)
+        with METRICS.timer("wikidata_web.get_pages_for_token"):
+            return get_pages_for_token_wikidata(token)
 
 
 class WikidataDBAPI(WikidataAPI):
+    """
+    API that keeps results of wikidata requests in database. Ancestor closures of entities are kept too,
+    so graph of entity seen before is read in one query.
+
+    With ``policy`` rows of entity and token tables get stale after TTL and tables are kept within size limits.
+    Hits of rows are counted in memory and written every ``access_flush_every`` hits, because write on every
+    read would be slower than the read. Stale rows with many hits are returned at once and fetched again
+    by background thread.
+
+    Rows missing in database are fetched by ``web_api`` if it is given - e.g. asynchronous client - else by
+    synchronous web functions.
+    """
+
     database_name: str
+    policy: Optional[CachePolicy]
+    web_api: Optional[WikidataAPI]
 
-    def __init__(self, database_name: str):
+    def __init__(
+        self,
+        database_name: str,
+        policy: CachePolicy = None,
+        access_flush_every: int = DEFAULT_ACCESS_FLUSH_EVERY,
+        evict_every: int = DEFAULT_EVICT_EVERY,
+        web_api: WikidataAPI = None,
+    ):
+        """
+        Set object attributes. Cache columns are added to database without them, if ``policy`` is given.
+
+        Args:
+            database_name: Path to database.
+            policy: Policy of cache, None - rows never get stale and tables are not limited.
+            access_flush_every: Number of hits kept in memory before they are written.
+            evict_every: Number of new rows after which tables over limits of ``policy`` are evicted.
+            web_api: API that fetches rows missing in database and wikipedia pages, None - web functions.
+        """
         self.database_name = database_name
+        self.policy = policy
+        self.web_api = web_api
+        self.access_flush_every = access_flush_every
+        self.evict_every = evict_every
+        self._ancestors_table_created = False
+        self._accesses: Dict[str, Dict[str, Tuple[int, float]]] = {table: {} for table in CACHE_TABLES}
+        self._pending_accesses = 0
+        self._new_rows = 0
+        self._refreshing: Set[Tuple[str, str]] = set()
+        self._refresh_executor: Optional[ThreadPoolExecutor] = None
+        self._refresh_executor_pid = -1
+        self._lock = Lock()
+
+        if policy is not None and not has_cache_columns(database_name):
+            add_cache_columns(database_name)
+        # rows of database with BLOBs are saved by upsert after its keys are unique
+        if get_schema_version(database_name) == SCHEMA_VERSION_BLOB:
+            add_unique_keys(database_name)
+
+    def __getstate__(self):
+        # lock and thread can't be pickled, every process counts its own hits
+        return {
+            "database_name": self.database_name,
+            "policy": self.policy,
+            "access_flush_every": self.access_flush_every,
+            "evict_every": self.evict_every,
+            "web_api": self.web_api,
+        }
+
+    def __setstate__(self, state):
+        self.__init__(**state)
 
     def get_subclasses_for_entity(self, entity: str) -> List[str]:
-        return get_subclasses_for_entity_db(self.database_name, entity)
+        with METRICS.timer("wikidata_db.get_subclasses_for_entity"):
+            if self.policy is None and self.web_api is None:
+                return get_subclasses_for_entity_db(self.database_name, entity)
+            if self.web_api is not None:
+                return self._get("entity", str(entity), lambda: self.web_api.get_subclasses_for_entity(entity))
+            return self._get("entity", str(entity), lambda: get_subclasses_for_entity_wikidata(EntityId(entity)))
 
     def get_pages_for_token(self, token: str) -> List[str]:
-        return get_pages_for_token_db(self.database_name, token)
+        with METRICS.timer("wikidata_db.get_pages_for_token"):
+            if self.policy is None and self.web_api is None:
+                return get_pages_for_token_db(self.database_name, token)
+            if self.web_api is not None:
+                return self._get("token", token, lambda: self.web_api.get_pages_for_token(token))
+            return self._get("token", token, lambda: get_pages_for_token_wikidata(token))
+
+    def get_wikipedia_title(self, entity: str) -> Optional[str]:
+        if self.web_api is not None:
+            return self.web_api.get_wikipedia_title(entity)
+        return super().get_wikipedia_title(entity)
+
+    def get_wikipedia_content(self, page_title: str) -> str:
+        if self.web_api is not None:
+            return self.web_api.get_wikipedia_content(page_title)
+        return super().get_wikipedia_content(page_title)
+
+    def _get(self, table: str, key: str, fetch: Callable[[], List[str]]) -> List[str]:
+        ids, status, hits = lookup_cached_ids(self.database_name, table, key, self.policy)
+
+        if status in (CACHE_HIT, CACHE_STALE) and self.policy is not None:
+            self._record_access(table, key)
+        if status == CACHE_HIT:
+            return ids
+        if status == CACHE_STALE and hits >= self.policy.refresh_min_hits:
+            self._refresh_in_background(table, key, fetch, ids)
+            return ids
+
+        fetched_ids = fetch()
+        # stale or invalid row is replaced
+        self._save(table, key, fetched_ids, status != CACHE_MISS and fetched_ids != ids)
+        return fetched_ids
+
+    def _save(self, table: str, key: str, ids: List[str], changed: bool = False) -> None:
+        save_cached_ids(self.database_name, table, key, ids)
+        if changed and table == "entity":
+            # closures with old subclasses of entity are not valid
+            self._create_ancestors_table()
+            invalidate_ancestors(self.database_name, [key])
+
+        with self._lock:
+            self._new_rows += 1
+            evict = self.evict_every > 0 and self._new_rows % self.evict_every == 0
+        if evict and self.policy is not None and (self.policy.max_rows > 0 or self.policy.max_bytes > 0):
+            self._create_ancestors_table()
+            evict_cache(self.database_name, self.policy)
+
+    def _create_ancestors_table(self) -> None:
+        # closures of older databases get members before they are invalidated or evicted
+        with self._lock:
+            if not self._ancestors_table_created:
+                create_ancestors_table(self.database_name)
+                self._ancestors_table_created = True
+
+    def _record_access(self, table: str, key: str) -> None:
+        with self._lock:
+            hits, _ = self._accesses[table].get(key, (0, 0.0))
+            self._accesses[table][key] = (hits + 1, time.time())
+            self._pending_accesses += 1
+            flush = self._pending_accesses >= self.access_flush_every
+        if flush:
+            self.flush_accesses()
+
+    def flush_accesses(self) -> None:
+        """
+        Write hits counted in memory to database.
+        """
+        with self._lock:
+            accesses = self._accesses
+            self._accesses = {table: {} for table in CACHE_TABLES}
+            self._pending_accesses = 0
+
+        for table, table_accesses in accesses.items():
+            if table_accesses:
+                record_accesses(self.database_name, table, table_accesses)
+
+    def _refresh_in_background(
+        self, table: str, key: str, fetch: Callable[[], List[str]], ids: List[str]
+    ) -> None:
+        with self._lock:
+            if (table, key) in self._refreshing:
+                return
+            self._refreshing.add((table, key))
+            # thread of parent process doesn't exist in forked one
+            if self._refresh_executor is None or self._refresh_executor_pid != os.getpid():
+                self._refresh_executor = ThreadPoolExecutor(1)
+                self._refresh_executor_pid = os.getpid()
+            executor = self._refresh_executor
+
+        def refresh():
+            try:
+                new_ids = fetch()
+                self._save(table, key, new_ids, new_ids != ids)
+                METRICS.inc(f"db_cache.{table}.refreshed")
+            except Exception:
+                METRICS.inc(f"db_cache.{table}.refresh_failed")
+            finally:
+                with self._lock:
+                    self._refreshing.discard((table, key))
+
+        executor.submit(refresh)
+
+    def flush(self) -> None:
+        """
+        Wait for background refreshes and write counted hits.
+        """
+        with self._lock:
+            executor = self._refresh_executor if self._refresh_executor_pid == os.getpid() else None
+            self._refresh_executor = None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+        if self.policy is not None:
+            self.flush_accesses()
+
+    def close(self) -> None:
+        """
+        Wait for background refreshes, write counted hits and evict tables over limits.
+        """
+        self.flush()
+        if self.policy is not None and (self.policy.max_rows > 0 or self.policy.max_bytes > 0):
+            self._create_ancestors_table()
+            evict_cache(self.database_name, self.policy)
+
+    def get_entity_ancestors(self, entity: str, depth: int) -> EntityAncestors:
+        """
+        Read ancestor closure of ``entity`` for depth and targets from database. Missing closure, or one older
+        than TTL of policy, is computed by walk and saved next to closures of other depths or targets.
+
+        Args:
+            entity: ID of entity, Q{NUM} format.
+            depth: Number of levels.
+
+        Returns:
+            Ancestor closure of ``entity``.
+        """
+        self._create_ancestors_table()
+        config = get_ancestors_config_key(depth, TARGET_ENTITIES)
+
+        with METRICS.timer("wikidata_db.get_entity_ancestors"):
+            ancestors = get_entity_ancestors_db(self.database_name, str(entity), config, self.policy)
+
+        if ancestors is None:
+            ancestors = super().get_entity_ancestors(entity, depth)
+            add_entity_ancestors_to_data_base(self.database_name, str(entity), config, ancestors)
+
+        return ancestors
+
+
+class InMemoryWikidataAPI(WikidataAPI):
+    """
+    API over data kept in dicts - e.g. synthetic taxonomy or recorded responses. Lookups that are missing
+    in data return empty results, like lookups of unknown tokens and entities in real API.
+    """
+
+    subclasses: Dict[str, List[str]]
+    pages: Dict[str, List[str]]
+    wikipedia_titles: Dict[str, str]
+    wikipedia_contents: Dict[str, str]
+
+    def __init__(
+        self,
+        subclasses: Dict[str, List[str]],
+        pages: Dict[str, List[str]],
+        wikipedia_titles: Dict[str, str] = None,
+        wikipedia_contents: Dict[str, str] = None,
+    ):
+        self.subclasses = subclasses
+        self.pages = pages
+        self.wikipedia_titles = wikipedia_titles if wikipedia_titles is not None else {}
+        self.wikipedia_contents = wikipedia_contents if wikipedia_contents is not None else {}
+
+    def get_subclasses_for_entity(self, entity: str) -> List[str]:
+        return list(self.subclasses.get(entity, []))
+
+    def get_pages_for_token(self, token: str) -> List[str]:
+        return list(self.pages.get(token, []))
+
+    def get_wikipedia_title(self, entity: str) -> Optional[str]:
+        return self.wikipedia_titles.get(entity)
+
+    def get_wikipedia_content(self, page_title: str) -> str:
+        return self.wikipedia_contents.get(page_title, "")
+
+
+class CachedWikidataAPI(WikidataAPI):
+    """
+    Wrapper that keeps results of another API in memory, bounded LRU caches - one for subclasses and one for
+    pages. It is useful in long living processes, where the same lookups repeat.
+    """
+
+    api: WikidataAPI
+    cache_size: int
+    hits: int
+    misses: int
+
+    def __init__(self, api: WikidataAPI, cache_size: int = DEFAULT_MEMORY_CACHE_SIZE):
+        self.api = api
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._subclasses: "OrderedDict[str, List[str]]" = OrderedDict()
+        self._pages: "OrderedDict[str, List[str]]" = OrderedDict()
+        self._titles: "OrderedDict[str, Optional[str]]" = OrderedDict()
+        self._contents: "OrderedDict[str, str]" = OrderedDict()
+        self._ancestors: "OrderedDict[str, EntityAncestors]" = OrderedDict()
+        self._lock = Lock()
+
+    def __getstate__(self):
+        # lock can't be pickled, caches are not copied to other processes
+        return {"api": self.api, "cache_size": self.cache_size}
+
+    def __setstate__(self, state):
+        self.__init__(state["api"], state["cache_size"])
+
+    def _get(self, cache: OrderedDict, key: str, fun):
+        with self._lock:
+            value = cache.get(key, _MISSING)
+            if value is not _MISSING:
+                cache.move_to_end(key)
+                self.hits += 1
+                METRICS.inc("memory_cache.hit")
+                return value
+
+        value = fun(key)
+
+        with self._lock:
+            self.misses += 1
+            METRICS.inc("memory_cache.miss")
+            cache[key] = value
+            if len(cache) > self.cache_size:
+                cache.popitem(last=False)
+
+        return value
+
+    def get_subclasses_for_entity(self, entity: str) -> List[str]:
+        return self._get(self._subclasses, entity, self.api.get_subclasses_for_entity)
+
+    def get_pages_for_token(self, token: str) -> List[str]:
+        return self._get(self._pages, token, self.api.get_pages_for_token)
+
+    def get_wikipedia_title(self, entity: str) -> Optional[str]:
+        return self._get(self._titles, entity, self.api.get_wikipedia_title)
+
+    def get_wikipedia_content(self, page_title: str) -> str:
+        return self._get(self._contents, page_title, self.api.get_wikipedia_content)
+
+    def get_entity_ancestors(self, entity: str, depth: int) -> EntityAncestors:
+        # wrapped API may keep closures itself, e.g. in database
+        return self._get(
+            self._ancestors, f"{entity}:{depth}", lambda _: self.api.get_entity_ancestors(entity, depth)
+        )
+
+    def flush(self) -> None:
+        self.api.flush()
+
+    def cache_stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "subclasses": len(self._subclasses),
+            "pages": len(self._pages),
+            "wikipedia_titles": len(self._titles),
+            "wikipedia_contents": len(self._contents),
+            "ancestors": len(self._ancestors),
+        }
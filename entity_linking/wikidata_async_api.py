@@ -0,0 +1,372 @@
+"""
+Asynchronous client of Wikidata and Wikipedia. All requests go through one pooled HTTP session, number of
+requests in flight is limited and their rate is limited by token bucket. Identical lookups in flight share
+one request.
+
+WikidataAsyncAPI plugs the client into synchronous code as WikidataAPI - client runs on event loop in
+background thread, so many threads (e.g. lookup threads of linking service) can wait for it at once.
+"""
+import asyncio
+import os
+from multiprocessing.util import Finalize
+from threading import Lock, Thread
+from typing import Any, Awaitable, Dict, List, Optional, Tuple
+
+import aiohttp
+
+from entity_linking.maintenance.metrics import METRICS
+from entity_linking.utils import (DEFAULT_WEB_CONCURRENCY,
+                                  DEFAULT_WEB_RATE_LIMIT, USER_AGENT,
+                                  WIKIDATA_URL, WIKIDATA_URL_SPARQL,
+                                  WIKIPEDIA_API_URL)
+from entity_linking.wikidata_api import WikidataAPI
+from entity_linking.wikidata_web_api import (
+    create_pages_for_token_query, get_entities_from_sparql_result,
+    get_polish_wikipedia_title_from_entity_data,
+    get_subclasses_from_entity_data, is_token_searchable)
+from entity_linking.wikipedia_api import get_site_content_from_extract
+
+# default timeout of single request in seconds
+DEFAULT_WEB_TIMEOUT: float = 60.0
+
+ClientSettings = Tuple[int, float, float, Tuple[Tuple[str, Any], ...]]
+
+# event loops with clients of current process by settings of client, every process has one client per settings
+_PROCESS_CLIENTS: Dict[ClientSettings, Tuple[asyncio.AbstractEventLoop, "AsyncWikidataClient"]] = {}
+_PROCESS_CLIENTS_PID: int = -1
+_PROCESS_CLIENTS_LOCK = Lock()
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter - ``rate`` tokens per second are added to bucket of size ``capacity``,
+    every request takes one token.
+    """
+
+    def __init__(self, rate: float, capacity: float = None) -> None:
+        """
+        Set object attributes, bucket is full at the beginning.
+
+        Args:
+            rate: Number of tokens added per second, 0 - no limit.
+            capacity: Size of bucket - max burst of requests. Default: ``rate``, at least 1.
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated: Optional[float] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def acquire(self) -> None:
+        """
+        Wait for token and take it.
+        """
+        if self.rate <= 0:
+            return
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            # get_running_loop is not available in Python 3.6
+            loop = asyncio.get_event_loop()
+            while True:
+                now = loop.time()
+                if self._updated is not None:
+                    self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+
+                await asyncio.sleep((1.0 - self._tokens) / self.rate)
+
+
+class AsyncWikidataClient:
+    """
+    Asynchronous client of Wikidata and Wikipedia. Client must be used by one event loop.
+
+    Attributes:
+        requests: Number of sent requests.
+        coalesced: Number of lookups that waited for identical request in flight.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = DEFAULT_WEB_CONCURRENCY,
+        rate_limit: float = DEFAULT_WEB_RATE_LIMIT,
+        timeout: float = DEFAULT_WEB_TIMEOUT,
+        wikidata_url: str = WIKIDATA_URL,
+        sparql_url: str = WIKIDATA_URL_SPARQL,
+        wikipedia_url: str = WIKIPEDIA_API_URL,
+    ) -> None:
+        """
+        Set object attributes, session is created on first request.
+
+        Args:
+            concurrency: Max number of requests in flight.
+            rate_limit: Max number of requests per second, 0 - no limit.
+            timeout: Timeout of single request in seconds.
+            wikidata_url: Address of wikidata.
+            sparql_url: Address of wikidata SPARQL API.
+            wikipedia_url: Address of wikipedia API.
+        """
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.wikidata_url = wikidata_url
+        self.sparql_url = sparql_url
+        self.wikipedia_url = wikipedia_url
+        self.requests = 0
+        self.coalesced = 0
+        self._bucket = TokenBucket(rate_limit)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._in_flight: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], asyncio.Future] = {}
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.concurrency),
+                headers={"User-Agent": USER_AGENT},
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    async def _fetch_json(self, url: str, params: Dict[str, str]) -> Any:
+        session = self._get_session()
+        async with self._semaphore:
+            await self._bucket.acquire()
+            self.requests += 1
+            METRICS.inc("async_web.request")
+            with METRICS.timer("async_web.request"):
+                async with session.get(url, params=params) as response:
+                    # invalid or missing entity
+                    if response.status in (400, 404):
+                        return None
+                    response.raise_for_status()
+                    return await response.json(content_type=None)
+
+    async def get_json(self, url: str, params: Dict[str, str] = None) -> Any:
+        """
+        Get JSON from ``url``. Identical requests in flight are sent once.
+
+        Args:
+            url: Address of resource.
+            params: Query parameters.
+
+        Returns:
+            Parsed JSON or None for invalid or missing resource.
+        """
+        if params is None:
+            params = {}
+
+        key = (url, tuple(sorted(params.items())))
+        future = self._in_flight.get(key)
+
+        if future is None:
+            future = asyncio.ensure_future(self._fetch_json(url, params))
+            self._in_flight[key] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self.coalesced += 1
+            METRICS.inc("async_web.coalesced")
+
+        # one cancelled waiter doesn't cancel request of others
+        return await asyncio.shield(future)
+
+    async def get_entity_data(self, entity: str) -> Dict[str, Any]:
+        """
+        Args:
+            entity: ID of entity in format Q{NUM}.
+
+        Returns:
+            Entity data in wikidata JSON format, empty dict for invalid entity.
+        """
+        data = await self.get_json(f"{self.wikidata_url}Special:EntityData/{entity}.json")
+        if not data or not data.get("entities"):
+            return {}
+        # redirected entity is returned under its new ID
+        return data["entities"].get(entity, next(iter(data["entities"].values())))
+
+    async def get_subclasses_for_entity(self, entity: str) -> List[str]:
+        return get_subclasses_from_entity_data(await self.get_entity_data(entity))
+
+    async def get_pages_for_token(self, token: str) -> List[str]:
+        if not is_token_searchable(token):
+            return []
+
+        data = await self.get_json(
+            self.sparql_url, {"format": "json", "query": create_pages_for_token_query(token)}
+        )
+        return get_entities_from_sparql_result(data) if data else []
+
+    async def get_wikipedia_title(self, entity: str) -> Optional[str]:
+        return get_polish_wikipedia_title_from_entity_data(await self.get_entity_data(entity))
+
+    async def get_wikipedia_content(self, page_title: str) -> str:
+        data = await self.get_json(
+            self.wikipedia_url,
+            {
+                "action": "query",
+                "prop": "extracts",
+                "titles": page_title,
+                "explaintext": "1",
+                "exsectionformat": "wiki",
+                "format": "json",
+            },
+        )
+        if not data:
+            return ""
+
+        for page_id, page in data.get("query", {}).get("pages", {}).items():
+            if page_id != "-1":
+                return get_site_content_from_extract(page.get("extract", ""))
+        return ""
+
+    async def close(self) -> None:
+        """
+        Close HTTP session.
+        """
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+def _get_process_client(settings: ClientSettings) -> Tuple[asyncio.AbstractEventLoop, AsyncWikidataClient]:
+    """
+    Returns:
+        Event loop and client with ``settings`` of current process, created on first use. Client is closed and
+        loop is stopped at exit of process.
+    """
+    global _PROCESS_CLIENTS_PID
+
+    with _PROCESS_CLIENTS_LOCK:
+        if _PROCESS_CLIENTS_PID != os.getpid():
+            # loops of parent process don't run in forked process
+            _PROCESS_CLIENTS.clear()
+            _PROCESS_CLIENTS_PID = os.getpid()
+
+        if settings not in _PROCESS_CLIENTS:
+            concurrency, rate_limit, timeout, client_kwargs = settings
+            loop = asyncio.new_event_loop()
+            client = AsyncWikidataClient(concurrency, rate_limit, timeout, **dict(client_kwargs))
+            _PROCESS_CLIENTS[settings] = loop, client
+            Thread(target=loop.run_forever, daemon=True).start()
+            # worker exits by os._exit, so atexit doesn't run - multiprocessing finalizers do
+            Finalize(None, _close_process_client, args=(settings,), exitpriority=0)
+        return _PROCESS_CLIENTS[settings]
+
+
+def _close_process_client(settings: ClientSettings) -> None:
+    with _PROCESS_CLIENTS_LOCK:
+        if _PROCESS_CLIENTS_PID != os.getpid():
+            return
+        loop_and_client = _PROCESS_CLIENTS.pop(settings, None)
+
+    if loop_and_client is not None:
+        loop, client = loop_and_client
+        asyncio.run_coroutine_threadsafe(client.close(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+
+
+class WikidataAsyncAPI(WikidataAPI):
+    """
+    Synchronous WikidataAPI backed by AsyncWikidataClient. Event loop with client runs in background thread
+    created lazily in every process and shared by all APIs of process with the same settings, so object can
+    be sent to Pool workers.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = DEFAULT_WEB_CONCURRENCY,
+        rate_limit: float = DEFAULT_WEB_RATE_LIMIT,
+        timeout: float = DEFAULT_WEB_TIMEOUT,
+        **client_kwargs: Any,
+    ) -> None:
+        """
+        Set object attributes.
+
+        Args:
+            concurrency: Max number of requests in flight.
+            rate_limit: Max number of requests per second, 0 - no limit.
+            timeout: Timeout of single request in seconds.
+            client_kwargs: Other arguments of AsyncWikidataClient, e.g. addresses of services.
+        """
+        self.concurrency = concurrency
+        self.rate_limit = rate_limit
+        self.timeout = timeout
+        self.client_kwargs = client_kwargs
+        self._settings: ClientSettings = (concurrency, rate_limit, timeout, tuple(sorted(client_kwargs.items())))
+
+    def __getstate__(self):
+        # event loop and its thread stay in process that created them
+        return {
+            "concurrency": self.concurrency,
+            "rate_limit": self.rate_limit,
+            "timeout": self.timeout,
+            "client_kwargs": self.client_kwargs,
+        }
+
+    def __setstate__(self, state):
+        self.__init__(state["concurrency"], state["rate_limit"], state["timeout"], **state["client_kwargs"])
+
+    @property
+    def client(self) -> AsyncWikidataClient:
+        """
+        Client of current process, created with its event loop on first use.
+        """
+        return _get_process_client(self._settings)[1]
+
+    def run(self, coroutine: Awaitable) -> Any:
+        """
+        Run ``coroutine`` on event loop of client and wait for result.
+
+        Args:
+            coroutine: Coroutine of client.
+
+        Returns:
+            Result of ``coroutine``.
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, _get_process_client(self._settings)[0]).result()
+
+    def get_subclasses_for_entity(self, entity: str) -> List[str]:
+        with METRICS.timer("async_web.get_subclasses_for_entity"):
+            return self.run(self.client.get_subclasses_for_entity(str(entity)))
+
+    def get_pages_for_token(self, token: str) -> List[str]:
+        with METRICS.timer("async_web.get_pages_for_token"):
+            return self.run(self.client.get_pages_for_token(token))
+
+    def get_wikipedia_title(self, entity: str) -> Optional[str]:
+        with METRICS.timer("wikipedia.get_title"):
+            return self.run(self.client.get_wikipedia_title(str(entity)))
+
+    def get_wikipedia_content(self, page_title: str) -> str:
+        with METRICS.timer("wikipedia.get_content"):
+            return self.run(self.client.get_wikipedia_content(page_title))
+
+    def get_pages_for_tokens(self, tokens: List[str]) -> List[List[str]]:
+        """
+        Search all ``tokens`` concurrently.
+
+        Args:
+            tokens: Queries to search in wikidata base.
+
+        Returns:
+            Pages for every token, in the same order as ``tokens``.
+        """
+        client = self.client
+
+        async def gather():
+            return await asyncio.gather(*[client.get_pages_for_token(t) for t in tokens])
+
+        with METRICS.timer("async_web.get_pages_for_tokens"):
+            return list(self.run(gather()))
+
+    def close(self) -> None:
+        """
+        Close HTTP session and stop event loop of current process, otherwise they are closed at exit.
+        """
+        _close_process_client(self._settings)
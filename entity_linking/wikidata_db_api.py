@@ -3,94 +3,535 @@ Module that contains wikidata API build around sqlite3 database. It is use to ma
 saving results to future use.
 """
 
+import hashlib
 import sqlite3
-from typing import List
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Union
 
 from wikidata.entity import EntityId
 
+from entity_linking.maintenance.metrics import METRICS
+from entity_linking.qid_codec import decode_qids, encode_qids
+from entity_linking.utils import EntityAncestors
 from entity_linking.wikidata_web_api import (
     get_pages_for_token_wikidata, get_subclasses_for_entity_wikidata)
 
+# lists of IDs saved as text: Q{NUM};...Q{NUM};
+SCHEMA_VERSION_TEXT: int = 1
+# lists of IDs saved as BLOBs encoded by ``encode_qids``
+SCHEMA_VERSION_BLOB: int = 2
+# BLOBs and unique index of id of entity and token tables - row is saved by one upsert
+SCHEMA_VERSION_UNIQUE_KEYS: int = 3
+# version of databases created by create_db.py
+CURRENT_SCHEMA_VERSION: int = SCHEMA_VERSION_UNIQUE_KEYS
+
+# version of data saved in rows of entity and token tables - rows of other version are fetched again,
+# it is changed when the same lookup gives other data, e.g. subclasses are taken by other properties
+CACHE_ROW_VERSION: int = 1
+# columns of entity and token tables that describe cached row
+CACHE_COLUMNS: List[Tuple[str, str]] = [
+    ("fetched", "real"),
+    ("version", "integer"),
+    ("last_access", "real"),
+    ("hits", "integer"),
+]
+# cached table -> field with list of IDs
+CACHE_TABLES: Dict[str, str] = {"entity": "sub", "token": "pages"}
+
+# statuses of cache lookup
+CACHE_HIT: str = "hit"
+CACHE_STALE: str = "stale"
+CACHE_MISS: str = "miss"
+CACHE_INVALID: str = "invalid"
+
+# eviction policies - remove the least recently used or the least frequently used rows first
+EVICTION_LRU: str = "lru"
+EVICTION_LFU: str = "lfu"
+EVICTION_POLICIES: List[str] = [EVICTION_LRU, EVICTION_LFU]
+# default number of hits that makes stale row refreshed in background
+DEFAULT_REFRESH_MIN_HITS: int = 3
+# max number of IDs in one IN (...) query - SQLite older than 3.32 allows 999 parameters
+QUERY_IDS_BATCH_SIZE: int = 500
+
+# database path -> True if it has cache columns, read once per process
+_cache_columns: Dict[str, bool] = {}
+
+# database path -> schema version, read once per process
+_schema_versions: Dict[str, int] = {}
+
+
+def set_schema_version(conn: sqlite3.Connection, database_name: str, version: int) -> None:
+    """
+    Save schema version in meta table, create table if it doesn't exist. Caller commits.
 
-def add_entity_subclasses_to_data_base(
-    database_name: str, entity: str, subclasses: List[str]
-) -> None:
+    Args:
+        conn: Connection to database.
+        database_name: Path to database.
+        version: Schema version.
     """
-    Insert into entity table new record for ``entity``, save in sub field ``subclasses``.
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key text PRIMARY KEY, value text)")
+    conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES('schema_version', ?)", (str(version),))
+    _schema_versions[database_name] = version
+
+
+def forget_database(database_name: str) -> None:
+    """
+    Forget schema version and cache columns read from database - it was created again or replaced.
 
     Args:
         database_name: Path to database.
-        entity: Name of entity to add, Q{NUM} format.
-        subclasses: Subclasses of ``entity``.
     """
+    _schema_versions.pop(database_name, None)
+    _cache_columns.pop(database_name, None)
+
+
+def get_schema_version(database_name: str) -> int:
+    """
+    Args:
+        database_name: Path to database.
+
+    Returns:
+        Schema version of database, SCHEMA_VERSION_TEXT for databases without meta table.
+    """
+    version = _schema_versions.get(database_name)
+    if version is not None:
+        return version
 
     conn = sqlite3.connect(database_name)
-    c = conn.cursor()
+    try:
+        result = conn.execute("SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+    except sqlite3.OperationalError:
+        result = None
+    finally:
+        conn.close()
+
+    version = int(result[0]) if result is not None else SCHEMA_VERSION_TEXT
+    _schema_versions[database_name] = version
+    return version
 
-    subclasses_str = ""
-    for sub in subclasses:
-        subclasses_str += f"{sub};"
 
-    c.execute(f"""INSERT INTO entity(id, sub) VALUES('{entity}', '{subclasses_str}')""")
+def encode_ids_for_db(ids: List[str], version: int) -> Union[str, bytes]:
+    """
+    Args:
+        ids: List of IDs.
+        version: Schema version of database.
+
+    Returns:
+        Value of sub or pages field. Lists that ``encode_qids`` can't encode are saved as text in every version.
+    """
+    if version >= SCHEMA_VERSION_BLOB:
+        try:
+            return encode_qids(ids)
+        except ValueError:
+            METRICS.inc("db_cache.text_fallback")
+    return "".join(f"{x};" for x in ids)
+
+
+def _add_unique_keys(conn: sqlite3.Connection) -> Dict[str, int]:
+    removed = {}
+    for table in CACHE_TABLES:
+        # duplicates are updated together, so the last inserted one is kept
+        removed[table] = conn.execute(
+            f"DELETE FROM {table} WHERE rowid NOT IN (SELECT max(rowid) FROM {table} GROUP BY id)"
+        ).rowcount
+        conn.execute(f"DROP INDEX IF EXISTS {table}_id")
+        conn.execute(f"CREATE UNIQUE INDEX {table}_id ON {table}(id)")
+    return removed
+
+
+def add_unique_keys(database_name: str) -> Dict[str, int]:
+    """
+    Remove duplicated rows of entity and token tables, create unique index of their id and set schema
+    version to SCHEMA_VERSION_UNIQUE_KEYS. Database must have schema version SCHEMA_VERSION_BLOB.
 
-    conn.commit()
+    Args:
+        database_name: Path to database.
+
+    Returns:
+        Table name -> number of removed duplicates.
+    """
+    conn = sqlite3.connect(database_name)
+    with conn:
+        removed = _add_unique_keys(conn)
+        set_schema_version(conn, database_name, SCHEMA_VERSION_UNIQUE_KEYS)
     conn.close()
 
+    for table, rows in removed.items():
+        METRICS.inc(f"db_cache.{table}.duplicates_removed", rows)
+    return removed
 
-def get_subclasses_for_entity_db(database_name: str, entity: str) -> List[str]:
+
+def convert_database(database_name: str, vacuum: bool = True) -> Dict[str, int]:
     """
-    Check if database is entry for given entity. If so take subclasses from database, if not
-    take subclasses from Wikidata additionally adding new entry to database.
+    Convert sub and pages fields of database to BLOBs, remove duplicated rows, make keys unique and set schema
+    version to CURRENT_SCHEMA_VERSION. Conversion is done in one transaction, so interrupted conversion leaves
+    database unchanged.
 
     Args:
         database_name: Path to database.
-        entity: Name of entity, Q{NUM} format.
+        vacuum: If True, rebuild database file after conversion, so it is smaller on disk.
 
     Returns:
-        List of subclasses for ``entity``.
+        Table name -> number of rows saved as BLOB after conversion.
+    """
+
+    def to_blob(value):
+        if value is None or isinstance(value, bytes):
+            return value
+        try:
+            return encode_qids(decode_qids(value))
+        except ValueError:
+            return value
+
+    conn = sqlite3.connect(database_name)
+    conn.create_function("qids_to_blob", 1, to_blob)
+
+    result = {}
+    with conn:
+        _add_unique_keys(conn)
+        for table, field in [("entity", "sub"), ("token", "pages")]:
+            conn.execute(f"UPDATE {table} SET {field} = qids_to_blob({field})")
+            result[table] = conn.execute(f"SELECT count(*) FROM {table} WHERE typeof({field}) = 'blob'").fetchone()[0]
+        set_schema_version(conn, database_name, CURRENT_SCHEMA_VERSION)
+
+    if vacuum:
+        conn.execute("VACUUM")
+    conn.close()
+
+    return result
+
+
+@dataclass
+class CachePolicy:
+    """
+    Policy of entity and token tables of database with cache columns, see ``add_cache_columns``.
+
+    Attributes:
+        ttl: Age of row in seconds after which it is stale, 0 - rows never get stale.
+        max_rows: Max number of rows of every table, 0 - no limit.
+        max_bytes: Max size of keys and values of every table, 0 - no limit.
+        eviction: EVICTION_LRU or EVICTION_LFU - which rows are removed first when table is over limit.
+        refresh_min_hits: Stale row with at least that many hits is returned and refreshed in background,
+            less used one is fetched again before it is returned.
+    """
+
+    ttl: float = 0.0
+    max_rows: int = 0
+    max_bytes: int = 0
+    eviction: str = EVICTION_LRU
+    refresh_min_hits: int = DEFAULT_REFRESH_MIN_HITS
+
+    def __post_init__(self):
+        if self.eviction not in EVICTION_POLICIES:
+            raise ValueError(f"Unknown eviction policy: {self.eviction}, expected one of {EVICTION_POLICIES}")
+
+
+def has_cache_columns(database_name: str) -> bool:
     """
+    Args:
+        database_name: Path to database.
+
+    Returns:
+        True if entity table has cache columns - databases created before they were added have not.
+    """
+    result = _cache_columns.get(database_name)
+    if result is None:
+        conn = sqlite3.connect(database_name)
+        fields = {row[1] for row in conn.execute("PRAGMA table_info(entity)")}
+        conn.close()
+        result = _cache_columns[database_name] = all(name in fields for name, _ in CACHE_COLUMNS)
+    return result
 
+
+def add_cache_columns(database_name: str) -> None:
+    """
+    Add cache columns and key indexes to entity and token tables, if they are missing. Age of existing rows
+    is not known, so they are saved as fetched now.
+
+    Args:
+        database_name: Path to database.
+    """
+    now = time.time()
     conn = sqlite3.connect(database_name)
-    c = conn.cursor()
+    with conn:
+        for table in CACHE_TABLES:
+            fields = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            for name, field_type in CACHE_COLUMNS:
+                if name not in fields:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {field_type}")
+            conn.execute(
+                f"UPDATE {table} SET fetched = ?, version = ?, last_access = ?, hits = 0 WHERE fetched IS NULL",
+                (now, CACHE_ROW_VERSION, now),
+            )
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_id ON {table}(id)")
+    conn.close()
+    _cache_columns[database_name] = True
+
+
+def save_cached_ids(database_name: str, table: str, key: str, ids: List[str]) -> None:
+    """
+    Save ``ids`` as value of ``key`` in ``table`` - existing row of key is replaced, its hits are kept. Database
+    with unique keys saves row by one upsert, so processes that save the same key never duplicate it.
 
-    c.execute(f"SELECT sub FROM entity WHERE id = '{entity}'")
+    Args:
+        database_name: Path to database.
+        table: Name of table from CACHE_TABLES.
+        key: ID of entity or token.
+        ids: Subclasses of entity or pages of token.
+    """
+    field = CACHE_TABLES[table]
+    version = get_schema_version(database_name)
+    value = encode_ids_for_db(ids, version)
 
-    result = c.fetchone()
+    conn = sqlite3.connect(database_name)
+    with conn:
+        if version >= SCHEMA_VERSION_UNIQUE_KEYS and has_cache_columns(database_name):
+            now = time.time()
+            conn.execute(
+                f"INSERT INTO {table}(id, {field}, fetched, version, last_access, hits) VALUES(?, ?, ?, ?, ?, 0) "
+                f"ON CONFLICT(id) DO UPDATE SET {field} = excluded.{field}, fetched = excluded.fetched, "
+                f"version = excluded.version",
+                (key, value, now, CACHE_ROW_VERSION, now),
+            )
+        elif version >= SCHEMA_VERSION_UNIQUE_KEYS:
+            conn.execute(
+                f"INSERT INTO {table}(id, {field}) VALUES(?, ?) "
+                f"ON CONFLICT(id) DO UPDATE SET {field} = excluded.{field}",
+                (key, value),
+            )
+        elif has_cache_columns(database_name):
+            now = time.time()
+            updated = conn.execute(
+                f"UPDATE {table} SET {field} = ?, fetched = ?, version = ? WHERE id = ?",
+                (value, now, CACHE_ROW_VERSION, key),
+            ).rowcount
+            if not updated:
+                conn.execute(
+                    f"INSERT INTO {table}(id, {field}, fetched, version, last_access, hits) VALUES(?, ?, ?, ?, ?, 0)",
+                    (key, value, now, CACHE_ROW_VERSION, now),
+                )
+        elif not conn.execute(f"UPDATE {table} SET {field} = ? WHERE id = ?", (value, key)).rowcount:
+            conn.execute(f"INSERT INTO {table}(id, {field}) VALUES(?, ?)", (key, value))
+    conn.close()
+
+
+def lookup_cached_ids(
+    database_name: str, table: str, key: str, policy: CachePolicy = None
+) -> Tuple[Optional[List[str]], str, int]:
+    """
+    Read value of ``key`` from ``table``.
+
+    Args:
+        database_name: Path to database.
+        table: Name of table from CACHE_TABLES.
+        key: ID of entity or token.
+        policy: Policy of cache, None - rows never get stale.
+
+    Returns:
+        Tuple: value - None if row is missing or has other version, status - one of CACHE_HIT, CACHE_STALE,
+        CACHE_MISS and CACHE_INVALID, and number of hits of row.
+    """
+    field = CACHE_TABLES[table]
+    columns = has_cache_columns(database_name)
+
+    conn = sqlite3.connect(database_name)
+    select = f"{field}, fetched, version, hits" if columns else field
+    result = conn.execute(f"SELECT {select} FROM {table} WHERE id = ?", (key,)).fetchone()
     conn.close()
 
-    # no such entity in db
     if result is None:
-        sub = get_subclasses_for_entity_wikidata(EntityId(entity))
-        add_entity_subclasses_to_data_base(database_name, entity, sub)
-        return sub
-    # such entity already in db
+        status = CACHE_MISS
+    elif not columns:
+        status = CACHE_HIT
+    elif result[2] is not None and result[2] != CACHE_ROW_VERSION:
+        status = CACHE_INVALID
+    elif policy is not None and policy.ttl > 0 and time.time() - (result[1] or 0.0) > policy.ttl:
+        status = CACHE_STALE
     else:
-        return result[0].split(";")[:-1]
+        status = CACHE_HIT
 
+    METRICS.inc(f"db_cache.{table}.{status}")
+    if status in (CACHE_MISS, CACHE_INVALID):
+        return None, status, 0
+    return decode_qids(result[0]), status, (result[3] or 0) if columns else 0
 
-def add_token_pages_to_data_base(
-    database_name: str, token: str, pages: List[str]
-) -> None:
+
+def record_accesses(database_name: str, table: str, accesses: Dict[str, Tuple[int, float]]) -> None:
     """
-    Insert into token table new record for ``token``, save in pages field ``pages``.
+    Add hits and set time of last access of rows, in one transaction.
 
     Args:
-        database_name: Path to database.
-        token: Token to add - plain str.
-        pages: Pages for ``token``.
+        database_name: Path to database with cache columns.
+        table: Name of table from CACHE_TABLES.
+        accesses: Key -> number of hits and time of last hit.
+    """
+    conn = sqlite3.connect(database_name)
+    with conn:
+        conn.executemany(
+            f"UPDATE {table} SET hits = hits + ?, last_access = max(coalesce(last_access, 0), ?) WHERE id = ?",
+            [(hits, last_access, key) for key, (hits, last_access) in accesses.items()],
+        )
+    conn.close()
+
+
+def evict_cache(database_name: str, policy: CachePolicy) -> Dict[str, int]:
+    """
+    Remove rows of entity and token tables over limits of ``policy``. Rows are kept from the most recently used
+    (LRU) or the most often used (LFU) one. Closures with removed entities are removed from ancestors table,
+    which is kept within the same limits from the most recently saved closure.
+
+    Args:
+        database_name: Path to database with cache columns.
+        policy: Policy of cache.
+
+    Returns:
+        Table name -> number of removed rows.
     """
+    order = "last_access DESC" if policy.eviction == EVICTION_LRU else "hits DESC, last_access DESC"
+    removed = {}
 
     conn = sqlite3.connect(database_name)
-    c = conn.cursor()
+    with conn:
+        for table, field in CACHE_TABLES.items():
+            removed[table] = 0
+            evicted_ids = []
+            if policy.max_rows > 0:
+                evicted_ids += _delete_rows(
+                    conn, table, f"SELECT rowid FROM {table} ORDER BY {order}, rowid DESC LIMIT -1 OFFSET ?",
+                    (policy.max_rows,),
+                )
+            if policy.max_bytes > 0:
+                evicted_ids += _delete_rows(
+                    conn, table, f"SELECT rowid FROM (SELECT rowid, "
+                    f"sum(length(id) + coalesce(length({field}), 0)) OVER (ORDER BY {order}, rowid DESC) AS total "
+                    f"FROM {table}) WHERE total > ?",
+                    (policy.max_bytes,),
+                )
+            removed[table] = len(evicted_ids)
+            METRICS.inc(f"db_cache.{table}.evicted", removed[table])
+            if table == "entity":
+                _invalidate_ancestors(conn, evicted_ids)
+
+        removed["ancestors"] = 0
+        if _has_ancestors_table(conn):
+            if policy.max_rows > 0:
+                removed["ancestors"] += _delete_closures(conn, conn.execute(
+                    "SELECT id, config FROM ancestors ORDER BY rowid DESC LIMIT -1 OFFSET ?", (policy.max_rows,)
+                ).fetchall())
+            if policy.max_bytes > 0:
+                removed["ancestors"] += _delete_closures(conn, conn.execute(
+                    "SELECT id, config FROM (SELECT id, config, sum(length(id) + length(config) + "
+                    "length(edges) + length(targets)) OVER (ORDER BY rowid DESC) AS total FROM ancestors) "
+                    "WHERE total > ?",
+                    (policy.max_bytes,),
+                ).fetchall())
+            METRICS.inc("db_cache.ancestors.evicted", removed["ancestors"])
+    conn.close()
+
+    return removed
+
+
+def _delete_rows(conn: sqlite3.Connection, table: str, rowids_query: str, params: Tuple) -> List[str]:
+    ids = [row[0] for row in conn.execute(f"SELECT id FROM {table} WHERE rowid IN ({rowids_query})", params)]
+    conn.execute(f"DELETE FROM {table} WHERE rowid IN ({rowids_query})", params)
+    return ids
+
+
+def _has_ancestors_table(conn: sqlite3.Connection) -> bool:
+    query = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ancestors_member'"
+    return conn.execute(query).fetchone() is not None
+
+
+def _delete_closures(conn: sqlite3.Connection, keys: List[Tuple[str, str]]) -> int:
+    conn.executemany("DELETE FROM ancestors WHERE id = ? AND config = ?", keys)
+    conn.executemany("DELETE FROM ancestors_member WHERE id = ? AND config = ?", keys)
+    return len(keys)
+
+
+def _invalidate_ancestors(conn: sqlite3.Connection, entities: List[str]) -> int:
+    if not entities or not _has_ancestors_table(conn):
+        return 0
+
+    entities = list(set(entities))
+    keys = set()
+    for start in range(0, len(entities), QUERY_IDS_BATCH_SIZE):
+        batch = entities[start:start + QUERY_IDS_BATCH_SIZE]
+        keys.update(conn.execute(
+            f"SELECT id, config FROM ancestors_member WHERE entity IN ({', '.join('?' * len(batch))})", batch
+        ))
+
+    removed = _delete_closures(conn, sorted(keys))
+    METRICS.inc("db_cache.ancestors.invalidated", removed)
+    return removed
 
-    pages_str = ""
-    for page in pages:
-        pages_str += f"{page};"
 
-    c.execute(f"""INSERT INTO token(id, pages) VALUES('{token}', '{pages_str}')""")
+def invalidate_ancestors(database_name: str, entities: List[str]) -> int:
+    """
+    Remove closures computed from rows of any of ``entities`` from ancestors table - these rows changed
+    or were removed. Closures are found by ancestors_member table.
+
+    Args:
+        database_name: Path to database.
+        entities: IDs of entities, Q{NUM} format.
 
-    conn.commit()
+    Returns:
+        Number of removed closures.
+    """
+    conn = sqlite3.connect(database_name)
+    with conn:
+        removed = _invalidate_ancestors(conn, entities)
     conn.close()
+    return removed
+
+
+def add_entity_subclasses_to_data_base(
+    database_name: str, entity: str, subclasses: List[str]
+) -> None:
+    """
+    Save in entity table record for ``entity``, save in sub field ``subclasses``.
+
+    Args:
+        database_name: Path to database.
+        entity: Name of entity to add, Q{NUM} format.
+        subclasses: Subclasses of ``entity``.
+    """
+    save_cached_ids(database_name, "entity", entity, subclasses)
+
+
+def get_subclasses_for_entity_db(database_name: str, entity: str) -> List[str]:
+    """
+    Check if database is entry for given entity. If so take subclasses from database, if not
+    take subclasses from Wikidata additionally adding new entry to database.
+
+    Args:
+        database_name: Path to database.
+        entity: Name of entity, Q{NUM} format.
+
+    Returns:
+        List of subclasses for ``entity``.
+    """
+    sub, _, _ = lookup_cached_ids(database_name, "entity", str(entity))
+
+    # no such entity in db
+    if sub is None:
+        sub = get_subclasses_for_entity_wikidata(EntityId(entity))
+        add_entity_subclasses_to_data_base(database_name, str(entity), sub)
+    return sub
+
+
+def add_token_pages_to_data_base(
+    database_name: str, token: str, pages: List[str]
+) -> None:
+    """
+    Save in token table record for ``token``, save in pages field ``pages``.
+
+    Args:
+        database_name: Path to database.
+        token: Token to add - plain str.
+        pages: Pages for ``token``.
+    """
+    save_cached_ids(database_name, "token", token, pages)
 
 
 def get_pages_for_token_db(database_name: str, token: str) -> List[str]:
@@ -105,24 +546,173 @@ def get_pages_for_token_db(database_name: str, token: str) -> List[str]:
     Returns:
         List of pages for ``token``.
     """
-    # this two sign cause db errors!
-    if "'" in token or "\\" in token:
+    pages, _, _ = lookup_cached_ids(database_name, "token", token)
+
+    # no such token in db
+    if pages is None:
         pages = get_pages_for_token_wikidata(token)
-        return pages
+        add_token_pages_to_data_base(database_name, token, pages)
+    return pages
 
+
+def get_ancestors_config_key(depth: int, targets: List[str]) -> str:
+    """
+    Get key of configuration used to compute ancestors - stored ancestors with other key are not valid.
+
+    Args:
+        depth: Max depth of ancestor closure.
+        targets: Target entities.
+
+    Returns:
+        Configuration key.
+    """
+    targets_hash = hashlib.sha1(";".join(sorted(targets)).encode()).hexdigest()[:16]
+    return f"{depth}:{targets_hash}"
+
+
+def _parse_edges(edges_str: str) -> List[Tuple[str, str, int]]:
+    # edges are in format {LEVEL}:Q{NUM}:Q{NUM};...
+    edges = []
+    for edge in edges_str.split(";")[:-1]:
+        level, source, target = edge.split(":")
+        edges.append((source, target, int(level)))
+    return edges
+
+
+def _get_closure_members(entity: str, config: str, edges: List[Tuple[str, str, int]]) -> List[str]:
+    # members are entities whose subclasses were read by walk - targets of the last level are not expanded;
+    # config of unknown format gives all entities of closure
+    depth_str = config.split(":")[0]
+    depth = int(depth_str) if depth_str.isdigit() else None
+    members = {entity}
+    for source, target, level in edges:
+        members.add(source)
+        if depth is None or level < depth - 1:
+            members.add(target)
+    return sorted(members)
+
+
+def _get_closure_fetched(conn: sqlite3.Connection, database_name: str, members: List[str]) -> float:
+    # closure is as old as the oldest row it was computed from
+    fetched = time.time()
+    if not has_cache_columns(database_name):
+        return fetched
+    for start in range(0, len(members), QUERY_IDS_BATCH_SIZE):
+        batch = members[start:start + QUERY_IDS_BATCH_SIZE]
+        oldest = conn.execute(
+            f"SELECT min(coalesce(fetched, 0)) FROM entity WHERE id IN ({', '.join('?' * len(batch))})", batch
+        ).fetchone()[0]
+        if oldest is not None:
+            fetched = min(fetched, oldest)
+    return fetched
+
+
+def create_ancestors_table(database_name: str) -> None:
+    """
+    Create ancestors and ancestors_member tables if they don't exist - databases created before they were added
+    have no such tables. Table of older databases, with ``id`` key only, is created again with ``(id, config)``
+    key and its rows are copied. Fetch time and members of existing closures are computed from their edges.
+
+    Args:
+        database_name: Path to database.
+    """
     conn = sqlite3.connect(database_name)
-    c = conn.cursor()
+    with conn:
+        columns = sorted(conn.execute("PRAGMA table_info(ancestors)"), key=lambda r: r[5])
+        key = [row[1] for row in columns if row[5]]
+        has_members = _has_ancestors_table(conn)
+        if key == ["id"]:
+            conn.execute("ALTER TABLE ancestors RENAME TO ancestors_old")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS ancestors "
+            "(id text, config text, edges text, targets text, fetched real, PRIMARY KEY (id, config))"
+        )
+        if key == ["id"]:
+            conn.execute(
+                "INSERT INTO ancestors(id, config, edges, targets) SELECT id, config, edges, targets FROM ancestors_old"
+            )
+            conn.execute("DROP TABLE ancestors_old")
+        elif columns and "fetched" not in {row[1] for row in columns}:
+            conn.execute("ALTER TABLE ancestors ADD COLUMN fetched real")
+
+        if not has_members:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS ancestors_member "
+                "(entity text, id text, config text, PRIMARY KEY (entity, id, config))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ancestors_member_closure ON ancestors_member(id, config)")
+            for entity, config, edges_str in conn.execute("SELECT id, config, edges FROM ancestors").fetchall():
+                members = _get_closure_members(entity, config, _parse_edges(edges_str))
+                conn.executemany(
+                    "INSERT OR IGNORE INTO ancestors_member(entity, id, config) VALUES(?, ?, ?)",
+                    [(member, entity, config) for member in members],
+                )
+                conn.execute(
+                    "UPDATE ancestors SET fetched = ? WHERE id = ? AND config = ? AND fetched IS NULL",
+                    (_get_closure_fetched(conn, database_name, members), entity, config),
+                )
+    conn.close()
 
-    c.execute(f"SELECT pages FROM token WHERE id = '{token}'")
 
-    result = c.fetchone()
+def add_entity_ancestors_to_data_base(
+    database_name: str, entity: str, config: str, ancestors: EntityAncestors
+) -> None:
+    """
+    Insert or replace record of ``entity`` and ``config`` in ancestors table. Edges are saved in format
+    {LEVEL}:Q{NUM}:Q{NUM};... and targets in format Q{NUM};...Q{NUM}; Entities whose subclasses were read by walk
+    are saved in ancestors_member table, and fetch time of the oldest of their rows is fetch time of closure.
+
+    Args:
+        database_name: Path to database.
+        entity: Name of entity, Q{NUM} format.
+        config: Configuration key from ``get_ancestors_config_key``.
+        ancestors: Ancestor closure of ``entity``.
+    """
+    edges_str = "".join(f"{level}:{source}:{target};" for source, target, level in ancestors.edges)
+    targets_str = "".join(f"{target};" for target in ancestors.targets)
+    members = _get_closure_members(entity, config, ancestors.edges)
+
+    conn = sqlite3.connect(database_name)
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO ancestors(id, config, edges, targets, fetched) VALUES(?, ?, ?, ?, ?)",
+            (entity, config, edges_str, targets_str, _get_closure_fetched(conn, database_name, members)),
+        )
+        conn.execute("DELETE FROM ancestors_member WHERE id = ? AND config = ?", (entity, config))
+        conn.executemany(
+            "INSERT INTO ancestors_member(entity, id, config) VALUES(?, ?, ?)",
+            [(member, entity, config) for member in members],
+        )
+    conn.close()
+
+
+def get_entity_ancestors_db(
+    database_name: str, entity: str, config: str, policy: CachePolicy = None
+) -> Optional[EntityAncestors]:
+    """
+    Read ancestor closure of ``entity`` from ancestors table in one query.
+
+    Args:
+        database_name: Path to database.
+        entity: Name of entity, Q{NUM} format.
+        config: Configuration key from ``get_ancestors_config_key``.
+        policy: Policy of cache, None - closures never get stale.
+
+    Returns:
+        Ancestor closure or None if it is missing for ``config`` or stale - it has to be computed again.
+    """
+    conn = sqlite3.connect(database_name)
+    result = conn.execute(
+        "SELECT edges, targets, fetched FROM ancestors WHERE id = ? AND config = ?", (entity, config)
+    ).fetchone()
     conn.close()
 
-    # no such token in db
     if result is None:
-        pages = get_pages_for_token_wikidata(token)
-        add_token_pages_to_data_base(database_name, token, pages)
-        return pages
-    # such token already in db
-    else:
-        return result[0].split(";")[:-1]
+        METRICS.inc("db_cache.ancestors.miss")
+        return None
+    if policy is not None and policy.ttl > 0 and time.time() - (result[2] or 0.0) > policy.ttl:
+        METRICS.inc("db_cache.ancestors.stale")
+        return None
+
+    METRICS.inc("db_cache.ancestors.hit")
+    return EntityAncestors(_parse_edges(result[0]), result[1].split(";")[:-1])
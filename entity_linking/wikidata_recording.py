@@ -0,0 +1,324 @@
+"""
+Record and replay of Wikidata API. Recording wrapper logs every lookup and its result to gzip file with JSON
+lines, replay API serves logged results with simulated latency - classification run can be repeated offline,
+with the same results, and its timing doesn't depend on network.
+
+SPARQL reachability of candidates is recorded and replayed by RecordingReachability and ReplayReachability.
+
+Every process writes its own part file <file_name>.part-<pid>, because Pool workers record at the same time.
+Parts are joined into <file_name> by ``merge_recordings``, replay reads both the file and not merged parts.
+"""
+import glob
+import gzip
+import json
+import os
+import random
+import time
+import zlib
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from entity_linking.maintenance.metrics import METRICS
+from entity_linking.reachability import ReachabilityBackend, TargetDistances
+from entity_linking.utils import TARGET_ENTITIES, EntityAncestors
+from entity_linking.wikidata_api import WikidataAPI
+from entity_linking.wikidata_db_api import get_ancestors_config_key
+
+# kinds of recorded lookups
+RECORD_SUBCLASSES: str = "s"
+RECORD_PAGES: str = "p"
+RECORD_WIKIPEDIA_TITLE: str = "t"
+RECORD_WIKIPEDIA_CONTENT: str = "c"
+RECORD_REACHABILITY: str = "r"
+RECORD_ANCESTORS: str = "a"
+
+
+def get_reachability_key(entity: str, max_depth: int) -> str:
+    """
+    Args:
+        entity: ID of candidate entity, Q{NUM} format.
+        max_depth: Max length of path.
+
+    Returns:
+        Key of recorded reachable targets of ``entity``.
+    """
+    return f"{entity}:{max_depth}"
+
+
+def get_ancestors_key(entity: str, depth: int) -> str:
+    """
+    Args:
+        entity: ID of entity, Q{NUM} format.
+        depth: Number of levels.
+
+    Returns:
+        Key of recorded ancestor closure of ``entity``, closures of other targets are not valid.
+    """
+    return f"{entity}:{get_ancestors_config_key(depth, TARGET_ENTITIES)}"
+
+
+def get_recording_part_name(file_name: str, pid: Union[int, str]) -> str:
+    """
+    Args:
+        file_name: Name of recording file.
+        pid: ID of process or glob pattern.
+
+    Returns:
+        Name of part file written by process ``pid``.
+    """
+    return f"{file_name}.part-{pid}"
+
+
+def read_recording_file(file_name: str) -> Dict[Tuple[str, str], Any]:
+    """
+    Read records from one recording file. File of killed process may be not finished - records written
+    before the end of file are read.
+
+    Args:
+        file_name: Name of recording file or part.
+
+    Returns:
+        Dict (kind, key) -> recorded value.
+    """
+    records = {}
+
+    with gzip.open(file_name, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                try:
+                    kind, key, value = json.loads(line)
+                except ValueError:
+                    # last line of not finished file
+                    break
+                records[(kind, key)] = value
+        except (EOFError, zlib.error):
+            pass
+
+    return records
+
+
+def load_recording(file_name: str) -> Dict[Tuple[str, str], Any]:
+    """
+    Read records from recording file and from all its not merged parts.
+
+    Args:
+        file_name: Name of recording file.
+
+    Returns:
+        Dict (kind, key) -> recorded value.
+    """
+    records = {}
+    for name in [file_name] + sorted(glob.glob(get_recording_part_name(glob.escape(file_name), "*"))):
+        if os.path.isfile(name):
+            records.update(read_recording_file(name))
+    return records
+
+
+def merge_recordings(file_name: str) -> int:
+    """
+    Join recording file and its parts into one file ``file_name`` and remove parts.
+
+    Args:
+        file_name: Name of recording file.
+
+    Returns:
+        Number of records in joined file.
+    """
+    parts = glob.glob(get_recording_part_name(glob.escape(file_name), "*"))
+    records = load_recording(file_name)
+
+    tmp_name = f"{file_name}.tmp"
+    with gzip.open(tmp_name, "wt", encoding="utf-8") as f:
+        for (kind, key), value in records.items():
+            f.write(json.dumps([kind, key, value], ensure_ascii=False) + "\n")
+    os.replace(tmp_name, file_name)
+
+    for part in parts:
+        os.remove(part)
+
+    return len(records)
+
+
+class RecordingWikidataAPI(WikidataAPI):
+    """
+    Wrapper that passes lookups to another API and logs them. The same lookup is logged only once
+    by every process.
+    """
+
+    api: WikidataAPI
+    file_name: str
+
+    def __init__(self, api: WikidataAPI, file_name: str):
+        self.api = api
+        self.file_name = file_name
+        self._file: Any = None
+        self._file_pid = -1
+        self._recorded = set()
+        self._lock = Lock()
+
+    def __getstate__(self):
+        # open file and lock can't be pickled, every process writes its own part
+        return {"api": self.api, "file_name": self.file_name}
+
+    def __setstate__(self, state):
+        self.__init__(state["api"], state["file_name"])
+
+    def _record(self, kind: str, key: str, value: Any) -> None:
+        with self._lock:
+            if (kind, key) in self._recorded and self._file_pid == os.getpid():
+                return
+
+            if self._file is None or self._file_pid != os.getpid():
+                # file opened by parent process is not used by forked one
+                self._file = gzip.open(
+                    get_recording_part_name(self.file_name, os.getpid()), "at", encoding="utf-8"
+                )
+                self._file_pid = os.getpid()
+                self._recorded = set()
+
+            self._file.write(json.dumps([kind, key, value], ensure_ascii=False) + "\n")
+            # workers are terminated by Pool, so every record is flushed to make it readable
+            self._file.flush()
+            self._recorded.add((kind, key))
+
+    def get_subclasses_for_entity(self, entity: str) -> List[str]:
+        result = self.api.get_subclasses_for_entity(entity)
+        self._record(RECORD_SUBCLASSES, str(entity), result)
+        return result
+
+    def get_pages_for_token(self, token: str) -> List[str]:
+        result = self.api.get_pages_for_token(token)
+        self._record(RECORD_PAGES, token, result)
+        return result
+
+    def get_wikipedia_title(self, entity: str) -> Optional[str]:
+        result = self.api.get_wikipedia_title(entity)
+        self._record(RECORD_WIKIPEDIA_TITLE, str(entity), result)
+        return result
+
+    def get_wikipedia_content(self, page_title: str) -> str:
+        result = self.api.get_wikipedia_content(page_title)
+        self._record(RECORD_WIKIPEDIA_CONTENT, page_title, result)
+        return result
+
+    def get_entity_ancestors(self, entity: str, depth: int) -> EntityAncestors:
+        # wrapped API may read closure without subclasses lookups, so closure is recorded too
+        result = self.api.get_entity_ancestors(entity, depth)
+        self._record(RECORD_ANCESTORS, get_ancestors_key(str(entity), depth), [result.edges, result.targets])
+        return result
+
+    def flush(self) -> None:
+        self.api.flush()
+
+    def close(self) -> None:
+        """
+        Close part file of current process.
+        """
+        with self._lock:
+            if self._file is not None and self._file_pid == os.getpid():
+                self._file.close()
+            self._file = None
+
+
+class ReplayWikidataAPI(WikidataAPI):
+    """
+    API that serves lookups from recording. Every lookup waits ``latency`` seconds plus random time up to
+    ``jitter`` seconds, to simulate network. Lookups that were not recorded return empty results or raise
+    KeyError in strict mode.
+
+    Attributes:
+        misses: Number of lookups that were not recorded.
+    """
+
+    file_name: str
+    latency: float
+    jitter: float
+    strict: bool
+    misses: int
+
+    def __init__(
+        self, file_name: str, latency: float = 0.0, jitter: float = 0.0, strict: bool = False
+    ):
+        self.file_name = file_name
+        self.latency = latency
+        self.jitter = jitter
+        self.strict = strict
+        self.misses = 0
+        self._records = load_recording(file_name)
+        self._random = random.Random(0)
+
+    def _replay(self, kind: str, key: str, default: Any) -> Any:
+        delay = self.latency + (self._random.uniform(0.0, self.jitter) if self.jitter > 0 else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+        try:
+            value = self._records[(kind, key)]
+        except KeyError:
+            self.misses += 1
+            METRICS.inc("replay.miss")
+            if self.strict:
+                raise KeyError(f"Lookup {kind}:{key} is not recorded in {self.file_name}!")
+            return default
+
+        METRICS.inc("replay.hit")
+        return value
+
+    def get_subclasses_for_entity(self, entity: str) -> List[str]:
+        return list(self._replay(RECORD_SUBCLASSES, str(entity), []))
+
+    def get_pages_for_token(self, token: str) -> List[str]:
+        return list(self._replay(RECORD_PAGES, token, []))
+
+    def get_wikipedia_title(self, entity: str) -> Optional[str]:
+        return self._replay(RECORD_WIKIPEDIA_TITLE, str(entity), None)
+
+    def get_wikipedia_content(self, page_title: str) -> str:
+        return self._replay(RECORD_WIKIPEDIA_CONTENT, page_title, "")
+
+    def get_entity_ancestors(self, entity: str, depth: int) -> EntityAncestors:
+        key = get_ancestors_key(str(entity), depth)
+        if (RECORD_ANCESTORS, key) not in self._records:
+            # recordings without closures have subclasses of every walked entity
+            return super().get_entity_ancestors(entity, depth)
+
+        edges, targets = self._replay(RECORD_ANCESTORS, key, None)
+        return EntityAncestors([tuple(edge) for edge in edges], targets)
+
+
+class RecordingReachability(ReachabilityBackend):
+    """
+    Wrapper that passes reachability of candidates to another backend and logs results with recording API,
+    so replayed run filters out the same pages.
+    """
+
+    backend: ReachabilityBackend
+    recorder: RecordingWikidataAPI
+
+    def __init__(self, backend: ReachabilityBackend, recorder: RecordingWikidataAPI):
+        self.backend = backend
+        self.recorder = recorder
+
+    def get_reachable_targets(self, entities: List[str], max_depth: int) -> Dict[str, TargetDistances]:
+        result = self.backend.get_reachable_targets(entities, max_depth)
+        for entity, distances in result.items():
+            self.recorder._record(RECORD_REACHABILITY, get_reachability_key(entity, max_depth), distances)
+        return result
+
+
+class ReplayReachability(ReachabilityBackend):
+    """
+    Backend that serves reachability of candidates from recording of replay API. Not recorded candidate
+    has no reachable target.
+    """
+
+    api: ReplayWikidataAPI
+
+    def __init__(self, api: ReplayWikidataAPI):
+        self.api = api
+
+    def get_reachable_targets(self, entities: List[str], max_depth: int) -> Dict[str, TargetDistances]:
+        return {
+            str(entity): dict(self.api._replay(RECORD_REACHABILITY, get_reachability_key(str(entity), max_depth), {}))
+            for entity in entities
+        }
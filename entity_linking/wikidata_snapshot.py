@@ -0,0 +1,262 @@
+"""
+Read-only snapshot of cache database. ``export_snapshot`` freezes entity and token tables into one file,
+WikidataSnapshotAPI serves lookups from it through mmap - the file is not copied to process memory, so Pool
+workers share its pages through page cache and lookups take no lock and run no query.
+
+File layout, all integers little-endian uint64:
+    header: MAGIC, then number of records and offset of section for entity and token table
+    section: hashes of keys, sorted; 2 * number + 1 offsets; records
+Record i is key from offsets[2i] to offsets[2i + 1] and value from offsets[2i + 1] to offsets[2i + 2].
+Value is list of IDs encoded by ``encode_qids`` or, for lists it can't encode, SNAPSHOT_TEXT byte and text.
+"""
+import hashlib
+import mmap
+import os
+import sqlite3
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from entity_linking.maintenance.metrics import METRICS
+from entity_linking.qid_codec import decode_qids, encode_qids
+from entity_linking.wikidata_api import WikidataAPI
+
+# first bytes of snapshot file, the last byte is format version
+SNAPSHOT_MAGIC: bytes = b"ELSNAP\x00\x01"
+# first byte of value saved as text
+SNAPSHOT_TEXT: int = 0
+
+# sections of snapshot - table and its key and value fields
+SNAPSHOT_SECTIONS: List[Tuple[str, str, str]] = [("entity", "id", "sub"), ("token", "id", "pages")]
+
+_HEADER_SIZE = len(SNAPSHOT_MAGIC) + 16 * len(SNAPSHOT_SECTIONS)
+
+
+def get_key_hash(key: bytes) -> int:
+    """
+    Args:
+        key: Key of record, UTF-8 encoded.
+
+    Returns:
+        64-bit hash of key, the same in every process - unlike ``hash``.
+    """
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+
+
+def encode_snapshot_value(value: Any) -> bytes:
+    """
+    Args:
+        value: Value of sub or pages field - text or BLOB.
+
+    Returns:
+        Value saved in snapshot.
+    """
+    ids = decode_qids(value)
+    try:
+        return encode_qids(ids)
+    except ValueError:
+        return bytes([SNAPSHOT_TEXT]) + "".join(f"{x};" for x in ids).encode()
+
+
+def decode_snapshot_value(value: memoryview) -> List[str]:
+    """
+    Args:
+        value: Value saved in snapshot.
+
+    Returns:
+        List of IDs.
+    """
+    if value[0] == SNAPSHOT_TEXT:
+        return decode_qids(bytes(value[1:]).decode())
+    return decode_qids(value)
+
+
+def _write_section(f, records: Dict[bytes, bytes]) -> None:
+    entries = sorted((get_key_hash(key), key, value) for key, value in records.items())
+
+    hashes = np.array([h for h, _, _ in entries], dtype="<u8")
+    offsets = np.zeros(2 * len(entries) + 1, dtype="<u8")
+    position = f.tell() + hashes.nbytes + offsets.nbytes
+    offsets[0] = position
+    for x, (_, key, value) in enumerate(entries):
+        position += len(key)
+        offsets[2 * x + 1] = position
+        position += len(value)
+        offsets[2 * x + 2] = position
+
+    f.write(hashes.tobytes())
+    f.write(offsets.tobytes())
+    for _, key, value in entries:
+        f.write(key)
+        f.write(value)
+
+
+def export_snapshot(database_name: str, snapshot_name: str) -> Dict[str, int]:
+    """
+    Write snapshot of entity and token tables. Snapshot is written to temporary file and renamed, so
+    processes that read old snapshot are not affected.
+
+    Args:
+        database_name: Path to database.
+        snapshot_name: Path to snapshot file.
+
+    Returns:
+        Table name -> number of records in snapshot.
+    """
+    conn = sqlite3.connect(database_name)
+    sections = []
+    try:
+        for table, key_field, value_field in SNAPSHOT_SECTIONS:
+            records: Dict[bytes, bytes] = {}
+            for key, value in conn.execute(f"SELECT {key_field}, {value_field} FROM {table} ORDER BY rowid"):
+                # the first record of duplicated key is returned by database lookups too
+                records.setdefault(key.encode(), encode_snapshot_value(value))
+            sections.append(records)
+    finally:
+        conn.close()
+
+    tmp_name = f"{snapshot_name}.tmp"
+    with open(tmp_name, "wb") as f:
+        f.write(b"\x00" * _HEADER_SIZE)
+        header = [SNAPSHOT_MAGIC]
+        for records in sections:
+            # sections start at 8 bytes boundary, so arrays are aligned
+            f.write(b"\x00" * (-f.tell() % 8))
+            header.append(np.array([len(records), f.tell()], dtype="<u8").tobytes())
+            _write_section(f, records)
+        f.seek(0)
+        f.write(b"".join(header))
+    os.replace(tmp_name, snapshot_name)
+
+    return {table: len(records) for (table, _, _), records in zip(SNAPSHOT_SECTIONS, sections)}
+
+
+def is_snapshot_file(file_name: str) -> bool:
+    """
+    Returns:
+        True if ``file_name`` is snapshot, False for database or missing file.
+    """
+    try:
+        with open(file_name, "rb") as f:
+            return f.read(len(SNAPSHOT_MAGIC)) == SNAPSHOT_MAGIC
+    except OSError:
+        return False
+
+
+class SnapshotSection:
+    """
+    Sorted hash table of one section, arrays are views of mapped file.
+    """
+
+    def __init__(self, buffer: mmap.mmap, count: int, offset: int):
+        self._buffer = memoryview(buffer)
+        self.hashes = np.frombuffer(buffer, dtype="<u8", count=count, offset=offset)
+        self.offsets = np.frombuffer(buffer, dtype="<u8", count=2 * count + 1, offset=offset + 8 * count)
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def get(self, key: str) -> Optional[memoryview]:
+        """
+        Returns:
+            Value of ``key`` - view of mapped file, or None if there is no such key.
+        """
+        encoded = key.encode()
+        key_hash = np.uint64(get_key_hash(encoded))
+        x = int(np.searchsorted(self.hashes, key_hash))
+
+        # keys with the same hash are next to each other
+        while x < len(self.hashes) and self.hashes[x] == key_hash:
+            start, middle, end = (int(o) for o in self.offsets[2 * x : 2 * x + 3])
+            if self._buffer[start:middle] == encoded:
+                return self._buffer[middle:end]
+            x += 1
+        return None
+
+    def release(self) -> None:
+        self._buffer.release()
+
+
+class WikidataSnapshotAPI(WikidataAPI):
+    """
+    API that serves subclasses and pages from snapshot. Lookups missing in snapshot go to ``fallback``
+    API if it is given, else they return empty list. Snapshot is never changed.
+
+    Attributes:
+        misses: Number of lookups missing in snapshot.
+    """
+
+    snapshot_name: str
+    fallback: Optional[WikidataAPI]
+    misses: int
+
+    def __init__(self, snapshot_name: str, fallback: WikidataAPI = None):
+        self.snapshot_name = snapshot_name
+        self.fallback = fallback
+        self.misses = 0
+
+        with open(snapshot_name, "rb") as f:
+            self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._buffer[: len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            self._buffer.close()
+            raise ValueError(f"{snapshot_name} is not snapshot file")
+
+        header = np.frombuffer(self._buffer, dtype="<u8", count=2 * len(SNAPSHOT_SECTIONS), offset=len(SNAPSHOT_MAGIC))
+        self._entity, self._token = [
+            SnapshotSection(self._buffer, int(header[2 * x]), int(header[2 * x + 1]))
+            for x in range(len(SNAPSHOT_SECTIONS))
+        ]
+
+    def __getstate__(self):
+        # mapping can't be pickled, worker maps the same file and shares its pages
+        return {"snapshot_name": self.snapshot_name, "fallback": self.fallback}
+
+    def __setstate__(self, state):
+        self.__init__(state["snapshot_name"], state["fallback"])
+
+    def __len__(self) -> int:
+        return len(self._entity) + len(self._token)
+
+    def _lookup(self, section: SnapshotSection, kind: str, key: str, fetch) -> List[str]:
+        value = section.get(key)
+        if value is not None:
+            METRICS.inc(f"snapshot.{kind}.hit")
+            return decode_snapshot_value(value)
+
+        METRICS.inc(f"snapshot.{kind}.miss")
+        self.misses += 1
+        return fetch(key) if self.fallback is not None else []
+
+    def get_subclasses_for_entity(self, entity: str) -> List[str]:
+        with METRICS.timer("wikidata_snapshot.get_subclasses_for_entity"):
+            return self._lookup(
+                self._entity, "entity", str(entity), lambda x: self.fallback.get_subclasses_for_entity(x)
+            )
+
+    def get_pages_for_token(self, token: str) -> List[str]:
+        with METRICS.timer("wikidata_snapshot.get_pages_for_token"):
+            return self._lookup(self._token, "token", token, lambda x: self.fallback.get_pages_for_token(x))
+
+    def get_wikipedia_title(self, entity: str) -> Optional[str]:
+        if self.fallback is not None:
+            return self.fallback.get_wikipedia_title(entity)
+        return super().get_wikipedia_title(entity)
+
+    def get_wikipedia_content(self, page_title: str) -> str:
+        if self.fallback is not None:
+            return self.fallback.get_wikipedia_content(page_title)
+        return super().get_wikipedia_content(page_title)
+
+    def flush(self) -> None:
+        if self.fallback is not None:
+            self.fallback.flush()
+
+    def close(self) -> None:
+        """
+        Unmap snapshot file. Arrays of sections must not be used after it.
+        """
+        del self._entity.hashes, self._entity.offsets, self._token.hashes, self._token.offsets
+        self._entity.release()
+        self._token.release()
+        self._buffer.close()
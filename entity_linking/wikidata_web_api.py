@@ -102,42 +102,21 @@ def get_data_for_given_entity(entity: EntityId) -> Dict[str, Any]:
     }
 
 
-def get_subclasses_for_entity_wikidata(entity: EntityId) -> List:
+def get_subclasses_from_entity_data(entity_data: Dict[str, Any]) -> List[str]:
     """
-    Get data using Wikidata library and only instance of part.
+    Take "instance of", "subclass of" and "facet of" values from entity data.
 
     Args:
-        entity: Name of entity, in format Q{Number}.
+        entity_data: Entity data in wikidata JSON format.
 
     Returns:
-       List of "instance of" and "subclass of" for entity.
+       List of "instance of", "subclass of" and "facet of" for entity.
     """
-    # load data
-    client = Client()
-    entity = client.get(entity, load=True)
-    entity_data = entity.data
-
     instance_of = []
     if "claims" in entity_data:
-        # take instance of entity
-        if ID_INSTANCE_OF in entity_data["claims"]:
-            for _, obj in enumerate(entity_data["claims"][ID_INSTANCE_OF]):
-                mainsnak = obj["mainsnak"]
-                if mainsnak["snaktype"] != "novalue":
-                    if "datavalue" in mainsnak:
-                        instance_of.append(mainsnak["datavalue"]["value"]["id"])
-
-        # take subclass of entity
-        if ID_SUBCLASS_OF in entity_data["claims"]:
-            for _, obj in enumerate(entity_data["claims"][ID_SUBCLASS_OF]):
-                mainsnak = obj["mainsnak"]
-                if mainsnak["snaktype"] != "novalue":
-                    if "datavalue" in mainsnak:
-                        instance_of.append(mainsnak["datavalue"]["value"]["id"])
-
-        # take facet of entity
-        if ID_FACET_OF in entity_data["claims"]:
-            for _, obj in enumerate(entity_data["claims"][ID_FACET_OF]):
+        # take instance of, subclass of and facet of entity
+        for property_id in [ID_INSTANCE_OF, ID_SUBCLASS_OF, ID_FACET_OF]:
+            for obj in entity_data["claims"].get(property_id, []):
                 mainsnak = obj["mainsnak"]
                 if mainsnak["snaktype"] != "novalue":
                     if "datavalue" in mainsnak:
@@ -145,25 +124,34 @@ def get_subclasses_for_entity_wikidata(entity: EntityId) -> List:
     return instance_of
 
 
-def get_pages_for_token_wikidata(token: str) -> List[str]:
+def get_subclasses_for_entity_wikidata(entity: EntityId) -> List:
     """
-    Get wikidata results for given ``token`` using SPARQL language.
+    Get data using Wikidata library and only instance of part.
 
     Args:
-        token: Query to search in wikidata base.
+        entity: Name of entity, in format Q{Number}.
 
     Returns:
-        List of results as a entities IDs.
+       List of "instance of" and "subclass of" for entity.
+    """
+    # load data
+    client = Client()
+    entity = client.get(entity, load=True)
+    return get_subclasses_from_entity_data(entity.data)
+
+
+def create_pages_for_token_query(token: str) -> str:
     """
+    Create SPARQL query that searches wikidata entities for ``token``, ref:
+    https://www.mediawiki.org/wiki/Wikidata_Query_Service/User_Manual/MWAPI#Examples
 
-    # omit tokens with '\' sign - that tokens cause wikidata error
-    for w in token.split():
-        if w == "\\":
-            return []
+    Args:
+        token: Query to search in wikidata base.
 
-    # crete request for given token, ref:
-    # https://www.mediawiki.org/wiki/Wikidata_Query_Service/User_Manual/MWAPI#Examples
-    q = (
+    Returns:
+        SPARQL query.
+    """
+    return (
         "SELECT * WHERE { "
         "   SERVICE wikibase:mwapi { "
         '       bd:serviceParam wikibase:api "EntitySearch" . '
@@ -177,21 +165,69 @@ def get_pages_for_token_wikidata(token: str) -> List[str]:
         f" LIMIT {DEFAULT_RESULTS_LIMIT}"
     )
 
+
+def is_token_searchable(token: str) -> bool:
+    """
+    Args:
+        token: Query to search in wikidata base.
+
+    Returns:
+        False for tokens with '\\' sign - that tokens cause wikidata error.
+    """
+    return all(w != "\\" for w in token.split())
+
+
+def get_entities_from_sparql_result(data: Dict[str, Any]) -> List[str]:
+    """
+    Args:
+        data: JSON result of query created by ``create_pages_for_token_query``.
+
+    Returns:
+        List of results as a entities IDs.
+    """
+    return [x["item"]["value"].split("/")[-1] for x in data["results"]["bindings"]]
+
+
+def get_pages_for_token_wikidata(token: str) -> List[str]:
+    """
+    Get wikidata results for given ``token`` using SPARQL language.
+
+    Args:
+        token: Query to search in wikidata base.
+
+    Returns:
+        List of results as a entities IDs.
+    """
+
+    # omit tokens with '\' sign - that tokens cause wikidata error
+    if not is_token_searchable(token):
+        return []
+
     # request for json
     headers = {"User-Agent": USER_AGENT}
     r: requests.Response = requests.get(
-        WIKIDATA_URL_SPARQL, headers=headers, params={"format": "json", "query": q}
+        WIKIDATA_URL_SPARQL,
+        headers=headers,
+        params={"format": "json", "query": create_pages_for_token_query(token)},
     )
 
-    # parse json
-    data = r.json()
+    return get_entities_from_sparql_result(r.json())
+
+
+def get_polish_wikipedia_title_from_entity_data(entity_data: Dict[str, Any]) -> Union[None, str]:
+    """
+    Args:
+        entity_data: Entity data in wikidata JSON format.
 
-    # take entities
-    entities = []
-    for x in data["results"]["bindings"]:
-        entities.append(x["item"]["value"].split("/")[-1])
+    Returns:
+        Title of page in wikipedia or None if value is missing.
+    """
+    if "sitelinks" in entity_data:
+        if "plwiki" in entity_data["sitelinks"]:
+            if "url" in entity_data["sitelinks"]["plwiki"]:
+                return entity_data["sitelinks"]["plwiki"]["title"]
 
-    return entities
+    return None
 
 
 def get_title_in_polish_wikipedia(entity: EntityId) -> Union[None, str]:
@@ -207,14 +243,7 @@ def get_title_in_polish_wikipedia(entity: EntityId) -> Union[None, str]:
     # load data
     client = Client()
     entity = client.get(entity, load=True)
-    entity_data = entity.data
-
-    if "sitelinks" in entity_data:
-        if "plwiki" in entity_data["sitelinks"]:
-            if "url" in entity_data["sitelinks"]["plwiki"]:
-                return entity_data["sitelinks"]["plwiki"]["title"]
-
-    return None
+    return get_polish_wikipedia_title_from_entity_data(entity.data)
 
 
 def get_url_to_polish_wikipedia(entity: EntityId) -> Union[None, str]:
@@ -3,18 +3,26 @@ Module contains function to deal with wikpedia pages using wikipediaapi library.
 See: https://pypi.org/project/Wikipedia-API/
 """
 
+import re
+from typing import TYPE_CHECKING, List
 
 import wikipediaapi
 from wikidata.entity import EntityId
 
-from entity_linking.utils import (MAX_WIKIPEDIA_PAGE_CONTENT_LEN, MORFEUSZ,
-                                  TokensSequence)
-from entity_linking.wikidata_web_api import (get_title_in_polish_wikipedia,
-                                             get_url_to_polish_wikipedia)
+from entity_linking.maintenance.metrics import METRICS
+from entity_linking.morph_analyser import get_analyser
+from entity_linking.utils import MAX_WIKIPEDIA_PAGE_CONTENT_LEN, TokensSequence
+from entity_linking.wikidata_web_api import get_url_to_polish_wikipedia
+
+if TYPE_CHECKING:
+    from entity_linking.wikidata_api import WikidataAPI
+
+# heading of section in page extract in wiki format, e.g. "== Historia =="
+SECTION_HEADING_RE = re.compile(r"^(={2,})\s*(.*?)\s*\1\s*$")
 
 
 def get_context_similarity_from_wikipedia(
-    sequence: TokensSequence, entity: EntityId
+    sequence: TokensSequence, entity: EntityId, wikidata_api: "WikidataAPI" = None
 ) -> float:
     """
     Try to score ``entity`` using context given by ``sequence``. Take wikipedia page link to ``entity``, take
@@ -23,19 +31,25 @@ def get_context_similarity_from_wikipedia(
     Args:
         sequence: Sequence from which was taken ``entity``.
         entity: ID od entity given by Q{NUM}.
+        wikidata_api: API used to get wikipedia page. Default: WikidataWebAPI.
 
     Returns:
         Float that describe percent of similar important words between wikipedia page and ``sequence``.
     """
+    if wikidata_api is None:
+        from entity_linking.wikidata_api import WikidataWebAPI
 
-    page_title = get_title_in_polish_wikipedia(entity)
+        wikidata_api = WikidataWebAPI()
+
+    page_title = wikidata_api.get_wikipedia_title(entity)
 
     if page_title is None:
         return 0.0
 
-    page_content = get_site_wikipedia_site_content(page_title)
+    page_content = wikidata_api.get_wikipedia_content(page_title)
 
-    m_result = MORFEUSZ.analyse(page_content)
+    with METRICS.timer("wikipedia.morfeusz"):
+        m_result = get_analyser().analyse(page_content)
 
     # simplify morfeusz result - take only first result for token, take only subst and adj tags
     cur_position = 0
@@ -99,3 +113,31 @@ def get_site_wikipedia_site_content(page_title: str) -> str:
         result += x.text
 
     return result[:MAX_WIKIPEDIA_PAGE_CONTENT_LEN]
+
+
+def get_site_content_from_extract(extract: str) -> str:
+    """
+    Get the same content as ``get_site_wikipedia_site_content`` from page extract in wiki format, taken directly
+    from MediaWiki API - texts of top level sections, without page summary and subsections.
+
+    Args:
+        extract: Page extract in wiki format.
+
+    Returns:
+        Content of wikipedia page.
+    """
+    sections: List[List[str]] = []
+    level = 0
+
+    for line in extract.split("\n"):
+        heading = SECTION_HEADING_RE.match(line)
+        if heading is not None:
+            level = len(heading.group(1))
+            if level == 2:
+                sections.append([])
+        elif level == 2:
+            sections[-1].append(line)
+
+    result = "".join("\n".join(lines).strip() for lines in sections)
+
+    return result[:MAX_WIKIPEDIA_PAGE_CONTENT_LEN]
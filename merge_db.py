@@ -0,0 +1,38 @@
+"""
+Simple script to merge cache databases into one database, or to compact one database.
+"""
+
+import argparse
+import os
+import sys
+
+from entity_linking.cache_merge import (DEFAULT_MERGE_BATCH_SIZE,
+                                        merge_databases, sort_by_recency)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("output", help="path to merged database, it is overwritten")
+    parser.add_argument(
+        "db_names",
+        nargs="+",
+        help="paths to databases, the same database as output compacts it",
+    )
+    parser.add_argument(
+        "--in-order", action="store_true",
+        help="databases are given from the oldest to the newest, default: order by modification time",
+    )
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_MERGE_BATCH_SIZE, help="rows in one insert")
+    parser.add_argument("--no-vacuum", action="store_true", help="don't rebuild merged database file")
+
+    args = parser.parse_args(sys.argv[1:])
+
+    for name in args.db_names:
+        if not os.path.isfile(name):
+            parser.error(f"The file {name} doesn't exist!")
+
+    db_names = args.db_names if args.in_order else sort_by_recency(args.db_names)
+    stats = merge_databases(db_names, args.output, args.batch_size, not args.no_vacuum)
+
+    print(f"Data base merged! Path: {args.output}")
+    for table, table_stats in stats.items():
+        print(f"{table}: {table_stats['rows']} rows, {table_stats['duplicates']} duplicates dropped")
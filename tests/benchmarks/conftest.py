@@ -0,0 +1,115 @@
+"""
+Minimal benchmark harness. Test takes ``benchmark`` fixture and calls it with function to measure. Results of
+session are compared with results of previous commit (HEAD~1) saved in BENCHMARKS_DIR - benchmarks slower
+than REGRESSION_THRESHOLD times and by more than REGRESSION_MIN_DELTA seconds are reported at the end of
+session. Results are saved as <commit>.json only if environment variable BENCHMARK_SAVE is set to 1.
+"""
+import json
+import os
+import platform
+import subprocess
+import time
+from typing import Any, Callable, Dict
+
+import pytest
+
+ROOT_DIR: str = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# directory with saved benchmark results, one file per commit
+BENCHMARKS_DIR: str = os.environ.get("BENCHMARKS_DIR", os.path.join(ROOT_DIR, ".benchmarks"))
+# benchmark is reported as regression when its min time is this many times greater than previous one
+REGRESSION_THRESHOLD: float = float(os.environ.get("BENCHMARK_REGRESSION_THRESHOLD", "1.5"))
+# benchmark is reported as regression only if its min time is greater by this many seconds - noise of
+# sub-millisecond benchmarks is bigger than REGRESSION_THRESHOLD
+REGRESSION_MIN_DELTA: float = float(os.environ.get("BENCHMARK_REGRESSION_MIN_DELTA", "0.001"))
+# if True, results of session are saved
+SAVE_RESULTS: bool = os.environ.get("BENCHMARK_SAVE", "") == "1"
+# default number of measured rounds
+DEFAULT_ROUNDS: int = 5
+
+# results of current session: benchmark name -> stats
+_RESULTS: Dict[str, Dict[str, float]] = {}
+
+
+def _get_commit(ref: str = "HEAD") -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", ref], cwd=ROOT_DIR, stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL, check=True,
+        ).stdout.decode("utf-8").strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+@pytest.fixture
+def benchmark(request) -> Callable[..., Any]:
+    """
+    Fixture that measures given function. Function is called once to warm up and then ``rounds`` times,
+    min and mean time is saved under name of test.
+    """
+    def run(fun: Callable[..., Any], *args: Any, rounds: int = DEFAULT_ROUNDS, **kwargs: Any) -> Any:
+        result = fun(*args, **kwargs)
+        times = []
+        for _ in range(rounds):
+            start_time = time.perf_counter()
+            result = fun(*args, **kwargs)
+            times.append(time.perf_counter() - start_time)
+
+        _RESULTS[request.node.name] = {
+            "rounds": rounds,
+            "min": min(times),
+            "mean": sum(times) / len(times),
+        }
+        return result
+
+    return run
+
+
+def _load_previous_results() -> Dict[str, Any]:
+    previous_commit = _get_commit("HEAD~1")
+    file_name = os.path.join(BENCHMARKS_DIR, f"{previous_commit}.json")
+    if previous_commit == "unknown" or not os.path.isfile(file_name):
+        return {}
+    with open(file_name) as f:
+        return json.load(f)
+
+
+def pytest_terminal_summary(terminalreporter) -> None:
+    if not _RESULTS:
+        return
+
+    commit = _get_commit()
+    previous = _load_previous_results()
+    previous_results = previous.get("benchmarks", {})
+
+    terminalreporter.section("benchmarks")
+    regressions = []
+    for name, stats in sorted(_RESULTS.items()):
+        line = f"{name:60} mean {stats['mean'] * 1000.0:10.3f} ms  min {stats['min'] * 1000.0:10.3f} ms"
+        # min time is compared - it is the least affected by noise of other processes
+        if name in previous_results and previous_results[name]["min"] > 0:
+            ratio = stats["min"] / previous_results[name]["min"]
+            line += f"  x{ratio:.2f} vs {previous['commit']}"
+            if ratio > REGRESSION_THRESHOLD and stats["min"] - previous_results[name]["min"] > REGRESSION_MIN_DELTA:
+                regressions.append(name)
+        terminalreporter.write_line(line)
+
+    for name in regressions:
+        terminalreporter.write_line(
+            f"REGRESSION: {name} is more than {REGRESSION_THRESHOLD}x slower than in {previous['commit']}",
+            red=True,
+        )
+
+    if not SAVE_RESULTS:
+        return
+
+    os.makedirs(BENCHMARKS_DIR, exist_ok=True)
+    with open(os.path.join(BENCHMARKS_DIR, f"{commit}.json"), "w") as f:
+        json.dump(
+            {
+                "commit": commit,
+                "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "python": platform.python_version(),
+                "benchmarks": _RESULTS,
+            },
+            f, indent=2, sort_keys=True,
+        )
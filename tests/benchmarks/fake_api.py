@@ -0,0 +1,28 @@
+"""
+Wikidata API that serves responses recorded in fixture file, so benchmarks run without network and always
+measure the same work.
+"""
+import json
+import os
+
+from entity_linking.wikidata_api import InMemoryWikidataAPI
+
+FIXTURES_DIR: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+# sequences in PolEval format - with lemmas, tags and entity IDs
+SEQUENCES_FILE: str = os.path.join(FIXTURES_DIR, "sequences.tsv")
+# recorded responses of Wikidata and Wikipedia
+RECORDED_RESPONSES_FILE: str = os.path.join(FIXTURES_DIR, "recorded_responses.json")
+
+
+class FixtureWikidataAPI(InMemoryWikidataAPI):
+    """
+    API with responses recorded in ``file_name``.
+    """
+
+    def __init__(self, file_name: str = RECORDED_RESPONSES_FILE) -> None:
+        with open(file_name, encoding="utf-8") as f:
+            data = json.load(f)
+
+        super().__init__(
+            data["subclasses"], data["pages"], data["wikipedia_titles"], data["wikipedia_contents"]
+        )
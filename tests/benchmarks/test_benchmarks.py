@@ -0,0 +1,134 @@
+import csv
+
+from wikidata.entity import EntityId
+
+from entity_linking.classification_report import create_result_data_frame
+from entity_linking.entity_classifier import (
+    NoContextGraphEntityClassifier, WikipediaContextGraphEntityClassifier)
+from entity_linking.graph_wikidata import (create_graph_for_entity,
+                                           get_graph_score)
+from entity_linking.load_test_data import (
+    get_sequences_from_file, load_sequences_from_test_file_with_lemmas_and_tags)
+from entity_linking.qid_codec import decode_qids, encode_qids
+from entity_linking.sparse_taxonomy import SparseTaxonomy
+from entity_linking.tokenizer import (WikidataLengthTokenizer,
+                                      WikidataMorphTagsTokenizer)
+from entity_linking.wikipedia_api import get_context_similarity_from_wikipedia
+from .fake_api import SEQUENCES_FILE, FixtureWikidataAPI
+
+SEQUENCES_NUMBER = 12
+MAX_GRAPH_LEVELS = 6
+
+
+def load_sequences():
+    return load_sequences_from_test_file_with_lemmas_and_tags(SEQUENCES_FILE, SEQUENCES_NUMBER)
+
+
+def test_load_sequences_from_test_file(benchmark):
+    sequences = benchmark(load_sequences, rounds=20)
+    assert len(sequences) == SEQUENCES_NUMBER
+
+
+def test_get_sequences_from_file(benchmark):
+    def load():
+        with open(SEQUENCES_FILE) as f:
+            return list(get_sequences_from_file(csv.reader(f, delimiter="\t")))
+
+    assert len(benchmark(load, rounds=20)) == SEQUENCES_NUMBER
+
+
+def test_morph_tags_tokenizer(benchmark):
+    sequences = load_sequences()
+    tokenizer = WikidataMorphTagsTokenizer(FixtureWikidataAPI(), 2)
+    groups = benchmark(lambda: [tokenizer.tokenize(s) for s in sequences])
+    assert any(g.token == "Krzysztof Krawczyk" for g in groups[0])
+
+
+def test_length_tokenizer(benchmark):
+    sequences = load_sequences()
+    tokenizer = WikidataLengthTokenizer(FixtureWikidataAPI(), 2)
+    groups = benchmark(lambda: [tokenizer.tokenize(s) for s in sequences])
+    assert sum(len(g) for g in groups) > 0
+
+
+def test_create_graph_for_entity(benchmark):
+    api = FixtureWikidataAPI()
+    entities = ["Q1380592", "Q231593", "Q548", "Q31487", "Q1420", "Q4167410"]
+    graphs = benchmark(lambda: [create_graph_for_entity(EntityId(e), api, MAX_GRAPH_LEVELS) for e in entities])
+    assert "Q2221906" in graphs[1].nodes
+
+
+def test_get_graph_score(benchmark):
+    api = FixtureWikidataAPI()
+    graphs = [
+        (create_graph_for_entity(EntityId(e), api, MAX_GRAPH_LEVELS), e)
+        for e in ["Q1380592", "Q588", "Q231593", "Q548", "Q31487", "Q1420"]
+    ]
+    scores = benchmark(lambda: [get_graph_score(g, EntityId(e)) for g, e in graphs], rounds=20)
+    assert all(s > 0 for s in scores)
+
+
+def test_sparse_walk_scores(benchmark):
+    api = FixtureWikidataAPI()
+    entities = ["Q1380592", "Q588", "Q231593", "Q548", "Q31487", "Q1420"]
+    taxonomy = SparseTaxonomy(api.subclasses)
+    scores = benchmark(lambda: taxonomy.get_walk_scores(entities, MAX_GRAPH_LEVELS), rounds=20)
+    assert all(s > 0 for s in scores)
+
+
+def test_decode_qids_blob(benchmark):
+    lists = list(FixtureWikidataAPI().subclasses.values())
+    encoded = [encode_qids(ids) for ids in lists]
+    assert benchmark(lambda: [decode_qids(e) for e in encoded], rounds=20) == lists
+
+
+def test_decode_qids_text(benchmark):
+    # old text format, baseline of decode_qids_blob
+    lists = list(FixtureWikidataAPI().subclasses.values())
+    encoded = ["".join(f"{x};" for x in ids) for ids in lists]
+    assert benchmark(lambda: [decode_qids(e) for e in encoded], rounds=20) == lists
+
+
+def test_wikipedia_scorer(benchmark):
+    api = FixtureWikidataAPI()
+    sequences = load_sequences()
+    pairs = [(sequences[0], "Q1380592"), (sequences[2], "Q548"), (sequences[4], "Q31487"), (sequences[9], "Q111")]
+    scores = benchmark(lambda: [get_context_similarity_from_wikipedia(s, EntityId(e), api) for s, e in pairs])
+    assert any(s > 0 for s in scores)
+
+
+def test_create_result_data_frame(benchmark):
+    api = FixtureWikidataAPI()
+    classifier = NoContextGraphEntityClassifier(WikidataMorphTagsTokenizer(api, 2), api, MAX_GRAPH_LEVELS, 1)
+    classified = []
+    for s in load_sequences():
+        chosen = classifier.classify_sequence_get_chosen_tokens(s)
+        classified.append((s, [t for t, _ in chosen], [r for _, r in chosen]))
+
+    data_frames = benchmark(lambda: [create_result_data_frame(*c) for c in classified])
+    assert sum(df["correct_predict"].sum() for df in data_frames) > 0
+
+
+def test_no_context_classifier(benchmark):
+    api = FixtureWikidataAPI()
+    classifier = NoContextGraphEntityClassifier(WikidataMorphTagsTokenizer(api, 2), api, MAX_GRAPH_LEVELS, 1)
+    sequences = load_sequences()
+    results = benchmark(lambda: [classifier.classify_sequence(s) for s in sequences], rounds=3)
+    assert sum(df["correct_predict"].sum() for df in results) > 0
+
+
+def test_wikipedia_context_classifier(benchmark):
+    api = FixtureWikidataAPI()
+    classifier = WikipediaContextGraphEntityClassifier(
+        WikidataMorphTagsTokenizer(api, 2), api, MAX_GRAPH_LEVELS, 1
+    )
+    sequences = load_sequences()
+    results = benchmark(lambda: [classifier.classify_sequence(s) for s in sequences], rounds=3)
+    assert len(results) == SEQUENCES_NUMBER
+
+
+def test_classify_sequences_from_file(benchmark):
+    api = FixtureWikidataAPI()
+    classifier = NoContextGraphEntityClassifier(WikidataMorphTagsTokenizer(api, 2), api, MAX_GRAPH_LEVELS, 2)
+    result_df = benchmark(classifier.classify_sequences_from_file, SEQUENCES_FILE, SEQUENCES_NUMBER, rounds=3)
+    assert result_df["test_classified"].sum() > 0
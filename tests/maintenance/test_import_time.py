@@ -0,0 +1,16 @@
+import pytest
+
+from entity_linking.maintenance.import_time import IMPORT_BUDGETS, measure_import
+
+# max import time of CLI entry point, in seconds - generous to avoid flaky results on slow machines
+APP_IMPORT_TIME_BUDGET: float = 1.0
+
+
+@pytest.mark.parametrize("module", list(IMPORT_BUDGETS.keys()))
+def test_import_does_not_load_heavy_modules(module):
+    result = measure_import(module, IMPORT_BUDGETS[module])
+    assert result["loaded"] == []
+
+
+def test_app_import_time():
+    assert measure_import("app")["seconds"] < APP_IMPORT_TIME_BUDGET
@@ -0,0 +1,80 @@
+import tracemalloc
+from io import StringIO
+
+from entity_linking.batch_linker import link_sequences
+from entity_linking.entity_classifier import NoContextGraphEntityClassifier
+from entity_linking.maintenance.memory_profiler import (
+    disable_memory_profiling, enable_memory_profiling, load_memory_reports,
+    summarize_memory_reports)
+from entity_linking.tokenizer import WikidataMorphTagsTokenizer
+from ..test_utils import FakeWikidataAPI, create_test_sequence
+
+
+def create_classifier(processes_num: int) -> NoContextGraphEntityClassifier:
+    api = FakeWikidataAPI()
+    return NoContextGraphEntityClassifier(WikidataMorphTagsTokenizer(api, 2), api, 2, processes_num)
+
+
+def test_profile_parent_and_workers(tmp_path):
+    output_dir = str(tmp_path / "memory")
+    enable_memory_profiling(2, output_dir)
+    try:
+        link_sequences(create_classifier(2), [create_test_sequence(i) for i in range(8)], StringIO(), 2, True, 1)
+    finally:
+        disable_memory_profiling()
+
+    reports = load_memory_reports(output_dir)
+    assert reports[0]["role"] == "parent"
+    assert reports[0]["sequences"] == 8
+    assert {r["role"] for r in reports[1:]} == {"worker"}
+    assert set(reports[1]["stages"]) == {"tokenize", "classify_pages"}
+
+    summary = summarize_memory_reports(reports)
+    assert "Top growing allocation sites:" in summary
+    assert "tokenize" in summary
+    assert not tracemalloc.is_tracing()
+
+
+def test_classification_memory_doesnt_grow():
+    classifier = create_classifier(1)
+    sequences = [create_test_sequence(i) for i in range(50)]
+    for s in sequences:
+        classifier.classify_sequence_get_chosen_tokens(s)
+
+    tracemalloc.start()
+    try:
+        for s in sequences:
+            classifier.classify_sequence_get_chosen_tokens(s)
+        first, _ = tracemalloc.get_traced_memory()
+        for _ in range(4):
+            for s in sequences:
+                classifier.classify_sequence_get_chosen_tokens(s)
+        last, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert last - first < 64 * 1024
+
+
+def test_worker_report_is_saved_at_exit(tmp_path):
+    output_dir = str(tmp_path / "memory")
+    enable_memory_profiling(100, output_dir)
+    try:
+        link_sequences(create_classifier(2), [create_test_sequence(i) for i in range(4)], StringIO(), 2, True, 1)
+    finally:
+        disable_memory_profiling()
+
+    workers = [r for r in load_memory_reports(output_dir) if r["role"] == "worker"]
+    assert workers
+    assert sum(r["sequences"] for r in workers) == 4
+
+
+def test_tracing_of_caller_is_not_stopped(tmp_path):
+    tracemalloc.start()
+    try:
+        enable_memory_profiling(2, str(tmp_path / "memory"))
+        link_sequences(create_classifier(1), [create_test_sequence(0)], StringIO(), 1)
+        disable_memory_profiling()
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
@@ -0,0 +1,55 @@
+import json
+from multiprocessing import Pool
+
+from entity_linking.maintenance.metrics import METRICS, Metrics
+
+
+def _worker(x):
+    METRICS.collect()
+    with METRICS.timer("work"):
+        METRICS.inc("items", x)
+    return METRICS.collect()
+
+
+def test_counters_and_timers():
+    metrics = Metrics()
+    metrics.inc("a")
+    metrics.inc("a", 2)
+    with metrics.timer("t"):
+        pass
+    metrics.add_time("t", 5.0)
+    snapshot = metrics.snapshot()
+    assert snapshot["counters"] == {"a": 3}
+    assert snapshot["timers"]["t"]["count"] == 2
+    assert snapshot["timers"]["t"]["max"] == 5.0
+
+
+def test_merge_and_collect():
+    metrics = Metrics()
+    other = Metrics()
+    other.inc("a")
+    other.add_time("t", 1.0)
+    metrics.merge(other.collect())
+    metrics.merge({"counters": {"a": 1}, "timers": {"t": {"count": 1, "total": 2.0, "max": 2.0}}})
+    assert other.snapshot() == {"counters": {}, "timers": {}}
+    assert metrics.snapshot() == {"counters": {"a": 2}, "timers": {"t": {"count": 2, "total": 3.0, "max": 2.0}}}
+
+
+def test_aggregation_across_workers():
+    metrics = Metrics()
+    with Pool(2) as p:
+        for snapshot in p.map(_worker, [1, 2, 3]):
+            metrics.merge(snapshot)
+    assert metrics.snapshot()["counters"]["items"] == 6
+    assert metrics.snapshot()["timers"]["work"]["count"] == 3
+
+
+def test_export():
+    metrics = Metrics()
+    metrics.inc("db_cache.token.hit", 4)
+    metrics.add_time("classifier.tokenize", 0.5)
+    assert json.loads(metrics.to_json())["counters"]["db_cache.token.hit"] == 4
+    prometheus = metrics.to_prometheus().split("\n")
+    assert "entity_linking_db_cache_token_hit_total 4" in prometheus
+    assert "entity_linking_classifier_tokenize_seconds_count 1" in prometheus
+    assert "entity_linking_classifier_tokenize_seconds_sum 0.5" in prometheus
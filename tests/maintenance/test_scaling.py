@@ -0,0 +1,9 @@
+from entity_linking.maintenance.scaling import ENGINES, run_scaling_experiment
+
+
+def test_run_scaling_experiment():
+    results = run_scaling_experiment([1, 2], [2], [1, 2], [5], entities_sample=2, sequences_num=2, repeat=1)
+    assert len(results) == 4 * len(ENGINES)
+    assert {r["engine"] for r in results} == set(ENGINES)
+    assert all(r["seconds"] >= 0 and r["peak_memory"] >= 0 for r in results)
+    assert max(r["nodes"] for r in results) == 7
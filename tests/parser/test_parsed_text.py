@@ -0,0 +1,54 @@
+import pytest
+from entity_linking.parser.parser import Parser
+from entity_linking.parser.parsed_text import Interner, ParsedText
+
+TEST_TEXT = "Zaginieni 11-latkowie poszli do domu, a dom był pusty."
+
+
+@pytest.fixture(scope="module")
+def parser():
+    return Parser()
+
+
+def test_interner():
+    interner = Interner()
+    assert interner.intern("a") == 0
+    assert interner.intern("b") == 1
+    assert interner.intern("a") == 0
+    assert interner.value(1) == "b"
+    assert len(interner) == 2
+
+
+def test_compact_equal_to_tokens(parser):
+    tokens = parser.parse_text(TEST_TEXT)
+    parsed = parser.parse_text_compact(TEST_TEXT)
+    assert len(parsed) == len(tokens)
+    for token, view in zip(tokens, parsed):
+        assert token == view
+        assert view == token
+
+
+def test_compact_interns_strings(parser):
+    parsed = parser.parse_text_compact("dom dom dom")
+    assert len(parsed) == 3
+    assert parsed.words[0] == parsed.words[1] == parsed.words[2]
+
+
+def test_not_contiguous_analyses():
+    analyses = [(0, 1, ("a", "a1", "t1", [], [])),
+                (1, 2, ("b", "b1", "t2", ["x"], [])),
+                (0, 1, ("a", "a2", "t3", [], ["y"]))]
+    parsed = ParsedText.from_analyses(analyses)
+    assert len(parsed) == 2
+    assert parsed.analyses_count(0) == 2
+    assert [a.lemma for a in parsed[0].analyses] == ["a1", "a2"]
+    assert parsed[1].analyses[0].add_info_1 == ["x"]
+    assert parsed[-1].word == "b"
+
+    from_iterator = ParsedText.from_analyses(iter(analyses))
+    assert [a.lemma for a in from_iterator[0].analyses] == ["a1", "a2"]
+
+
+def test_index_error():
+    with pytest.raises(IndexError):
+        ParsedText()[0]
@@ -54,3 +54,9 @@ def test_multiple_word_analysis(parser, double_analysis_token, double_analysis_w
     assert tokens[0] == double_analysis_token
     simple_analysis_token._range = Range(start=1, end=2)
     assert tokens[1] == simple_analysis_token
+
+
+def test_parse_texts(parser, simple_analysis_word):
+    texts = [simple_analysis_word, "", simple_analysis_word + " kot"]
+    result = parser.parse_texts(texts)
+    assert result == [parser.parse_text(t) for t in texts]
@@ -0,0 +1,82 @@
+import csv
+import sqlite3
+from io import StringIO
+
+from create_db import drop_and_create_database
+from entity_linking.batch_linker import link_sequences, write_linked_sequence
+from entity_linking.entity_classifier import NoContextGraphEntityClassifier
+from entity_linking.load_test_data import get_sequences_from_file
+from entity_linking.tokenizer import WikidataMorphTagsTokenizer
+from entity_linking.wikidata_api import WikidataDBAPI
+from entity_linking.wikidata_db_api import CachePolicy
+from .benchmarks.fake_api import SEQUENCES_FILE
+from .test_utils import FakeWikidataAPI, create_test_sequence
+
+
+def create_classifier() -> NoContextGraphEntityClassifier:
+    api = FakeWikidataAPI()
+    return NoContextGraphEntityClassifier(WikidataMorphTagsTokenizer(api, 2), api, 2, 1)
+
+
+def test_classify_sequence_get_chosen_tokens():
+    chosen = create_classifier().classify_sequence_get_chosen_tokens(create_test_sequence(0))
+    assert len(chosen) == 1
+    token, result = chosen[0]
+    assert (token.start, token.end, token.token) == (0, 1, "Jan")
+    assert result.result_entity == "Q1"
+
+
+def test_write_linked_sequence():
+    output = StringIO()
+    sequence = create_test_sequence(7)
+    write_linked_sequence(output, sequence, create_classifier().classify_sequence_get_chosen_tokens(sequence))
+    lines = output.getvalue().split("\n")
+    assert lines[0] == "7\tJan\tJan\t0\tsubst:sg:nom:m1\tJan\tQ1"
+    assert lines[1] == "7\tNowak\tNowak\t1\tsubst:sg:nom:m1\t_\t_"
+    assert lines[4] == ""
+
+
+def test_write_linked_sequence_with_document_id():
+    output = StringIO()
+    sequence = create_test_sequence(7)
+    sequence.document_id = "doc-12"
+    write_linked_sequence(output, sequence, [])
+    assert output.getvalue().split("\n")[0] == "doc-12\tJan\tJan\t0\tsubst:sg:nom:m1\t_\t_"
+
+    with open(SEQUENCES_FILE) as f:
+        sequences = get_sequences_from_file(csv.reader(f, delimiter="\t"))
+        assert [next(sequences).document_id for _ in range(2)] == ["0", "1"]
+
+
+def test_link_sequences_ordered_and_unordered():
+    sequences = [create_test_sequence(i) for i in range(6)]
+
+    serial_output = StringIO()
+    summary = link_sequences(create_classifier(), sequences, serial_output, 1)
+    assert summary.sequences == 6
+    assert summary.tokens == 24
+    assert summary.linked_spans == 6
+
+    pool_output = StringIO()
+    pool_summary = link_sequences(create_classifier(), iter(sequences), pool_output, 2, True, 1)
+    assert pool_summary.metrics.snapshot()["counters"]["classifier.sequences"] == 6
+    assert pool_output.getvalue() == serial_output.getvalue()
+
+    unordered_output = StringIO()
+    link_sequences(create_classifier(), iter(sequences), unordered_output, 2, False, 1)
+    assert sorted(unordered_output.getvalue().split("\n")) == sorted(serial_output.getvalue().split("\n"))
+
+
+def test_workers_write_hits_of_database_rows(tmp_path):
+    database_name = str(tmp_path / "entity_linking.db")
+    drop_and_create_database(database_name)
+    api = WikidataDBAPI(database_name, CachePolicy(), web_api=FakeWikidataAPI())
+    classifier = NoContextGraphEntityClassifier(WikidataMorphTagsTokenizer(api, 2), api, 2, 1)
+
+    link_sequences(classifier, iter([create_test_sequence(i) for i in range(6)]), StringIO(), 2, True, 1)
+
+    # workers flush hits after every sequence, they don't run atexit handlers
+    conn = sqlite3.connect(database_name)
+    hits = conn.execute("SELECT hits FROM token WHERE id = 'Jan'").fetchone()[0]
+    conn.close()
+    assert hits >= 4
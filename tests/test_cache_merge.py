@@ -0,0 +1,118 @@
+import os
+import sqlite3
+
+from create_db import drop_and_create_database
+from entity_linking.cache_merge import (merge_databases, merge_rows,
+                                        sort_by_recency)
+from entity_linking.utils import EntityAncestors
+from entity_linking.wikidata_api import WikidataDBAPI
+from entity_linking.wikidata_db_api import (add_entity_ancestors_to_data_base,
+                                            add_entity_subclasses_to_data_base,
+                                            add_token_pages_to_data_base,
+                                            get_entity_ancestors_db)
+
+
+def create_text_database(name, entities, tokens):
+    conn = sqlite3.connect(name)
+    conn.execute("CREATE TABLE entity (id text, sub text)")
+    conn.execute("CREATE TABLE token (id text, pages text)")
+    conn.executemany("INSERT INTO entity VALUES(?, ?)", entities)
+    conn.executemany("INSERT INTO token VALUES(?, ?)", tokens)
+    conn.commit()
+    conn.close()
+
+
+def count_rows(name, table):
+    conn = sqlite3.connect(name)
+    try:
+        return conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_merge_keeps_newest_rows(tmp_path):
+    old = str(tmp_path / "old.db")
+    create_text_database(old, [("Q1", "Q5;"), ("Q2", "Q3;"), ("Q1", "Q9;")], [("Jan", "Q1;"), ("ma", "")])
+
+    new = str(tmp_path / "new.db")
+    drop_and_create_database(new)
+    add_entity_subclasses_to_data_base(new, "Q2", ["Q7"])
+    add_entity_subclasses_to_data_base(new, "Q4", ["Q5", "x"])
+    add_token_pages_to_data_base(new, "Nowak", ["Q2"])
+    add_entity_ancestors_to_data_base(new, "Q2", "3:abc", EntityAncestors([("Q2", "Q7", 0)], []))
+    add_entity_ancestors_to_data_base(new, "Q2", "2:abc", EntityAncestors([("Q2", "Q7", 0)], []))
+
+    output = str(tmp_path / "merged.db")
+    stats = merge_databases([old, new], output, batch_size=2)
+
+    assert stats == {
+        "entity": {"rows": 3, "duplicates": 2},
+        "token": {"rows": 3, "duplicates": 0},
+        "ancestors": {"rows": 2, "duplicates": 0},
+    }
+    api = WikidataDBAPI(output)
+    # later row of the same database, row of newer database
+    assert api.get_subclasses_for_entity("Q1") == ["Q9"]
+    assert api.get_subclasses_for_entity("Q2") == ["Q7"]
+    assert api.get_subclasses_for_entity("Q4") == ["Q5", "x"]
+    assert [api.get_pages_for_token(t) for t in ["Jan", "ma", "Nowak"]] == [["Q1"], [], ["Q2"]]
+    assert get_entity_ancestors_db(output, "Q2", "3:abc").edges == [("Q2", "Q7", 0)]
+    assert get_entity_ancestors_db(output, "Q2", "2:abc").edges == [("Q2", "Q7", 0)]
+
+    conn = sqlite3.connect(output)
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    types = conn.execute("SELECT DISTINCT typeof(sub) FROM entity ORDER BY 1").fetchall()
+    members = conn.execute("SELECT config, entity FROM ancestors_member ORDER BY 1, 2").fetchall()
+    untimed = conn.execute("SELECT count(*) FROM ancestors WHERE fetched IS NULL").fetchone()[0]
+    conn.close()
+    assert {"entity_id", "token_id"} <= indexes
+    assert types == [("blob",), ("text",)]
+    assert members == [("2:abc", "Q2"), ("2:abc", "Q7"), ("3:abc", "Q2"), ("3:abc", "Q7")]
+    assert untimed == 0
+    assert not os.path.exists(f"{output}.tmp")
+
+
+def test_compact_database_in_place(tmp_path):
+    name = str(tmp_path / "cache.db")
+    create_text_database(name, [("Q1", "Q5;")] * 50, [("Jan", "Q1;")] * 50)
+
+    merge_databases([name], name)
+
+    assert count_rows(name, "entity") == 1
+    assert count_rows(name, "token") == 1
+    assert WikidataDBAPI(name).get_pages_for_token("Jan") == ["Q1"]
+
+
+def test_sort_by_recency_and_merge_order(tmp_path):
+    first, second = str(tmp_path / "a.db"), str(tmp_path / "b.db")
+    create_text_database(first, [("Q1", "Q5;")], [])
+    create_text_database(second, [("Q1", "Q7;")], [])
+    os.utime(first, (2000000000, 2000000000))
+    os.utime(second, (1000000000, 1000000000))
+
+    assert sort_by_recency([first, second]) == [second, first]
+    assert list(merge_rows(sort_by_recency([first, second]), "entity", ["id", "sub"])) == [(("Q1", "Q5;"), 1)]
+
+
+def test_merge_keeps_freshest_row_and_sums_hits(tmp_path):
+    first, second = str(tmp_path / "first.db"), str(tmp_path / "second.db")
+    for name, sub, fetched, last_access, hits in [(first, "Q5;", 200, 10, 2), (second, "Q6;", 100, 50, 3)]:
+        drop_and_create_database(name)
+        conn = sqlite3.connect(name)
+        conn.execute(
+            "INSERT INTO entity(id, sub, fetched, version, last_access, hits) VALUES('Q1', ?, ?, 1, ?, ?)",
+            (sub, fetched, last_access, hits),
+        )
+        conn.commit()
+        conn.close()
+
+    output = str(tmp_path / "merged.db")
+    merge_databases([first, second], output)
+
+    conn = sqlite3.connect(output)
+    rows = conn.execute("SELECT sub, fetched, last_access, hits FROM entity").fetchall()
+    conn.close()
+    # row fetched later wins over row of newer database
+    assert len(rows) == 1
+    assert rows[0][1:] == (200, 50, 5)
+    assert WikidataDBAPI(output).get_subclasses_for_entity("Q1") == ["Q5"]
@@ -0,0 +1,69 @@
+import os
+
+import pandas as pd
+import pytest
+
+from entity_linking.checkpoint import ClassificationCheckpoint
+from entity_linking.entity_classifier import \
+    WikipediaContextGraphEntityClassifier
+from entity_linking.tokenizer import WikidataMorphTagsTokenizer
+from .benchmarks.fake_api import SEQUENCES_FILE, FixtureWikidataAPI
+
+SEQUENCES_NUMBER = 12
+
+
+class FailingClassifier(WikipediaContextGraphEntityClassifier):
+    """
+    Classifier that crashes on sequence ``fail_at``.
+    """
+
+    fail_at = 6
+
+    def classify_sequence(self, sequence):
+        if sequence.id == self.fail_at:
+            raise RuntimeError("crash")
+        return super().classify_sequence(sequence)
+
+
+def create_classifier(classifier_type=WikipediaContextGraphEntityClassifier):
+    api = FixtureWikidataAPI()
+    return classifier_type(WikidataMorphTagsTokenizer(api, 2), api, 6, 1, page_threads=1)
+
+
+def get_parts(checkpoint_dir):
+    return sorted(x for x in os.listdir(checkpoint_dir) if x.startswith("part-"))
+
+
+def test_resume_after_crash(tmp_path):
+    checkpoint_dir = str(tmp_path / "checkpoint")
+    expected = create_classifier().classify_sequences_from_file(SEQUENCES_FILE, SEQUENCES_NUMBER)
+
+    with pytest.raises(RuntimeError):
+        create_classifier(FailingClassifier).classify_sequences_from_file(
+            SEQUENCES_FILE, SEQUENCES_NUMBER, checkpoint_dir, checkpoint_every=4
+        )
+    # full part and sequences classified before crash
+    assert get_parts(checkpoint_dir) == ["part-000001.pkl", "part-000002.pkl"]
+
+    classifier = create_classifier()
+    result = classifier.classify_sequences_from_file(
+        SEQUENCES_FILE, SEQUENCES_NUMBER, checkpoint_dir, resume=True, checkpoint_every=4
+    )
+
+    pd.testing.assert_frame_equal(result, expected)
+    counters = classifier.run_metrics.snapshot()["counters"]
+    assert counters["classifier.resumed_sequences"] == FailingClassifier.fail_at
+    assert counters["classifier.sequences"] == SEQUENCES_NUMBER
+    assert len(get_parts(checkpoint_dir)) == 4
+
+
+def test_checkpoint_of_other_run_is_not_used(tmp_path):
+    checkpoint_dir = str(tmp_path / "checkpoint")
+    create_classifier().classify_sequences_from_file(SEQUENCES_FILE, 2, checkpoint_dir)
+
+    with pytest.raises(ValueError):
+        ClassificationCheckpoint(checkpoint_dir, SEQUENCES_FILE).load(resume=False)
+    with pytest.raises(ValueError):
+        ClassificationCheckpoint(checkpoint_dir, str(tmp_path / "other.tsv")).load(resume=True)
+
+    assert sorted(ClassificationCheckpoint(checkpoint_dir, SEQUENCES_FILE).load(resume=True)) == [0, 1]
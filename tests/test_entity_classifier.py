@@ -0,0 +1,97 @@
+import pickle
+import threading
+import time
+from collections import Counter
+from typing import List
+
+from entity_linking.entity_classifier import NoContextGraphEntityClassifier
+from entity_linking.maintenance.metrics import METRICS
+from entity_linking.tokenizer import WikidataLengthTokenizer
+from entity_linking.utils import Token, TokensSequence
+from .test_utils import FakeWikidataAPI
+
+
+class SlowWikidataAPI(FakeWikidataAPI):
+    """
+    Slow API that counts calls and calls running at the same time.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = Counter()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def get_subclasses_for_entity(self, entity: str) -> List[str]:
+        with self.lock:
+            self.calls[entity] += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.05)
+        with self.lock:
+            self.in_flight -= 1
+        return {"Q1": ["Q5"], "Q2": ["Q3"], "Q4": ["Q5"], "Q6": ["Q5"]}.get(entity, [])
+
+    def get_pages_for_token(self, token: str) -> List[str]:
+        return {"Jan": ["Q2", "Q1"], "Nowak": ["Q4", "Q1"], "Kowalski": ["Q6"]}.get(token, [])
+
+
+def create_sequence() -> TokensSequence:
+    return TokensSequence(
+        [Token(t, 1, "_", "_", t, "subst:sg:nom:m1") for t in ["Jan", "Nowak", "Kowalski"]], 0
+    )
+
+
+def classify(page_threads: int):
+    api = SlowWikidataAPI()
+    classifier = NoContextGraphEntityClassifier(WikidataLengthTokenizer(api, 1), api, 1, 1, page_threads)
+    result = classifier.classify_sequence_get_chosen_tokens(create_sequence())
+    return [(t.token, r.result_entity, r.score) for t, r in result], api
+
+
+def test_candidate_pages_are_evaluated_concurrently():
+    serial_result, serial_api = classify(1)
+    threaded_result, threaded_api = classify(4)
+
+    assert threaded_result == serial_result
+    assert [(token, entity) for token, entity, _ in serial_result] == [("Jan", "Q1"), ("Nowak", "Q4")]
+    # Q1 is candidate of two groups, but it is evaluated once
+    assert serial_api.calls["Q1"] == threaded_api.calls["Q1"] == 1
+    assert serial_api.max_in_flight == 1
+    assert threaded_api.max_in_flight > 1
+
+
+def test_classifier_with_threads_can_be_pickled():
+    api = FakeWikidataAPI()
+    classifier = NoContextGraphEntityClassifier(WikidataLengthTokenizer(api, 1), api, 1, 1, 4)
+    classifier.classify_sequence_get_chosen_tokens(create_sequence())
+    copy = pickle.loads(pickle.dumps(classifier))
+    assert copy.classify_sequence_get_chosen_tokens(create_sequence())[0][1].result_entity == "Q1"
+
+
+class FlushCountingWikidataAPI(FakeWikidataAPI):
+    def __init__(self):
+        self.flushes = 0
+
+    def flush(self) -> None:
+        # API is flushed after every sequence, the same API classifies next sequences of worker
+        self.flushes += 1
+        if self.flushes > 1:
+            METRICS.inc("test.reused_api")
+
+
+def test_workers_keep_classifier_between_sequences():
+    api = FlushCountingWikidataAPI()
+    classifier = NoContextGraphEntityClassifier(WikidataLengthTokenizer(api, 1), api, 1, 2)
+    sequences = [create_sequence() for _ in range(6)]
+    for x, sequence in enumerate(sequences):
+        sequence.id = x
+    METRICS.collect()
+
+    result = classifier.classify_sequences(sequences)
+
+    assert len(result) > 0
+    counters = classifier.run_metrics.snapshot()["counters"]
+    assert counters["classifier.sequences"] == 6
+    # every worker unpickles classifier once
+    assert counters["test.reused_api"] >= 4
@@ -0,0 +1,102 @@
+import json
+import socket
+from threading import Thread
+
+import pytest
+
+from entity_linking.entity_classifier import NoContextGraphEntityClassifier
+from entity_linking.linking_service import (LatencyHistogram, LinkingService,
+                                            MicroBatcher, create_server)
+from entity_linking.load_test_client import (run_load_test,
+                                             send_link_request,
+                                             sequence_to_request)
+from entity_linking.tokenizer import WikidataMorphTagsTokenizer
+from entity_linking.wikidata_api import CachedWikidataAPI
+from .test_utils import FakeWikidataAPI, create_test_sequence
+
+
+@pytest.fixture
+def service():
+    api = FakeWikidataAPI()
+    classifier = NoContextGraphEntityClassifier(WikidataMorphTagsTokenizer(api, 2), api, 2, 1)
+    return LinkingService(classifier, 4, 0.05)
+
+
+@pytest.fixture
+def server_url(service):
+    server = create_server(service, "127.0.0.1", 0)
+    thread = Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_latency_histogram():
+    histogram = LatencyHistogram()
+    for latency in [0.0005, 0.003, 0.003, 0.2]:
+        histogram.record(latency)
+    d = histogram.to_dict()
+    assert d["count"] == 4
+    assert d["p50_ms"] == 5
+    assert d["p99_ms"] == 200
+    assert d["buckets"]["le_5ms"] == 2
+
+
+def test_micro_batcher_groups_items():
+    sizes = []
+
+    def handler(items):
+        sizes.append(len(items))
+        return [x * 2 for x in items]
+
+    batcher = MicroBatcher(handler, 3, 0.2)
+    futures = [batcher.submit(x) for x in range(5)]
+    assert [f.result() for f in futures] == [0, 2, 4, 6, 8]
+    assert sizes == [3, 2]
+
+
+def test_service_wraps_api_with_cache(service):
+    assert isinstance(service.classifier.wikidata_api, CachedWikidataAPI)
+    assert service.classifier.tokenizer.wikidata_API is service.classifier.wikidata_api
+
+
+def test_link(service):
+    response = service.link(sequence_to_request(create_test_sequence(0)))
+    assert response["tokens"] == ["Jan", "Nowak", "idzie", "."]
+    assert response["spans"] == [{"start": 0, "end": 1, "token": "Jan", "entity": "Q1", "score": 0.5}]
+
+
+def test_http_server(server_url):
+    response = send_link_request(server_url, sequence_to_request(create_test_sequence(0)))
+    assert response["spans"][0]["entity"] == "Q1"
+
+    result = run_load_test(server_url, [create_test_sequence(0)], 4, 20)
+    assert result["errors"] == 0
+    assert result["histogram"].count == 20
+
+
+def test_unix_socket_server(service, tmp_path):
+    socket_path = str(tmp_path / "linking.sock")
+    server = create_server(service, socket_path=socket_path)
+    thread = Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    body = json.dumps(sequence_to_request(create_test_sequence(0))).encode("utf-8")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(socket_path)
+        s.sendall(
+            b"POST /link HTTP/1.0\r\nContent-Type: application/json\r\n"
+            + f"Content-Length: {len(body)}\r\n\r\n".encode("utf-8")
+            + body
+        )
+        data = b""
+        while True:
+            chunk = s.recv(4096)
+            if not chunk:
+                break
+            data += chunk
+
+    server.shutdown()
+    server.server_close()
+    assert json.loads(data.split(b"\r\n\r\n", 1)[1])["spans"][0]["entity"] == "Q1"
@@ -0,0 +1,42 @@
+from entity_linking.morph_analyser import MorfeuszAnalyser, get_analyser, get_morfeusz
+
+TEST_TEXT: str = "Ala ma kota, a 11-latkowie (np. Jan) poszli do domu.  Nowy\tTarg 3,5 mln zł!"
+
+
+def test_analyse_same_as_morfeusz():
+    analyser = MorfeuszAnalyser()
+    assert analyser.analyse(TEST_TEXT) == get_morfeusz().analyse(TEST_TEXT)
+
+
+def test_analyse_uses_cache():
+    analyser = MorfeuszAnalyser()
+    analyser.analyse("kot kot kot")
+    assert analyser.misses == 1
+    assert analyser.hits == 2
+    assert analyser.cache_len() == 1
+
+
+def test_cache_is_bounded():
+    analyser = MorfeuszAnalyser(cache_size=2)
+    analyser.analyse("dom kot pies")
+    assert analyser.cache_len() == 2
+    analyser.analyse("dom")
+    assert analyser.misses == 4
+
+
+def test_analyse_many():
+    analyser = MorfeuszAnalyser()
+    texts = ["Nowy Targ", "", "kot i pies"]
+    result = analyser.analyse_many(texts)
+    assert result == [get_morfeusz().analyse(t) for t in texts]
+
+
+def test_get_analyser_is_shared():
+    assert get_analyser() is get_analyser()
+
+
+def test_analyse_many_analyses_form_once():
+    analyser = MorfeuszAnalyser(cache_size=1)
+    result = analyser.analyse_many(["dom kot", "kot dom"])
+    assert analyser.misses == 2
+    assert result == [get_morfeusz().analyse(t) for t in ["dom kot", "kot dom"]]
@@ -0,0 +1,118 @@
+import pickle
+
+import pytest
+
+from entity_linking.negative_cache import (BloomFilter,
+                                           NegativeCacheWikidataAPI)
+from entity_linking.utils import EntityAncestors
+from .test_utils import FakeWikidataAPI
+
+
+class CountingAPI(FakeWikidataAPI):
+    def __init__(self):
+        self.calls = []
+
+    def get_subclasses_for_entity(self, entity):
+        self.calls.append(entity)
+        return super().get_subclasses_for_entity(entity)
+
+    def get_pages_for_token(self, token):
+        self.calls.append(token)
+        return super().get_pages_for_token(token)
+
+
+def test_bloom_filter_false_positive_rate():
+    bloom = BloomFilter.create(2000, 0.01)
+    # key reported as present before it is added is not counted
+    added = sum(bloom.add(f"t:{x}") for x in range(2000))
+    assert added > 1980 and bloom.count == added
+
+    assert all(f"t:{x}" in bloom for x in range(2000))
+    assert not bloom.add("t:1")
+    assert bloom.estimated_false_positive_rate() == pytest.approx(0.01, rel=0.2)
+
+    false_positives = sum(f"e:{x}" in bloom for x in range(10000))
+    assert false_positives / 10000 < 0.02
+
+
+def test_bloom_filter_save_load_union(tmp_path):
+    file_name = str(tmp_path / "negative.bloom")
+    first, second = BloomFilter.create(100, 0.01), BloomFilter.create(100, 0.01)
+    first.add("t:Kowalski")
+    second.add("e:Q404")
+    second.save(file_name)
+
+    first.union(BloomFilter.load(file_name))
+    assert "t:Kowalski" in first and "e:Q404" in first
+    assert first.count == 2
+
+    with pytest.raises(ValueError):
+        first.union(BloomFilter.create(1000, 0.01))
+
+
+def test_negative_lookups_skip_api(tmp_path):
+    file_name = str(tmp_path / "negative.bloom")
+    inner = CountingAPI()
+    api = NegativeCacheWikidataAPI(inner, file_name, capacity=100, verify_every=0)
+
+    for _ in range(3):
+        assert api.get_pages_for_token("Kowalski") == []
+        assert api.get_pages_for_token("Jan") == ["Q2", "Q1"]
+        assert api.get_subclasses_for_entity("Q5") == []
+    assert inner.calls == ["Kowalski", "Jan", "Q5", "Jan", "Jan"]
+    assert api.hits == 4
+
+    api.save()
+    inner.calls.clear()
+    loaded = NegativeCacheWikidataAPI(inner, file_name)
+    assert loaded.get_subclasses_for_entity("Q5") == []
+    # token and entity with the same name are other keys
+    assert loaded.get_subclasses_for_entity("Kowalski") == []
+    assert inner.calls == ["Kowalski"]
+
+    # worker loads filter from file
+    assert pickle.loads(pickle.dumps(api)).get_pages_for_token("Kowalski") == []
+    assert inner.calls == ["Kowalski"]
+
+
+def test_verified_lookups_measure_false_positives():
+    inner = CountingAPI()
+    api = NegativeCacheWikidataAPI(inner, capacity=100, verify_every=2)
+    # key of lookup with result added by hand simulates false positive
+    api.filter.add("t:Nowak")
+    api.get_pages_for_token("Kowalski")
+
+    results = [api.get_pages_for_token(t) for t in ["Nowak", "Nowak", "Kowalski", "Kowalski"]]
+
+    assert results == [[], ["Q2"], [], []]
+    stats = api.stats()
+    assert (stats["hits"], stats["verified"], stats["measured_fp_rate"]) == (4, 2, 0.5)
+    assert 0 < stats["estimated_fp_rate"] < 0.01
+
+
+def test_ancestors_are_read_from_wrapped_api(tmp_path):
+    class AncestorsAPI(CountingAPI):
+        def get_entity_ancestors(self, entity, depth):
+            return EntityAncestors([(entity, "Q5", 0)], ["Q5"])
+
+    api = AncestorsAPI()
+    negative = NegativeCacheWikidataAPI(api, str(tmp_path / "negative.bloom"))
+    assert negative.get_entity_ancestors("Q1", 3).edges == [("Q1", "Q5", 0)]
+    assert api.calls == []
+
+
+def test_worker_keys_are_saved_by_flush(tmp_path):
+    file_name = str(tmp_path / "negative.bloom")
+    api = NegativeCacheWikidataAPI(CountingAPI(), file_name, capacity=100, verify_every=0)
+
+    # every worker gets API pickled by Pool
+    for token in ["Kowalski", "Nowy", "Targ"]:
+        worker = pickle.loads(pickle.dumps(api))
+        assert worker.get_pages_for_token(token) == []
+        worker.flush()
+
+    worker = pickle.loads(pickle.dumps(api))
+    assert worker.filter.count == 3
+    for token in ["Kowalski", "Nowy", "Targ"]:
+        assert worker.get_pages_for_token(token) == []
+    assert worker.api.calls == []
@@ -0,0 +1,90 @@
+import pytest
+
+from entity_linking.entity_classifier import NoContextGraphEntityClassifier
+from entity_linking.prewarm import DATABASE_PHASES, prewarm_cache
+from entity_linking.synthetic import (create_synthetic_wikidata_api,
+                                      generate_sequences, generate_taxonomy)
+from entity_linking.tokenizer import WikidataLengthTokenizer
+from entity_linking.wikidata_api import CachedWikidataAPI, WikidataAPI
+
+
+class FailingAPI(WikidataAPI):
+    def get_subclasses_for_entity(self, entity):
+        raise AssertionError(f"not prewarmed entity: {entity}")
+
+    def get_pages_for_token(self, token):
+        raise AssertionError(f"not prewarmed token: {token}")
+
+    def get_wikipedia_title(self, entity):
+        raise AssertionError(f"not prewarmed title: {entity}")
+
+    def get_wikipedia_content(self, page_title):
+        raise AssertionError(f"not prewarmed content: {page_title}")
+
+
+def test_classification_after_prewarm_needs_no_lookup():
+    synthetic = generate_taxonomy(4, 3, 2, roots=2)
+    sequences = generate_sequences(synthetic, 5, 20)
+    api = CachedWikidataAPI(create_synthetic_wikidata_api(synthetic, ambiguity=3))
+
+    report = prewarm_cache(api, WikidataLengthTokenizer(api, 1), iter(sequences), 4, concurrency=4)
+
+    assert report.sequences == 5
+    assert report.unique_queries < report.queries
+    assert 0 < report.target_pages <= report.unique_pages < report.unique_entities
+    assert report.wikipedia_pages > 0
+    assert report.failed == {}
+    assert report.projected_hit_rate() == 1.0
+    # in-memory cache has no hit and miss counters
+    assert report.cold_hit_rate() is None
+    assert "projected hit rate: 100.0%" in str(report)
+
+    expected_api = create_synthetic_wikidata_api(synthetic, ambiguity=3)
+    expected_classifier = NoContextGraphEntityClassifier(
+        WikidataLengthTokenizer(expected_api, 1), expected_api, 4, 1, page_threads=1
+    )
+
+    api.api = FailingAPI()
+    classifier = NoContextGraphEntityClassifier(WikidataLengthTokenizer(api, 1), api, 4, 1, page_threads=1)
+    linked = []
+    for sequence in sequences:
+        expected = expected_classifier.classify_sequence_get_chosen_tokens(sequence)
+        result = classifier.classify_sequence_get_chosen_tokens(sequence)
+        assert [r.result_entity for _, r in result] == [r.result_entity for _, r in expected]
+        linked.extend(r.result_entity for _, r in result)
+
+    # wikipedia pages of linked entities are cached too
+    assert linked
+    for entity in linked:
+        api.get_wikipedia_content(api.get_wikipedia_title(entity))
+
+
+def test_failed_lookups_are_counted():
+    class BrokenPagesAPI(FailingAPI):
+        def get_pages_for_token(self, token):
+            if token.startswith("Byt"):
+                raise ValueError(token)
+            return []
+
+    synthetic = generate_taxonomy(3, 2, 1)
+    api = BrokenPagesAPI()
+    report = prewarm_cache(api, WikidataLengthTokenizer(api, 1), generate_sequences(synthetic, 3, 10), 2)
+
+    assert report.failed["pages"] > 0
+    assert report.projected_hit_rate() < 1.0
+    assert report.unique_pages == 0
+
+
+def test_projected_hit_rate_counts_persistent_phases():
+    synthetic = generate_taxonomy(4, 3, 2, roots=2)
+    api = CachedWikidataAPI(create_synthetic_wikidata_api(synthetic, ambiguity=3))
+    report = prewarm_cache(
+        api, WikidataLengthTokenizer(api, 1), generate_sequences(synthetic, 5, 20), 4, persistent_phases=DATABASE_PHASES
+    )
+
+    wikipedia_lookups = report.lookups["wikipedia_title"] + report.lookups["wikipedia_content"]
+    assert wikipedia_lookups > 0
+    assert report.projected_hit_rate() == pytest.approx(1.0 - wikipedia_lookups / sum(report.lookups.values()))
+
+    report.persistent_phases = ()
+    assert report.projected_hit_rate() == 0.0
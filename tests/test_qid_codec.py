@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from entity_linking.qid_codec import (DECODE_LOOP_MAX_BYTES,
+                                      decode_qid_numbers, decode_qids,
+                                      encode_qids)
+
+
+@pytest.mark.parametrize(
+    "ids",
+    [
+        [],
+        ["Q5"],
+        ["Q5", "Q43229", "Q1", "Q1"],
+        ["Q4167410", "P31", "L7", "Q0"],
+        [f"Q{2 ** 40}", "Q3", f"Q{2 ** 60}"],
+    ],
+)
+def test_encode_decode(ids):
+    data = encode_qids(ids)
+    assert isinstance(data, bytes)
+    assert decode_qids(data) == ids
+
+
+def test_encoded_list_is_compact():
+    ids = [f"Q{x}" for x in range(1000000, 1000100)]
+    data = encode_qids(ids)
+    # first ID takes 4 bytes, every next one 1 byte
+    assert len(data) == 1 + 4 + 99
+    assert len(data) < len("".join(f"{x};" for x in ids)) / 8
+
+
+def test_decode_qid_numbers():
+    numbers, kinds = decode_qid_numbers(encode_qids(["Q10", "P31", "Q2"]))
+    np.testing.assert_array_equal(numbers, [10, 31, 2])
+    np.testing.assert_array_equal(kinds, [0, 1, 0])
+
+
+def test_short_and_long_lists_are_decoded_the_same():
+    ids = [f"Q{x * 7919}" for x in range(300)] + ["P31", "Q1"]
+    data = encode_qids(ids)
+    assert len(data) > DECODE_LOOP_MAX_BYTES
+    assert decode_qids(data) == ids
+
+    for size in [1, 10, 50]:
+        assert len(encode_qids(ids[:size])) <= DECODE_LOOP_MAX_BYTES
+        assert decode_qids(encode_qids(ids[:size])) == ids[:size]
+
+
+def test_decode_text():
+    assert decode_qids("Q1;Q2;") == ["Q1", "Q2"]
+    assert decode_qids("") == []
+
+
+def test_invalid_input():
+    with pytest.raises(ValueError):
+        encode_qids(["Q1", "abc"])
+    with pytest.raises(ValueError):
+        decode_qids(b"\x07\x01")
+    with pytest.raises(ValueError):
+        decode_qids(encode_qids(["Q1000"])[:-1])
+    with pytest.raises(ValueError):
+        decode_qids(b"")
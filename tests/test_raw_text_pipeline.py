@@ -0,0 +1,39 @@
+from entity_linking.parser.parsed_text import ParsedText
+from entity_linking.raw_text_pipeline import (choose_analysis,
+                                              choose_tokens_path,
+                                              get_sequences_from_raw_text,
+                                              text_to_sequence)
+from entity_linking.utils import NOT_WIKIDATA_ENTITY_SIGN
+
+TEST_LINES = ["Nowy Targ leży w Polsce.\n", "\n", "Zaginieni 11-latkowie, Jan i Ala.\n"]
+
+
+def test_text_to_sequence():
+    sequence = text_to_sequence("Nowy Targ leży w Polsce.", 3)
+    assert sequence.id == 3
+    assert [t.token_value for t in sequence.sequence] == ["Nowy", "Targ", "leży", "w", "Polsce", "."]
+    assert [t.preceding_token for t in sequence.sequence] == [0, 1, 1, 1, 1, 0]
+    assert sequence.sequence[4].lemma == "Polska"
+    assert sequence.sequence[4].get_first_morph_tags_part() == "subst"
+    assert all(t.entity_id == NOT_WIKIDATA_ENTITY_SIGN for t in sequence.sequence)
+
+
+def test_choose_analysis_prefers_subst():
+    analyses = [(0, 1, ("Zaginieni", "zaginiony:A", "adj:pl:nom.voc:m1:pos", [], [])),
+                (0, 1, ("Zaginieni", "zaginiony:S", "subst:pl:nom.voc:m1", [], []))]
+    assert choose_analysis(ParsedText.from_analyses(analyses), 0) == ("zaginiony", "subst:pl:nom.voc:m1")
+
+
+def test_choose_tokens_path_takes_longest_segment():
+    analyses = [(0, 1, ("miał", "mieć", "praet:sg:m1:imperf", [], [])),
+                (0, 2, ("miałem", "miał", "subst:sg:inst:m3", [], [])),
+                (1, 2, ("em", "być", "aglt:sg:pri:imperf:wok", [], [])),
+                (2, 3, ("kot", "kot", "subst:sg:nom:m2", [], []))]
+    assert choose_tokens_path(ParsedText.from_analyses(analyses)) == [1, 3]
+
+
+def test_get_sequences_from_raw_text_serial_and_pool():
+    serial = list(get_sequences_from_raw_text(TEST_LINES, 1))
+    pool = list(get_sequences_from_raw_text(TEST_LINES, 2, 1))
+    assert [s.id for s in serial] == [0, 1]
+    assert serial == pool
@@ -0,0 +1,197 @@
+import json
+import re
+import socketserver
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from threading import Thread
+from typing import List
+from urllib.parse import parse_qs
+
+import pytest
+from wikidata.entity import EntityId
+
+from entity_linking.entity_classifier import (
+    NoContextGraphEntityClassifier, WikipediaContextGraphEntityClassifier)
+from entity_linking.graph_wikidata import create_graph_for_entity
+from entity_linking.reachability import (ApiReachability, CachedReachability,
+                                         ReachabilityBackend,
+                                         SparqlReachability,
+                                         create_reachability_query)
+from entity_linking.tokenizer import WikidataLengthTokenizer
+from entity_linking.utils import Token, TokensSequence
+from entity_linking.wikidata_api import InMemoryWikidataAPI
+
+TARGETS = ["Q5", "Q43229"]
+SUBCLASSES = {
+    "Q1": ["Q5"],
+    "Q2": ["Q3"],
+    "Q3": ["Q7"],
+    "Q7": ["Q43229", "Q2"],
+    "Q4": ["Q9", "Q3"],
+    "Q9": ["Q5"],
+    "Q6": ["Q4167410"],
+    "Q4167410": ["Q5"],
+}
+ENTITY_PREFIX = "http://www.wikidata.org/entity/"
+
+
+class SparqlStandInHandler(BaseHTTPRequestHandler):
+    """
+    Stand-in of SPARQL service - it evaluates queries created by ``create_reachability_query`` on SUBCLASSES.
+    """
+
+    queries: List[str] = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"])).decode()
+        query = parse_qs(body)["query"][0]
+        type(self).queries.append(query)
+
+        items = re.findall(r"wd:(Q\d+)", re.search(r"VALUES \?item \{(.*?)\}", query).group(1))
+        targets = re.findall(r"wd:(Q\d+)", re.search(r"VALUES \?target \{(.*?)\}", query).group(1))
+        max_depth = max(int(d) for d in re.findall(r"BIND\((\d+) AS \?depth\)", query))
+
+        bindings = []
+        for item in items:
+            # property paths go through every node, also through disambiguation page
+            this_level, distances = [item], {}
+            for depth in range(1, max_depth + 1):
+                this_level = [p for e in this_level for p in SUBCLASSES.get(e, [])]
+                for p in this_level:
+                    if p in targets and p not in distances:
+                        distances[p] = depth
+            for target, distance in distances.items():
+                bindings.append(
+                    {
+                        "item": {"type": "uri", "value": ENTITY_PREFIX + item},
+                        "target": {"type": "uri", "value": ENTITY_PREFIX + target},
+                        "distance": {"type": "literal", "value": str(distance)},
+                    }
+                )
+
+        data = json.dumps({"results": {"bindings": bindings}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/sparql-results+json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+@pytest.fixture
+def sparql_url():
+    SparqlStandInHandler.queries = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SparqlStandInHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/sparql"
+    server.shutdown()
+    server.server_close()
+
+
+def test_create_reachability_query():
+    query = create_reachability_query(["Q1", "Q2"], TARGETS, 2)
+
+    assert "VALUES ?item { wd:Q1 wd:Q2 }" in query
+    assert "VALUES ?target { wd:Q5 wd:Q43229 }" in query
+    assert "?item (wdt:P31|wdt:P279|wdt:P1269) ?target . BIND(1 AS ?depth)" in query
+    assert "?item (wdt:P31|wdt:P279|wdt:P1269)/(wdt:P31|wdt:P279|wdt:P1269) ?target . BIND(2 AS ?depth)" in query
+    assert "MIN(?depth) AS ?distance" in query
+    assert "BIND(3 AS ?depth)" not in query
+
+
+def test_sparql_reachability(sparql_url):
+    backend = SparqlReachability(sparql_url, TARGETS, batch_size=2)
+    result = backend.get_reachable_targets(["Q1", "Q2", "Q4", "Q8", "Q1"], 3)
+
+    assert result == {"Q1": {"Q5": 1}, "Q2": {"Q43229": 3}, "Q4": {"Q5": 2, "Q43229": 3}, "Q8": {}}
+    # 4 unique candidates in batches of 2
+    assert len(SparqlStandInHandler.queries) == 2
+    assert backend.get_target_distances("Q2", 2) == {}
+
+
+def test_api_reachability_matches_graph():
+    api = InMemoryWikidataAPI(SUBCLASSES, {})
+    backend = ApiReachability(api, TARGETS)
+
+    for entity in ["Q1", "Q2", "Q4", "Q6", "Q8"]:
+        graph = create_graph_for_entity(EntityId(entity), api, 3)
+        distances = backend.get_target_distances(entity, 3)
+        assert set(distances) == {t for t in TARGETS if t in graph.nodes}
+
+    # disambiguation page is not expanded
+    assert backend.get_target_distances("Q6", 3) == {}
+
+
+def test_cached_reachability_batches_only_missing(sparql_url):
+    backend = CachedReachability(SparqlReachability(sparql_url, TARGETS))
+
+    backend.get_reachable_targets(["Q1", "Q2"], 3)
+    assert backend.get_reachable_targets(["Q1", "Q2", "Q4"], 3) == {
+        "Q1": {"Q5": 1},
+        "Q2": {"Q43229": 3},
+        "Q4": {"Q5": 2, "Q43229": 3},
+    }
+    assert backend.get_target_distances("Q4", 3) == {"Q5": 2, "Q43229": 3}
+
+    assert len(SparqlStandInHandler.queries) == 2
+    assert "wd:Q1" not in SparqlStandInHandler.queries[1]
+    assert (backend.hits, backend.misses) == (3, 3)
+
+
+class CountingReachability(ReachabilityBackend):
+    def __init__(self, backend: ReachabilityBackend):
+        self.backend = backend
+        self.calls = []
+
+    def get_reachable_targets(self, entities, max_depth):
+        self.calls.append(list(entities))
+        return self.backend.get_reachable_targets(entities, max_depth)
+
+
+def test_classifier_skips_unreachable_pages():
+    class PagesAPI(InMemoryWikidataAPI):
+        fetched = []
+
+        def get_subclasses_for_entity(self, entity):
+            self.fetched.append(entity)
+            return super().get_subclasses_for_entity(entity)
+
+    api = PagesAPI(SUBCLASSES, {"Jan": ["Q8", "Q1"]})
+    reachability = CountingReachability(ApiReachability(InMemoryWikidataAPI(SUBCLASSES, {}), TARGETS))
+    classifier = NoContextGraphEntityClassifier(
+        WikidataLengthTokenizer(api, 1), api, 3, 1, page_threads=1, reachability=CachedReachability(reachability)
+    )
+
+    sequence = TokensSequence([Token(t, 1, "_", "_", t, "subst:sg:nom:m1") for t in ["Jan", "ma"]], 0)
+    _, results = classifier.classify_tokens_groups(sequence)
+
+    # original and lemma form
+    assert [r.result_entity for r in results] == ["Q1", "Q1"]
+    # one batch for all pages of sequence, Q8 has no graph
+    assert reachability.calls == [["Q8", "Q1"]]
+    assert "Q8" not in PagesAPI.fetched
+
+
+
+def test_wikipedia_classifier_doesnt_walk_reachable_pages():
+    class WikipediaAPI(InMemoryWikidataAPI):
+        fetched = []
+
+        def get_subclasses_for_entity(self, entity):
+            self.fetched.append(entity)
+            return super().get_subclasses_for_entity(entity)
+
+    api = WikipediaAPI(SUBCLASSES, {"Jan": ["Q8", "Q1"]})
+    reachability = CachedReachability(ApiReachability(InMemoryWikidataAPI(SUBCLASSES, {}), TARGETS))
+    classifier = WikipediaContextGraphEntityClassifier(
+        WikidataLengthTokenizer(api, 1), api, 3, 1, page_threads=1, reachability=reachability
+    )
+
+    assert classifier.get_page_graph("Q1") is not None
+    assert classifier.get_page_graph("Q8") is None
+    assert WikipediaAPI.fetched == []
@@ -0,0 +1,150 @@
+import sqlite3
+import time
+
+import pandas as pd
+import pytest
+
+from entity_linking.entity_classifier import \
+    WikipediaContextGraphEntityClassifier
+from entity_linking.load_test_data import \
+    load_sequences_from_test_file_with_lemmas_and_tags
+from entity_linking.sharded_run import (JOB_DONE, JOB_FAILED, JOB_PENDING,
+                                        JobQueue, merge_results,
+                                        read_sequences, run_worker,
+                                        split_sequences)
+from entity_linking.tokenizer import WikidataMorphTagsTokenizer
+from .benchmarks.fake_api import SEQUENCES_FILE, FixtureWikidataAPI
+
+SEQUENCES_NUMBER = 12
+
+
+def create_classifier():
+    api = FixtureWikidataAPI()
+    return WikipediaContextGraphEntityClassifier(WikidataMorphTagsTokenizer(api, 2), api, 6, 1, page_threads=1)
+
+
+def create_queue(tmp_path, shard_size=5):
+    queue = JobQueue(str(tmp_path / "queue.db"))
+    queue.create(SEQUENCES_FILE, split_sequences(SEQUENCES_FILE, SEQUENCES_NUMBER, shard_size),
+                 str(tmp_path / "results"), max_attempts=2)
+    return queue
+
+
+def test_ranges_read_the_same_sequences():
+    ranges = split_sequences(SEQUENCES_FILE, SEQUENCES_NUMBER, 5)
+    expected = load_sequences_from_test_file_with_lemmas_and_tags(SEQUENCES_FILE, SEQUENCES_NUMBER)
+
+    assert [(r.first_sequence, r.sequences) for r in ranges] == [(0, 5), (5, 5), (10, 2)]
+    assert all(a.end == b.start for a, b in zip(ranges, ranges[1:]))
+
+    sequences = [s for r in ranges for s in read_sequences(SEQUENCES_FILE, r)]
+    assert [s.id for s in sequences] == list(range(SEQUENCES_NUMBER))
+    assert [s.sequence for s in sequences] == [s.sequence for s in expected]
+
+    # all sequences of file
+    everything = split_sequences(SEQUENCES_FILE, 0, 1000)
+    assert len(everything) == 1
+    assert everything[0].sequences >= SEQUENCES_NUMBER
+
+
+def test_sharded_run_is_the_same_as_one_run(tmp_path):
+    queue = create_queue(tmp_path)
+    expected = create_classifier().classify_sequences_from_file(SEQUENCES_FILE, SEQUENCES_NUMBER)
+
+    # two workers share jobs
+    assert run_worker(create_classifier(), queue.database_name, "first", max_jobs=1) == 1
+    assert run_worker(create_classifier(), queue.database_name, "second") == 2
+    assert queue.progress()[JOB_DONE] == 3
+    assert [job.worker for job in queue.get_jobs()] == ["first", "second", "second"]
+
+    result, metrics, seq_number = merge_results(queue.database_name)
+
+    pd.testing.assert_frame_equal(result, expected)
+    assert seq_number == SEQUENCES_NUMBER
+    assert metrics.snapshot()["counters"]["classifier.sequences"] == SEQUENCES_NUMBER
+    assert metrics.snapshot()["timers"]["classifier.run"]["count"] == 3
+
+
+def test_claim_lease_and_failures(tmp_path):
+    queue = create_queue(tmp_path)
+    with pytest.raises(ValueError):
+        queue.create(SEQUENCES_FILE, [], str(tmp_path / "results"))
+
+    first = queue.claim("a")
+    assert (first.id, first.attempts) == (1, 1)
+    assert queue.claim("b").id == 2
+
+    # lease of "a" expired - job is claimed again and "a" can't complete it
+    again = queue.claim("c", lease=-1)
+    assert (again.id, again.worker, again.attempts) == (1, "c", 2)
+    assert not queue.complete(first)
+    assert queue.complete(again)
+
+    third = queue.claim("a")
+    queue.fail(third, "error")
+    third = queue.claim("a")
+    assert third.id == 3
+    queue.fail(third, "error again")
+
+    jobs = queue.get_jobs()
+    assert [job.status for job in jobs] == [JOB_DONE, "running", JOB_FAILED]
+    assert jobs[2].error == "error again"
+    assert queue.claim("a") is None
+    assert queue.progress()[JOB_PENDING] == 0
+
+    with pytest.raises(ValueError):
+        merge_results(queue.database_name)
+
+
+def test_expired_job_is_failed_after_max_attempts(tmp_path):
+    queue = create_queue(tmp_path)
+    assert queue.claim("a").attempts == 1
+    assert queue.claim("b", lease=-1).attempts == 2
+
+    # the second lease of job 1 expired, it is not claimed the third time
+    job = queue.claim("c", lease=-1)
+    assert (job.id, job.attempts) == (2, 1)
+
+    first = queue.get_jobs()[0]
+    assert first.status == JOB_FAILED
+    assert first.error == "Lease expired 2 times"
+
+
+class SlowClassifier(WikipediaContextGraphEntityClassifier):
+    def __init__(self, queue, lease, steal=False):
+        api = FixtureWikidataAPI()
+        super().__init__(WikidataMorphTagsTokenizer(api, 2), api, 6, 1, page_threads=1)
+        self.queue = queue
+        self.lease = lease
+        self.steal = steal
+        self.claims = []
+
+    def classify_sequences(self, sequences):
+        if self.steal:
+            conn = sqlite3.connect(self.queue.database_name)
+            with conn:
+                conn.execute("UPDATE jobs SET worker = 'other'")
+            conn.close()
+        # job is classified longer than lease
+        time.sleep(self.lease * 2)
+        self.claims.append(self.queue.claim("other", self.lease))
+        return super().classify_sequences(sequences)
+
+
+def test_claim_is_renewed_while_job_is_classified(tmp_path):
+    queue = create_queue(tmp_path, shard_size=SEQUENCES_NUMBER)
+    classifier = SlowClassifier(queue, 0.3)
+
+    assert run_worker(classifier, queue.database_name, "a", lease=classifier.lease) == 1
+    assert classifier.claims == [None]
+    assert queue.progress()[JOB_DONE] == 1
+
+
+def test_job_claimed_by_other_worker_is_not_counted(tmp_path):
+    queue = create_queue(tmp_path, shard_size=SEQUENCES_NUMBER)
+    classifier = SlowClassifier(queue, 0.1, steal=True)
+
+    assert run_worker(classifier, queue.database_name, "a", lease=classifier.lease) == 0
+    assert [job.worker for job in queue.get_jobs()] == ["other"]
+    with pytest.raises(ValueError):
+        run_worker(classifier, queue.database_name, lease=0)
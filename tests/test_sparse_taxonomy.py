@@ -0,0 +1,184 @@
+import pickle
+import sqlite3
+
+import numpy as np
+import pytest
+from wikidata.entity import EntityId
+
+from entity_linking.entity_classifier import (
+    NoContextGraphEntityClassifier, SparseTaxonomyEntityClassifier)
+from entity_linking.graph_wikidata import (check_if_target_entity_is_in_graph,
+                                           create_graph_for_entity,
+                                           get_graph_score)
+from entity_linking.reachability import ApiReachability
+from entity_linking.sparse_taxonomy import (SparseReachability,
+                                            SparseTaxonomy, get_entity_number,
+                                            load_taxonomy_from_db)
+from entity_linking.synthetic import (create_synthetic_wikidata_api,
+                                      generate_sequences, generate_taxonomy)
+from entity_linking.tokenizer import WikidataLengthTokenizer
+from entity_linking.wikidata_api import InMemoryWikidataAPI
+
+TARGETS = ["Q5", "Q43229"]
+SUBCLASSES = {
+    "Q1": ["Q5"],
+    "Q2": ["Q3"],
+    "Q3": ["Q7"],
+    "Q7": ["Q43229", "Q2"],
+    "Q4": ["Q9", "Q3", "Q9"],
+    "Q9": ["Q5"],
+    "Q6": ["Q4167410"],
+    "Q4167410": ["Q5"],
+    "Q10": ["P31", "Q5"],
+}
+
+
+def test_get_entity_number():
+    assert get_entity_number("Q42") == 42
+    assert get_entity_number("P31") is None
+    assert get_entity_number("") is None
+
+
+def test_reachable_targets_match_api_walk():
+    taxonomy = SparseTaxonomy(SUBCLASSES, TARGETS)
+    api_backend = ApiReachability(InMemoryWikidataAPI(SUBCLASSES, {}), TARGETS)
+    entities = ["Q1", "Q2", "Q4", "Q6", "Q8", "Q10", "Q5"]
+
+    for depth in [1, 2, 3, 4]:
+        assert taxonomy.get_reachable_targets(entities, depth) == api_backend.get_reachable_targets(entities, depth)
+
+
+def test_walk_counts():
+    taxonomy = SparseTaxonomy(SUBCLASSES, TARGETS)
+    counts = taxonomy.get_walk_counts(["Q4", "Q404"], 3)
+
+    assert counts.shape == (2, 3, 2)
+    # duplicated edge Q4 -> Q9 is one edge
+    assert counts[0, :, 0].tolist() == [0, 1, 0]
+    assert counts[0, :, 1].tolist() == [0, 0, 1]
+    assert not counts[1].any()
+
+
+@pytest.mark.parametrize("fan_in", [1, 2])
+def test_walk_scores_match_graph_scores(fan_in):
+    synthetic = generate_taxonomy(4, 3, fan_in, roots=2)
+    taxonomy = SparseTaxonomy(synthetic.subclasses)
+    api = InMemoryWikidataAPI(synthetic.subclasses, {})
+    entities = synthetic.leaves[:20] + synthetic.levels[2][:5]
+
+    scores = taxonomy.get_walk_scores(entities, synthetic.depth)
+    for entity, score in zip(entities, scores):
+        graph = create_graph_for_entity(EntityId(entity), api, synthetic.depth)
+        assert check_if_target_entity_is_in_graph(graph)
+        assert score == pytest.approx(get_graph_score(graph, EntityId(entity)))
+
+    assert taxonomy.get_walk_scores(["Q404"], 2).tolist() == [0.0]
+
+
+@pytest.mark.parametrize("depth", [1, 2, 3])
+def test_walk_scores_of_shortcut_edges_match_graph_scores(depth):
+    # Q1 -> Q3 skips Q2 of path Q1 -> Q2 -> Q3, paths longer than depth are in graph
+    subclasses = {"Q1": ["Q2", "Q3"], "Q2": ["Q3"], "Q3": ["Q5"], "Q6": ["Q7", "Q5"], "Q7": ["Q8"], "Q8": ["Q5"]}
+    taxonomy = SparseTaxonomy(subclasses, TARGETS)
+    api = InMemoryWikidataAPI(subclasses, {})
+
+    entities = ["Q1", "Q2", "Q6"]
+    scores = taxonomy.get_walk_scores(entities, depth)
+    for entity, score in zip(entities, scores):
+        graph = create_graph_for_entity(EntityId(entity), api, depth)
+        expected = get_graph_score(graph, EntityId(entity)) if check_if_target_entity_is_in_graph(graph) else 0.0
+        assert score == pytest.approx(expected)
+
+    if depth == 2:
+        assert scores[0] == pytest.approx(1.0 / 3.0 + 1.0 / 4.0)
+
+
+def test_taxonomy_is_rebuilt_after_change():
+    taxonomy = SparseTaxonomy({"Q1": ["Q2"]}, TARGETS)
+    assert taxonomy.get_reachable_targets(["Q1"], 2) == {"Q1": {}}
+
+    taxonomy.add_subclasses({"Q2": ["Q5"]})
+    assert taxonomy.get_reachable_targets(["Q1"], 2) == {"Q1": {"Q5": 2}}
+    assert "Q2" in taxonomy and len(taxonomy) == 2
+
+    copy = pickle.loads(pickle.dumps(taxonomy))
+    assert copy.get_reachable_targets(["Q1"], 2) == {"Q1": {"Q5": 2}}
+
+
+def test_sparse_reachability_expands_missing_entities():
+    class CountingAPI(InMemoryWikidataAPI):
+        calls = []
+
+        def get_subclasses_for_entity(self, entity):
+            self.calls.append(entity)
+            return super().get_subclasses_for_entity(entity)
+
+    taxonomy = SparseTaxonomy({"Q2": ["Q3"], "Q3": ["Q7"]}, TARGETS)
+    backend = SparseReachability(taxonomy, CountingAPI(SUBCLASSES, {}))
+
+    assert backend.get_reachable_targets(["Q2", "Q4"], 3) == {"Q2": {"Q43229": 3}, "Q4": {"Q5": 2, "Q43229": 3}}
+    # entities at the last level are not expanded
+    assert sorted(CountingAPI.calls) == ["Q4", "Q5", "Q7", "Q9"]
+
+
+def test_load_taxonomy_from_db(tmp_path):
+    database_name = str(tmp_path / "test.db")
+    conn = sqlite3.connect(database_name)
+    conn.execute("CREATE TABLE entity(id TEXT PRIMARY KEY, sub TEXT)")
+    conn.executemany("INSERT INTO entity VALUES(?, ?)", [("Q1", "Q9;"), ("Q9", "Q5;"), ("Q5", "")])
+    conn.commit()
+    conn.close()
+
+    taxonomy = load_taxonomy_from_db(database_name, TARGETS)
+    assert len(taxonomy) == 3
+    np.testing.assert_array_equal(taxonomy.get_walk_scores(["Q1", "Q9"], 2), [1.0 / 3.0, 0.5])
+
+
+def test_sparse_classifier_matches_no_context_classifier():
+    synthetic = generate_taxonomy(4, 3, 2, roots=2)
+    api = create_synthetic_wikidata_api(synthetic, ambiguity=3)
+    sequences = generate_sequences(synthetic, 5, 20)
+
+    graph_classifier = NoContextGraphEntityClassifier(WikidataLengthTokenizer(api, 1), api, 4, 1, page_threads=1)
+    sparse_classifier = SparseTaxonomyEntityClassifier(WikidataLengthTokenizer(api, 1), api, 4, 1)
+
+    linked = 0
+    for sequence in sequences:
+        expected = graph_classifier.classify_sequence_get_chosen_tokens(sequence)
+        result = sparse_classifier.classify_sequence_get_chosen_tokens(sequence)
+        assert [(t.token, r.result_entity) for t, r in result] == [(t.token, r.result_entity) for t, r in expected]
+        linked += len(result)
+
+    assert linked > 0
+
+    # leaves and their ancestors were fetched once
+    assert 0 < len(sparse_classifier.taxonomy) < synthetic.nodes_count()
+
+
+def test_walk_scores_of_cyclic_taxonomy_match_graph_scores():
+    subclasses = {"Q1": ["Q2"], "Q2": ["Q3", "Q5"], "Q3": ["Q2", "Q5"], "Q4": ["Q4", "Q5"]}
+    taxonomy = SparseTaxonomy(subclasses, TARGETS)
+    api = InMemoryWikidataAPI(subclasses, {})
+
+    for entity in ["Q1", "Q2", "Q4"]:
+        graph = create_graph_for_entity(EntityId(entity), api, 4)
+        assert taxonomy.get_walk_scores([entity], 4)[0] == pytest.approx(get_graph_score(graph, EntityId(entity)))
+
+
+def test_sparse_classifier_scores_pages_once():
+    class CountingClassifier(SparseTaxonomyEntityClassifier):
+        batches = []
+
+        def get_walk_scores(self, pages):
+            self.batches.append(list(pages))
+            return super().get_walk_scores(pages)
+
+    api = InMemoryWikidataAPI(SUBCLASSES, {})
+    classifier = CountingClassifier(WikidataLengthTokenizer(api, 1), api, 3, 1)
+
+    classifier.prefetch_reachability(["Q1", "Q8", "Q4"])
+    graph = classifier.get_page_graph("Q1")
+    assert classifier.score_page(None, "Q1", graph) == pytest.approx(0.5)
+    assert classifier.get_page_graph("Q8") is None
+    assert [r.result_entity for r in classifier.classify_pages(None, ["Q4"])] == ["Q4"]
+    assert CountingClassifier.batches == [["Q1", "Q8", "Q4"]]
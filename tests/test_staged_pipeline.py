@@ -0,0 +1,100 @@
+import time
+
+import pandas as pd
+import pytest
+
+from entity_linking.entity_classifier import \
+    WikipediaContextGraphEntityClassifier
+from entity_linking.load_test_data import \
+    load_sequences_from_test_file_with_lemmas_and_tags
+from entity_linking.staged_pipeline import (PIPELINE_STAGES, StagedPipeline,
+                                            classify_sequences_with_pipeline,
+                                            format_pipeline_stats,
+                                            get_bottleneck, get_stage_workers)
+from entity_linking.tokenizer import WikidataMorphTagsTokenizer
+from entity_linking.wikidata_api import CachedWikidataAPI
+from .benchmarks.fake_api import SEQUENCES_FILE, FixtureWikidataAPI
+
+SEQUENCES_NUMBER = 12
+
+
+def create_classifier():
+    api = FixtureWikidataAPI()
+    return WikipediaContextGraphEntityClassifier(WikidataMorphTagsTokenizer(api, 2), api, 6, 1, page_threads=1)
+
+
+def test_pipeline_result_is_the_same_as_sequential():
+    classifier = create_classifier()
+    sequences = load_sequences_from_test_file_with_lemmas_and_tags(SEQUENCES_FILE, SEQUENCES_NUMBER)
+    expected = pd.concat([classifier.classify_sequence(s) for s in sequences]).reset_index(drop=True)
+
+    result, stats = classify_sequences_with_pipeline(
+        create_classifier(), SEQUENCES_FILE, SEQUENCES_NUMBER, {"graph": 3, "score": 2}, queue_size=2
+    )
+
+    pd.testing.assert_frame_equal(result, expected)
+    assert [s.name for s in stats] == PIPELINE_STAGES
+    assert all(s.items == SEQUENCES_NUMBER for s in stats)
+    assert [s.workers for s in stats if s.name in ("graph", "score")] == [3, 2]
+
+
+def test_pipeline_uses_cached_api():
+    classifier = create_classifier()
+    classify_sequences_with_pipeline(classifier, SEQUENCES_FILE, 2)
+
+    assert isinstance(classifier.wikidata_api, CachedWikidataAPI)
+    assert classifier.tokenizer.wikidata_API is classifier.wikidata_api
+    assert classifier.run_metrics.snapshot()["counters"]["classifier.sequences"] == 2
+
+
+def test_get_stage_workers():
+    workers = get_stage_workers({"lookup": 32})
+    assert list(workers) == PIPELINE_STAGES
+    assert workers["lookup"] == 32
+
+    with pytest.raises(ValueError):
+        get_stage_workers({"parse": 2})
+    with pytest.raises(ValueError):
+        get_stage_workers({"load": 2})
+
+
+def test_stage_workers_run_concurrently():
+    def slow(x):
+        time.sleep(0.05)
+        return x * 2
+
+    pipeline = StagedPipeline("source", [("slow", slow, 4)])
+    start_time = time.time()
+    result = sorted(pipeline.run(range(8)))
+
+    assert result == [x * 2 for x in range(8)]
+    assert time.time() - start_time < 0.35
+
+
+def test_bottleneck_and_backpressure():
+    def slow(x):
+        time.sleep(0.02)
+        return x
+
+    pipeline = StagedPipeline("source", [("fast", lambda x: x, 1), ("slow", slow, 1)], queue_size=1)
+    assert list(pipeline.run(range(10))) == list(range(10))
+
+    source, fast, slow_stats = pipeline.stats
+    assert get_bottleneck(pipeline.stats) is slow_stats
+    assert slow_stats.utilization > 0.5
+    # full queues block fast stages
+    assert fast.output_wait > 0.05
+    assert max(s.max_queue for s in pipeline.stats) <= 1
+    assert "Bottleneck: slow" in format_pipeline_stats(pipeline.stats)
+
+
+def test_stage_error_stops_pipeline():
+    def fail(x):
+        if x == 3:
+            raise RuntimeError("broken item")
+        return x
+
+    pipeline = StagedPipeline("source", [("fail", fail, 2), ("next", lambda x: x, 1)], queue_size=1)
+
+    with pytest.raises(RuntimeError, match="broken item"):
+        list(pipeline.run(range(1000)))
@@ -0,0 +1,42 @@
+from wikidata.entity import EntityId
+
+from entity_linking.entity_classifier import NoContextGraphEntityClassifier
+from entity_linking.graph_wikidata import (check_if_target_entity_is_in_graph,
+                                           create_graph_for_entity)
+from entity_linking.load_test_data import \
+    load_sequences_from_test_file_with_lemmas_and_tags
+from entity_linking.synthetic import (create_synthetic_wikidata_api,
+                                      generate_sequences, generate_taxonomy,
+                                      save_sequences_to_test_file)
+from entity_linking.tokenizer import WikidataMorphTagsTokenizer
+
+
+def test_generate_taxonomy():
+    taxonomy = generate_taxonomy(3, 3, 2, roots=2, seed=1)
+    assert [len(level) for level in taxonomy.levels] == [2, 6, 18, 54]
+    assert taxonomy.depth == 3
+    assert all(len(taxonomy.subclasses[e]) == 2 for e in taxonomy.leaves)
+    assert generate_taxonomy(3, 3, 2, roots=2, seed=1) == taxonomy
+
+
+def test_synthetic_api_reaches_target():
+    taxonomy = generate_taxonomy(4, 2, 2)
+    api = create_synthetic_wikidata_api(taxonomy, ambiguity=2)
+    leaf = taxonomy.leaves[0]
+    assert check_if_target_entity_is_in_graph(create_graph_for_entity(EntityId(leaf), api, 4))
+    assert api.get_pages_for_token(api.get_wikipedia_title(leaf))[0] == leaf
+
+
+def test_save_and_classify_sequences(tmp_path):
+    taxonomy = generate_taxonomy(2, 2)
+    api = create_synthetic_wikidata_api(taxonomy)
+    sequences = generate_sequences(taxonomy, 3, 10, entities_ratio=0.5)
+    file_name = str(tmp_path / "synthetic.tsv")
+    save_sequences_to_test_file(sequences, file_name)
+
+    loaded = load_sequences_from_test_file_with_lemmas_and_tags(file_name, 3)
+    assert [[t.entity_id for t in s.sequence] for s in loaded] == [[t.entity_id for t in s.sequence] for s in sequences]
+
+    classifier = NoContextGraphEntityClassifier(WikidataMorphTagsTokenizer(api, 2), api, 2, 1)
+    result_df = classifier.classify_sequence(loaded[0])
+    assert result_df["correct_predict"].sum() == result_df["test_classified"].sum()
@@ -1,6 +1,31 @@
+from typing import List
+
+from entity_linking.utils import Token, TokensSequence
+from entity_linking.wikidata_api import WikidataAPI
+
 # test entity 1 - "Nowy Targ"
 TEST_ENTITY_1: str = "Q231593"
 # test entity 2 - "The Blues Brothers"
 TEST_ENTITY_2: str = "Q1344949"
 # test entity 3 - "Krzysztof Krawczyk"
-TEST_ENTITY_3: str = "Q1380592"
\ No newline at end of file
+TEST_ENTITY_3: str = "Q1380592"
+
+
+class FakeWikidataAPI(WikidataAPI):
+    def get_subclasses_for_entity(self, entity: str) -> List[str]:
+        return {"Q1": ["Q5"], "Q2": ["Q3"]}.get(entity, [])
+
+    def get_pages_for_token(self, token: str) -> List[str]:
+        return {"Jan": ["Q2", "Q1"], "Nowak": ["Q2"]}.get(token, [])
+
+
+def create_test_sequence(idx: int) -> TokensSequence:
+    return TokensSequence(
+        [
+            Token("Jan", 0, "_", "_", "Jan", "subst:sg:nom:m1"),
+            Token("Nowak", 1, "_", "_", "Nowak", "subst:sg:nom:m1"),
+            Token("idzie", 1, "_", "_", "iść", "fin:sg:ter:imperf"),
+            Token(".", 0, "_", "_", ".", "interp"),
+        ],
+        idx,
+    )
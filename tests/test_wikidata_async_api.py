@@ -0,0 +1,170 @@
+import json
+import pickle
+import re
+import socketserver
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from threading import Lock, Thread
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+import entity_linking.wikidata_async_api as wikidata_async_api
+from entity_linking.wikidata_async_api import WikidataAsyncAPI
+
+ENTITIES = {
+    "Q1": {
+        "claims": {"P31": [{"mainsnak": {"snaktype": "value", "datavalue": {"value": {"id": "Q5"}}}}]},
+        "sitelinks": {"plwiki": {"title": "Jan", "url": "https://pl.wikipedia.org/wiki/Jan"}},
+    },
+}
+PAGES = {"Jan": ["Q2", "Q1"]}
+EXTRACTS = {"Jan": "Imię.\n\n== Historia ==\nJan jest imieniem.\n\n=== Inne ===\nx\n"}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    delay = 0.05
+    lock = Lock()
+    requests = []
+    in_flight = 0
+    max_in_flight = 0
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.requests.append(self.path)
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        time.sleep(cls.delay)
+
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        code, data = 200, None
+
+        if url.path.startswith("/wiki/Special:EntityData/"):
+            entity = url.path.split("/")[-1][: -len(".json")]
+            if entity in ENTITIES:
+                data = {"entities": {entity: ENTITIES[entity]}}
+            else:
+                code, data = 400, {"error": "Invalid ID"}
+        elif url.path == "/sparql":
+            token = re.search(r'mwapi:search "(.*?)"', params["query"]).group(1)
+            data = {"results": {"bindings": [
+                {"item": {"value": f"http://www.wikidata.org/entity/{p}"}} for p in PAGES.get(token, [])
+            ]}}
+        elif url.path == "/w/api.php":
+            title = params["titles"]
+            if title in EXTRACTS:
+                data = {"query": {"pages": {"7": {"title": title, "extract": EXTRACTS[title]}}}}
+            else:
+                data = {"query": {"pages": {"-1": {"title": title, "missing": ""}}}}
+
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+        with cls.lock:
+            cls.in_flight -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+@pytest.fixture
+def stub_url():
+    StubHandler.requests = []
+    StubHandler.max_in_flight = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def create_api(url, concurrency=16, rate_limit=0.0):
+    return WikidataAsyncAPI(
+        concurrency, rate_limit, wikidata_url=f"{url}/wiki/", sparql_url=f"{url}/sparql",
+        wikipedia_url=f"{url}/w/api.php",
+    )
+
+
+def test_lookups(stub_url):
+    api = create_api(stub_url)
+    try:
+        assert api.get_subclasses_for_entity("Q1") == ["Q5"]
+        assert api.get_subclasses_for_entity("Q404") == []
+        assert api.get_pages_for_token("Jan") == ["Q2", "Q1"]
+        assert api.get_pages_for_token("Nowak") == []
+        assert api.get_pages_for_token("a \\ b") == []
+        assert api.get_wikipedia_title("Q1") == "Jan"
+        assert api.get_wikipedia_content("Jan") == "Jan jest imieniem."
+        assert api.get_wikipedia_content("Brak") == ""
+    finally:
+        api.close()
+
+
+def test_identical_lookups_are_coalesced(stub_url):
+    api = create_api(stub_url)
+    try:
+        assert api.get_pages_for_tokens(["Jan"] * 10) == [["Q2", "Q1"]] * 10
+        assert len(StubHandler.requests) == 1
+        assert api.client.coalesced == 9
+    finally:
+        api.close()
+
+
+def test_concurrency_limit_and_connection_reuse(stub_url):
+    api = create_api(stub_url, concurrency=2)
+    try:
+        results = api.get_pages_for_tokens([f"token{i}" for i in range(8)])
+        assert results == [[]] * 8
+        assert StubHandler.max_in_flight == 2
+        assert len(StubHandler.requests) == 8
+    finally:
+        api.close()
+
+
+def test_rate_limit(stub_url):
+    StubHandler.delay = 0.0
+    api = create_api(stub_url, rate_limit=20.0)
+    try:
+        # bucket allows burst of 20 requests, next 10 wait for tokens
+        start_time = time.time()
+        api.get_pages_for_tokens([f"token{i}" for i in range(30)])
+        assert time.time() - start_time >= 0.45
+    finally:
+        StubHandler.delay = 0.05
+        api.close()
+
+
+def test_pickle(stub_url):
+    api = pickle.loads(pickle.dumps(create_api(stub_url)))
+    try:
+        assert api.get_subclasses_for_entity("Q1") == ["Q5"]
+    finally:
+        api.close()
+
+
+def test_process_has_one_client(stub_url):
+    api = create_api(stub_url)
+    client = api.client
+    try:
+        copies = [pickle.loads(pickle.dumps(api)) for _ in range(5)]
+        for copy in copies:
+            assert copy.get_subclasses_for_entity("Q1") == ["Q5"]
+        assert all(copy.client is client for copy in copies)
+        assert len(wikidata_async_api._PROCESS_CLIENTS) == 1
+    finally:
+        copies[0].close()
+
+    # closed client is not used again
+    assert not wikidata_async_api._PROCESS_CLIENTS
+    assert api.client is not client
+    api.close()
@@ -0,0 +1,421 @@
+import sqlite3
+import time
+
+import pytest
+from wikidata.entity import EntityId
+
+import entity_linking.wikidata_api as wikidata_api
+from create_db import drop_and_create_database
+from entity_linking.graph_wikidata import create_graph_for_entity
+from entity_linking.wikidata_api import (CachedWikidataAPI,
+                                         InMemoryWikidataAPI, WikidataDBAPI)
+from entity_linking.wikidata_db_api import (CACHE_ROW_VERSION,
+                                            CURRENT_SCHEMA_VERSION,
+                                            SCHEMA_VERSION_BLOB,
+                                            SCHEMA_VERSION_TEXT, CachePolicy,
+                                            add_entity_subclasses_to_data_base,
+                                            add_token_pages_to_data_base,
+                                            convert_database, evict_cache,
+                                            forget_database,
+                                            get_ancestors_config_key,
+                                            get_schema_version,
+                                            has_cache_columns)
+
+SUBCLASSES = {
+    "Q1": ["Q2", "Q3"],
+    "Q2": ["Q5"],
+    "Q3": ["Q2", "Q4167410"],
+    "Q4167410": ["Q7"],
+    "Q5": ["Q8"],
+    "Q7": [],
+    "Q8": [],
+}
+
+
+@pytest.fixture
+def database_name(tmp_path):
+    name = str(tmp_path / "entity_linking.db")
+    drop_and_create_database(name)
+    for entity, subclasses in SUBCLASSES.items():
+        add_entity_subclasses_to_data_base(name, entity, subclasses)
+    return name
+
+
+@pytest.fixture
+def lookups(monkeypatch):
+    calls = []
+    get_subclasses = wikidata_api.get_subclasses_for_entity_db
+
+    def counting_get_subclasses(database_name, entity):
+        calls.append(entity)
+        return get_subclasses(database_name, entity)
+
+    monkeypatch.setattr(wikidata_api, "get_subclasses_for_entity_db", counting_get_subclasses)
+    return calls
+
+
+def get_edges(graph):
+    return sorted(graph.edges)
+
+
+def test_ancestors_are_saved_and_read(database_name, lookups):
+    api = WikidataDBAPI(database_name)
+    expected = get_edges(create_graph_for_entity(EntityId("Q1"), InMemoryWikidataAPI(SUBCLASSES, {}), 3))
+
+    assert get_edges(create_graph_for_entity(EntityId("Q1"), api, 3)) == expected
+    # every entity is expanded once, disambiguation page is not expanded
+    assert sorted(lookups) == ["Q1", "Q2", "Q3", "Q5"]
+
+    lookups.clear()
+    ancestors = api.get_entity_ancestors("Q1", 3)
+    assert lookups == []
+    assert sorted((s, t) for s, t, _ in ancestors.edges) == expected
+    assert ("Q2", "Q5", 1) in ancestors.edges
+    assert ancestors.targets == ["Q5"]
+
+
+def test_ancestors_are_kept_per_config(database_name, lookups, monkeypatch):
+    targets = wikidata_api.TARGET_ENTITIES
+    api = WikidataDBAPI(database_name)
+    api.get_entity_ancestors("Q1", 2)
+
+    # other depth
+    lookups.clear()
+    assert ("Q5", "Q8", 2) in api.get_entity_ancestors("Q1", 3).edges
+    assert lookups
+
+    # other targets
+    lookups.clear()
+    monkeypatch.setattr(wikidata_api, "TARGET_ENTITIES", ["Q5", "Q8"])
+    assert api.get_entity_ancestors("Q1", 3).targets == ["Q5", "Q8"]
+    assert lookups
+
+    # closure of the first config is not replaced
+    lookups.clear()
+    monkeypatch.setattr(wikidata_api, "TARGET_ENTITIES", targets)
+    assert api.get_entity_ancestors("Q1", 2).targets == ["Q5"]
+    assert lookups == []
+
+    conn = sqlite3.connect(database_name)
+    rows = conn.execute("SELECT id, config FROM ancestors ORDER BY rowid").fetchall()
+    conn.close()
+    assert rows == [
+        ("Q1", get_ancestors_config_key(2, targets)),
+        ("Q1", get_ancestors_config_key(3, targets)),
+        ("Q1", get_ancestors_config_key(3, ["Q8", "Q5"])),
+    ]
+
+
+def test_ancestors_table_is_created_in_old_database(tmp_path):
+    name = str(tmp_path / "old.db")
+    conn = sqlite3.connect(name)
+    conn.execute("CREATE TABLE entity (id text, sub text)")
+    conn.execute("CREATE TABLE token (id text, pages text)")
+    conn.commit()
+    conn.close()
+    add_entity_subclasses_to_data_base(name, "Q1", ["Q5"])
+    add_entity_subclasses_to_data_base(name, "Q5", [])
+
+    assert WikidataDBAPI(name).get_entity_ancestors("Q1", 2).edges == [("Q1", "Q5", 0)]
+
+
+def test_ancestors_table_key_is_migrated(tmp_path):
+    name = str(tmp_path / "old.db")
+    conn = sqlite3.connect(name)
+    conn.execute("CREATE TABLE entity (id text, sub text)")
+    conn.execute("CREATE TABLE token (id text, pages text)")
+    conn.execute("CREATE TABLE ancestors (id text PRIMARY KEY, config text, edges text, targets text)")
+    conn.execute("INSERT INTO ancestors VALUES('Q1', 'old', '0:Q1:Q5;', 'Q5;')")
+    conn.commit()
+    conn.close()
+    add_entity_subclasses_to_data_base(name, "Q1", ["Q5"])
+    add_entity_subclasses_to_data_base(name, "Q5", [])
+
+    api = WikidataDBAPI(name)
+    assert api.get_entity_ancestors("Q1", 2).edges == [("Q1", "Q5", 0)]
+
+    conn = sqlite3.connect(name)
+    rows = conn.execute("SELECT id, config FROM ancestors ORDER BY rowid").fetchall()
+    members = conn.execute("SELECT entity FROM ancestors_member WHERE config = 'old' ORDER BY entity").fetchall()
+    conn.close()
+    assert rows == [("Q1", "old"), ("Q1", get_ancestors_config_key(2, wikidata_api.TARGET_ENTITIES))]
+    # depth of unknown config is not known, all entities of closure are its members
+    assert members == [("Q1",), ("Q5",)]
+
+
+def test_cached_api_uses_database_ancestors(database_name, lookups):
+    api = CachedWikidataAPI(WikidataDBAPI(database_name))
+    api.get_entity_ancestors("Q1", 3)
+    api.get_entity_ancestors("Q1", 3)
+
+    assert sorted(lookups) == ["Q1", "Q2", "Q3", "Q5"]
+    assert api.cache_stats()["ancestors"] == 1
+
+
+def create_text_database(name):
+    conn = sqlite3.connect(name)
+    conn.execute("CREATE TABLE entity (id text, sub text)")
+    conn.execute("CREATE TABLE token (id text, pages text)")
+    conn.executemany("INSERT INTO entity VALUES(?, ?)", [("Q1", "Q5;Q43229;"), ("Q5", ""), ("Q7", "Q1;x;")])
+    conn.execute("INSERT INTO token VALUES('Jan', 'Q8;Q1;')")
+    conn.commit()
+    conn.close()
+
+
+def test_new_database_saves_blobs(database_name):
+    add_token_pages_to_data_base(database_name, "Jan", ["Q8", "Q1"])
+    api = WikidataDBAPI(database_name)
+
+    assert get_schema_version(database_name) == CURRENT_SCHEMA_VERSION
+    assert api.get_pages_for_token("Jan") == ["Q8", "Q1"]
+    assert api.get_subclasses_for_entity("Q3") == ["Q2", "Q4167410"]
+
+    conn = sqlite3.connect(database_name)
+    types = conn.execute("SELECT DISTINCT typeof(sub) FROM entity").fetchall()
+    conn.close()
+    assert types == [("blob",)]
+
+
+def test_convert_database(tmp_path):
+    name = str(tmp_path / "old.db")
+    create_text_database(name)
+    assert get_schema_version(name) == SCHEMA_VERSION_TEXT
+    add_entity_subclasses_to_data_base(name, "Q8", ["Q5"])
+    set_rows(name, "INSERT INTO entity VALUES('Q8', 'Q5;')")
+
+    # list with ID that can't be encoded stays text, duplicated row is removed
+    assert convert_database(name) == {"entity": 3, "token": 1}
+    assert get_schema_version(name) == CURRENT_SCHEMA_VERSION
+    assert get_rows(name, "SELECT count(*) FROM entity WHERE id = 'Q8'") == [(1,)]
+
+    api = WikidataDBAPI(name)
+    assert api.get_subclasses_for_entity("Q1") == ["Q5", "Q43229"]
+    assert api.get_subclasses_for_entity("Q5") == []
+    assert api.get_subclasses_for_entity("Q7") == ["Q1", "x"]
+    assert api.get_subclasses_for_entity("Q8") == ["Q5"]
+    assert api.get_pages_for_token("Jan") == ["Q8", "Q1"]
+
+    # conversion of converted database changes nothing
+    assert convert_database(name, vacuum=False) == {"entity": 3, "token": 1}
+
+
+@pytest.fixture
+def fetched(monkeypatch):
+    calls = []
+
+    def fetch_subclasses(entity):
+        calls.append(str(entity))
+        return ["Q99"]
+
+    monkeypatch.setattr(wikidata_api, "get_subclasses_for_entity_wikidata", fetch_subclasses)
+    return calls
+
+
+def set_rows(database_name, query, parameters=()):
+    conn = sqlite3.connect(database_name)
+    conn.execute(query, parameters)
+    conn.commit()
+    conn.close()
+
+
+def get_rows(database_name, query):
+    conn = sqlite3.connect(database_name)
+    rows = conn.execute(query).fetchall()
+    conn.close()
+    return rows
+
+
+def test_stale_and_invalid_rows_are_fetched_again(database_name, fetched):
+    api = WikidataDBAPI(database_name, CachePolicy(ttl=3600, refresh_min_hits=5))
+    assert api.get_subclasses_for_entity("Q1") == ["Q2", "Q3"]
+
+    set_rows(database_name, "UPDATE entity SET fetched = 0 WHERE id = 'Q1'")
+    set_rows(database_name, "UPDATE entity SET version = ? WHERE id = 'Q2'", (CACHE_ROW_VERSION + 1,))
+
+    assert api.get_subclasses_for_entity("Q1") == ["Q99"]
+    assert api.get_subclasses_for_entity("Q2") == ["Q99"]
+    assert api.get_subclasses_for_entity("Q1") == ["Q99"]
+    assert fetched == ["Q1", "Q2"]
+    assert get_rows(database_name, "SELECT count(*) FROM entity WHERE id = 'Q1'") == [(1,)]
+
+
+def test_stale_hot_rows_are_refreshed_in_background(database_name, fetched):
+    api = WikidataDBAPI(database_name, CachePolicy(ttl=3600, refresh_min_hits=2), access_flush_every=2)
+    for _ in range(2):
+        api.get_subclasses_for_entity("Q1")
+    assert get_rows(database_name, "SELECT hits FROM entity WHERE id = 'Q1'") == [(2,)]
+
+    set_rows(database_name, "UPDATE entity SET fetched = 0 WHERE id = 'Q1'")
+    # stale value is returned at once
+    assert api.get_subclasses_for_entity("Q1") == ["Q2", "Q3"]
+    api.close()
+
+    assert fetched == ["Q1"]
+    assert api.get_subclasses_for_entity("Q1") == ["Q99"]
+    assert get_rows(database_name, "SELECT hits FROM entity WHERE id = 'Q1'") == [(3,)]
+
+
+@pytest.mark.parametrize("eviction, kept", [("lru", ["Q2", "Q3"]), ("lfu", ["Q1", "Q3"])])
+def test_eviction(database_name, eviction, kept):
+    set_rows(database_name, "UPDATE entity SET last_access = 0, hits = 0")
+    set_rows(database_name, "UPDATE entity SET last_access = 10, hits = 5 WHERE id = 'Q1'")
+    set_rows(database_name, "UPDATE entity SET last_access = 30, hits = 1 WHERE id = 'Q2'")
+    set_rows(database_name, "UPDATE entity SET last_access = 20, hits = 9 WHERE id = 'Q3'")
+
+    removed = evict_cache(database_name, CachePolicy(max_rows=2, eviction=eviction))
+
+    assert removed == {"entity": len(SUBCLASSES) - 2, "token": 0, "ancestors": 0}
+    assert sorted(row[0] for row in get_rows(database_name, "SELECT id FROM entity")) == kept
+
+
+def get_ancestors_ids(database_name):
+    ids = sorted(row[0] for row in get_rows(database_name, "SELECT id FROM ancestors"))
+    # every closure has members and members of removed closures are removed
+    keys = get_rows(database_name, "SELECT id, config FROM ancestors ORDER BY 1, 2")
+    assert get_rows(database_name, "SELECT DISTINCT id, config FROM ancestors_member ORDER BY 1, 2") == keys
+    return ids
+
+
+def test_ancestors_members_and_fetch_time(database_name):
+    api = WikidataDBAPI(database_name, CachePolicy())
+    set_rows(database_name, "UPDATE entity SET fetched = 100 + rowid")
+    api.get_entity_ancestors("Q1", 3)
+
+    # Q7 and Q8 are on the last level, their rows are not read
+    members = get_rows(database_name, "SELECT entity FROM ancestors_member ORDER BY entity")
+    assert [row[0] for row in members] == ["Q1", "Q2", "Q3", "Q4167410", "Q5"]
+    assert get_rows(database_name, "SELECT fetched FROM ancestors") == get_rows(
+        database_name, "SELECT fetched FROM entity WHERE id = 'Q1'"
+    )
+
+
+def test_stale_ancestors_are_computed_again(tmp_path):
+    name = str(tmp_path / "ttl.db")
+    drop_and_create_database(name)
+    web_api = InMemoryWikidataAPI({"Q1": ["Q2"], "Q2": ["Q5"]}, {})
+    api = WikidataDBAPI(name, CachePolicy(ttl=0.1, refresh_min_hits=5), web_api=web_api)
+    assert get_edges(create_graph_for_entity(EntityId("Q1"), api, 2)) == [("Q1", "Q2"), ("Q2", "Q5")]
+
+    web_api.subclasses["Q2"] = ["Q7"]
+    # closure is fresh before TTL
+    assert get_edges(create_graph_for_entity(EntityId("Q1"), api, 2)) == [("Q1", "Q2"), ("Q2", "Q5")]
+
+    time.sleep(0.2)
+    assert get_edges(create_graph_for_entity(EntityId("Q1"), api, 2)) == [("Q1", "Q2"), ("Q2", "Q7")]
+    get_ancestors_ids(name)
+
+
+def test_changed_rows_invalidate_ancestors(database_name, fetched, monkeypatch):
+    api = WikidataDBAPI(database_name, CachePolicy(ttl=3600, refresh_min_hits=5))
+    for entity in ["Q1", "Q5", "Q7"]:
+        api.get_entity_ancestors(entity, 3)
+    assert get_ancestors_ids(database_name) == ["Q1", "Q5", "Q7"]
+
+    # refetched row with the same subclasses keeps closures
+    set_rows(database_name, "UPDATE entity SET fetched = 0 WHERE id = 'Q7'")
+    with monkeypatch.context() as m:
+        m.setattr(wikidata_api, "get_subclasses_for_entity_wikidata", lambda entity: [])
+        assert api.get_subclasses_for_entity("Q7") == []
+    assert get_ancestors_ids(database_name) == ["Q1", "Q5", "Q7"]
+
+    # Q5 is in closures of Q1 and Q5
+    set_rows(database_name, "UPDATE entity SET fetched = 0 WHERE id = 'Q5'")
+    assert api.get_subclasses_for_entity("Q5") == ["Q99"]
+    assert get_ancestors_ids(database_name) == ["Q7"]
+
+
+def test_refreshed_rows_invalidate_ancestors(database_name, fetched):
+    api = WikidataDBAPI(database_name, CachePolicy(ttl=3600, refresh_min_hits=1), access_flush_every=1)
+    api.get_entity_ancestors("Q3", 3)
+    api.get_subclasses_for_entity("Q4167410")
+    assert get_ancestors_ids(database_name) == ["Q3"]
+
+    set_rows(database_name, "UPDATE entity SET fetched = 0 WHERE id = 'Q4167410'")
+    api.get_subclasses_for_entity("Q4167410")
+    api.flush()
+
+    assert fetched == ["Q4167410"]
+    assert get_ancestors_ids(database_name) == []
+
+
+def test_eviction_of_ancestors(database_name):
+    api = WikidataDBAPI(database_name)
+    for entity in ["Q1", "Q7", "Q8"]:
+        api.get_entity_ancestors(entity, 3)
+    set_rows(database_name, "UPDATE entity SET last_access = rowid")
+
+    # Q1 is the least recently used row, its closure is invalid
+    removed = evict_cache(database_name, CachePolicy(max_rows=len(SUBCLASSES) - 1))
+    assert removed == {"entity": 1, "token": 0, "ancestors": 0}
+    assert get_ancestors_ids(database_name) == ["Q7", "Q8"]
+
+    # entity rows of closures are kept, the least recently saved closure is over limit
+    api.get_entity_ancestors("Q8", 2)
+    set_rows(database_name, "UPDATE entity SET last_access = 100 WHERE id IN ('Q7', 'Q8')")
+    removed = evict_cache(database_name, CachePolicy(max_rows=2))
+    assert removed == {"entity": len(SUBCLASSES) - 3, "token": 0, "ancestors": 1}
+    assert get_ancestors_ids(database_name) == ["Q8", "Q8"]
+
+
+def test_eviction_by_size(database_name):
+    set_rows(database_name, "UPDATE entity SET last_access = rowid")
+    size = get_rows(database_name, "SELECT sum(length(id) + length(sub)) FROM entity")[0][0]
+
+    evict_cache(database_name, CachePolicy(max_bytes=size - 1))
+
+    # the least recently used row is removed
+    assert "Q1" not in {row[0] for row in get_rows(database_name, "SELECT id FROM entity")}
+    assert get_rows(database_name, "SELECT count(*) FROM entity") == [(len(SUBCLASSES) - 1,)]
+
+    with pytest.raises(ValueError):
+        CachePolicy(eviction="fifo")
+
+
+def test_unique_keys_are_added_to_blob_database(database_name):
+    set_rows(database_name, "DROP INDEX entity_id")
+    set_rows(database_name, "INSERT INTO entity(id, sub, hits) SELECT id, sub, hits FROM entity WHERE id = 'Q1'")
+    set_rows(database_name, "UPDATE meta SET value = ? WHERE key = 'schema_version'", (str(SCHEMA_VERSION_BLOB),))
+    forget_database(database_name)
+
+    api = WikidataDBAPI(database_name)
+    assert get_schema_version(database_name) == CURRENT_SCHEMA_VERSION
+    assert get_rows(database_name, "SELECT count(*) FROM entity WHERE id = 'Q1'") == [(1,)]
+    assert api.get_subclasses_for_entity("Q1") == ["Q2", "Q3"]
+
+
+def test_saved_row_is_upserted(database_name):
+    set_rows(database_name, "UPDATE entity SET hits = 7 WHERE id = 'Q1'")
+    add_entity_subclasses_to_data_base(database_name, "Q1", ["Q8"])
+
+    assert get_rows(database_name, "SELECT sub IS NOT NULL, hits FROM entity WHERE id = 'Q1'") == [(1, 7)]
+    assert WikidataDBAPI(database_name).get_subclasses_for_entity("Q1") == ["Q8"]
+    with pytest.raises(sqlite3.IntegrityError):
+        set_rows(database_name, "INSERT INTO entity(id) VALUES('Q1')")
+
+
+def test_cache_columns_are_added_to_old_database(tmp_path, fetched):
+    name = str(tmp_path / "old.db")
+    create_text_database(name)
+    assert not has_cache_columns(name)
+
+    api = WikidataDBAPI(name, CachePolicy(max_rows=1), evict_every=1)
+    assert has_cache_columns(name)
+    assert api.get_subclasses_for_entity("Q1") == ["Q5", "Q43229"]
+    assert get_rows(name, "SELECT count(*) FROM entity WHERE fetched IS NULL") == [(0,)]
+
+    api.get_subclasses_for_entity("Q404")
+    assert get_rows(name, "SELECT id FROM entity") == [("Q404",)]
+
+
+def test_missing_rows_are_fetched_by_web_api(database_name):
+    web_api = InMemoryWikidataAPI({"Q404": ["Q5"]}, {"Jan": ["Q1"]}, {"Q1": "Jan"})
+    api = WikidataDBAPI(database_name, web_api=web_api)
+
+    assert api.get_subclasses_for_entity("Q404") == ["Q5"]
+    assert api.get_pages_for_token("Jan") == ["Q1"]
+    assert api.get_wikipedia_title("Q1") == "Jan"
+
+    # saved rows are read from database
+    web_api.subclasses.clear()
+    assert api.get_subclasses_for_entity("Q404") == ["Q5"]
+    assert api.get_subclasses_for_entity("Q1") == ["Q2", "Q3"]
@@ -0,0 +1,117 @@
+import os
+import time
+from io import StringIO
+
+import pytest
+
+from entity_linking.batch_linker import link_sequences
+from entity_linking.entity_classifier import NoContextGraphEntityClassifier
+from entity_linking.reachability import ApiReachability
+from entity_linking.tokenizer import WikidataMorphTagsTokenizer
+from entity_linking.utils import EntityAncestors
+from entity_linking.wikidata_recording import (RecordingReachability,
+                                               RecordingWikidataAPI,
+                                               ReplayReachability,
+                                               ReplayWikidataAPI,
+                                               get_recording_part_name,
+                                               load_recording,
+                                               merge_recordings)
+from .test_utils import FakeWikidataAPI, create_test_sequence
+
+
+def link(api, processes_num):
+    classifier = NoContextGraphEntityClassifier(WikidataMorphTagsTokenizer(api, 2), api, 2, processes_num)
+    output = StringIO()
+    link_sequences(classifier, [create_test_sequence(i) for i in range(4)], output, processes_num, True, 1)
+    return output.getvalue()
+
+
+def test_record_in_workers_and_replay(tmp_path):
+    file_name = str(tmp_path / "recording.jsonl.gz")
+    expected = link(FakeWikidataAPI(), 1)
+
+    assert link(RecordingWikidataAPI(FakeWikidataAPI(), file_name), 2) == expected
+    assert merge_recordings(file_name) > 0
+    assert os.listdir(str(tmp_path)) == ["recording.jsonl.gz"]
+
+    replay = ReplayWikidataAPI(file_name)
+    assert link(replay, 1) == expected
+    assert replay.misses == 0
+
+
+def test_record_wikipedia_and_replay_strict(tmp_path):
+    file_name = str(tmp_path / "recording.jsonl.gz")
+
+    class WikipediaAPI(FakeWikidataAPI):
+        def get_wikipedia_title(self, entity):
+            return {"Q1": "Jan"}.get(entity)
+
+        def get_wikipedia_content(self, page_title):
+            return "Jan jest człowiekiem."
+
+    api = RecordingWikidataAPI(WikipediaAPI(), file_name)
+    assert api.get_wikipedia_title("Q1") == "Jan"
+    assert api.get_wikipedia_title("Q2") is None
+    assert api.get_wikipedia_content("Jan") == "Jan jest człowiekiem."
+    api.close()
+
+    replay = ReplayWikidataAPI(file_name, strict=True)
+    assert replay.get_wikipedia_title("Q1") == "Jan"
+    assert replay.get_wikipedia_title("Q2") is None
+    assert replay.get_wikipedia_content("Jan") == "Jan jest człowiekiem."
+    with pytest.raises(KeyError):
+        replay.get_pages_for_token("Kowalski")
+
+
+def test_not_finished_part_is_readable(tmp_path):
+    file_name = str(tmp_path / "recording.jsonl.gz")
+    api = RecordingWikidataAPI(FakeWikidataAPI(), file_name)
+    api.get_pages_for_token("Jan")
+    api.get_subclasses_for_entity("Q1")
+
+    # part file without gzip trailer, as left by terminated worker
+    assert load_recording(file_name) == {("p", "Jan"): ["Q2", "Q1"], ("s", "Q1"): ["Q5"]}
+    assert os.path.isfile(get_recording_part_name(file_name, os.getpid()))
+
+
+def test_replay_latency(tmp_path):
+    file_name = str(tmp_path / "recording.jsonl.gz")
+    api = RecordingWikidataAPI(FakeWikidataAPI(), file_name)
+    api.get_pages_for_token("Jan")
+    api.close()
+
+    replay = ReplayWikidataAPI(file_name, latency=0.02)
+    start_time = time.time()
+    assert replay.get_pages_for_token("Jan") == ["Q2", "Q1"]
+    assert time.time() - start_time >= 0.02
+
+
+def test_record_and_replay_reachability(tmp_path):
+    file_name = str(tmp_path / "recording.jsonl.gz")
+    api = RecordingWikidataAPI(FakeWikidataAPI(), file_name)
+    backend = RecordingReachability(ApiReachability(FakeWikidataAPI(), ["Q5"]), api)
+    expected = backend.get_reachable_targets(["Q1", "Q2"], 2)
+    assert expected["Q1"] == {"Q5": 1}
+    api.close()
+
+    replay = ReplayReachability(ReplayWikidataAPI(file_name, strict=True))
+    assert replay.get_reachable_targets(["Q1", "Q2"], 2) == expected
+    with pytest.raises(KeyError):
+        replay.get_reachable_targets(["Q1"], 3)
+
+
+def test_record_and_replay_ancestors(tmp_path):
+    class AncestorsAPI(FakeWikidataAPI):
+        def get_entity_ancestors(self, entity, depth):
+            return EntityAncestors([(entity, "Q5", 0)], ["Q5"])
+
+    file_name = str(tmp_path / "recording.jsonl.gz")
+    api = RecordingWikidataAPI(AncestorsAPI(), file_name)
+    expected = api.get_entity_ancestors("Q1", 3)
+    api.close()
+
+    # closure is replayed without subclasses lookups
+    replay = ReplayWikidataAPI(file_name, strict=True)
+    assert replay.get_entity_ancestors("Q1", 3) == expected
+    with pytest.raises(KeyError):
+        replay.get_entity_ancestors("Q1", 2)
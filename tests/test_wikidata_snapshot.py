@@ -0,0 +1,87 @@
+import pickle
+import sqlite3
+from multiprocessing import Pool
+
+import pytest
+
+from create_db import drop_and_create_database
+from entity_linking.qid_codec import encode_qids
+from entity_linking.wikidata_db_api import (add_entity_subclasses_to_data_base,
+                                            add_token_pages_to_data_base)
+from entity_linking.wikidata_snapshot import (SNAPSHOT_MAGIC,
+                                              WikidataSnapshotAPI,
+                                              export_snapshot,
+                                              is_snapshot_file)
+from .test_utils import FakeWikidataAPI
+
+SUBCLASSES = {"Q1": ["Q5", "Q43229"], "Q5": [], "Q7": ["Q1", "x"]}
+PAGES = {"Jan": ["Q8", "Q1"], "Kowalski": [], "Łódź": ["Q580"]}
+
+
+@pytest.fixture
+def snapshot_name(tmp_path):
+    database_name = str(tmp_path / "entity_linking.db")
+    drop_and_create_database(database_name)
+    for entity, subclasses in SUBCLASSES.items():
+        add_entity_subclasses_to_data_base(database_name, entity, subclasses)
+    for token, pages in PAGES.items():
+        add_token_pages_to_data_base(database_name, token, pages)
+    # the first record of duplicated key is kept, keys are unique since schema version 3, so duplicate is
+    # inserted into table without unique index, like in older database
+    conn = sqlite3.connect(database_name)
+    with conn:
+        conn.execute("DROP INDEX token_id")
+        conn.execute("INSERT INTO token (id, pages) VALUES (?, ?)", ("Jan", encode_qids(["Q2"])))
+    conn.close()
+
+    name = str(tmp_path / "entity_linking.snap")
+    assert export_snapshot(database_name, name) == {"entity": 3, "token": 3}
+    assert is_snapshot_file(name) and not is_snapshot_file(database_name)
+    return name
+
+
+def test_snapshot_lookups(snapshot_name):
+    api = WikidataSnapshotAPI(snapshot_name)
+    assert len(api) == 6
+
+    for entity, subclasses in SUBCLASSES.items():
+        assert api.get_subclasses_for_entity(entity) == subclasses
+    for token, pages in PAGES.items():
+        assert api.get_pages_for_token(token) == pages
+
+    assert api.get_subclasses_for_entity("Q404") == []
+    assert api.get_pages_for_token("Q1") == []
+    assert api.misses == 2
+    api.close()
+
+
+def test_snapshot_fallback(snapshot_name):
+    api = WikidataSnapshotAPI(snapshot_name, FakeWikidataAPI())
+    fake = FakeWikidataAPI()
+
+    assert api.get_pages_for_token("Jan") == ["Q8", "Q1"]
+    assert api.get_pages_for_token("Nowak") == fake.get_pages_for_token("Nowak") == ["Q2"]
+    assert api.misses == 1
+
+
+def get_pages(api):
+    return [api.get_pages_for_token(t) for t in PAGES]
+
+
+def test_snapshot_in_worker_processes(snapshot_name):
+    api = WikidataSnapshotAPI(snapshot_name)
+    assert pickle.loads(pickle.dumps(api)).get_subclasses_for_entity("Q1") == ["Q5", "Q43229"]
+
+    with Pool(2) as pool:
+        assert pool.map(get_pages, [api, api]) == [list(PAGES.values())] * 2
+
+
+def test_not_snapshot_file(tmp_path):
+    name = str(tmp_path / "other.snap")
+    with open(name, "wb") as f:
+        f.write(SNAPSHOT_MAGIC[:-1] + b"\x09" + b"\x00" * 64)
+
+    assert not is_snapshot_file(name)
+    assert not is_snapshot_file(str(tmp_path / "missing.snap"))
+    with pytest.raises(ValueError):
+        WikidataSnapshotAPI(name)